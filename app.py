@@ -11,7 +11,6 @@
 
 from __future__ import annotations
 
-import io
 import json
 import logging
 import os
@@ -19,28 +18,38 @@ import re
 import threading
 import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
+
+from core_funnels import INVALID, Completion, Funnel, FunnelContext, FunnelEffects, FunnelEngine, Step
+from core_classifier import IntentClassifier, Prediction, load_labeled_csv, seed_examples
+from core_intents import CommandIndex, IntentMatcher
+from core_retrieval import ensure_index as ensure_faq_index, load_index as load_faq_index
+from integrations_google import GoogleServices, LazyService, SheetSnapshot
+from integrations_gpt import ask_gpt, faq_answer, sdk_available as gpt_sdk_available, stats as gpt_stats
+from utils_amounts import parse_amount
+from utils_circuit_breaker import BreakerRegistry
+from utils_latency import LatencyRegistry
+from utils_logger import LazyJson, SamplingFilter, parse_sample_rates, setup_queue_logging
+from utils_metrics import StageMetrics
+from utils_profiler import RequestProfiler, StackSampler
+from utils_validators import extract_messages
+from workers_bus_emitter import BusEmitter
+from workers_outbox import Outbox
+from workers_campaign_pacer import CampaignPacer
+from workers_debounce import InboundDebouncer
+from workers_delivery_tracker import DeliveryTracker
+from workers_scheduler import JobScheduler
+from workers_status_buffer import StatusRingBuffer, extract_statuses, is_status_only
+from workers_warmup import Warmup
 
-# Google
-try:
-    from google.oauth2 import service_account
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseUpload
-except Exception:  # pragma: no cover - dependencias opcionales de entorno
-    service_account = None
-    build = None
-    MediaIoBaseUpload = None
-
-# GPT opcional
-try:
-    import openai
-except Exception:  # pragma: no cover - dependencia opcional
-    openai = None
 
 
 # ==========================
@@ -50,9 +59,25 @@ load_dotenv()
 
 META_TOKEN = os.getenv("META_TOKEN", "").strip()
 WABA_PHONE_ID = os.getenv("WABA_PHONE_ID", "").strip()
+# Base de la Graph API; el benchmark de carga la apunta a un servidor local.
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com/v20.0").strip().rstrip("/")
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "").strip()
 ADVISOR_NUMBER = os.getenv("ADVISOR_NUMBER", "5216682478005").strip()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
+FAQ_INDEX_DIR = os.getenv("FAQ_INDEX_DIR", os.path.join("knowledge", "index")).strip()
+# El indice se construye en el build del deploy:
+#   python core_retrieval.py build --src knowledge --out knowledge/index
+# FAQ_AUTO_BUILD=true lo construye al arrancar si falta o si las fuentes
+# cambiaron (apagado por defecto: alarga el arranque en frio).
+FAQ_SRC_DIR = os.getenv("FAQ_SRC_DIR", "knowledge").strip()
+FAQ_AUTO_BUILD = os.getenv("FAQ_AUTO_BUILD", "false").strip().lower() in ("1", "true", "yes", "on")
+# Clasificador local de intencion (core_classifier). Historico etiquetado
+# opcional: export CSV de RESPUESTAS_CLIENTE con columnas MENSAJE e INTENT.
+INTENT_TRAINING_CSV = os.getenv("INTENT_TRAINING_CSV", "").strip()
+INTENT_SHORT_CIRCUIT_ENABLED = os.getenv("INTENT_SHORT_CIRCUIT_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+INTENT_SHORT_CIRCUIT_MIN_CONFIDENCE = float(os.getenv("INTENT_SHORT_CIRCUIT_MIN_CONFIDENCE", "0.9").strip() or "0.9")
+# Debajo de esta confianza el product_hint sale de las keywords (INTENT_SIGNALS).
+INTENT_HINT_MIN_CONFIDENCE = float(os.getenv("INTENT_HINT_MIN_CONFIDENCE", "0.25").strip() or "0.25")
 
 BOARDROOM_DECISION_URL = os.getenv("BOARDROOM_DECISION_URL", "").strip()
 BOARDROOM_AUTH_TOKEN = os.getenv("BOARDROOM_AUTH_TOKEN", "").strip()
@@ -61,6 +86,22 @@ BOARDROOM_ORCHESTRATE_PATH = "/api/boardroom/orchestrate"
 BUS_URL = os.getenv("BUS_URL", "").strip()
 BUS_INTERNAL_TOKEN = os.getenv("BUS_INTERNAL_TOKEN", "").strip()
 _BUS_ACTIVE = os.getenv("BUS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+# Emisor acotado para eventos fire-and-forget al bus (observaciones y
+# eventos legacy): workers fijos, cola con politica de desborde y batching
+# opcional si el bus expone BUS_BATCH_URL.
+BUS_EMITTER_WORKERS = int(os.getenv("BUS_EMITTER_WORKERS", "2"))
+BUS_EMITTER_QUEUE_MAX = int(os.getenv("BUS_EMITTER_QUEUE_MAX", "1000"))
+BUS_EMITTER_OVERFLOW = os.getenv("BUS_EMITTER_OVERFLOW", "drop_oldest").strip().lower()
+BUS_EMITTER_BATCH_MAX = int(os.getenv("BUS_EMITTER_BATCH_MAX", "1"))
+BUS_BATCH_URL = os.getenv("BUS_BATCH_URL", "").strip()
+# Outbox durable (SQLite en VICKY_DB_PATH) para confirmaciones de
+# instrucciones y eventos al bus: el turno solo escribe local y un drenador
+# entrega en lotes con reintento y dedupe por instruction_id/event_id.
+BUS_OUTBOX_ENABLED = os.getenv("BUS_OUTBOX_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+BUS_OUTBOX_BATCH_MAX = int(os.getenv("BUS_OUTBOX_BATCH_MAX", "50"))
+BUS_OUTBOX_MAX_ATTEMPTS = int(os.getenv("BUS_OUTBOX_MAX_ATTEMPTS", "10"))
+# POSTs en paralelo por proceso al drenar (sin BUS_BATCH_URL, una fila = un POST).
+BUS_OUTBOX_WORKERS = int(os.getenv("BUS_OUTBOX_WORKERS", "2"))
 BOARDROOM_IS_AUTHORITY = True
 NEUTRAL_FALLBACK_MESSAGE = "Recibí tu mensaje. En un momento te atiendo."
 # SECOM-AUTH-FIX-1 (DOC-0043, hydra-source-of-truth): default false = modo
@@ -70,6 +111,14 @@ NEUTRAL_FALLBACK_MESSAGE = "Recibí tu mensaje. En un momento te atiendo."
 SECOM_LOCAL_FALLBACK_ENABLED = os.getenv("SECOM_LOCAL_FALLBACK_ENABLED", "false").strip().lower() in (
     "1", "true", "yes", "on",
 )
+# Consulta "hedged": con SECOM_LOCAL_FALLBACK_ENABLED, las lecturas que
+# necesitaria el TECHNICAL_FALLBACK se preparan en paralelo a la consulta a
+# Boardroom. Solo lecturas sin efectos; el plan se usa unicamente si el
+# resultado es NOT_HANDLED/FAILED (un solo response owner por turno).
+BOARDROOM_HEDGED_FALLBACK_ENABLED = os.getenv("BOARDROOM_HEDGED_FALLBACK_ENABLED", "true").strip().lower() in (
+    "1", "true", "yes", "on",
+)
+BOARDROOM_HEDGE_WORKERS = int(os.getenv("BOARDROOM_HEDGE_WORKERS", "4"))
 _BOARDROOM_ALLOWED_INSTRUCTIONS = {
     "send_message",
     "ask_question",
@@ -81,10 +130,31 @@ _BOARDROOM_ALLOWED_INSTRUCTIONS = {
 }
 
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON", "").strip()
+# Opcional: directorio con <api>.<version>.json de discovery propios; sin el,
+# se usa el documento estatico que trae googleapiclient.
+GOOGLE_DISCOVERY_DIR = os.getenv("GOOGLE_DISCOVERY_DIR", "").strip()
 SHEETS_ID_LEADS = os.getenv("SHEETS_ID_LEADS", "").strip()
 SHEETS_TITLE_LEADS = os.getenv("SHEETS_TITLE_LEADS", "Prospectos SECOM Auto").strip()
 DRIVE_PARENT_FOLDER_ID = os.getenv("DRIVE_PARENT_FOLDER_ID", "").strip()
 AUTO_SEND_TOKEN = os.getenv("AUTO_SEND_TOKEN", "").strip()
+# Lecturas completas de la hoja de leads y de ENVIO_STATUS se reusan por
+# N segundos (0 = leer siempre). Las escrituras de este proceso invalidan;
+# las de otro worker se ven al vencer el TTL.
+LEADS_CACHE_TTL_S = float(os.getenv("LEADS_CACHE_TTL_S", "30"))
+# Un telefono que no esta en el snapshot de leads se busca otra vez en una
+# lectura fresca (un lead recien agregado por otro proceso no espera el TTL);
+# misses dentro de esta ventana comparten la misma relectura.
+LEADS_MISS_REFRESH_MIN_AGE_S = 1.0
+ENVIO_STATUS_CACHE_TTL_S = float(os.getenv("ENVIO_STATUS_CACHE_TTL_S", "30"))
+# Warm-up opcional al arrancar (clientes Google, hoja de leads, ENVIO_STATUS,
+# carpetas de Drive, pool del bus). /ext/ready responde 503 mientras corre;
+# WARMUP_DEADLINE_S acota cuanto puede retrasar el ready.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+WARMUP_DEADLINE_S = float(os.getenv("WARMUP_DEADLINE_S", "60"))
+# Profiling bajo demanda (/ext/profile/*). Con directorio, cada captura se
+# guarda ademas como archivo (.collapsed / .pstats).
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "").strip()
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
 
 # CF-4: celda de control fuera del rango A:Z que lee _sheet_get_rows(), para
 # no interferir con los datos de leads. Kill switch de la campana outbound
@@ -101,45 +171,117 @@ CAMPAIGN_PAUSED_VALUE = "PAUSED"
 CAMPAIGN_FAILURE_THRESHOLD = int(os.getenv("CAMPAIGN_FAILURE_THRESHOLD", "3"))
 _consecutive_send_failures = 0
 
+# Pacer in-process de la campana (reemplaza al cron de /ext/auto-send-one).
+# El kill switch se relee cada CAMPAIGN_PACER_PAUSE_CHECK_S y la hoja de
+# leads cada CAMPAIGN_PACER_REFRESH_S, no por mensaje.
+CAMPAIGN_PACER_DEFAULT_RATE_PER_MIN = float(os.getenv("CAMPAIGN_PACER_DEFAULT_RATE_PER_MIN", "2"))
+CAMPAIGN_PACER_MAX_RATE_PER_MIN = float(os.getenv("CAMPAIGN_PACER_MAX_RATE_PER_MIN", "60"))
+CAMPAIGN_PACER_PAUSE_CHECK_S = float(os.getenv("CAMPAIGN_PACER_PAUSE_CHECK_S", "30"))
+CAMPAIGN_PACER_REFRESH_S = float(os.getenv("CAMPAIGN_PACER_REFRESH_S", "300"))
+
+# Store local (SQLite) para jobs diferidos: recordatorios de poliza y
+# reintentos que antes vivian en threads dormidos y se perdian en cada
+# reinicio/deploy. En Render apuntar a un disco persistente.
+VICKY_DB_PATH = os.getenv("VICKY_DB_PATH", "vicky_local.sqlite3").strip()
+# Plantilla Meta opcional para el recordatorio -30d al cliente (fuera de la
+# ventana de 24h no se puede mandar texto libre). Sin plantilla solo se
+# avisa al asesor.
+AUTO_REMINDER_TEMPLATE = os.getenv("AUTO_REMINDER_TEMPLATE", "").strip()
+AUTO_REMINDER_HOUR_UTC = 16  # ~9-10am hora de Sinaloa
+
+# Circuit breakers por upstream (boardroom, bus, sheets, graph): con el
+# upstream conocido como caido el hot path va directo al fallback existente
+# en vez de pagar el timeout completo en cada turno. Estado en /ext/health.
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_WINDOW_S = float(os.getenv("BREAKER_WINDOW_S", "30"))
+BREAKER_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "30"))
+BREAKER_PROBE_INTERVAL_S = float(os.getenv("BREAKER_PROBE_INTERVAL_S", "5"))
+
+# Timeout adaptativo para Boardroom y el bus: percentil de las latencias
+# recientes del endpoint + margen, acotado por piso/techo. Con menos de
+# MIN_SAMPLES muestras se usa DEFAULT_S (el antiguo timeout fijo).
+BOARDROOM_TIMEOUT_PERCENTILE = float(os.getenv("BOARDROOM_TIMEOUT_PERCENTILE", "0.95"))
+BOARDROOM_TIMEOUT_MARGIN_S = float(os.getenv("BOARDROOM_TIMEOUT_MARGIN_S", "0.3"))
+BOARDROOM_TIMEOUT_FLOOR_S = float(os.getenv("BOARDROOM_TIMEOUT_FLOOR_S", "0.8"))
+BOARDROOM_TIMEOUT_CEILING_S = float(os.getenv("BOARDROOM_TIMEOUT_CEILING_S", "6"))
+BOARDROOM_TIMEOUT_DEFAULT_S = float(os.getenv("BOARDROOM_TIMEOUT_DEFAULT_S", "3"))
+BOARDROOM_TIMEOUT_MIN_SAMPLES = int(os.getenv("BOARDROOM_TIMEOUT_MIN_SAMPLES", "20"))
+BOARDROOM_LATENCY_WINDOW = int(os.getenv("BOARDROOM_LATENCY_WINDOW", "200"))
+
+# Debounce de rafagas: mensajes de texto consecutivos del mismo telefono
+# dentro de la ventana se procesan como un solo turno. 0 = deshabilitado.
+# Los funnels deterministas activos nunca se agregan (cada respuesta cuenta).
+INBOUND_DEBOUNCE_MS = int(os.getenv("INBOUND_DEBOUNCE_MS", "0"))
+INBOUND_DEBOUNCE_MAX_WAIT_MS = int(os.getenv("INBOUND_DEBOUNCE_MAX_WAIT_MS", "5000"))
+INBOUND_DEBOUNCE_MAX_MESSAGES = int(os.getenv("INBOUND_DEBOUNCE_MAX_MESSAGES", "10"))
+INBOUND_DEBOUNCE_WORKERS = int(os.getenv("INBOUND_DEBOUNCE_WORKERS", "4"))
+# Webhooks con varios mensajes (Meta agrupa bajo carga): se procesan todos,
+# agrupados por telefono y en orden; grupos de telefonos distintos corren en
+# paralelo con hasta INBOUND_BATCH_WORKERS threads.
+INBOUND_BATCH_WORKERS = int(os.getenv("INBOUND_BATCH_WORKERS", "4"))
+
+# Callbacks solo-status (sent/delivered/read/failed): el webhook los deja en
+# un ring buffer en memoria y responde 200 sin parsear; un thread los procesa
+# en lotes. Buffer lleno = se descarta el mas viejo.
+STATUS_FAST_PATH_ENABLED = os.getenv("STATUS_FAST_PATH_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+STATUS_BUFFER_SIZE = int(os.getenv("STATUS_BUFFER_SIZE", "10000"))
+STATUS_BATCH_MAX = int(os.getenv("STATUS_BATCH_MAX", "200"))
+
+# Tracker de entregas: wamid de cada plantilla enviada -> estado segun los
+# callbacks. Los cambios se escriben cada DELIVERY_FLUSH_INTERVAL_S en un solo
+# append a ENVIO_STATUS y un solo batchUpdate a la hoja de leads (columnas
+# opcionales; si no existen en el Sheet no se escriben).
+DELIVERY_FLUSH_INTERVAL_S = float(os.getenv("DELIVERY_FLUSH_INTERVAL_S", "10"))
+DELIVERY_INDEX_MAX = int(os.getenv("DELIVERY_INDEX_MAX", "50000"))
+LEADS_DELIVERY_STATE_COLUMN = os.getenv("LEADS_DELIVERY_STATE_COLUMN", "ENTREGA_ESTADO").strip()
+LEADS_DELIVERY_TIME_COLUMN = os.getenv("LEADS_DELIVERY_TIME_COLUMN", "ENTREGA_AT").strip()
+
 PORT = int(os.getenv("PORT", "5000"))
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+# Logging: el request solo encola; un QueueListener escribe a stderr
+# (utils_logger). Lineas de alto volumen (status callbacks, progreso del
+# envio masivo) se muestrean con LOG_SAMPLE_RATES="clave=tasa,...".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_QUEUE_ENABLED = os.getenv("LOG_QUEUE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "status=0.1,bulk_progress=0.1").strip()
+
+_log_format = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+_log_level = getattr(logging, LOG_LEVEL, logging.INFO)
+_log_pipeline = None
+if LOG_QUEUE_ENABLED:
+    _log_pipeline = setup_queue_logging(_log_level, _log_format, "%Y-%m-%d %H:%M:%S", LOG_QUEUE_MAX)
+else:
+    logging.basicConfig(level=_log_level, format=_log_format, datefmt="%Y-%m-%d %H:%M:%S")
 log = logging.getLogger("vicky-secom")
+_log_sampler = SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES))
+log.addFilter(_log_sampler)
 
-if OPENAI_API_KEY and openai:
-    try:
-        openai.api_key = OPENAI_API_KEY
-        log.info("OpenAI configurado correctamente")
-    except Exception:
-        log.warning("OpenAI configurado pero no disponible")
+# El cliente OpenAI (uno, compartido y con pool) lo crea integrations_gpt
+# en la primera solicitud "sgpt:"; aqui solo se verifica que el SDK exista.
+openai_ready = bool(OPENAI_API_KEY) and gpt_sdk_available()
 
 
 # ==========================
 # Google setup degradable
 # ==========================
-creds = None
-sheets_svc = None
-drive_svc = None
-google_ready = False
+# Sheets y Drive se crean en el primer uso (integrations_google), con el
+# documento de discovery estatico. Si crearlos falla, google_ready pasa a
+# False y el bot sigue en modo minimo como antes.
+def _google_init_failed(_exc: Exception) -> None:
+    global google_ready
+    google_ready = False
 
-if GOOGLE_CREDENTIALS_JSON and service_account and build:
-    try:
-        info = json.loads(GOOGLE_CREDENTIALS_JSON)
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = service_account.Credentials.from_service_account_info(info, scopes=scopes)
-        sheets_svc = build("sheets", "v4", credentials=creds)
-        drive_svc = build("drive", "v3", credentials=creds)
-        google_ready = True
-        log.info("✅ Google services listos (Sheets + Drive)")
-    except Exception:
-        log.exception("❌ No fue posible inicializar Google. Modo mínimo activo.")
+
+_google = GoogleServices(GOOGLE_CREDENTIALS_JSON, discovery_dir=GOOGLE_DISCOVERY_DIR, on_failure=_google_init_failed)
+google_ready = _google.configured
+sheets_svc = LazyService(_google.sheets) if google_ready else None
+drive_svc = LazyService(_google.drive) if google_ready else None
+
+if google_ready:
+    log.info("✅ Google configurado (Sheets + Drive se crean en el primer uso)")
 else:
     log.warning("⚠️ Credenciales de Google no disponibles. Modo mínimo activo.")
 
@@ -199,6 +341,127 @@ TEMPLATE_INTEREST_WORDS = {
     "vrim10",
 }
 
+# Comandos que el router local entiende tal cual; cualquier otro texto en
+# estado idle se reporta al asesor como duda/interes.
+LOCAL_MENU_COMMANDS = frozenset({
+    "1", "2", "3", "4", "5", "6", "7",
+    "menu", "menú", "inicio", "hola",
+    "imss", "ley 73", "prestamo", "préstamo", "pension", "pensión",
+    "auto", "seguro auto", "seguros de auto",
+    "vida", "salud", "seguro de vida", "seguro de salud",
+    "vrim", "tarjeta medica", "tarjeta médica",
+    "empresarial", "pyme", "credito", "crédito", "credito empresarial", "crédito empresarial",
+    "financiamiento", "financiamiento practico", "financiamiento práctico",
+    "contactar", "asesor", "contactar con christian",
+})
+
+# Alias de cada comando del menu. _command_index (core_intents.CommandIndex)
+# los resuelve sin acentos y con tolerancia a typos ("menuu", "seguro d auto").
+COMMAND_ALIASES = {
+    "imss": ("1", "imss", "ley 73", "préstamo", "prestamo", "pension", "pensión", "préstamo imss"),
+    "auto": ("2", "auto", "seguros de auto", "seguro auto", "seguro de auto"),
+    "vida": (
+        "3", "vida", "salud", "seguro de vida", "seguro de salud", "vida temporal",
+        "seguro vida", "seguros de vida", "protección familiar", "proteccion familiar",
+        "seguro de vida y salud",
+    ),
+    "vrim": ("4", "vrim", "tarjeta médica", "tarjeta medica"),
+    "empresarial": ("5", "empresarial", "pyme", "crédito empresarial", "credito empresarial"),
+    "financiamiento": (
+        "6", "financiamiento práctico", "financiamiento practico", "crédito simple", "credito simple", "financiamiento",
+    ),
+    "contacto": ("7", "contactar", "asesor", "contactar con christian"),
+    "menu": ("menu", "menú", "inicio"),
+}
+# "salud" a una letra de "saludo": solo exacto.
+COMMAND_EXACT_ONLY = ("salud",)
+
+# Vocabulario de senales de intencion. Se compila una sola vez en
+# _intent_matcher (core_intents): una regex, una pasada por texto.
+# Las keywords se comparan sin acentos, por palabra completa y con plural.
+INTENT_SIGNALS = {
+    "positive": ("sí", "claro", "ok", "okay", "okey", "de acuerdo", "vale", "afirmativo", "correcto", "me interesa"),
+    "negative": ("no", "nel", "nop", "negativo", "no quiero", "no gracias", "no interesa"),
+    "alianza": ("alianza", "despacho", "contable", "contador", "comisión"),
+    "non_alianza": (
+        "auto", "automóvil", "seguro", "póliza", "tpv", "terminal", "imss", "ley 73",
+        "préstamo", "crédito", "vida", "salud", "vrim",
+    ),
+    # Limites de palabra: las variantes que antes empataban por substring
+    # ("automóvil", "pensionado") van explicitas (sin acentos da igual).
+    "auto_context": ("auto", "automóvil", "seguro auto", "seguro de auto", "póliza", "placa"),
+    "non_auto": (
+        "crédito", "préstamo", "imss", "ley 73", "empresarial",
+        "pyme", "tpv", "terminal", "vida", "salud", "vrim", "financiamiento",
+    ),
+    "credit": ("crédito", "préstamo"),
+    "tpv_interest": (
+        "tpv", "terminal", "punto de venta", "punto-de-venta",
+        "cobrar con tarjeta", "cobro con tarjeta", "pagar con tarjeta",
+        "ligas de pago", "link de pago", "link pago", "cobro a distancia",
+    ),
+    "hint_vida": ("vida", "vida temporal", "seguro de vida", "protección familiar"),
+    "hint_auto": ("auto", "automóvil", "seguro auto", "placa", "póliza"),
+    "hint_tpv": ("tpv", "terminal", "punto de venta"),
+    "hint_imss": ("imss", "ley 73", "pensión", "pensionado", "pensionada"),
+    "hint_empresarial": ("empresarial", "pyme"),
+}
+_intent_matcher = IntentMatcher(INTENT_SIGNALS)
+
+GREETING_PHRASES = frozenset({
+    "hola", "buenas", "buenos dias", "buenos días", "buen dia", "buen día",
+    "buenas tardes", "buenas noches", "hey", "que tal", "qué tal", "holi",
+})
+
+# Ejemplos semilla del clasificador local: los mismos alias y keywords que
+# ya entiende el router. El historico etiquetado (INTENT_TRAINING_CSV) se suma.
+INTENT_SEEDS = {
+    "imss": COMMAND_ALIASES["imss"] + INTENT_SIGNALS["hint_imss"],
+    "auto": COMMAND_ALIASES["auto"] + INTENT_SIGNALS["hint_auto"],
+    "vida": COMMAND_ALIASES["vida"] + INTENT_SIGNALS["hint_vida"],
+    "vrim": COMMAND_ALIASES["vrim"],
+    "tpv": INTENT_SIGNALS["tpv_interest"],
+    "empresarial": COMMAND_ALIASES["empresarial"],
+    "financiamiento": COMMAND_ALIASES["financiamiento"],
+    "contact": COMMAND_ALIASES["contacto"],
+    "menu": COMMAND_ALIASES["menu"],
+    "greeting": tuple(GREETING_PHRASES),
+    "negative": INTENT_SIGNALS["negative"],
+}
+# Intencion -> product_hint. Solo los valores que Boardroom ya recibia;
+# vrim, financiamiento y el resto de intenciones viajan como "unknown".
+PRODUCT_HINTS = {
+    "vida": "vida_temporal",
+    "auto": "auto",
+    "tpv": "tpv",
+    "imss": "imss",
+    "empresarial": "empresarial",
+}
+# Senal de keywords -> product_hint, en el orden de prioridad de siempre;
+# respaldo de _infer_product_hint cuando el clasificador no esta seguro.
+SIGNAL_PRODUCT_HINTS = (
+    ("hint_vida", "vida_temporal"),
+    ("hint_auto", "auto"),
+    ("hint_tpv", "tpv"),
+    ("hint_imss", "imss"),
+    ("hint_empresarial", "empresarial"),
+)
+# Turnos triviales que el router local resuelve igual que Boardroom (ver
+# short-circuit); las intenciones de producto siempre pasan por Boardroom.
+TRIVIAL_INTENTS = frozenset({"menu", "greeting", "contact"})
+
+
+def _build_intent_classifier() -> IntentClassifier:
+    examples = seed_examples(INTENT_SEEDS)
+    if INTENT_TRAINING_CSV and os.path.exists(INTENT_TRAINING_CSV):
+        try:
+            examples += load_labeled_csv(INTENT_TRAINING_CSV)
+        except Exception:
+            log.exception("⚠️ No fue posible leer INTENT_TRAINING_CSV; solo semillas")
+    return IntentClassifier(examples)
+_command_index = CommandIndex(COMMAND_ALIASES, exact_only=COMMAND_EXACT_ONLY)
+_intent_classifier = _build_intent_classifier()
+
 AWAITING_TEMPLATE_RECOVERABLE_STATUSES = {
     "ENVIADO_INICIAL",
     "ENVIADO_TEMPLATE",
@@ -207,10 +470,99 @@ AWAITING_TEMPLATE_RECOVERABLE_STATUSES = {
 }
 
 
+# ==========================
+# Circuit breakers
+# ==========================
+class UpstreamUnavailable(RuntimeError):
+    """El circuit breaker del upstream esta abierto: fail-fast al fallback."""
+
+
+_breakers = BreakerRegistry(
+    failure_rate=BREAKER_FAILURE_RATE,
+    min_calls=BREAKER_MIN_CALLS,
+    window_s=BREAKER_WINDOW_S,
+    open_s=BREAKER_OPEN_S,
+    probe_interval_s=BREAKER_PROBE_INTERVAL_S,
+)
+for _upstream in ("boardroom", "bus", "sheets", "graph"):
+    _breakers.get(_upstream)
+
+
+_latency = LatencyRegistry(
+    window=BOARDROOM_LATENCY_WINDOW,
+    percentile=BOARDROOM_TIMEOUT_PERCENTILE,
+    margin_s=BOARDROOM_TIMEOUT_MARGIN_S,
+    floor_s=BOARDROOM_TIMEOUT_FLOOR_S,
+    ceiling_s=BOARDROOM_TIMEOUT_CEILING_S,
+    default_s=BOARDROOM_TIMEOUT_DEFAULT_S,
+    min_samples=BOARDROOM_TIMEOUT_MIN_SAMPLES,
+)
+
+
+def _timed_post(url: str, **kwargs: Any) -> requests.Response:
+    """requests.post con el timeout adaptativo del endpoint. Registra la
+    latencia de cada respuesta y, en timeout, el valor del timeout usado."""
+    tracker = _latency.get(url)
+    timeout = tracker.timeout()
+    started = time.monotonic()
+    try:
+        resp = requests.post(url, timeout=timeout, **kwargs)
+    except requests.exceptions.Timeout:
+        tracker.record(timeout, timed_out=True)
+        raise
+    tracker.record(time.monotonic() - started)
+    return resp
+
+
+def _record_upstream_status(upstream: str, status: int) -> None:
+    """429/5xx cuentan como fallo del upstream; 2xx-4xx significan que el
+    upstream esta vivo (un 4xx es error nuestro, no suyo)."""
+    breaker = _breakers.get(upstream)
+    if status == 429 or status >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+# ==========================
+# Metricas por etapa (/ext/metrics)
+# ==========================
+# Histogramas de latencia por etapa y resultado (utils_metrics). Las etapas
+# de I/O del turno se decoran con @_metrics.timed(...).
+_metrics = StageMetrics(namespace="vicky")
+
+
+def _ok_if(result: Any) -> str:
+    return "ok" if result else "failed"
+
+
+# ==========================
+# Profiling bajo demanda (/ext/profile)
+# ==========================
+# Sampler de pilas por N segundos y cProfile armado para los siguientes
+# requests de un path (utils_profiler). Ambos apagados por defecto.
+_stack_sampler = StackSampler(max_seconds=PROFILE_MAX_SECONDS, output_dir=PROFILE_OUTPUT_DIR)
+_request_profiler = RequestProfiler(output_dir=PROFILE_OUTPUT_DIR)
+
+
+@app.before_request
+def _start_request_profile():
+    profile = _request_profiler.maybe_start(request.path)
+    if profile is not None:
+        g.request_profile = profile
+
+
+@app.teardown_request
+def _finish_request_profile(_exc: Optional[BaseException]) -> None:
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        _request_profiler.finish(profile, f"{request.method} {request.path}")
+
+
 # ==========================
 # Utilidades generales
 # ==========================
-WPP_API_URL = f"https://graph.facebook.com/v20.0/{WABA_PHONE_ID}/messages" if WABA_PHONE_ID else None
+WPP_API_URL = f"{GRAPH_API_BASE}/{WABA_PHONE_ID}/messages" if WABA_PHONE_ID else None
 WPP_TIMEOUT = 15
 
 MAIN_MENU = (
@@ -248,35 +600,33 @@ def _normalize_to_e164_mx(phone_raw: str) -> str:
     return digits
 
 
+@lru_cache(maxsize=2048)
+def _intent_signals(text: str) -> FrozenSet[str]:
+    """Todas las senales de INTENT_SIGNALS presentes en el texto. Cacheado:
+    los distintos checks de un mismo turno comparten una sola pasada."""
+    return _intent_matcher.match(text or "")
+
+
+@lru_cache(maxsize=2048)
+def _resolve_command(text: str) -> Optional[str]:
+    """Comando de COMMAND_ALIASES para el texto (tolera acentos y typos) o None."""
+    return _command_index.resolve(text or "")
+
+
 def interpret_response(text: str) -> str:
     if not text:
         return "neutral"
-    t = text.lower().strip()
-    pos = ("sí", "si", "claro", "ok", "de acuerdo", "vale", "afirmativo", "correcto", "me interesa")
-    neg = ("no", "nel", "nop", "negativo", "no quiero", "no gracias", "no interesa")
-    if any(p in t for p in pos):
+    signals = _intent_signals(text)
+    if "positive" in signals:
         return "positive"
-    if any(n in t for n in neg):
+    if "negative" in signals:
         return "negative"
     return "neutral"
 
 
 def extract_number(text: str) -> Optional[float]:
-    if not text:
-        return None
-    clean = (
-        text.lower()
-        .replace(",", "")
-        .replace("$", "")
-        .replace("millón", "000000")
-        .replace("millon", "000000")
-        .replace("millones", "000000")
-    )
-    match = re.search(r"(\d{1,12}(?:\.\d+)?)", clean)
-    try:
-        return float(match.group(1)) if match else None
-    except Exception:
-        return None
+    """Monto o numero en el texto ("$8,500", "500 mil", "ocho mil quinientos")."""
+    return parse_amount(text)
 
 
 def _ensure_user(phone: str) -> Dict[str, Any]:
@@ -312,6 +662,7 @@ def _backoff(attempt: int) -> None:
     time.sleep(2**attempt)
 
 
+@_metrics.timed("graph_send_message", outcome=_ok_if)
 def send_message(to: str, text: str) -> bool:
     """Envía mensaje de texto WPP dentro de conversación activa."""
     if not (META_TOKEN and WPP_API_URL):
@@ -326,9 +677,13 @@ def send_message(to: str, text: str) -> bool:
     }
 
     for attempt in range(3):
+        if not _breakers.get("graph").allow():
+            log.warning("⛔ Graph API con circuit breaker abierto; no se envía mensaje a %s", to)
+            return False
         try:
             log.info("📤 Enviando mensaje a %s (intento %s)", to, attempt + 1)
             resp = requests.post(WPP_API_URL, headers=_wpp_headers(), json=payload, timeout=WPP_TIMEOUT)
+            _record_upstream_status("graph", resp.status_code)
             if resp.status_code in (200, 201):
                 log.info("✅ Mensaje enviado exitosamente a %s", to)
                 return True
@@ -338,12 +693,14 @@ def send_message(to: str, text: str) -> bool:
                 continue
             return False
         except requests.exceptions.Timeout:
+            _breakers.get("graph").record_failure()
             log.error("⏰ Timeout enviando mensaje a %s (intento %s)", to, attempt + 1)
             if attempt < 2:
                 _backoff(attempt)
                 continue
             return False
         except Exception:
+            _breakers.get("graph").record_failure()
             log.exception("❌ Error en send_message a %s", to)
             if attempt < 2:
                 _backoff(attempt)
@@ -352,12 +709,14 @@ def send_message(to: str, text: str) -> bool:
     return False
 
 
+@_metrics.timed("graph_send_template", outcome=_ok_if)
 def send_template_message(
     to: str,
     template_name: str,
     params: Dict[str, Any] | List[Any] | None = None,
     image_url: Optional[str] = None,
     components: Optional[List[Dict[str, Any]]] = None,
+    lead_row: Optional[int] = None,
 ) -> bool:
     """Envía plantilla Meta aprobada.
 
@@ -366,6 +725,7 @@ def send_template_message(
     - params es opcional; si no viene, NO se mandan parámetros de body.
     - image_url es opcional; si viene, se manda como header image.
     - components permite enviar componentes Meta completos cuando la plantilla lo requiera.
+    - lead_row (fila del lead en el Sheet) permite reflejar ahi la entrega.
     """
     if not (META_TOKEN and WPP_API_URL):
         log.error("❌ WhatsApp no configurado para plantillas.")
@@ -431,9 +791,13 @@ def send_template_message(
     }
 
     for attempt in range(3):
+        if not _breakers.get("graph").allow():
+            log.warning("⛔ Graph API con circuit breaker abierto; no se envía plantilla a %s", to)
+            return False
         try:
             log.info("📤 Enviando plantilla '%s' a %s (intento %s)", template_name, to, attempt + 1)
             resp = requests.post(WPP_API_URL, headers=_wpp_headers(), json=payload, timeout=WPP_TIMEOUT)
+            _record_upstream_status("graph", resp.status_code)
             if resp.status_code in (200, 201):
                 message_id = ""
                 try:
@@ -443,10 +807,7 @@ def send_template_message(
                         message_id = (messages[0] or {}).get("id", "")
                 except Exception:
                     message_id = ""
-                try:
-                    append_envio_status(str(to), message_id, "sent", template_name, _utc_now_iso())
-                except Exception:
-                    pass
+                _delivery.record_send(message_id, str(to), template_name, lead_row=lead_row)
                 log.info("✅ Plantilla '%s' enviada exitosamente a %s", template_name, to)
                 return True
 
@@ -456,12 +817,14 @@ def send_template_message(
                 continue
             return False
         except requests.exceptions.Timeout:
+            _breakers.get("graph").record_failure()
             log.error("⏰ Timeout enviando plantilla a %s (intento %s)", to, attempt + 1)
             if attempt < 2:
                 _backoff(attempt)
                 continue
             return False
         except Exception:
+            _breakers.get("graph").record_failure()
             log.exception("❌ Error en send_template_message a %s", to)
             if attempt < 2:
                 _backoff(attempt)
@@ -488,11 +851,26 @@ def forward_media_to_advisor(media_type: str, media_id: str) -> None:
 # ==========================
 # Google helpers
 # ==========================
+def _sheets_execute(req: Any) -> Any:
+    """Ejecuta un request de Sheets pasando por su circuit breaker."""
+    breaker = _breakers.get("sheets")
+    if not breaker.allow():
+        raise UpstreamUnavailable("Sheets con circuit breaker abierto")
+    try:
+        result = req.execute()
+    except Exception as exc:
+        status = getattr(getattr(exc, "resp", None), "status", None)
+        _record_upstream_status("sheets", int(status) if status else 503)
+        raise
+    breaker.record_success()
+    return result
+
+
 def _sheet_get_rows() -> Tuple[List[str], List[List[str]]]:
     if not (google_ready and sheets_svc and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS):
         raise RuntimeError("Sheets no disponible (google_ready/SHEETS_ID_LEADS/SHEETS_TITLE_LEADS).")
     rng = f"{SHEETS_TITLE_LEADS}!A:Z"
-    values = sheets_svc.spreadsheets().values().get(spreadsheetId=SHEETS_ID_LEADS, range=rng).execute()
+    values = _sheets_execute(sheets_svc.spreadsheets().values().get(spreadsheetId=SHEETS_ID_LEADS, range=rng))
     rows = values.get("values", [])
     if not rows:
         return [], []
@@ -500,6 +878,11 @@ def _sheet_get_rows() -> Tuple[List[str], List[List[str]]]:
     return headers, rows[1:]
 
 
+# Matching y el esquema de columnas (headers) salen de esta lectura cacheada;
+# el pacer y /ext/auto-send-one siguen leyendo fresco con _sheet_get_rows().
+_leads_snapshot = SheetSnapshot(LEADS_CACHE_TTL_S, lambda: _sheet_get_rows())
+
+
 def _idx(headers: List[str], name: str) -> Optional[int]:
     target = name.strip().lower()
     for i, header in enumerate(headers):
@@ -514,6 +897,16 @@ def _cell(row: List[str], i: Optional[int]) -> str:
     return (row[i] if i < len(row) else "") or ""
 
 
+def _read_lead_row(row_number_1based: int) -> List[str]:
+    """Una sola fila de la hoja de leads (lectura fresca, sin snapshot)."""
+    if not (google_ready and sheets_svc and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS):
+        raise RuntimeError("Sheets no disponible para leer fila.")
+    rng = f"{SHEETS_TITLE_LEADS}!A{row_number_1based}:Z{row_number_1based}"
+    values = _sheets_execute(sheets_svc.spreadsheets().values().get(spreadsheetId=SHEETS_ID_LEADS, range=rng))
+    rows = values.get("values", [])
+    return [str(v) for v in rows[0]] if rows else []
+
+
 def _update_row_cells(row_number_1based: int, updates: Dict[str, str], headers: List[str]) -> None:
     if not (google_ready and sheets_svc and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS):
         raise RuntimeError("Sheets no disponible para update.")
@@ -528,7 +921,8 @@ def _update_row_cells(row_number_1based: int, updates: Dict[str, str], headers:
     if not data:
         return
     body = {"valueInputOption": "USER_ENTERED", "data": data}
-    sheets_svc.spreadsheets().values().batchUpdate(spreadsheetId=SHEETS_ID_LEADS, body=body).execute()
+    _sheets_execute(sheets_svc.spreadsheets().values().batchUpdate(spreadsheetId=SHEETS_ID_LEADS, body=body))
+    _leads_snapshot.invalidate()
 
 
 def _is_campaign_paused() -> bool:
@@ -537,9 +931,9 @@ def _is_campaign_paused() -> bool:
         return False
     try:
         rng = f"{SHEETS_TITLE_LEADS}!{CAMPAIGN_PAUSE_CELL}"
-        result = sheets_svc.spreadsheets().values().get(
+        result = _sheets_execute(sheets_svc.spreadsheets().values().get(
             spreadsheetId=SHEETS_ID_LEADS, range=rng
-        ).execute()
+        ))
         values = result.get("values", [])
         cell = (values[0][0] if values and values[0] else "").strip().upper()
         return cell == CAMPAIGN_PAUSED_VALUE
@@ -555,12 +949,12 @@ def _set_campaign_paused(paused: bool) -> None:
     rng = f"{SHEETS_TITLE_LEADS}!{CAMPAIGN_PAUSE_CELL}"
     value = CAMPAIGN_PAUSED_VALUE if paused else ""
     body = {"values": [[value]]}
-    sheets_svc.spreadsheets().values().update(
+    _sheets_execute(sheets_svc.spreadsheets().values().update(
         spreadsheetId=SHEETS_ID_LEADS,
         range=rng,
         valueInputOption="USER_ENTERED",
         body=body,
-    ).execute()
+    ))
 
 
 def _register_send_result(ok: bool) -> bool:
@@ -612,7 +1006,7 @@ def _safe_update_row_cells(
     allowed_fields: Optional[set[str]] = None,
 ) -> None:
     try:
-        headers, _ = _sheet_get_rows()
+        headers, _ = _leads_snapshot.get()
         if not headers:
             log.warning("⚠️ Sheets sin headers; no se actualizaron campos")
             return
@@ -633,65 +1027,134 @@ def _safe_update_row_cells(
         log.exception("⚠️ No fue posible actualizar Sheets; continúa flujo")
 
 
+def _find_lead(headers: List[str], rows: List[List[str]], target: str) -> Optional[Dict[str, Any]]:
+    i_name = _idx(headers, "Nombre")
+    i_wa = _idx(headers, "WhatsApp")
+    i_status = _idx(headers, "ESTATUS")
+    i_last = _idx(headers, "LAST_MESSAGE_AT")
+    if i_wa is None or not target:
+        return None
+    for row_number, row in enumerate(rows, start=2):
+        if _normalize_phone_last10(_cell(row, i_wa)) == target:
+            nombre = _cell(row, i_name).strip() if i_name is not None else ""
+            estatus = _cell(row, i_status).strip() if i_status is not None else ""
+            last_at = _cell(row, i_last).strip() if i_last is not None else ""
+            return {"row": row_number, "nombre": nombre, "estatus": estatus, "last_message_at": last_at, "raw": row}
+    return None
+
+
+@_metrics.timed("sheets_match", outcome=lambda match: "hit" if match else "miss")
 def match_client_in_sheets(phone_last10: str) -> Optional[Dict[str, Any]]:
     if not (google_ready and sheets_svc and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS):
         log.warning("⚠️ Sheets no disponible; no se puede hacer matching.")
         return None
     try:
-        headers, rows = _sheet_get_rows()
-        i_name = _idx(headers, "Nombre")
-        i_wa = _idx(headers, "WhatsApp")
-        i_status = _idx(headers, "ESTATUS")
-        i_last = _idx(headers, "LAST_MESSAGE_AT")
-
-        if i_wa is None:
+        target = str(phone_last10).strip()
+        headers, rows = _leads_snapshot.get()
+        if _idx(headers, "WhatsApp") is None:
             log.warning("⚠️ No existe columna 'WhatsApp' en el Sheet.")
             return None
-
-        target = str(phone_last10).strip()
-        for row_number, row in enumerate(rows, start=2):
-            if target and _normalize_phone_last10(_cell(row, i_wa)) == target:
-                nombre = _cell(row, i_name).strip() if i_name is not None else ""
-                estatus = _cell(row, i_status).strip() if i_status is not None else ""
-                last_at = _cell(row, i_last).strip() if i_last is not None else ""
-                log.info("✅ Cliente encontrado en Sheets: %s (%s)", nombre, target)
-                return {"row": row_number, "nombre": nombre, "estatus": estatus, "last_message_at": last_at, "raw": row}
-
-        log.info("ℹ️ Cliente no encontrado en Sheets: %s", target)
+        match = _find_lead(headers, rows, target)
+        if match is None and target and _leads_snapshot.ttl_s > 0:
+            # El snapshot puede tener hasta LEADS_CACHE_TTL_S: antes de tratar
+            # el telefono como desconocido se busca en una lectura fresca.
+            fresh_headers, fresh_rows = _leads_snapshot.refresh(LEADS_MISS_REFRESH_MIN_AGE_S)
+            if fresh_rows is not rows:
+                match = _find_lead(fresh_headers, fresh_rows, target)
+        if match is None:
+            log.info("ℹ️ Cliente no encontrado en Sheets: %s", target)
+            return None
+        log.info("✅ Cliente encontrado en Sheets: %s (%s)", match["nombre"], target)
+        return match
+    except UpstreamUnavailable:
+        log.warning("⚠️ Sheets con circuit breaker abierto; matching omitido")
         return None
     except Exception:
         log.exception("❌ Error buscando en Sheets")
         return None
 
 
-def append_envio_status(phone: str, message_id: str, status: str, template_name: str, timestamp_iso: str) -> None:
-    if not (google_ready and sheets_svc and SHEETS_ID_LEADS):
+def _append_envio_status_rows(rows: List[List[str]]) -> None:
+    """Un solo append con todas las filas. Propaga el error (el tracker de
+    entregas reintenta); sin Sheets configurado no hace nada."""
+    if not (google_ready and sheets_svc and SHEETS_ID_LEADS) or not rows:
         return
-    try:
-        body = {"values": [[_normalize_phone_last10(phone), message_id or "", status or "", timestamp_iso or "", template_name or ""]]}
-        sheets_svc.spreadsheets().values().append(
-            spreadsheetId=SHEETS_ID_LEADS,
-            range="ENVIO_STATUS!A:E",
-            valueInputOption="USER_ENTERED",
-            insertDataOption="INSERT_ROWS",
-            body=body,
-        ).execute()
-    except Exception:
-        log.exception("❌ Error escribiendo ENVIO_STATUS")
+    _sheets_execute(sheets_svc.spreadsheets().values().append(
+        spreadsheetId=SHEETS_ID_LEADS,
+        range="ENVIO_STATUS!A:E",
+        valueInputOption="USER_ENTERED",
+        insertDataOption="INSERT_ROWS",
+        body={"values": rows},
+    ))
+    _envio_status_snapshot.invalidate()
+
+
+def _write_delivery_to_leads(updates: Dict[int, Tuple[str, Dict[str, str]]]) -> None:
+    """Estado de entrega por lead en un solo batchUpdate. La fila viene del
+    envio (hasta DELIVERY_FLUSH_INTERVAL_S antes): se verifica contra una
+    lectura fresca y, si ya no es de ese telefono, se busca su fila actual;
+    un lead que ya no esta se omite. Columnas que no existen se omiten."""
+    if not (google_ready and sheets_svc and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS) or not updates:
+        return
+    headers, rows = _sheet_get_rows()
+    i_wa = _idx(headers, "WhatsApp")
+    if i_wa is None:
+        log.warning("⚠️ No existe columna 'WhatsApp' en el Sheet; entrega no escrita en leads")
+        return
+    phone_rows: Optional[Dict[str, int]] = None
+    data = []
+    for row_number, (phone, cells) in sorted(updates.items()):
+        idx = row_number - 2
+        if not (0 <= idx < len(rows) and _normalize_phone_last10(_cell(rows[idx], i_wa)) == phone):
+            if phone_rows is None:
+                phone_rows = {}
+                for n, row in enumerate(rows, start=2):
+                    phone_rows.setdefault(_normalize_phone_last10(_cell(row, i_wa)), n)
+            moved = phone_rows.get(phone)
+            if moved is None:
+                log.warning("⚠️ Lead %s ya no esta en la fila %s ni en otra; entrega omitida", phone, row_number)
+                continue
+            log.info("↪️ Lead %s se movio de la fila %s a la %s", phone, row_number, moved)
+            row_number = moved
+        for col_name, value in cells.items():
+            j = _idx(headers, col_name) if col_name else None
+            if j is None:
+                continue
+            a1 = f"{SHEETS_TITLE_LEADS}!{chr(ord('A') + j)}{row_number}"
+            data.append({"range": a1, "values": [[value]]})
+    if not data:
+        return
+    body = {"valueInputOption": "USER_ENTERED", "data": data}
+    _sheets_execute(sheets_svc.spreadsheets().values().batchUpdate(spreadsheetId=SHEETS_ID_LEADS, body=body))
+
+
+# Indice wamid -> estado en memoria de este proceso: supone un solo worker
+# de gunicorn (ver workers_delivery_tracker.py). Con varios, los callbacks de
+# plantillas enviadas por otro worker se cuentan como desconocidos.
+_delivery = DeliveryTracker(
+    _append_envio_status_rows,
+    _write_delivery_to_leads,
+    normalize_phone=_normalize_phone_last10,
+    flush_interval_s=DELIVERY_FLUSH_INTERVAL_S,
+    max_messages=DELIVERY_INDEX_MAX,
+    state_column=LEADS_DELIVERY_STATE_COLUMN,
+    time_column=LEADS_DELIVERY_TIME_COLUMN,
+)
 
 
+@_metrics.timed("sheets_append_respuesta")
 def append_respuesta_cliente(phone: str, nombre: str, mensaje: str, fecha_iso: str) -> None:
     if not (google_ready and sheets_svc and SHEETS_ID_LEADS):
         return
     try:
         body = {"values": [[_normalize_phone_last10(phone), nombre or "", mensaje or "", fecha_iso or ""]]}
-        sheets_svc.spreadsheets().values().append(
+        _sheets_execute(sheets_svc.spreadsheets().values().append(
             spreadsheetId=SHEETS_ID_LEADS,
             range="RESPUESTAS_CLIENTE!A:D",
             valueInputOption="USER_ENTERED",
             insertDataOption="INSERT_ROWS",
             body=body,
-        ).execute()
+        ))
     except Exception:
         log.exception("❌ Error escribiendo RESPUESTAS_CLIENTE")
 
@@ -702,40 +1165,80 @@ def write_followup_to_sheets(row: int | str, note: str, date_iso: str) -> None:
         return
     try:
         body = {"values": [[str(row), date_iso, note]]}
-        sheets_svc.spreadsheets().values().append(
+        _sheets_execute(sheets_svc.spreadsheets().values().append(
             spreadsheetId=SHEETS_ID_LEADS,
             range="Seguimiento!A:C",
             valueInputOption="USER_ENTERED",
             insertDataOption="INSERT_ROWS",
             body=body,
-        ).execute()
+        ))
         log.info("✅ Seguimiento registrado en Sheets: %s", note)
     except Exception:
         log.exception("❌ Error escribiendo seguimiento en Sheets")
 
 
+def _read_envio_status() -> List[List[str]]:
+    resp = _sheets_execute(sheets_svc.spreadsheets().values().get(
+        spreadsheetId=SHEETS_ID_LEADS,
+        range="ENVIO_STATUS!A:E",
+    ))
+    return resp.get("values") or []
+
+
+_envio_status_snapshot = SheetSnapshot(ENVIO_STATUS_CACHE_TTL_S, lambda: _read_envio_status())
+
+
 def get_last_envio_template(phone_last10: str) -> str:
+    # Lo enviado por este proceso puede no estar escrito aun (flush en lote).
+    local = _delivery.last_template(phone_last10)
+    if local:
+        return local
     if not (google_ready and sheets_svc and SHEETS_ID_LEADS):
         return ""
     try:
-        resp = sheets_svc.spreadsheets().values().get(
-            spreadsheetId=SHEETS_ID_LEADS,
-            range="ENVIO_STATUS!A:E",
-        ).execute()
-        values = resp.get("values") or []
+        values = _envio_status_snapshot.get()
         target = (phone_last10 or "").strip()
         for row in reversed(values[1:]):
             if len(row) >= 1 and _normalize_phone_last10(row[0]) == target:
-                return (row[4] if len(row) >= 5 else "").strip()
+                template = (row[4] if len(row) >= 5 else "").strip()
+                # Filas de status de wamids ajenos no traen plantilla.
+                if template:
+                    return template
     except Exception:
         log.exception("❌ Error leyendo ENVIO_STATUS")
     return ""
 
 
+# Carpetas de cliente ya resueltas (nombre -> id). Los ids de Drive no
+# cambian; una subida fallida saca la carpeta por si la borraron.
+_drive_folder_ids: Dict[str, str] = {}
+
+
+def _prime_drive_folders() -> int:
+    """Carga todas las carpetas bajo DRIVE_PARENT_FOLDER_ID (warm-up)."""
+    q = (
+        "mimeType = 'application/vnd.google-apps.folder' "
+        f"and '{DRIVE_PARENT_FOLDER_ID}' in parents and trashed = false"
+    )
+    page_token = None
+    while True:
+        resp = drive_svc.files().list(
+            q=q, fields="nextPageToken, files(id, name)", pageSize=1000, pageToken=page_token,
+        ).execute()
+        for item in resp.get("files", []):
+            _drive_folder_ids.setdefault(item["name"], item["id"])
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return len(_drive_folder_ids)
+
+
 def _find_or_create_client_folder(folder_name: str) -> Optional[str]:
     if not (google_ready and drive_svc and DRIVE_PARENT_FOLDER_ID):
         log.warning("⚠️ Drive no disponible; no se puede crear carpeta.")
         return None
+    cached = _drive_folder_ids.get(folder_name)
+    if cached:
+        return cached
     try:
         safe_name = folder_name.replace("'", "\\'")
         q = (
@@ -745,30 +1248,35 @@ def _find_or_create_client_folder(folder_name: str) -> Optional[str]:
         resp = drive_svc.files().list(q=q, fields="files(id, name)").execute()
         items = resp.get("files", [])
         if items:
-            return items[0]["id"]
-        created = drive_svc.files().create(
-            body={
-                "name": folder_name,
-                "mimeType": "application/vnd.google-apps.folder",
-                "parents": [DRIVE_PARENT_FOLDER_ID],
-            },
-            fields="id",
-        ).execute()
-        return created.get("id")
+            folder_id = items[0]["id"]
+        else:
+            created = drive_svc.files().create(
+                body={
+                    "name": folder_name,
+                    "mimeType": "application/vnd.google-apps.folder",
+                    "parents": [DRIVE_PARENT_FOLDER_ID],
+                },
+                fields="id",
+            ).execute()
+            folder_id = created.get("id")
+        if folder_id:
+            _drive_folder_ids[folder_name] = folder_id
+        return folder_id
     except Exception:
         log.exception("❌ Error creando/buscando carpeta en Drive")
         return None
 
 
+@_metrics.timed("drive_upload", outcome=_ok_if)
 def upload_to_drive(file_name: str, file_bytes: bytes, mime_type: str, folder_name: str) -> Optional[str]:
-    if not (google_ready and drive_svc and MediaIoBaseUpload):
+    if not (google_ready and drive_svc):
         log.warning("⚠️ Drive no disponible; no se puede subir archivo.")
         return None
     try:
         folder_id = _find_or_create_client_folder(folder_name)
         if not folder_id:
             return None
-        media = MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype=mime_type, resumable=False)
+        media = _google.media_upload(file_bytes, mime_type)
         created = drive_svc.files().create(
             body={"name": file_name, "parents": [folder_id]},
             media_body=media,
@@ -776,6 +1284,7 @@ def upload_to_drive(file_name: str, file_bytes: bytes, mime_type: str, folder_na
         ).execute()
         return created.get("webViewLink") or created.get("id")
     except Exception:
+        _drive_folder_ids.pop(folder_name, None)
         log.exception("❌ Error subiendo archivo a Drive")
         return None
 
@@ -855,17 +1364,10 @@ def _alianza_is_context(match: Optional[Dict[str, Any]]) -> bool:
 
 
 def _explicit_non_alianza_intent(text: str) -> bool:
-    t = (text or "").strip().lower()
-    if not t:
-        return False
-    alianza_signals = ("alianza", "despacho", "contable", "contables", "contador", "contadores", "comision", "comisión")
-    if any(k in t for k in alianza_signals):
+    signals = _intent_signals(text)
+    if "alianza" in signals:
         return False
-    other_signals = (
-        "auto", "seguro", "póliza", "poliza", "tpv", "terminal", "imss", "ley 73",
-        "prestamo", "préstamo", "credito", "crédito", "vida", "salud", "vrim",
-    )
-    return any(k in t for k in other_signals)
+    return "non_alianza" in signals
 
 
 def _handle_alianza_context_response(phone: str, text: str, match: Dict[str, Any]) -> bool:
@@ -903,17 +1405,10 @@ def _auto_is_context(match: Optional[Dict[str, Any]]) -> bool:
 
 
 def _explicit_non_auto_intent(text: str) -> bool:
-    t = (text or "").strip().lower()
-    if not t:
+    signals = _intent_signals(text)
+    if "auto_context" in signals:
         return False
-    auto_signals = ("auto", "seguro auto", "seguro de auto", "póliza", "poliza", "placa", "placas")
-    if any(k in t for k in auto_signals):
-        return False
-    other_signals = (
-        "credito", "crédito", "prestamo", "préstamo", "imss", "ley 73", "empresarial",
-        "pyme", "tpv", "terminal", "vida", "salud", "vrim", "financiamiento",
-    )
-    return any(k in t for k in other_signals)
+    return "non_auto" in signals
 
 
 def _handle_auto_context_response(phone: str, text: str, match: Dict[str, Any]) -> bool:
@@ -979,19 +1474,25 @@ def _normalize_boardroom_url(url: str) -> str:
     return ""
 
 
+@lru_cache(maxsize=2048)
+def _classify_intent(text: str) -> Prediction:
+    return _intent_classifier.predict(text or "")
+
+
 def _infer_product_hint(text: str) -> str:
-    t = (text or "").strip().lower()
-    if t in ("3",) or any(k in t for k in ("vida", "vida temporal", "seguro de vida", "protección familiar", "proteccion familiar")):
-        return "vida_temporal"
-    if any(k in t for k in ("auto", "seguro auto", "placas", "póliza", "poliza")):
-        return "auto"
-    if any(k in t for k in ("tpv", "terminal", "punto de venta")):
-        return "tpv"
-    if any(k in t for k in ("imss", "ley 73", "pensión", "pension")):
-        return "imss"
-    if any(k in t for k in ("empresarial", "pyme")):
-        return "empresarial"
-    return "unknown"
+    prediction = _classify_intent(text)
+    hint = PRODUCT_HINTS.get(prediction.intent or "")
+    if hint and prediction.confidence >= INTENT_HINT_MIN_CONFIDENCE:
+        return hint
+    # Clasificador dudoso ("seguro" empata auto con confianza 0): se usan las
+    # keywords del texto en vez de adivinar.
+    signals = _intent_signals(text)
+    return next((hint for signal, hint in SIGNAL_PRODUCT_HINTS if signal in signals), "unknown")
+
+
+def _intent_payload(text: str) -> Dict[str, Any]:
+    prediction = _classify_intent(text)
+    return {"name": prediction.intent or "unknown", "confidence": prediction.confidence}
 
 
 def send_to_boardroom(phone: str, text: str, match: Optional[Dict[str, Any]] = None, message_id: Optional[str] = None, state: Optional[str] = None) -> dict:
@@ -1009,6 +1510,7 @@ def send_to_boardroom(phone: str, text: str, match: Optional[Dict[str, Any]] = N
         "state": state or "",
         "priority": "commercial",
         "product_hint": _infer_product_hint(text),
+        "intent": _intent_payload(text),
         "metadata": {
             "match_found": bool(match),
             "lead_name": _match_name(match),
@@ -1021,20 +1523,104 @@ def send_to_boardroom(phone: str, text: str, match: Optional[Dict[str, Any]] = N
         "Authorization": f"Bearer {BOARDROOM_AUTH_TOKEN}",
         "Content-Type": "application/json",
     }
+    if not _breakers.get("boardroom").allow():
+        log.info("⛔ Boardroom con circuit breaker abierto; fallback local")
+        return {"ok": False, "handled": False, "reason": "circuit_open"}
+    try:
+        resp = _timed_post(url, headers=headers, json=payload)
+    except requests.exceptions.Timeout:
+        _breakers.get("boardroom").record_failure()
+        return {"ok": False, "handled": False, "reason": "timeout"}
+    except Exception:
+        _breakers.get("boardroom").record_failure()
+        log.exception("⚠️ Boardroom unavailable; fallback local")
+        return {"ok": False, "handled": False, "reason": "exception"}
+    _record_upstream_status("boardroom", resp.status_code)
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=3)
         log.info("🧠 Boardroom request enviado")
         if resp.status_code >= 400:
             return {"ok": False, "handled": False, "reason": f"http_{resp.status_code}"}
         data = resp.json() if resp.text else {}
         return data if isinstance(data, dict) else {"ok": False, "handled": False, "reason": "invalid_response"}
-    except requests.exceptions.Timeout:
-        return {"ok": False, "handled": False, "reason": "timeout"}
     except Exception:
         log.exception("⚠️ Boardroom unavailable; fallback local")
         return {"ok": False, "handled": False, "reason": "exception"}
 
 
+_bus_emitter = BusEmitter(
+    workers=BUS_EMITTER_WORKERS,
+    max_queue=BUS_EMITTER_QUEUE_MAX,
+    overflow=BUS_EMITTER_OVERFLOW,
+    batch_max=BUS_EMITTER_BATCH_MAX,
+)
+
+
+# ==========================
+# Outbox del bus (SQLite)
+# ==========================
+_bus_outbox: Optional[Outbox] = None
+_bus_outbox_lock = threading.Lock()
+
+
+def _bus_headers(kind: str) -> Dict[str, str]:
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {BUS_INTERNAL_TOKEN}",
+    }
+    if kind in ("confirm", "observation"):
+        headers["X-Source-System"] = "vicky"
+    if kind == "observation":
+        headers["X-Event-Type"] = "inbound_message"
+    return headers
+
+
+def _outbox() -> Optional[Outbox]:
+    """Outbox compartido; se crea (y arranca su drenador) en el primer uso.
+    None si esta deshabilitado o el store local no se puede abrir."""
+    global _bus_outbox
+    if not BUS_OUTBOX_ENABLED:
+        return None
+    if _bus_outbox is not None:
+        return _bus_outbox
+    with _bus_outbox_lock:
+        if _bus_outbox is None:
+            try:
+                box = Outbox(
+                    VICKY_DB_PATH,
+                    headers_for=_bus_headers,
+                    batch_size=BUS_OUTBOX_BATCH_MAX,
+                    max_attempts=BUS_OUTBOX_MAX_ATTEMPTS,
+                    breaker=_breakers.get("bus"),
+                    workers=BUS_OUTBOX_WORKERS,
+                )
+                box.start()
+                _bus_outbox = box
+            except Exception:
+                log.exception("❌ No fue posible iniciar el outbox del bus en %s", VICKY_DB_PATH)
+                return None
+    return _bus_outbox
+
+
+def _enqueue_bus(
+    dedupe_key: str,
+    kind: str,
+    url: str,
+    payload: Dict[str, Any],
+    batch_url: Optional[str] = None,
+    label: str = "",
+) -> None:
+    """Deja el POST al bus en el outbox durable. Sin store local cae al
+    emisor en memoria (best-effort, igual que antes del outbox)."""
+    box = _outbox()
+    if box is not None:
+        try:
+            box.enqueue(dedupe_key, kind, url, payload, batch_url=batch_url)
+            return
+        except Exception:
+            log.exception("❌ Error encolando %s en outbox; se envia sin persistir", label or kind)
+    _bus_emitter.submit(url, payload, headers=_bus_headers(kind), batch_url=batch_url, label=label)
+
+
 def _emit_bus_event(
     phone: str,
     text: str,
@@ -1052,6 +1638,7 @@ def _emit_bus_event(
         return
 
     payload: Dict[str, Any] = {
+        "event_id": str(uuid.uuid4()),
         "source": "vicky_secom",
         "event_type": event_type,
         "telefono": phone,
@@ -1065,26 +1652,13 @@ def _emit_bus_event(
     if metadata:
         payload["metadata"] = metadata
 
-    def _post() -> None:
-        try:
-            requests.post(
-                BUS_URL,
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {BUS_INTERNAL_TOKEN}",
-                    "Content-Type": "application/json",
-                },
-                timeout=3,
-            )
-        except Exception as exc:
-            log.warning(
-                "Bus emit fallido phone_last4=%s error=%s: %s",
-                str(phone)[-4:],
-                type(exc).__name__,
-                str(exc),
-            )
-
-    threading.Thread(target=_post, daemon=True).start()
+    _enqueue_bus(
+        f"event:{payload['event_id']}",
+        "legacy_event",
+        BUS_URL,
+        payload,
+        label=f"{event_type} phone_last4={str(phone)[-4:]}",
+    )
 
 
 def _bus_event_url() -> str:
@@ -1147,8 +1721,9 @@ def _build_boardroom_event(
             "source": "whatsapp",
             "campaign_id": None,
             "ad_id": None,
-            "product_hint": "unknown",
+            "product_hint": _infer_product_hint(text),
         },
+        "intent": _intent_payload(text),
         "conversation": {
             "conversation_id": f"vicky_secom:{phone}",
             "last_known_stage": state or None,
@@ -1181,13 +1756,16 @@ def _parse_boardroom_instruction(body: object, event_id: str) -> Tuple[Optional[
     return body, None
 
 
+@_metrics.timed("boardroom_instruction", outcome=lambda result: result[1] or "ok")
 def _request_boardroom_instruction(payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
     if not _BUS_ACTIVE or not BUS_URL:
         return None, "bus_disabled_or_empty"
     if not BUS_INTERNAL_TOKEN:
         return None, "missing_bus_token"
+    if not _breakers.get("bus").allow():
+        return None, "circuit_open"
     try:
-        resp = requests.post(
+        resp = _timed_post(
             _bus_event_url(),
             json=payload,
             headers={
@@ -1196,14 +1774,20 @@ def _request_boardroom_instruction(payload: Dict[str, Any]) -> Tuple[Optional[Di
                 "X-Source-System": "vicky",
                 "X-Event-Type": "inbound_message",
             },
-            timeout=3,
         )
+    except requests.exceptions.Timeout:
+        _breakers.get("bus").record_failure()
+        return None, "timeout"
+    except Exception as exc:
+        _breakers.get("bus").record_failure()
+        log.warning("Boardroom bus request failed: %s: %s", type(exc).__name__, exc)
+        return None, "exception"
+    _record_upstream_status("bus", resp.status_code)
+    try:
         if resp.status_code >= 400:
             return None, f"http_{resp.status_code}"
         body = resp.json() if resp.text else {}
         return _parse_boardroom_instruction(body, payload["event_id"])
-    except requests.exceptions.Timeout:
-        return None, "timeout"
     except Exception as exc:
         log.warning("Boardroom bus request failed: %s: %s", type(exc).__name__, exc)
         return None, "exception"
@@ -1255,28 +1839,24 @@ def _confirm_boardroom_execution(
     delivery_status: str,
     error: Optional[str],
 ) -> None:
+    """Encola la confirmacion en el outbox: el POST a /confirm sale del
+    turno y se reintenta hasta entregarse (dedupe por instruction_id)."""
     instruction_id = body.get("instruction_id")
     if not instruction_id or not _BUS_ACTIVE or not BUS_URL or not BUS_INTERNAL_TOKEN:
         return
-    try:
-        requests.post(
-            _bus_confirm_url(),
-            json={
-                "instruction_id": instruction_id,
-                "executed": bool(executed),
-                "executed_at": f"{_utc_now_iso()}Z",
-                "delivery_status": delivery_status,
-                "error": error,
-            },
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {BUS_INTERNAL_TOKEN}",
-                "X-Source-System": "vicky",
-            },
-            timeout=3,
-        )
-    except Exception as exc:
-        log.warning("Boardroom confirm failed instruction_id=%s error=%s", instruction_id, exc)
+    _enqueue_bus(
+        f"confirm:{instruction_id}",
+        "confirm",
+        _bus_confirm_url(),
+        {
+            "instruction_id": instruction_id,
+            "executed": bool(executed),
+            "executed_at": f"{_utc_now_iso()}Z",
+            "delivery_status": delivery_status,
+            "error": error,
+        },
+        label=f"confirm instruction_id={instruction_id}",
+    )
 
 
 def _send_neutral_fallback(phone: str) -> None:
@@ -1385,6 +1965,58 @@ def _consult_boardroom(
     return outcome, body
 
 
+# Solo crea threads al primer submit.
+_hedge_pool = ThreadPoolExecutor(max_workers=BOARDROOM_HEDGE_WORKERS, thread_name_prefix="BoardroomHedge")
+_INFO_REPLY_WORDS = ("info", "informacion", "información", "mas info", "más info")
+
+
+def _fallback_prefetch_needed(phone: str, text: str) -> bool:
+    """True si _stateless_text_fallback haria una lectura remota para este
+    texto: la respuesta "info" a una plantilla sin awaiting_info en memoria
+    tiene que leer ENVIO_STATUS."""
+    return (
+        text.strip().lower() in _INFO_REPLY_WORDS
+        and not user_state.get(phone, "").startswith("awaiting_info:")
+    )
+
+
+def _prepare_fallback_plan(phone: str, text: str, last10: str) -> Dict[str, Any]:
+    """Datos que _stateless_text_fallback leeria de Sheets. Sin efectos: no
+    envia, no escribe estado; descartarlo nunca deja rastro."""
+    plan: Dict[str, Any] = {}
+    if _fallback_prefetch_needed(phone, text):
+        plan["last_tpl"] = get_last_envio_template(last10)
+    return plan
+
+
+def _consult_boardroom_hedged(
+    phone: str,
+    msg: Dict[str, Any],
+    match: Optional[Dict[str, Any]],
+    mtype: str,
+    text: str,
+    last10: str,
+) -> Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """_consult_boardroom + preparacion concurrente del plan de fallback.
+    Si el fallback no necesita lecturas remotas no se abre ningun thread.
+    Devuelve (outcome, body, plan); plan es None con HANDLED o si la
+    preparacion fallo (el fallback entonces lee por su cuenta)."""
+    if not (BOARDROOM_HEDGED_FALLBACK_ENABLED and _fallback_prefetch_needed(phone, text)):
+        outcome, body = _consult_boardroom(phone, msg, match, mtype, text)
+        return outcome, body, None
+
+    future = _hedge_pool.submit(_prepare_fallback_plan, phone, text, last10)
+    outcome, body = _consult_boardroom(phone, msg, match, mtype, text)
+    if outcome == "HANDLED":
+        future.cancel()
+        return outcome, body, None
+    try:
+        return outcome, body, future.result(timeout=WPP_TIMEOUT)
+    except Exception as exc:
+        log.warning("⚠️ Plan de fallback no disponible (%s); se calcula en linea", type(exc).__name__)
+        return outcome, body, None
+
+
 def _execute_handled_boardroom_instruction(phone: str, body: Dict[str, Any]) -> None:
     """Ejecuta una instruccion de Boardroom ya clasificada como HANDLED. Si
     el envio falla, usa el mensaje neutral (no una decision comercial local
@@ -1401,6 +2033,7 @@ def _stateless_text_fallback(
     match: Optional[Dict[str, Any]],
     idle: bool,
     last10: str,
+    plan: Optional[Dict[str, Any]] = None,
 ) -> None:
     """TECHNICAL_FALLBACK (DOC-0043 regla 4) para un turno de texto sin
     funnel activo, cuando Boardroom no produjo una decision util o fallo.
@@ -1415,15 +2048,18 @@ def _stateless_text_fallback(
     response owner por turno"; (b) el fallback GPT "sgpt:" -- genera
     respuesta persuasiva libre no guionada, exactamente lo que DOC-0043
     clasifica como COMMERCIAL_DECISION, no TECHNICAL_FALLBACK.
+    `plan` trae lecturas ya hechas en paralelo a Boardroom
+    (_consult_boardroom_hedged); lo que falte se lee aqui.
     """
+    plan = plan or {}
     t_norm_info = text.strip().lower()
-    if t_norm_info in ("info", "informacion", "información", "mas info", "más info"):
+    if t_norm_info in _INFO_REPLY_WORDS:
         last_tpl = ""
         st = user_state.get(phone, "")
         if st.startswith("awaiting_info:"):
             last_tpl = st.split(":", 1)[1].strip()
         if not last_tpl:
-            last_tpl = get_last_envio_template(last10)
+            last_tpl = plan["last_tpl"] if "last_tpl" in plan else get_last_envio_template(last10)
         if last_tpl in ("tpv_3", "promo_tpv", TPV_TEMPLATE_NAME):
             user_state[phone] = "tpv_giro"
             try:
@@ -1464,23 +2100,14 @@ def _stateless_text_fallback(
 
     if idle:
         t_norm = text.strip().lower()
-        greet_words = {
-            "hola", "buenas", "buenos dias", "buenos días", "buen dia", "buen día",
-            "buenas tardes", "buenas noches", "hey", "que tal", "qué tal", "holi",
-        }
-        if t_norm in greet_words:
+        if t_norm in GREETING_PHRASES:
             base = "Dime qué necesitas y con gusto te guío para ayudarte a encontrar el servicio que necesitas."
             nombre = _match_name(match)
             send_message(phone, f"Hola {nombre} 👋 {base}" if nombre else f"Hola 👋 {base}")
             user_state[phone] = "__greeted__"
             return
 
-        tpv_keywords = (
-            "tpv", "terminal", "terminales", "punto de venta", "punto-de-venta",
-            "cobrar con tarjeta", "cobro con tarjeta", "pagar con tarjeta",
-            "ligas de pago", "link de pago", "link pago", "cobro a distancia",
-        )
-        if any(k in t_norm for k in tpv_keywords):
+        if "tpv_interest" in _intent_signals(text):
             user_state[phone] = "tpv_giro"
             _notify_advisor(
                 "🧠 Interés detectado (TPV)\n"
@@ -1498,18 +2125,7 @@ def _stateless_text_fallback(
         return
 
     t_lower = text.lower().strip()
-    valid_commands = {
-        "1", "2", "3", "4", "5", "6", "7",
-        "menu", "menú", "inicio", "hola",
-        "imss", "ley 73", "prestamo", "préstamo", "pension", "pensión",
-        "auto", "seguro auto", "seguros de auto",
-        "vida", "salud", "seguro de vida", "seguro de salud",
-        "vrim", "tarjeta medica", "tarjeta médica",
-        "empresarial", "pyme", "credito", "crédito", "credito empresarial", "crédito empresarial",
-        "financiamiento", "financiamiento practico", "financiamiento práctico",
-        "contactar", "asesor", "contactar con christian",
-    }
-    if not t_lower.isdigit() and t_lower not in valid_commands and idle:
+    if not t_lower.isdigit() and t_lower not in LOCAL_MENU_COMMANDS and _resolve_command(t_lower) is None and idle:
         _notify_advisor(
             "📩 Cliente INTERESADO / DUDA detectada\n"
             f"WhatsApp: {phone}\n"
@@ -1545,27 +2161,14 @@ def _emit_boardroom_observation(
     if not _BUS_ACTIVE or not BUS_URL or not BUS_INTERNAL_TOKEN:
         return
     payload = _build_boardroom_event(phone, text, msg, mtype, match)
-
-    def _post() -> None:
-        try:
-            requests.post(
-                _bus_event_url(),
-                json=payload,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {BUS_INTERNAL_TOKEN}",
-                    "X-Source-System": "vicky",
-                    "X-Event-Type": "inbound_message",
-                },
-                timeout=3,
-            )
-        except Exception as exc:
-            log.warning(
-                "Boardroom observation emit fallido phone_last4=%s error=%s: %s",
-                phone[-4:], type(exc).__name__, str(exc),
-            )
-
-    threading.Thread(target=_post, daemon=True).start()
+    _enqueue_bus(
+        f"event:{payload['event_id']}",
+        "observation",
+        _bus_event_url(),
+        payload,
+        batch_url=BUS_BATCH_URL or None,
+        label=f"observation phone_last4={phone[-4:]}",
+    )
 
 
 def _extract_boardroom_decision(decision: Any) -> Dict[str, Any]:
@@ -1668,368 +2271,401 @@ def vida_start(phone: str, match: Optional[Dict[str, Any]] = None) -> None:
     )
 
 
-def _vida_next(phone: str, text: str, match: Optional[Dict[str, Any]] = None) -> None:
-    st = user_state.get(phone, "")
-    data = _ensure_user(phone)
-    data["last_message"] = text or ""
+def imss_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
+    user_state[phone] = "imss_beneficios"
+    log.info("🏥 Iniciando embudo IMSS para %s", phone)
+    send_message(phone, "🟩 *Préstamo IMSS Ley 73*\nBeneficios clave: trámite rápido, sin aval, pagos fijos y atención personalizada. ¿Te interesa conocer requisitos? (responde *sí* o *no*)")
 
-    if st == "vida_edad":
-        edad = extract_number(text)
-        if edad is None or edad < 18 or edad > 75:
-            send_message(phone, "Para revisar Seguro de Vida Temporal necesito una edad entre 18 y 75. ¿Cuál es tu edad?")
-            return
-        data["edad"] = int(edad)
-        user_state[phone] = "vida_fuma"
-        send_message(phone, "¿Fumas actualmente? Responde *sí* o *no*.")
-        return
 
-    if st == "vida_fuma":
-        intent = interpret_response(text)
-        if intent == "positive":
-            data["fuma"] = "sí"
-        elif intent == "negative":
-            data["fuma"] = "no"
-        else:
-            send_message(phone, "¿Fumas actualmente? Responde *sí* o *no*.")
-            return
-        user_state[phone] = "vida_estado"
-        send_message(phone, "¿En qué estado de la República vives?")
-        return
+def emp_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
+    user_state[phone] = "emp_confirma"
+    log.info("🏢 Iniciando embudo empresarial para %s", phone)
+    send_message(phone, "🟦 *Crédito Empresarial*\n¿Eres empresario(a) o representas una empresa? (sí/no)")
 
-    if st == "vida_estado":
-        estado = (text or "").strip()
-        if not estado:
-            send_message(phone, "¿En qué estado de la República vives?")
-            return
-        data["estado"] = estado
-        user_state[phone] = "vida_suma"
-        send_message(phone, "¿Qué suma asegurada te gustaría revisar? Ejemplo: 500 mil, 1 millón o 2 millones.")
-        return
 
-    if st == "vida_suma":
-        suma = (text or "").strip()
-        if not suma:
-            send_message(phone, "¿Qué suma asegurada te gustaría revisar? Ejemplo: 500 mil, 1 millón o 2 millones.")
-            return
-        data["suma"] = suma
-        user_state[phone] = "vida_objetivo"
-        send_message(phone, "¿Qué buscas proteger principalmente?\n1) Familia\n2) Deuda\n3) Negocio\n4) Otro")
-        return
+FP_QUESTIONS = [f"Pregunta {i}" for i in range(1, 12)]
 
-    if st == "vida_objetivo":
-        raw = (text or "").strip()
-        objetivo = {"1": "Familia", "2": "Deuda", "3": "Negocio", "4": "Otro"}.get(raw, raw.capitalize() if raw else "Otro")
-        data["objetivo"] = objetivo
-        send_message(
-            phone,
-            "Gracias. Ya tengo los datos iniciales para revisar una opción de Seguro de Vida Temporal.\n\n"
-            "Christian te dará seguimiento para revisar una propuesta según tu edad, perfil, suma asegurada y condiciones de contratación.",
-        )
-        _notify_advisor(
-            "🔔 VIDA TEMPORAL — Prospecto interesado\n"
-            f"WhatsApp: {phone}\n"
-            f"Nombre: {_match_name(match) or '(sin nombre)'}\n"
-            f"Edad: {data.get('edad', '')}\n"
-            f"Fuma: {data.get('fuma', '')}\n"
-            f"Estado: {data.get('estado', '')}\n"
-            f"Suma asegurada: {data.get('suma', '')}\n"
-            f"Objetivo: {data.get('objetivo', '')}"
-        )
-        try:
-            if match and match.get("row"):
-                _safe_update_row_cells(
-                    int(match["row"]),
-                    {
-                        "ESTATUS": "perfil_inicial_capturado",
-                        "PRODUCTO": "vida_temporal",
-                        "ULTIMO_CONTACTO": _utc_now_iso(),
-                        "NOTAS": "datos iniciales capturados para vida temporal",
-                        "LAST_MESSAGE": data.get("last_message", ""),
-                    },
-                    VIDA_SHEET_FIELDS,
-                )
-        except Exception:
-            log.exception("⚠️ No fue posible actualizar Sheets al cerrar Vida Temporal")
-        user_state[phone] = "__greeted__"
-        log.info("✅ Vida Temporal perfil inicial capturado")
-        return
 
-    vida_start(phone, match)
+def fp_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
+    user_state[phone] = "fp_q1"
+    _ensure_user(phone)["fp_answers"] = {}
+    log.info("💰 Iniciando embudo financiamiento práctico para %s", phone)
+    send_message(phone, "🟩 *Financiamiento Práctico*\nResponderemos 11 preguntas rápidas.\n1) " + FP_QUESTIONS[0])
 
 
-def imss_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
-    user_state[phone] = "imss_beneficios"
-    log.info("🏥 Iniciando embudo IMSS para %s", phone)
-    send_message(phone, "🟩 *Préstamo IMSS Ley 73*\nBeneficios clave: trámite rápido, sin aval, pagos fijos y atención personalizada. ¿Te interesa conocer requisitos? (responde *sí* o *no*)")
+def auto_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
+    user_state[phone] = "auto_intro"
+    log.info("🚗 Iniciando embudo seguro auto para %s", phone)
+    send_message(
+        phone,
+        "🚗 *Seguro de Auto*\nEnvíame por favor:\n• INE (frente)\n• Tarjeta de circulación *o* número de placas\n\nCuando lo envíes, te confirmaré recepción y procesaré la cotización.",
+    )
 
 
-def _imss_next(phone: str, text: str) -> None:
-    st = user_state.get(phone, "")
-    data = _ensure_user(phone)
-    if st == "imss_beneficios":
-        if interpret_response(text) == "positive":
-            user_state[phone] = "imss_pension"
-            send_message(phone, "¿Cuál es tu *pensión mensual* aproximada? (ej. $8,500)")
-        else:
-            send_message(phone, "Sin problema. Si deseas volver al menú, escribe *menú*.")
-        return
+# ==========================
+# Tablas de embudos
+# ==========================
+# Cada estado es una fila (prompt, parser, llave, siguiente). Los mensajes son
+# los mismos de siempre; el motor (core_funnels) hace el despacho y los
+# efectos de cierre. Los parsers devuelven INVALID para repetir la pregunta.
+def _parse_edad(text: str, data: Dict[str, Any]) -> Any:
+    edad = extract_number(text)
+    if edad is None or edad < 18 or edad > 75:
+        return INVALID
+    return int(edad)
 
-    if st == "imss_pension":
-        pension = extract_number(text)
-        if not pension:
-            send_message(phone, "No pude leer el monto. Indica tu *pensión mensual* (ej. 8500).")
-            return
-        data["imss_pension"] = pension
-        user_state[phone] = "imss_monto"
-        send_message(phone, "Gracias. ¿Qué *monto* te gustaría solicitar? (mínimo $40,000)")
-        return
 
-    if st == "imss_monto":
-        monto = extract_number(text)
-        if not monto:
-            send_message(phone, "Escribe un *monto* (ej. 100000).")
-            return
-        data["imss_monto"] = monto
-        user_state[phone] = "imss_nombre"
-        send_message(phone, "Perfecto. ¿Cuál es tu *nombre completo*?")
-        return
+def _parse_yes_no(text: str, data: Dict[str, Any]) -> Any:
+    intent = interpret_response(text)
+    if intent == "positive":
+        return "sí"
+    if intent == "negative":
+        return "no"
+    return INVALID
 
-    if st == "imss_nombre":
-        data["imss_nombre"] = text.strip()
-        user_state[phone] = "imss_ciudad"
-        send_message(phone, "¿En qué *ciudad* te encuentras?")
-        return
 
-    if st == "imss_ciudad":
-        data["imss_ciudad"] = text.strip()
-        user_state[phone] = "imss_nomina"
-        send_message(phone, "¿Tienes *nómina Inbursa* actualmente? (sí/no)\n*Nota:* No es obligatoria; si la tienes, accedes a *beneficios adicionales*.")
-        return
+def _parse_positive(text: str, data: Dict[str, Any]) -> Any:
+    return True if interpret_response(text) == "positive" else INVALID
 
-    if st == "imss_nomina":
-        tiene_nomina = interpret_response(text) == "positive"
-        data["imss_nomina_inbursa"] = "sí" if tiene_nomina else "no"
-        msg = (
-            "✅ *Preautorizado*. Un asesor te contactará.\n"
-            f"- Nombre: {data.get('imss_nombre','')}\n"
-            f"- Ciudad: {data.get('imss_ciudad','')}\n"
-            f"- Pensión: ${data.get('imss_pension',0):,.0f}\n"
-            f"- Monto deseado: ${data.get('imss_monto',0):,.0f}\n"
-            f"- Nómina Inbursa: {data.get('imss_nomina_inbursa','no')}\n"
-        )
-        send_message(phone, msg)
-        _notify_advisor(f"🔔 IMSS — Prospecto preautorizado\nWhatsApp: {phone}\n{msg}")
-        user_state[phone] = "__greeted__"
-        send_main_menu(phone)
-        return
 
-    imss_start(phone, None)
+def _parse_amount(text: str, data: Dict[str, Any]) -> Any:
+    return extract_number(text) or INVALID
 
 
-def emp_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
-    user_state[phone] = "emp_confirma"
-    log.info("🏢 Iniciando embudo empresarial para %s", phone)
-    send_message(phone, "🟦 *Crédito Empresarial*\n¿Eres empresario(a) o representas una empresa? (sí/no)")
+def _parse_emp_monto(text: str, data: Dict[str, Any]) -> Any:
+    monto = extract_number(text)
+    return monto if monto and monto >= 100000 else INVALID
 
 
-def _emp_next(phone: str, text: str) -> None:
-    st = user_state.get(phone, "")
-    data = _ensure_user(phone)
-    if st == "emp_confirma":
-        if interpret_response(text) != "positive":
-            send_message(phone, "Entendido. Si deseas volver al menú, escribe *menú*.")
-            return
-        user_state[phone] = "emp_giro"
-        send_message(phone, "¿A qué *se dedica* tu empresa?")
-        return
-    if st == "emp_giro":
-        data["emp_giro"] = text.strip()
-        user_state[phone] = "emp_monto"
-        send_message(phone, "¿Qué *monto* deseas? (mínimo $100,000)")
-        return
-    if st == "emp_monto":
-        monto = extract_number(text)
-        if not monto or monto < 100000:
-            send_message(phone, "El monto mínimo es $100,000. Indica un monto igual o mayor.")
-            return
-        data["emp_monto"] = monto
-        user_state[phone] = "emp_nombre"
-        send_message(phone, "¿Tu *nombre completo*?")
-        return
-    if st == "emp_nombre":
-        data["emp_nombre"] = text.strip()
-        user_state[phone] = "emp_ciudad"
-        send_message(phone, "¿Tu *ciudad*?")
-        return
-    if st == "emp_ciudad":
-        data["emp_ciudad"] = text.strip()
-        resumen = (
-            "✅ Gracias. Un asesor te contactará.\n"
-            f"- Nombre: {data.get('emp_nombre','')}\n"
-            f"- Ciudad: {data.get('emp_ciudad','')}\n"
-            f"- Giro: {data.get('emp_giro','')}\n"
-            f"- Monto: ${data.get('emp_monto',0):,.0f}\n"
-        )
-        send_message(phone, resumen)
-        _notify_advisor(f"🔔 Empresarial — Nueva solicitud\nWhatsApp: {phone}\n{resumen}")
-        user_state[phone] = "__greeted__"
-        send_main_menu(phone)
-        return
-    emp_start(phone, None)
+def _parse_free_text(text: str, data: Dict[str, Any]) -> Any:
+    # Sin validacion: estos pasos siempre aceptaron lo que llegara.
+    return (text or "").strip()
 
 
-FP_QUESTIONS = [f"Pregunta {i}" for i in range(1, 12)]
+def _parse_vida_objetivo(text: str, data: Dict[str, Any]) -> Any:
+    raw = (text or "").strip()
+    return {"1": "Familia", "2": "Deuda", "3": "Negocio", "4": "Otro"}.get(raw, raw.capitalize() if raw else "Otro")
 
 
-def fp_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
-    user_state[phone] = "fp_q1"
-    _ensure_user(phone)["fp_answers"] = {}
-    log.info("💰 Iniciando embudo financiamiento práctico para %s", phone)
-    send_message(phone, "🟩 *Financiamiento Práctico*\nResponderemos 11 preguntas rápidas.\n1) " + FP_QUESTIONS[0])
+def _parse_auto_intro(text: str, data: Dict[str, Any]) -> Any:
+    lower = (text or "").lower()
+    if "vencimiento" in lower or "vence" in lower or "fecha" in lower:
+        return "fecha"
+    if interpret_response(text) == "negative":
+        return "negative"
+    return INVALID
 
 
-def _fp_next(phone: str, text: str) -> None:
-    st = user_state.get(phone, "")
-    data = _ensure_user(phone)
-    if st.startswith("fp_q"):
-        idx = int(st.split("_q", 1)[1]) - 1
-        data.setdefault("fp_answers", {})[f"q{idx + 1}"] = text.strip()
-        if idx + 1 < len(FP_QUESTIONS):
-            user_state[phone] = f"fp_q{idx + 2}"
-            send_message(phone, f"{idx + 2}) {FP_QUESTIONS[idx + 1]}")
-            return
-        user_state[phone] = "fp_comentario"
-        send_message(phone, "¿Algún *comentario adicional*?")
-        return
+def _parse_auto_fecha(text: str, data: Dict[str, Any]) -> Any:
+    try:
+        return datetime.fromisoformat((text or "").strip()).date()
+    except ValueError:
+        return INVALID
 
-    if st == "fp_comentario":
-        data["fp_comentario"] = text.strip()
-        resumen = "✅ Gracias. Un asesor te contactará.\n" + "\n".join(
-            f"{k.upper()}: {v}" for k, v in data.get("fp_answers", {}).items()
-        )
-        if data.get("fp_comentario"):
-            resumen += f"\nCOMENTARIO: {data['fp_comentario']}"
-        send_message(phone, resumen)
-        _notify_advisor(f"🔔 Financiamiento Práctico — Resumen\nWhatsApp: {phone}\n{resumen}")
-        user_state[phone] = "__greeted__"
-        send_main_menu(phone)
-        return
 
-    fp_start(phone, None)
+def _parse_tpv_motivo(text: str, data: Dict[str, Any]) -> Any:
+    motivo = (text or "").strip()
+    return "" if motivo.lower() == "omitir" else motivo
 
 
-def auto_start(phone: str, match: Optional[Dict[str, Any]]) -> None:
-    user_state[phone] = "auto_intro"
-    log.info("🚗 Iniciando embudo seguro auto para %s", phone)
-    send_message(
-        phone,
-        "🚗 *Seguro de Auto*\nEnvíame por favor:\n• INE (frente)\n• Tarjeta de circulación *o* número de placas\n\nCuando lo envíes, te confirmaré recepción y procesaré la cotización.",
+def _vida_complete(ctx: FunnelContext) -> Completion:
+    data = ctx.data
+    log.info("✅ Vida Temporal perfil inicial capturado")
+    return Completion(
+        message=(
+            "Gracias. Ya tengo los datos iniciales para revisar una opción de Seguro de Vida Temporal.\n\n"
+            "Christian te dará seguimiento para revisar una propuesta según tu edad, perfil, suma asegurada y condiciones de contratación."
+        ),
+        advisor=(
+            "🔔 VIDA TEMPORAL — Prospecto interesado\n"
+            f"WhatsApp: {ctx.phone}\n"
+            f"Nombre: {_match_name(ctx.match) or '(sin nombre)'}\n"
+            f"Edad: {data.get('edad', '')}\n"
+            f"Fuma: {data.get('fuma', '')}\n"
+            f"Estado: {data.get('estado', '')}\n"
+            f"Suma asegurada: {data.get('suma', '')}\n"
+            f"Objetivo: {data.get('objetivo', '')}"
+        ),
+        sheet={
+            "ESTATUS": "perfil_inicial_capturado",
+            "PRODUCTO": "vida_temporal",
+            "ULTIMO_CONTACTO": _utc_now_iso(),
+            "NOTAS": "datos iniciales capturados para vida temporal",
+            "LAST_MESSAGE": data.get("last_message", ""),
+        },
     )
 
 
-def _auto_next(phone: str, text: str) -> None:
-    st = user_state.get(phone, "")
-    if st == "auto_intro":
-        intent = interpret_response(text)
-        lower = text.lower()
-        if "vencimiento" in lower or "vence" in lower or "fecha" in lower:
-            user_state[phone] = "auto_vencimiento_fecha"
-            send_message(phone, "¿Cuál es la *fecha de vencimiento* de tu póliza actual? (formato AAAA-MM-DD)")
-            return
-        if intent == "negative":
-            user_state[phone] = "auto_vencimiento_fecha"
-            send_message(phone, "Entendido. Para poder recordarte a tiempo, ¿cuál es la *fecha de vencimiento* de tu póliza? (AAAA-MM-DD)")
-            return
-        send_message(phone, "Perfecto. Puedes empezar enviando los *documentos* o una *foto* de la tarjeta/placas.")
-        return
+def _imss_complete(ctx: FunnelContext) -> Completion:
+    data = ctx.data
+    msg = (
+        "✅ *Preautorizado*. Un asesor te contactará.\n"
+        f"- Nombre: {data.get('imss_nombre','')}\n"
+        f"- Ciudad: {data.get('imss_ciudad','')}\n"
+        f"- Pensión: ${data.get('imss_pension',0):,.0f}\n"
+        f"- Monto deseado: ${data.get('imss_monto',0):,.0f}\n"
+        f"- Nómina Inbursa: {data.get('imss_nomina_inbursa','no')}\n"
+    )
+    return Completion(message=msg, advisor=f"🔔 IMSS — Prospecto preautorizado\nWhatsApp: {ctx.phone}\n{msg}", menu=True)
 
-    if st == "auto_vencimiento_fecha":
-        try:
-            fecha = datetime.fromisoformat(text.strip()).date()
-            objetivo = fecha - timedelta(days=30)
-            write_followup_to_sheets("auto_recordatorio", f"Recordatorio póliza -30d para {phone}", objetivo.isoformat())
-            threading.Thread(target=_retry_after_days, args=(phone, 7), daemon=True).start()
-            send_message(phone, f"✅ Gracias. Te contactaré *un mes antes* ({objetivo.isoformat()}).")
-            user_state[phone] = "__greeted__"
-            send_main_menu(phone)
-        except Exception:
-            send_message(phone, "Formato inválido. Usa AAAA-MM-DD. Ejemplo: 2025-12-31")
-        return
 
-    auto_start(phone, None)
+def _emp_complete(ctx: FunnelContext) -> Completion:
+    data = ctx.data
+    resumen = (
+        "✅ Gracias. Un asesor te contactará.\n"
+        f"- Nombre: {data.get('emp_nombre','')}\n"
+        f"- Ciudad: {data.get('emp_ciudad','')}\n"
+        f"- Giro: {data.get('emp_giro','')}\n"
+        f"- Monto: ${data.get('emp_monto',0):,.0f}\n"
+    )
+    return Completion(message=resumen, advisor=f"🔔 Empresarial — Nueva solicitud\nWhatsApp: {ctx.phone}\n{resumen}", menu=True)
 
 
-def _tpv_next(phone: str, text: str, match: Optional[Dict[str, Any]]) -> None:
-    st = user_state.get(phone, "")
-    data = _ensure_user(phone)
-    nombre = _match_name(match)
+def _fp_complete(ctx: FunnelContext) -> Completion:
+    data = ctx.data
+    resumen = "✅ Gracias. Un asesor te contactará.\n" + "\n".join(
+        f"{k.upper()}: {v}" for k, v in data.get("fp_answers", {}).items()
+    )
+    if data.get("fp_comentario"):
+        resumen += f"\nCOMENTARIO: {data['fp_comentario']}"
+    return Completion(message=resumen, advisor=f"🔔 Financiamiento Práctico — Resumen\nWhatsApp: {ctx.phone}\n{resumen}", menu=True)
 
-    if st == "tpv_giro":
-        giro = (text or "").strip()
-        if not giro:
-            send_message(phone, "Solo indícame tu *giro* (ej. restaurante, abarrotes, consultorio).")
-            return
-        data["tpv_giro"] = giro
-        user_state[phone] = "tpv_horario"
-        send_message(phone, "¿Qué *horario* te conviene para que Christian te contacte? (ej. hoy 4pm, mañana 10am)")
-        return
 
-    if st == "tpv_horario":
-        horario = (text or "").strip()
-        if not horario:
-            send_message(phone, "Indícame un *horario* (ej. hoy 4pm, mañana 10am).")
-            return
-        data["tpv_horario"] = horario
-        resumen = (
+def _auto_complete(ctx: FunnelContext) -> Completion:
+    phone = ctx.phone
+    fecha = ctx.data["auto_vencimiento"]
+    objetivo = fecha - timedelta(days=30)
+
+    def _after() -> None:
+        write_followup_to_sheets("auto_recordatorio", f"Recordatorio póliza -30d para {phone}", objetivo.isoformat())
+        _schedule_auto_recordatorio(phone, fecha, objetivo)
+        _retry_after_days(phone, 7)
+
+    return Completion(
+        message=f"✅ Gracias. Te contactaré *un mes antes* ({objetivo.isoformat()}).",
+        after=_after,
+        menu=True,
+    )
+
+
+def _tpv_interesado_complete(ctx: FunnelContext) -> Completion:
+    data = ctx.data
+    return Completion(
+        message=(
             "✅ Listo. En breve Christian te contactará para ofrecerte la mejor opción de terminal.\n"
             f"- Giro: {data.get('tpv_giro','')}\n"
             f"- Horario: {data.get('tpv_horario','')}"
-        )
-        send_message(phone, resumen)
-        _notify_advisor(
+        ),
+        advisor=(
             "🔔 TPV — Prospecto interesado\n"
-            f"WhatsApp: {phone}\n"
-            f"Nombre: {nombre or '(sin nombre)'}\n"
+            f"WhatsApp: {ctx.phone}\n"
+            f"Nombre: {_match_name(ctx.match) or '(sin nombre)'}\n"
             f"Giro: {data.get('tpv_giro','')}\n"
             f"Horario: {data.get('tpv_horario','')}"
-        )
-        try:
-            if match and match.get("row"):
-                headers, _ = _sheet_get_rows()
-                if headers and _idx(headers, "ESTATUS") is not None:
-                    _update_row_cells(int(match["row"]), {"ESTATUS": "TPV_INTERESADO"}, headers)
-        except Exception:
-            log.exception("⚠️ No fue posible actualizar ESTATUS TPV_INTERESADO")
-        user_state[phone] = "__greeted__"
-        return
+        ),
+        sheet={"ESTATUS": "TPV_INTERESADO"},
+    )
 
-    if st == "tpv_motivo":
-        motivo = (text or "").strip()
-        if motivo.lower() == "omitir":
-            motivo = ""
-        data["tpv_motivo"] = motivo
-        send_message(phone, "Gracias por tu respuesta. Si más adelante deseas una terminal, aquí estaré para ayudarte.")
-        try:
-            if match and match.get("row"):
-                headers, _ = _sheet_get_rows()
-                if headers and _idx(headers, "ESTATUS") is not None:
-                    _update_row_cells(int(match["row"]), {"ESTATUS": "TPV_NO_INTERESADO"}, headers)
-        except Exception:
-            log.exception("⚠️ No fue posible actualizar ESTATUS TPV_NO_INTERESADO")
-        user_state[phone] = "__greeted__"
-        return
 
-    user_state[phone] = "tpv_giro"
-    send_message(phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
+def _tpv_no_interesado_complete(ctx: FunnelContext) -> Completion:
+    return Completion(
+        message="Gracias por tu respuesta. Si más adelante deseas una terminal, aquí estaré para ayudarte.",
+        sheet={"ESTATUS": "TPV_NO_INTERESADO"},
+    )
+
 
+def _fp_store(idx: int):
+    def _store(data: Dict[str, Any], value: Any) -> None:
+        data.setdefault("fp_answers", {})[f"q{idx}"] = value
+    return _store
+
+
+def _tpv_restart(ctx: FunnelContext) -> None:
+    user_state[ctx.phone] = "tpv_giro"
+    send_message(ctx.phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
+
+
+_VIDA_SUMA_PROMPT = "¿Qué suma asegurada te gustaría revisar? Ejemplo: 500 mil, 1 millón o 2 millones."
+_MENU_HINT_RETRY = "Si deseas volver al menú, escribe *menú*."
+
+FUNNELS: Tuple[Funnel, ...] = (
+    Funnel("vida_", {
+        "vida_edad": Step(
+            parse=_parse_edad, store="edad", next="vida_fuma",
+            retry="Para revisar Seguro de Vida Temporal necesito una edad entre 18 y 75. ¿Cuál es tu edad?",
+        ),
+        "vida_fuma": Step("¿Fumas actualmente? Responde *sí* o *no*.", _parse_yes_no, "fuma", "vida_estado"),
+        "vida_estado": Step("¿En qué estado de la República vives?", store="estado", next="vida_suma"),
+        "vida_suma": Step(_VIDA_SUMA_PROMPT, store="suma", next="vida_objetivo"),
+        "vida_objetivo": Step(
+            "¿Qué buscas proteger principalmente?\n1) Familia\n2) Deuda\n3) Negocio\n4) Otro",
+            _parse_vida_objetivo, "objetivo", complete=_vida_complete,
+        ),
+    }, restart=lambda ctx: vida_start(ctx.phone, ctx.match)),
+    Funnel("imss_", {
+        "imss_beneficios": Step(parse=_parse_positive, next="imss_pension", retry=f"Sin problema. {_MENU_HINT_RETRY}"),
+        "imss_pension": Step(
+            "¿Cuál es tu *pensión mensual* aproximada? (ej. $8,500)", _parse_amount, "imss_pension", "imss_monto",
+            retry="No pude leer el monto. Indica tu *pensión mensual* (ej. 8500).",
+        ),
+        "imss_monto": Step(
+            "Gracias. ¿Qué *monto* te gustaría solicitar? (mínimo $40,000)", _parse_amount, "imss_monto", "imss_nombre",
+            retry="Escribe un *monto* (ej. 100000).",
+        ),
+        "imss_nombre": Step("Perfecto. ¿Cuál es tu *nombre completo*?", _parse_free_text, "imss_nombre", "imss_ciudad"),
+        "imss_ciudad": Step("¿En qué *ciudad* te encuentras?", _parse_free_text, "imss_ciudad", "imss_nomina"),
+        "imss_nomina": Step(
+            "¿Tienes *nómina Inbursa* actualmente? (sí/no)\n*Nota:* No es obligatoria; si la tienes, accedes a *beneficios adicionales*.",
+            lambda text, data: "sí" if interpret_response(text) == "positive" else "no",
+            "imss_nomina_inbursa", complete=_imss_complete,
+        ),
+    }, restart=lambda ctx: imss_start(ctx.phone, None)),
+    Funnel("emp_", {
+        "emp_confirma": Step(parse=_parse_positive, next="emp_giro", retry=f"Entendido. {_MENU_HINT_RETRY}"),
+        "emp_giro": Step("¿A qué *se dedica* tu empresa?", _parse_free_text, "emp_giro", "emp_monto"),
+        "emp_monto": Step(
+            "¿Qué *monto* deseas? (mínimo $100,000)", _parse_emp_monto, "emp_monto", "emp_nombre",
+            retry="El monto mínimo es $100,000. Indica un monto igual o mayor.",
+        ),
+        "emp_nombre": Step("¿Tu *nombre completo*?", _parse_free_text, "emp_nombre", "emp_ciudad"),
+        "emp_ciudad": Step("¿Tu *ciudad*?", _parse_free_text, "emp_ciudad", complete=_emp_complete),
+    }, restart=lambda ctx: emp_start(ctx.phone, None)),
+    Funnel("fp_", {
+        **{
+            f"fp_q{i}": Step(
+                f"{i}) {FP_QUESTIONS[i - 1]}", _parse_free_text, _fp_store(i),
+                f"fp_q{i + 1}" if i < len(FP_QUESTIONS) else "fp_comentario",
+            )
+            for i in range(1, len(FP_QUESTIONS) + 1)
+        },
+        "fp_comentario": Step("¿Algún *comentario adicional*?", _parse_free_text, "fp_comentario", complete=_fp_complete),
+    }, restart=lambda ctx: fp_start(ctx.phone, None)),
+    Funnel("auto_", {
+        "auto_intro": Step(
+            parse=_parse_auto_intro,
+            next=lambda value, ctx: "auto_vencimiento_fecha" if value == "fecha" else (
+                "auto_vencimiento_fecha",
+                "Entendido. Para poder recordarte a tiempo, ¿cuál es la *fecha de vencimiento* de tu póliza? (AAAA-MM-DD)",
+            ),
+            retry="Perfecto. Puedes empezar enviando los *documentos* o una *foto* de la tarjeta/placas.",
+        ),
+        "auto_vencimiento_fecha": Step(
+            "¿Cuál es la *fecha de vencimiento* de tu póliza actual? (formato AAAA-MM-DD)",
+            _parse_auto_fecha, "auto_vencimiento", complete=_auto_complete,
+            retry="Formato inválido. Usa AAAA-MM-DD. Ejemplo: 2025-12-31",
+        ),
+    }, restart=lambda ctx: auto_start(ctx.phone, None)),
+    Funnel("tpv_", {
+        "tpv_giro": Step(
+            store="tpv_giro", next="tpv_horario",
+            retry="Solo indícame tu *giro* (ej. restaurante, abarrotes, consultorio).",
+        ),
+        "tpv_horario": Step(
+            "¿Qué *horario* te conviene para que Christian te contacte? (ej. hoy 4pm, mañana 10am)",
+            store="tpv_horario", complete=_tpv_interesado_complete,
+            retry="Indícame un *horario* (ej. hoy 4pm, mañana 10am).",
+        ),
+        "tpv_motivo": Step(parse=_parse_tpv_motivo, store="tpv_motivo", complete=_tpv_no_interesado_complete),
+    }, restart=_tpv_restart),
+)
 
-def _retry_after_days(phone: str, days: int) -> None:
+_funnels = FunnelEngine(
+    FUNNELS,
+    FunnelEffects(
+        send=lambda phone, text: send_message(phone, text),
+        notify=lambda text: _notify_advisor(text),
+        update_sheet=lambda match, updates: _safe_update_row_cells(int(match["row"]), updates, VIDA_SHEET_FIELDS),
+        main_menu=lambda phone: send_main_menu(phone),
+        set_state=lambda phone, state: user_state.__setitem__(phone, state),
+        get_data=lambda phone: _ensure_user(phone),
+    ),
+)
+
+
+def _vida_next(phone: str, text: str, match: Optional[Dict[str, Any]] = None) -> None:
+    """Avanza el embudo de Vida Temporal (atajo usado por Boardroom y tests)."""
+    st = user_state.get(phone, "")
+    # Fuera del embudo, "vida_" no es un paso: el motor reinicia con vida_start.
+    _funnels.advance(phone, st if st.startswith("vida_") else "vida_", text, match)
+
+
+# ==========================
+# Jobs diferidos (SQLite)
+# ==========================
+_job_scheduler: Optional[JobScheduler] = None
+_job_scheduler_lock = threading.Lock()
+
+
+def _scheduler() -> Optional[JobScheduler]:
+    """JobScheduler compartido; se crea (y arranca su dispatcher) en el
+    primer uso. Devuelve None si el store local no se puede abrir -- el
+    turno sigue, solo se pierde el job (igual que antes con un reinicio)."""
+    global _job_scheduler
+    if _job_scheduler is not None:
+        return _job_scheduler
+    with _job_scheduler_lock:
+        if _job_scheduler is None:
+            try:
+                sched = JobScheduler(VICKY_DB_PATH)
+                # lambdas: resuelven el handler al ejecutar (permite patch en tests)
+                sched.register("auto_reintento", lambda payload: _run_auto_reintento_job(payload))
+                sched.register("auto_recordatorio", lambda payload: _run_auto_recordatorio_job(payload))
+                sched.start()
+                _job_scheduler = sched
+            except Exception:
+                log.exception("❌ No fue posible iniciar JobScheduler en %s", VICKY_DB_PATH)
+                return None
+    return _job_scheduler
+
+
+def _schedule_job(kind: str, run_at: datetime | float, payload: Dict[str, Any], job_id: Optional[str] = None) -> Optional[str]:
+    sched = _scheduler()
+    if sched is None:
+        log.warning("⚠️ JobScheduler no disponible; job %s no agendado", kind)
+        return None
     try:
-        time.sleep(days * 24 * 60 * 60)
-        send_message(phone, "⏰ Seguimos a tus órdenes. ¿Deseas que coticemos tu seguro de auto cuando se acerque el vencimiento?")
-        write_followup_to_sheets("auto_reintento", f"Reintento +{days}d enviado a {phone}", _utc_now_iso())
+        return sched.schedule(kind, run_at, payload, job_id=job_id)
     except Exception:
-        log.exception("Error en reintento programado")
+        log.exception("❌ Error agendando job %s", kind)
+        return None
+
+
+def _retry_after_days(phone: str, days: int) -> Optional[str]:
+    """Agenda el reintento +N días como job persistente (antes: un thread
+    dormido N días por cliente, perdido en cada reinicio)."""
+    run_at = time.time() + days * 24 * 60 * 60
+    job_id = f"auto_reintento:{phone}:{datetime.utcnow().date().isoformat()}"
+    return _schedule_job("auto_reintento", run_at, {"phone": phone, "days": days}, job_id=job_id)
+
+
+def _schedule_auto_recordatorio(phone: str, vencimiento: Any, objetivo: Any) -> Optional[str]:
+    run_at = datetime.combine(objetivo, datetime.min.time()).replace(hour=AUTO_REMINDER_HOUR_UTC, tzinfo=timezone.utc)
+    payload = {"phone": phone, "vencimiento": vencimiento.isoformat(), "objetivo": objetivo.isoformat()}
+    return _schedule_job("auto_recordatorio", run_at, payload, job_id=f"auto_recordatorio:{phone}:{objetivo.isoformat()}")
+
+
+def _run_auto_reintento_job(payload: Dict[str, Any]) -> None:
+    phone = str(payload.get("phone") or "")
+    days = payload.get("days")
+    # Un envio fallido se propaga: el scheduler reintenta con backoff en vez
+    # de marcar el job como hecho.
+    if not send_message(phone, "⏰ Seguimos a tus órdenes. ¿Deseas que coticemos tu seguro de auto cuando se acerque el vencimiento?"):
+        raise RuntimeError(f"envio de reintento fallido para {phone}")
+    write_followup_to_sheets("auto_reintento", f"Reintento +{days}d enviado a {phone}", _utc_now_iso())
+
+
+def _run_auto_recordatorio_job(payload: Dict[str, Any]) -> None:
+    phone = str(payload.get("phone") or "")
+    vencimiento = payload.get("vencimiento") or ""
+    # Se falla antes de avisar al asesor para no duplicar el aviso al reintentar.
+    if AUTO_REMINDER_TEMPLATE and not send_template_message(phone, AUTO_REMINDER_TEMPLATE):
+        raise RuntimeError(f"plantilla de recordatorio fallida para {phone}")
+    _notify_advisor(
+        "⏰ AUTO — Recordatorio de renovación (-30d)\n"
+        f"WhatsApp: {phone}\n"
+        f"Vencimiento póliza: {vencimiento}"
+    )
+    write_followup_to_sheets("auto_recordatorio_enviado", f"Recordatorio póliza -30d enviado para {phone}", _utc_now_iso())
 
 
 # ==========================
@@ -2057,29 +2693,7 @@ def _route_command(phone: str, text: str, match: Optional[Dict[str, Any]]) -> No
         send_main_menu(phone)
         return
 
-    if st.startswith("vida_"):
-        log.info("🧭 vida dispatch active phone=%s state=%s text=%s", phone, st, text)
-        _vida_next(phone, text, match)
-        return
-
-    if st.startswith("imss_"):
-        _imss_next(phone, text)
-        return
-
-    if st.startswith("auto_"):
-        _auto_next(phone, text)
-        return
-
-    if st.startswith("tpv_"):
-        _tpv_next(phone, text, match)
-        return
-
-    if st.startswith("emp_"):
-        _emp_next(phone, text)
-        return
-
-    if st.startswith("fp_"):
-        _fp_next(phone, text)
+    if _funnels.advance(phone, st, text, match):
         return
 
     # TPV por contexto de plantilla queda después del dispatch temprano.
@@ -2087,11 +2701,8 @@ def _route_command(phone: str, text: str, match: Optional[Dict[str, Any]]) -> No
         if tpv_start_from_reply(phone, text, match):
             return
 
-    tlow = t.lower()
-    if (
-        ("credito" in tlow or "crédito" in tlow or "prestamo" in tlow or "préstamo" in tlow)
-        and not any(k in tlow for k in ("auto", "seguro auto", "seguro de auto", "póliza", "poliza", "placa"))
-    ):
+    signals = _intent_signals(t)
+    if "credit" in signals and "auto_context" not in signals:
         send_message(
             phone,
             "¿Qué tipo de crédito buscas?\n"
@@ -2102,33 +2713,36 @@ def _route_command(phone: str, text: str, match: Optional[Dict[str, Any]]) -> No
         )
         return
 
-    if t in ("1", "imss", "ley 73", "préstamo", "prestamo", "pension", "pensión"):
+    command = _resolve_command(t)
+    if command == "imss":
         log.info("🧭 imss_start candidate phone=%s state=%s text=%s", phone, user_state.get(phone, ""), text)
         imss_start(phone, match)
-    elif t in ("2", "auto", "seguros de auto", "seguro auto"):
+    elif command == "auto":
         auto_start(phone, match)
-    elif t in (
-        "3", "vida", "salud", "seguro de vida", "seguro de salud", "vida temporal",
-        "seguro vida", "seguros de vida", "protección familiar", "proteccion familiar",
-        "seguro de vida y salud",
-    ):
+    elif command == "vida":
         vida_start(phone, match)
-    elif t in ("4", "vrim", "tarjeta médica", "tarjeta medica"):
+    elif command == "vrim":
         send_message(phone, "🩺 *VRIM* — Membresía médica. Notificaré al asesor para darte detalles.")
         _notify_advisor(f"🔔 VRIM — Solicitud de contacto\nWhatsApp: {phone}")
         send_main_menu(phone)
-    elif t in ("5", "empresarial", "pyme", "crédito empresarial", "credito empresarial"):
+    elif command == "empresarial":
         emp_start(phone, match)
-    elif t in ("6", "financiamiento práctico", "financiamiento practico", "crédito simple", "credito simple", "financiamiento"):
+    elif command == "financiamiento":
         fp_start(phone, match)
-    elif t in ("7", "contactar", "asesor", "contactar con christian"):
+    elif command == "contacto":
         _notify_advisor(f"🔔 Contacto directo — Cliente solicita hablar\nWhatsApp: {phone}")
         send_message(phone, "✅ Listo. Avisé a Christian para que te contacte.")
         send_main_menu(phone)
-    elif t in ("menu", "menú", "inicio"):
+    elif command == "menu":
         user_state[phone] = "__greeted__"
         send_main_menu(phone)
     else:
+        # Texto libre: si el FAQ local cubre la pregunta se responde ya (sin
+        # OpenAI); el asesor igual quedo notificado en el handler.
+        answer = faq_answer(text)
+        if answer:
+            send_message(phone, f"{answer}\n\nEscribe *menú* para ver opciones.")
+            return
         send_message(
             phone,
             "En breve, su asesor Christian López se pondrá en contacto con usted para brindarle asesoría personalizada y resolver todas sus dudas de manera directa y segura. Escribe *menú* para ver opciones.",
@@ -2153,15 +2767,20 @@ def webhook_verify():
     return "Error", 403
 
 
+@_metrics.timed("graph_download_media", outcome=lambda result: _ok_if(result[0]))
 def _download_media(media_id: str) -> Tuple[Optional[bytes], Optional[str], Optional[str]]:
     if not META_TOKEN:
         return None, None, None
+    if not _breakers.get("graph").allow():
+        log.warning("⛔ Graph API con circuit breaker abierto; media %s no descargada", media_id)
+        return None, None, None
     try:
         meta = requests.get(
-            f"https://graph.facebook.com/v20.0/{media_id}",
+            f"{GRAPH_API_BASE}/{media_id}",
             headers={"Authorization": f"Bearer {META_TOKEN}"},
             timeout=WPP_TIMEOUT,
         )
+        _record_upstream_status("graph", meta.status_code)
         if meta.status_code != 200:
             log.warning("⚠️ Meta media meta falló %s: %s", meta.status_code, meta.text[:200])
             return None, None, None
@@ -2181,6 +2800,7 @@ def _download_media(media_id: str) -> Tuple[Optional[bytes], Optional[str], Opti
         log.info("✅ Media descargada: %s (%s bytes)", filename, len(binary.content))
         return binary.content, mime, filename
     except Exception:
+        _breakers.get("graph").record_failure()
         log.exception("❌ Error descargando media")
         return None, None, None
 
@@ -2453,290 +3073,430 @@ def _handle_awaiting_template_response(phone: str, text: str, match: Optional[Di
     return True
 
 
-@app.post("/webhook")
-def webhook_receive():
-    try:
-        intent_handled = False
-        payload = request.get_json(force=True, silent=True) or {}
-        log.info("📥 Webhook recibido: %s...", json.dumps(payload, ensure_ascii=False)[:500])
+def _intent_short_circuit(phone: str, text: str, idle: bool) -> bool:
+    """Turno trivial ("menu", "1", "hola") que el router local resuelve sin
+    esperar a Boardroom. Apagado salvo INTENT_SHORT_CIRCUIT_ENABLED; Boardroom
+    igual recibe la observacion del turno."""
+    if not (INTENT_SHORT_CIRCUIT_ENABLED and idle and SECOM_LOCAL_FALLBACK_ENABLED):
+        return False
+    prediction = _classify_intent(text)
+    if prediction.intent not in TRIVIAL_INTENTS or prediction.confidence < INTENT_SHORT_CIRCUIT_MIN_CONFIDENCE:
+        return False
+    log.info("⚡ Turno trivial local phone=%s intent=%s conf=%.2f", phone, prediction.intent, prediction.confidence)
+    return True
 
-        entry = (payload.get("entry") or [{}])[0]
-        changes = (entry.get("changes") or [{}])[0]
-        value = changes.get("value", {})
-        messages = value.get("messages", [])
-        statuses = value.get("statuses", [])
 
-        if not messages:
-            if statuses:
-                for st in statuses:
-                    try:
-                        if (st.get("status") or "").lower() == "failed":
-                            log.warning("❌ STATUS failed (detalle): %s", json.dumps(st, ensure_ascii=False))
-                    except Exception:
-                        pass
-            log.info("ℹ️ Webhook sin mensajes (posible status update)")
-            return jsonify({"ok": True}), 200
+@_metrics.timed("turn")
+def _process_inbound_message(msg: Dict[str, Any]) -> None:
+    """Un turno completo para un mensaje entrante: matching en Sheets,
+    registro de la respuesta y decision (Boardroom / funnel / fallback).
+    Corre dentro del request del webhook o, con debounce, desde el
+    dispatcher de rafagas con el texto ya agregado."""
+    intent_handled = False
+    phone = msg.get("from")
+    if not phone:
+        log.warning("⚠️ Mensaje sin número de teléfono")
+        return
 
-        msg = messages[0]
-        phone = msg.get("from")
-        if not phone:
-            log.warning("⚠️ Mensaje sin número de teléfono")
-            return jsonify({"ok": True}), 200
+    _metrics.inc("inbound_messages", msg.get("type") or "unknown")
+    last10 = _normalize_phone_last10(phone)
+    match = _lookup_client(last10)
+    st_now = user_state.get(phone, "")
+    idle = st_now in ("", "__greeted__")
 
-        last10 = _normalize_phone_last10(phone)
-        match = match_client_in_sheets(last10)
-        st_now = user_state.get(phone, "")
-        idle = st_now in ("", "__greeted__")
+    mtype = msg.get("type")
+    if mtype == "text" and "text" in msg:
+        text = (msg.get("text") or {}).get("body", "").strip()
+        log.info("💬 Texto recibido de %s: %s", phone, text)
 
-        mtype = msg.get("type")
-        if mtype == "text" and "text" in msg:
-            text = (msg.get("text") or {}).get("body", "").strip()
-            log.info("💬 Texto recibido de %s: %s", phone, text)
+        try:
+            append_respuesta_cliente(phone, _match_name(match), text, _utc_now_iso())
+        except Exception:
+            pass
 
-            try:
-                append_respuesta_cliente(phone, _match_name(match), text, _utc_now_iso())
-            except Exception:
-                pass
+        _ensure_user(phone)["last_message"] = text
 
-            _ensure_user(phone)["last_message"] = text
+        if SECOM_LOCAL_FALLBACK_ENABLED and _is_active_funnel_state(st_now):
+            # ACTIVE_DETERMINISTIC_FUNNEL_TURN (DOC-0043 regla 3): continua
+            # localmente sin bloquear en Boardroom por cada paso.
+            _emit_boardroom_observation(phone, msg, match, mtype, text)
+            _route_command(phone, text, match)
+            return
 
-            if SECOM_LOCAL_FALLBACK_ENABLED and _is_active_funnel_state(st_now):
-                # ACTIVE_DETERMINISTIC_FUNNEL_TURN (DOC-0043 regla 3): continua
-                # localmente sin bloquear en Boardroom por cada paso.
-                _emit_boardroom_observation(phone, msg, match, mtype, text)
-                _route_command(phone, text, match)
-                return jsonify({"ok": True}), 200
+        if SECOM_LOCAL_FALLBACK_ENABLED and st_now.startswith("awaiting_info:"):
+            _emit_boardroom_observation(phone, msg, match, mtype, text)
+            if _handle_awaiting_template_response(phone, text, match):
+                return
+            _stateless_text_fallback(phone, text, match, idle, last10)
+            return
 
-            if SECOM_LOCAL_FALLBACK_ENABLED and st_now.startswith("awaiting_info:"):
+        if BOARDROOM_IS_AUTHORITY:
+            if _intent_short_circuit(phone, text, idle):
                 _emit_boardroom_observation(phone, msg, match, mtype, text)
-                if _handle_awaiting_template_response(phone, text, match):
-                    return jsonify({"ok": True}), 200
                 _stateless_text_fallback(phone, text, match, idle, last10)
-                return jsonify({"ok": True}), 200
-
-            if BOARDROOM_IS_AUTHORITY:
-                if SECOM_LOCAL_FALLBACK_ENABLED:
-                    outcome, body = _consult_boardroom(phone, msg, match, mtype, text)
-                    if outcome == "HANDLED":
-                        _execute_handled_boardroom_instruction(phone, body)
-                    else:
-                        _stateless_text_fallback(phone, text, match, idle, last10)
+                return
+            if SECOM_LOCAL_FALLBACK_ENABLED:
+                outcome, body, plan = _consult_boardroom_hedged(phone, msg, match, mtype, text, last10)
+                if outcome == "HANDLED":
+                    _execute_handled_boardroom_instruction(phone, body)
                 else:
-                    _handle_boardroom_authority(phone, msg, match, mtype, text)
-                return jsonify({"ok": True}), 200
+                    _stateless_text_fallback(phone, text, match, idle, last10, plan)
+            else:
+                _handle_boardroom_authority(phone, msg, match, mtype, text)
+            return
 
-            # HOTFIX 2: si hay estado activo local, NO entra Boardroom ni interceptores globales.
-            active_local_state = user_state.get(phone, "").startswith(ACTIVE_FUNNEL_PREFIXES)
-            log.info("🧭 Router input phone=%s state=%s text=%s", phone, user_state.get(phone, ""), text)
+        # HOTFIX 2: si hay estado activo local, NO entra Boardroom ni interceptores globales.
+        active_local_state = user_state.get(phone, "").startswith(ACTIVE_FUNNEL_PREFIXES)
+        log.info("🧭 Router input phone=%s state=%s text=%s", phone, user_state.get(phone, ""), text)
 
-            if active_local_state:
-                _route_command(phone, text, match)
-                return jsonify({"ok": True}), 200
+        if active_local_state:
+            _route_command(phone, text, match)
+            return
 
-            if _handle_awaiting_template_response(phone, text, match):
-                return jsonify({"ok": True}), 200
+        if _handle_awaiting_template_response(phone, text, match):
+            return
 
-            _emit_bus_event(phone=phone, text=text)
+        _emit_bus_event(phone=phone, text=text)
 
-            if BOARDROOM_ENABLED:
-                boardroom_result = send_to_boardroom(
-                    phone,
-                    text,
-                    match=match,
-                    message_id=msg.get("id"),
-                    state=user_state.get(phone, ""),
-                )
-                if execute_boardroom_decision(phone, boardroom_result, match=match):
-                    return jsonify({"ok": True}), 200
-
-            t_norm_info = text.strip().lower()
-            if t_norm_info in ("info", "informacion", "información", "mas info", "más info"):
-                last_tpl = ""
-                st = user_state.get(phone, "")
-                if st.startswith("awaiting_info:"):
-                    last_tpl = st.split(":", 1)[1].strip()
-                if not last_tpl:
-                    last_tpl = get_last_envio_template(last10)
-                if last_tpl in ("tpv_3", "promo_tpv", TPV_TEMPLATE_NAME):
-                    user_state[phone] = "tpv_giro"
-                    try:
-                        _notify_advisor(
-                            "🧾 Respuesta a plantilla (TPV)\n"
-                            f"Template: {last_tpl}\n"
-                            f"WhatsApp: {phone}\n"
-                            f"Nombre: {_match_name(match) or '(sin nombre)'}\n"
-                            f"Mensaje: {text}"
-                        )
-                    except Exception:
-                        pass
-                    send_message(phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
-                    return jsonify({"ok": True}), 200
-
-            if idle and match:
-                if _auto_is_context(match) and _explicit_non_auto_intent(text):
-                    log.info("🔀 Escape de flujo AUTO por intención explícita: %s", text)
-                else:
-                    if _alianza_is_context(match):
-                        if _handle_alianza_context_response(phone, text, match):
-                            intent_handled = True
-                    if intent_handled:
-                        return jsonify({"ok": True}), 200
-
-                    if _auto_is_context(match):
-                        if _handle_auto_context_response(phone, text, match):
-                            intent_handled = True
-                    if intent_handled:
-                        return jsonify({"ok": True}), 200
-
-                if _tpv_is_context(match):
-                    if tpv_start_from_reply(phone, text, match):
-                        intent_handled = True
-                if intent_handled:
-                    return jsonify({"ok": True}), 200
-
-            if idle:
-                t_norm = text.strip().lower()
-                greet_words = {
-                    "hola", "buenas", "buenos dias", "buenos días", "buen dia", "buen día",
-                    "buenas tardes", "buenas noches", "hey", "que tal", "qué tal", "holi",
-                }
-                if t_norm in greet_words:
-                    base = "Dime qué necesitas y con gusto te guío para ayudarte a encontrar el servicio que necesitas."
-                    nombre = _match_name(match)
-                    send_message(phone, f"Hola {nombre} 👋 {base}" if nombre else f"Hola 👋 {base}")
-                    user_state[phone] = "__greeted__"
-                    return jsonify({"ok": True}), 200
-
-                tpv_keywords = (
-                    "tpv", "terminal", "terminales", "punto de venta", "punto-de-venta",
-                    "cobrar con tarjeta", "cobro con tarjeta", "pagar con tarjeta",
-                    "ligas de pago", "link de pago", "link pago", "cobro a distancia",
-                )
-                if any(k in t_norm for k in tpv_keywords):
-                    user_state[phone] = "tpv_giro"
+        if BOARDROOM_ENABLED:
+            boardroom_result = send_to_boardroom(
+                phone,
+                text,
+                match=match,
+                message_id=msg.get("id"),
+                state=user_state.get(phone, ""),
+            )
+            if execute_boardroom_decision(phone, boardroom_result, match=match):
+                return
+
+        t_norm_info = text.strip().lower()
+        if t_norm_info in ("info", "informacion", "información", "mas info", "más info"):
+            last_tpl = ""
+            st = user_state.get(phone, "")
+            if st.startswith("awaiting_info:"):
+                last_tpl = st.split(":", 1)[1].strip()
+            if not last_tpl:
+                last_tpl = get_last_envio_template(last10)
+            if last_tpl in ("tpv_3", "promo_tpv", TPV_TEMPLATE_NAME):
+                user_state[phone] = "tpv_giro"
+                try:
                     _notify_advisor(
-                        "🧠 Interés detectado (TPV)\n"
+                        "🧾 Respuesta a plantilla (TPV)\n"
+                        f"Template: {last_tpl}\n"
                         f"WhatsApp: {phone}\n"
                         f"Nombre: {_match_name(match) or '(sin nombre)'}\n"
                         f"Mensaje: {text}"
                     )
-                    send_message(phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
-                    return jsonify({"ok": True}), 200
+                except Exception:
+                    pass
+                send_message(phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
+                return
 
-            if idle and interpret_response(text) == "negative":
-                send_message(phone, "Gracias por tu respuesta. Quedo a tus órdenes para cualquier duda o si más adelante deseas revisarlo.")
+        if idle and match:
+            if _auto_is_context(match) and _explicit_non_auto_intent(text):
+                log.info("🔀 Escape de flujo AUTO por intención explícita: %s", text)
+            else:
+                if _alianza_is_context(match):
+                    if _handle_alianza_context_response(phone, text, match):
+                        intent_handled = True
+                if intent_handled:
+                    return
+
+                if _auto_is_context(match):
+                    if _handle_auto_context_response(phone, text, match):
+                        intent_handled = True
+                if intent_handled:
+                    return
+
+            if _tpv_is_context(match):
+                if tpv_start_from_reply(phone, text, match):
+                    intent_handled = True
+            if intent_handled:
+                return
+
+        if idle:
+            t_norm = text.strip().lower()
+            if t_norm in GREETING_PHRASES:
+                base = "Dime qué necesitas y con gusto te guío para ayudarte a encontrar el servicio que necesitas."
+                nombre = _match_name(match)
+                send_message(phone, f"Hola {nombre} 👋 {base}" if nombre else f"Hola 👋 {base}")
                 user_state[phone] = "__greeted__"
-                send_main_menu(phone)
-                return jsonify({"ok": True}), 200
-
-            t_lower = text.lower().strip()
-            valid_commands = {
-                "1", "2", "3", "4", "5", "6", "7",
-                "menu", "menú", "inicio", "hola",
-                "imss", "ley 73", "prestamo", "préstamo", "pension", "pensión",
-                "auto", "seguro auto", "seguros de auto",
-                "vida", "salud", "seguro de vida", "seguro de salud",
-                "vrim", "tarjeta medica", "tarjeta médica",
-                "empresarial", "pyme", "credito", "crédito", "credito empresarial", "crédito empresarial",
-                "financiamiento", "financiamiento practico", "financiamiento práctico",
-                "contactar", "asesor", "contactar con christian",
-            }
-            if not t_lower.isdigit() and t_lower not in valid_commands and idle:
+                return
+
+            if "tpv_interest" in _intent_signals(text):
+                user_state[phone] = "tpv_giro"
                 _notify_advisor(
-                    "📩 Cliente INTERESADO / DUDA detectada\n"
+                    "🧠 Interés detectado (TPV)\n"
                     f"WhatsApp: {phone}\n"
+                    f"Nombre: {_match_name(match) or '(sin nombre)'}\n"
                     f"Mensaje: {text}"
                 )
+                send_message(phone, "✅ Perfecto. Para recomendarte la mejor terminal Inbursa, dime: ¿*a qué giro* pertenece tu negocio?")
+                return
 
-            if phone not in user_state:
-                user_state[phone] = "__greeted__"
-                if not match:
-                    _greet_and_match(phone)
+        if idle and interpret_response(text) == "negative":
+            send_message(phone, "Gracias por tu respuesta. Quedo a tus órdenes para cualquier duda o si más adelante deseas revisarlo.")
+            user_state[phone] = "__greeted__"
+            send_main_menu(phone)
+            return
 
-            if text.lower().startswith("sgpt:") and openai and OPENAI_API_KEY:
-                prompt = text.split("sgpt:", 1)[1].strip()
-                try:
-                    log.info("🧠 Procesando solicitud GPT para %s", phone)
-                    completion = openai.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0.4,
-                    )
-                    answer = completion.choices[0].message.content.strip()
-                    send_message(phone, answer)
-                    return jsonify({"ok": True}), 200
-                except Exception:
-                    log.exception("❌ Error llamando a OpenAI")
-                    send_message(phone, "Hubo un detalle al procesar tu solicitud. Intentemos de nuevo.")
-                    return jsonify({"ok": True}), 200
+        t_lower = text.lower().strip()
+        if not t_lower.isdigit() and t_lower not in LOCAL_MENU_COMMANDS and _resolve_command(t_lower) is None and idle:
+            _notify_advisor(
+                "📩 Cliente INTERESADO / DUDA detectada\n"
+                f"WhatsApp: {phone}\n"
+                f"Mensaje: {text}"
+            )
 
-            _route_command(phone, text, match)
-            return jsonify({"ok": True}), 200
+        if phone not in user_state:
+            user_state[phone] = "__greeted__"
+            if not match:
+                _greet_and_match(phone)
+
+        if text.lower().startswith("sgpt:") and (openai_ready or faq_index is not None):
+            prompt = text.split("sgpt:", 1)[1].strip()
+            # ask_gpt: FAQ local primero; OpenAI solo con los pasajes top como
+            # contexto. Ocupado/error ya vienen como texto para el cliente.
+            log.info("🧠 Procesando solicitud GPT para %s", phone)
+            send_message(phone, ask_gpt(prompt, api_key=OPENAI_API_KEY))
+            return
 
-        if mtype in {"image", "document", "audio", "video"}:
-            log.info("📎 Multimedia recibida de %s: %s", phone, mtype)
+        _route_command(phone, text, match)
+        return
+
+    if mtype in {"image", "document", "audio", "video"}:
+        log.info("📎 Multimedia recibida de %s: %s", phone, mtype)
+
+        if SECOM_LOCAL_FALLBACK_ENABLED and _is_active_funnel_state(st_now):
+            _emit_boardroom_observation(phone, msg, match, mtype, _message_text(msg, mtype))
+            _handle_media(phone, msg)
+            return
+
+        if BOARDROOM_IS_AUTHORITY:
+            if SECOM_LOCAL_FALLBACK_ENABLED:
+                outcome, body = _consult_boardroom(phone, msg, match, mtype, _message_text(msg, mtype))
+                if outcome == "HANDLED":
+                    _execute_handled_boardroom_instruction(phone, body)
+                else:
+                    _handle_media(phone, msg)
+            else:
+                _handle_boardroom_authority(phone, msg, match, mtype, _message_text(msg, mtype))
+            return
+        _handle_media(phone, msg)
+        return
+
+    if mtype == "button":
+        _btn = msg.get("button") or {}
+        button_text = (_btn.get("text") or _btn.get("payload") or "").strip()
+        if button_text:
+            log.info("🔘 Botón Quick Reply de %s: %s", phone, button_text)
+            try:
+                append_respuesta_cliente(phone, _match_name(match), button_text, _utc_now_iso())
+            except Exception:
+                pass
 
             if SECOM_LOCAL_FALLBACK_ENABLED and _is_active_funnel_state(st_now):
-                _emit_boardroom_observation(phone, msg, match, mtype, _message_text(msg, mtype))
-                _handle_media(phone, msg)
-                return jsonify({"ok": True}), 200
+                _emit_boardroom_observation(phone, msg, match, mtype, button_text)
+                _route_command(phone, button_text, match)
+                return
 
             if BOARDROOM_IS_AUTHORITY:
                 if SECOM_LOCAL_FALLBACK_ENABLED:
-                    outcome, body = _consult_boardroom(phone, msg, match, mtype, _message_text(msg, mtype))
+                    outcome, body = _consult_boardroom(phone, msg, match, mtype, button_text)
                     if outcome == "HANDLED":
                         _execute_handled_boardroom_instruction(phone, body)
-                    else:
-                        _handle_media(phone, msg)
+                    elif not _handle_awaiting_template_response(phone, button_text, match):
+                        _route_command(phone, button_text, match)
                 else:
-                    _handle_boardroom_authority(phone, msg, match, mtype, _message_text(msg, mtype))
-                return jsonify({"ok": True}), 200
-            _handle_media(phone, msg)
-            return jsonify({"ok": True}), 200
+                    _handle_boardroom_authority(phone, msg, match, mtype, button_text)
+                return
+            if _handle_awaiting_template_response(phone, button_text, match):
+                return
+            _route_command(phone, button_text, match)
+        return
 
-        if mtype == "button":
-            _btn = msg.get("button") or {}
-            button_text = (_btn.get("text") or _btn.get("payload") or "").strip()
-            if button_text:
-                log.info("🔘 Botón Quick Reply de %s: %s", phone, button_text)
-                try:
-                    append_respuesta_cliente(phone, _match_name(match), button_text, _utc_now_iso())
-                except Exception:
-                    pass
+    if BOARDROOM_IS_AUTHORITY:
+        if SECOM_LOCAL_FALLBACK_ENABLED:
+            outcome, body = _consult_boardroom(phone, msg, match, mtype or "unknown", "")
+            if outcome == "HANDLED":
+                _execute_handled_boardroom_instruction(phone, body)
+            # NOT_HANDLED/FAILED: sin accion local segura definida para
+            # tipos de mensaje desconocidos -- se responde 200 sin enviar
+            # nada, igual que el log "tipo no manejado" de mas abajo.
+        else:
+            _handle_boardroom_authority(phone, msg, match, mtype or "unknown", "")
+        return
 
-                if SECOM_LOCAL_FALLBACK_ENABLED and _is_active_funnel_state(st_now):
-                    _emit_boardroom_observation(phone, msg, match, mtype, button_text)
-                    _route_command(phone, button_text, match)
-                    return jsonify({"ok": True}), 200
-
-                if BOARDROOM_IS_AUTHORITY:
-                    if SECOM_LOCAL_FALLBACK_ENABLED:
-                        outcome, body = _consult_boardroom(phone, msg, match, mtype, button_text)
-                        if outcome == "HANDLED":
-                            _execute_handled_boardroom_instruction(phone, body)
-                        elif not _handle_awaiting_template_response(phone, button_text, match):
-                            _route_command(phone, button_text, match)
-                    else:
-                        _handle_boardroom_authority(phone, msg, match, mtype, button_text)
-                    return jsonify({"ok": True}), 200
-                if _handle_awaiting_template_response(phone, button_text, match):
-                    return jsonify({"ok": True}), 200
-                _route_command(phone, button_text, match)
-            return jsonify({"ok": True}), 200
+    log.info("ℹ️ Tipo de mensaje no manejado: %s", mtype)
+    return
 
-        if BOARDROOM_IS_AUTHORITY:
-            if SECOM_LOCAL_FALLBACK_ENABLED:
-                outcome, body = _consult_boardroom(phone, msg, match, mtype or "unknown", "")
-                if outcome == "HANDLED":
-                    _execute_handled_boardroom_instruction(phone, body)
-                # NOT_HANDLED/FAILED: sin accion local segura definida para
-                # tipos de mensaje desconocidos -- se responde 200 sin enviar
-                # nada, igual que el log "tipo no manejado" de mas abajo.
-            else:
-                _handle_boardroom_authority(phone, msg, match, mtype or "unknown", "")
+
+def _coalesce_text_messages(msgs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Un solo mensaje de texto con los cuerpos de la rafaga en orden. Toma
+    id/metadata del ultimo mensaje."""
+    if len(msgs) == 1:
+        return msgs[0]
+    merged = dict(msgs[-1])
+    bodies = [((m.get("text") or {}).get("body") or "").strip() for m in msgs]
+    merged["text"] = {"body": " ".join(b for b in bodies if b)}
+    merged["coalesced_ids"] = [m.get("id") for m in msgs]
+    return merged
+
+
+def _flush_inbound_burst(phone: str, msgs: List[Dict[str, Any]]) -> None:
+    if len(msgs) > 1:
+        log.info("🧩 %s mensajes de %s agregados en un turno", len(msgs), phone)
+    _process_inbound_message(_coalesce_text_messages(msgs))
+
+
+_inbound_debouncer = InboundDebouncer(
+    # lambda: resuelve al ejecutar (permite patch en tests)
+    on_flush=lambda phone, msgs: _flush_inbound_burst(phone, msgs),
+    window_s=INBOUND_DEBOUNCE_MS / 1000.0,
+    max_wait_s=INBOUND_DEBOUNCE_MAX_WAIT_MS / 1000.0,
+    max_items=INBOUND_DEBOUNCE_MAX_MESSAGES,
+    workers=INBOUND_DEBOUNCE_WORKERS,
+)
+
+
+def _debounce_eligible(msg: Dict[str, Any]) -> bool:
+    if INBOUND_DEBOUNCE_MS <= 0:
+        return False
+    phone = msg.get("from")
+    if not phone or msg.get("type") != "text" or "text" not in msg:
+        return False
+    return not _is_active_funnel_state(user_state.get(phone, ""))
+
+
+def _dispatch_inbound_message(msg: Dict[str, Any]) -> None:
+    """Procesa en linea o deja el mensaje en el buffer de rafagas. Un
+    mensaje no agregable (media, boton, funnel activo) vacia antes la rafaga
+    pendiente del mismo telefono; si esa rafaga se esta procesando, el
+    mensaje se encola detras y lo corre el worker del debouncer (el webhook
+    responde sin esperar)."""
+    if _debounce_eligible(msg):
+        _inbound_debouncer.submit(msg["from"], msg)
+        return
+    phone = msg.get("from")
+    if not phone:
+        _process_inbound_message(msg)
+        return
+
+    def _after_burst(pending: Optional[List[Dict[str, Any]]]) -> None:
+        if pending:
+            _flush_inbound_burst(phone, pending)
+        _process_inbound_message(msg)
+
+    if not _inbound_debouncer.run_exclusive(phone, _after_burst):
+        log.info("⏳ Mensaje %s de %s encolado tras la rafaga en curso", msg.get("type"), phone)
+
+
+def _handle_status_batch(statuses: List[Dict[str, Any]]) -> None:
+    """Lote de status sacado del ring buffer (thread StatusBuffer)."""
+    _delivery.on_statuses(statuses)
+    for st in statuses:
+        if (st.get("status") or "").lower() == "failed":
+            log.warning("❌ STATUS failed (detalle): %s", LazyJson(st, 0))
+    log.info("ℹ️ %s status procesados fuera del request", len(statuses), extra={"sample": "status"})
+
+
+_status_buffer = StatusRingBuffer(_handle_status_batch, capacity=STATUS_BUFFER_SIZE, batch_max=STATUS_BATCH_MAX)
+_STATUS_ACK = b'{"ok":true}\n'
+
+
+# Lookups de cliente ya hechos para el grupo de mensajes en curso (un
+# telefono de un mismo webhook): el matching en Sheets corre una vez por
+# telefono y no una vez por mensaje. None fuera de un grupo.
+_group_matches: ContextVar[Optional[Dict[str, Optional[Dict[str, Any]]]]] = ContextVar("group_matches", default=None)
+_inbound_batch_pool = ThreadPoolExecutor(max_workers=max(1, INBOUND_BATCH_WORKERS), thread_name_prefix="InboundBatch")
+
+
+def _lookup_client(last10: str) -> Optional[Dict[str, Any]]:
+    memo = _group_matches.get()
+    if memo is None:
+        return match_client_in_sheets(last10)
+    if last10 not in memo:
+        memo[last10] = match_client_in_sheets(last10)
+    return memo[last10]
+
+
+def _group_messages_by_phone(messages: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Telefono -> mensajes en orden de timestamp (estable: empates quedan
+    en el orden del payload). Telefonos en orden de primera aparicion; ids
+    repetidos dentro del payload se descartan."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    seen_ids = set()
+    for msg in messages:
+        msg_id = msg.get("id")
+        if msg_id and msg_id in seen_ids:
+            continue
+        if msg_id:
+            seen_ids.add(msg_id)
+        groups.setdefault(msg.get("from") or "", []).append(msg)
+
+    def _ts(msg: Dict[str, Any]) -> int:
+        try:
+            return int(msg.get("timestamp") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    for msgs in groups.values():
+        msgs.sort(key=_ts)
+    return groups
+
+
+def _dispatch_phone_group(msgs: List[Dict[str, Any]]) -> None:
+    token = _group_matches.set({})
+    try:
+        for msg in msgs:
+            try:
+                _dispatch_inbound_message(msg)
+            except Exception:
+                log.exception("❌ Error procesando mensaje %s de %s", msg.get("id"), msg.get("from"))
+    finally:
+        _group_matches.reset(token)
+
+
+def _dispatch_inbound_batch(messages: List[Dict[str, Any]]) -> None:
+    """Todos los mensajes del webhook. Un solo telefono corre en el request;
+    varios se reparten en el pool y el webhook espera a que terminen."""
+    groups = _group_messages_by_phone(messages)
+    if len(messages) > 1:
+        log.info("📦 Webhook con %s mensajes de %s telefonos", len(messages), len(groups))
+    if len(groups) == 1:
+        _dispatch_phone_group(next(iter(groups.values())))
+        return
+    futures = [_inbound_batch_pool.submit(_dispatch_phone_group, msgs) for msgs in groups.values()]
+    for future in futures:
+        future.result()
+
+
+@app.post("/webhook")
+def webhook_receive():
+    try:
+        if STATUS_FAST_PATH_ENABLED:
+            body = request.get_data()
+            if is_status_only(body):
+                _status_buffer.submit(body)
+                return app.response_class(_STATUS_ACK, status=200, mimetype="application/json")
+
+        payload = request.get_json(force=True, silent=True) or {}
+
+        messages = extract_messages(payload)
+        statuses = extract_statuses(payload)
+        log.info(
+            "📥 Webhook recibido: %s",
+            LazyJson(payload, LOG_PAYLOAD_MAX_CHARS),
+            extra={"sample": "status"} if not messages else None,
+        )
+
+        if statuses:
+            _handle_status_batch(statuses)
+        if not messages:
+            log.info("ℹ️ Webhook sin mensajes (posible status update)", extra={"sample": "status"})
             return jsonify({"ok": True}), 200
 
-        log.info("ℹ️ Tipo de mensaje no manejado: %s", mtype)
+        _dispatch_inbound_batch(messages)
         return jsonify({"ok": True}), 200
 
     except Exception:
@@ -2744,6 +3504,59 @@ def webhook_receive():
         return jsonify({"ok": True}), 200
 
 
+# ==========================
+# Warm-up (/ext/ready)
+# ==========================
+# Pasos que dejan abiertas las conexiones con pool (clientes Google, sesiones
+# del bus) y cargados los caches que usa el primer turno. Graph y la consulta
+# a Boardroom usan requests.post por llamada (sin pool): no hay nada que
+# precalentar ahi.
+def _warm_google_clients() -> Any:
+    if not google_ready:
+        return "omitido"
+    _google.sheets()
+    if DRIVE_PARENT_FOLDER_ID:
+        _google.drive()
+    return _google.stats()["built"]
+
+
+def _warm_leads() -> Any:
+    if not (google_ready and SHEETS_ID_LEADS and SHEETS_TITLE_LEADS):
+        return "omitido"
+    headers, rows = _leads_snapshot.prime()
+    return {"headers": len(headers), "rows": len(rows)}
+
+
+def _warm_envio_status() -> Any:
+    if not (google_ready and SHEETS_ID_LEADS):
+        return "omitido"
+    return {"rows": len(_envio_status_snapshot.prime())}
+
+
+def _warm_drive_folders() -> Any:
+    if not (google_ready and DRIVE_PARENT_FOLDER_ID):
+        return "omitido"
+    return {"folders": _prime_drive_folders()}
+
+
+def _warm_bus() -> Any:
+    if not (_BUS_ACTIVE and BUS_URL):
+        return "omitido"
+    detail = {"emitter": _bus_emitter.preconnect(BUS_URL)}
+    box = _outbox()
+    if box is not None:
+        detail["outbox"] = box.preconnect(BUS_URL)
+    return detail
+
+
+_warmup = Warmup(deadline_s=WARMUP_DEADLINE_S)
+_warmup.add("google_clients", _warm_google_clients)
+_warmup.add("leads", _warm_leads)
+_warmup.add("envio_status", _warm_envio_status)
+_warmup.add("drive_folders", _warm_drive_folders)
+_warmup.add("bus", _warm_bus)
+
+
 # ==========================
 # Endpoints auxiliares
 # ==========================
@@ -2763,11 +3576,117 @@ def ext_health():
         "status": "ok",
         "whatsapp_configured": bool(META_TOKEN and WABA_PHONE_ID),
         "google_ready": google_ready,
-        "openai_ready": bool(openai and OPENAI_API_KEY),
+        "openai_ready": openai_ready,
+        "google": _google.stats(),
+        "gpt": gpt_stats(),
+        "faq_index": {"passages": len(faq_index)} if faq_index is not None else None,
         "boardroom_enabled": BOARDROOM_ENABLED,
+        "scheduler": _job_scheduler.stats() if _job_scheduler else {"running": False},
+        "bus_emitter": _bus_emitter.stats(),
+        "bus_outbox": _bus_outbox.stats() if _bus_outbox else {"running": False},
+        "circuit_breakers": _breakers.snapshot(),
+        "boardroom_latency": _latency.snapshot(),
+        "inbound_debounce": _inbound_debouncer.stats(),
+        "status_buffer": _status_buffer.stats(),
+        "delivery": _delivery.stats(),
+        "sheet_cache": {"leads": _leads_snapshot.stats(), "envio_status": _envio_status_snapshot.stats()},
+        "logging": {
+            "queue": _log_pipeline.stats() if _log_pipeline else None,
+            "sampling": _log_sampler.stats(),
+        },
     }), 200
 
 
+@app.get("/ext/ready")
+def ext_ready():
+    """Readiness para el balanceador: 503 mientras corre el warm-up. /health
+    sigue siendo solo liveness."""
+    if not WARMUP_ENABLED:
+        return jsonify({"ready": True, "warmup": {"state": "disabled"}}), 200
+    status = _warmup.status()
+    return jsonify({"ready": status["ready"], "warmup": status}), 200 if status["ready"] else 503
+
+
+@app.get("/ext/metrics")
+def ext_metrics():
+    """Histogramas por etapa en formato de texto Prometheus; ?format=json
+    devuelve los mismos datos con p50/p95/p99 estimados."""
+    if request.args.get("format") == "json":
+        return jsonify({"stages": _metrics.snapshot()}), 200
+    return _metrics.render_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@app.post("/ext/profile/start")
+def ext_profile_start():
+    """Prende el sampler de pilas. Body: seconds (default 30), interval_ms
+    (default 5), include_idle (default false)."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    body = request.get_json(force=True, silent=True) or {}
+    try:
+        seconds = float(body.get("seconds") or 30)
+        interval_ms = float(body.get("interval_ms") or 5)
+        if seconds <= 0 or interval_ms <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "seconds/interval_ms inválidos"}), 400
+    if not _stack_sampler.start(seconds, interval_ms / 1000.0, include_idle=bool(body.get("include_idle"))):
+        return jsonify({"ok": False, "error": "sampler ya activo", "status": _stack_sampler.status()}), 409
+    return jsonify({"ok": True, "status": _stack_sampler.status()}), 202
+
+
+@app.post("/ext/profile/stop")
+def ext_profile_stop():
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    stopped = _stack_sampler.stop()
+    return jsonify({"ok": True, "stopped": stopped, "status": _stack_sampler.status()}), 200
+
+
+@app.get("/ext/profile/status")
+def ext_profile_status():
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "sampler": _stack_sampler.status(), "request": _request_profiler.status()}), 200
+
+
+@app.get("/ext/profile/stacks")
+def ext_profile_stacks():
+    """Pilas de la ultima captura en formato collapsed (flamegraph.pl,
+    speedscope). Si la captura sigue corriendo devuelve lo acumulado."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return _stack_sampler.collapsed(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+@app.post("/ext/profile/request")
+def ext_profile_request_arm():
+    """Arma cProfile para los siguientes `count` requests (default 1) cuyo
+    path empiece con `path` (default /webhook)."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    body = request.get_json(force=True, silent=True) or {}
+    try:
+        count = int(body.get("count") or 1)
+        if count <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "count inválido"}), 400
+    path = str(body.get("path") or "/webhook").strip()
+    return jsonify({"ok": True, "status": _request_profiler.arm(count, path)}), 202
+
+
+@app.get("/ext/profile/request")
+def ext_profile_request_report():
+    """Reporte pstats (cumulative) del ultimo request perfilado."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    report = _request_profiler.last_report()
+    if report is None:
+        return jsonify({"ok": False, "error": "sin request perfilado", "status": _request_profiler.status()}), 404
+    return report, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
 @app.post("/ext/test-send")
 def ext_test_send():
     try:
@@ -2807,7 +3726,7 @@ def _bulk_send_worker(items: List[Dict[str, Any]]) -> None:
                 failed += 1
                 continue
 
-            log.info("📤 [%s/%s] Procesando: %s", i, len(items), to)
+            log.info("📤 [%s/%s] Procesando: %s", i, len(items), to, extra={"sample": "bulk_progress"})
 
             if not template and text:
                 log.warning("⚠️ Outbound proactivo sin template rechazado para %s", to)
@@ -2822,7 +3741,7 @@ def _bulk_send_worker(items: List[Dict[str, Any]]) -> None:
                     image_url=image_url,
                     components=components,
                 )
-                log.info("   ↳ Plantilla '%s' a %s: %s", template, to, "✅" if success else "❌")
+                log.info("   ↳ Plantilla '%s' a %s: %s", template, to, "✅" if success else "❌", extra={"sample": "bulk_progress"})
             else:
                 log.warning("   ↳ Item %s sin contenido válido", i)
                 failed += 1
@@ -2928,7 +3847,7 @@ def _status_for_template(template_name: str) -> str:
         return "ENVIADO_VRIM"
     return "ENVIADO_TEMPLATE"
 
-def _pick_next_pending(headers: List[str], rows: List[List[str]]) -> Optional[Dict[str, Any]]:
+def _iter_pending(headers: List[str], rows: List[List[str]], after_row: int = 1):
     i_name = _idx(headers, "Nombre")
     i_wa = _idx(headers, "WhatsApp")
     i_status = _idx(headers, "ESTATUS")
@@ -2937,7 +3856,7 @@ def _pick_next_pending(headers: List[str], rows: List[List[str]]) -> Optional[Di
     if i_name is None or i_wa is None:
         raise RuntimeError("Faltan columnas requeridas: 'Nombre' y/o 'WhatsApp'.")
 
-    for row_number, row in enumerate(rows, start=2):
+    for row_number, row in enumerate(rows[max(0, after_row - 1):], start=max(2, after_row + 1)):
         wa = _cell(row, i_wa).strip()
         if not wa:
             continue
@@ -2951,9 +3870,64 @@ def _pick_next_pending(headers: List[str], rows: List[List[str]]) -> Optional[Di
             continue
 
         nombre = _cell(row, i_name).strip()
-        return {"row_number": row_number, "nombre": nombre, "whatsapp": wa}
+        yield {"row_number": row_number, "nombre": nombre, "whatsapp": wa}
 
-    return None
+
+def _pick_next_pending(headers: List[str], rows: List[List[str]], after_row: int = 1) -> Optional[Dict[str, Any]]:
+    return next(_iter_pending(headers, rows, after_row=after_row), None)
+
+
+def _count_pending(headers: List[str], rows: List[List[str]]) -> int:
+    return sum(1 for _ in _iter_pending(headers, rows))
+
+
+def _send_campaign_template(
+    headers: List[str],
+    nxt: Dict[str, Any],
+    template_name: str,
+    params: Any = None,
+    image_url: Optional[str] = None,
+    components: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Envía la plantilla de campaña a un lead pendiente y marca su fila.
+    Compartido por /ext/auto-send-one y el pacer in-process."""
+    to = _normalize_to_e164_mx(nxt["whatsapp"])
+    nombre = (nxt["nombre"] or "").strip() or "Cliente"
+
+    ok = send_template_message(
+        to,
+        template_name,
+        params=params,
+        image_url=image_url,
+        components=components,
+        lead_row=nxt["row_number"],
+    )
+
+    if ok:
+        user_state[to] = f"awaiting_info:{template_name}"
+        data = _ensure_user(to)
+        data["awaiting_info_started_at"] = _utc_now_iso()
+    else:
+        _delivery.record_send("", to, template_name, lead_row=nxt["row_number"], status="failed")
+
+    auto_paused = _register_send_result(ok)
+
+    now_iso = _utc_now_iso()
+    estatus_val = "FALLO_ENVIO" if not ok else _status_for_template(template_name)
+    _update_row_cells(nxt["row_number"], {"ESTATUS": estatus_val, "LAST_MESSAGE_AT": now_iso}, headers)
+
+    response = {
+        "ok": True,
+        "sent": bool(ok),
+        "to": to,
+        "row": nxt["row_number"],
+        "nombre": nombre,
+        "template": template_name,
+        "timestamp": now_iso,
+    }
+    if auto_paused:
+        response["auto_paused"] = True
+    return response
 
 
 @app.post("/ext/auto-send-one")
@@ -2983,8 +3957,6 @@ def ext_auto_send_one():
         if not nxt:
             return jsonify({"ok": True, "sent": False, "reason": "no_pending"}), 200
 
-        to = _normalize_to_e164_mx(nxt["whatsapp"])
-        nombre = (nxt["nombre"] or "").strip() or "Cliente"
         params = body.get("params") if "params" in body else None
         image_url = str(body.get("image_url") or body.get("header_image_url") or "").strip() or None
         components = body.get("components") if isinstance(body.get("components"), list) else None
@@ -2992,41 +3964,14 @@ def ext_auto_send_one():
         if body.get("components") is not None and components is None:
             return jsonify({"ok": False, "error": "components debe ser una lista"}), 400
 
-        ok = send_template_message(
-            to,
+        response = _send_campaign_template(
+            headers,
+            nxt,
             template_name,
             params=params,
             image_url=image_url,
             components=components,
         )
-
-        if ok:
-            user_state[to] = f"awaiting_info:{template_name}"
-            data = _ensure_user(to)
-            data["awaiting_info_started_at"] = _utc_now_iso()
-        else:
-            try:
-                append_envio_status(to, "", "failed", template_name, _utc_now_iso())
-            except Exception:
-                pass
-
-        auto_paused = _register_send_result(ok)
-
-        now_iso = _utc_now_iso()
-        estatus_val = "FALLO_ENVIO" if not ok else _status_for_template(template_name)
-        _update_row_cells(nxt["row_number"], {"ESTATUS": estatus_val, "LAST_MESSAGE_AT": now_iso}, headers)
-
-        response = {
-            "ok": True,
-            "sent": bool(ok),
-            "to": to,
-            "row": nxt["row_number"],
-            "nombre": nombre,
-            "template": template_name,
-            "timestamp": now_iso,
-        }
-        if auto_paused:
-            response["auto_paused"] = True
         return jsonify(response), 200
 
     except Exception as exc:
@@ -3034,6 +3979,172 @@ def ext_auto_send_one():
         return jsonify({"ok": False, "error": str(exc)}), 500
 
 
+# ==========================
+# Pacer de campaña (in-process)
+# ==========================
+_campaign_pacer = CampaignPacer(
+    is_paused=lambda: _is_campaign_paused(),
+    pause_check_s=CAMPAIGN_PACER_PAUSE_CHECK_S,
+)
+
+
+def _make_pacer_send_next(
+    template_name: str,
+    params: Any = None,
+    image_url: Optional[str] = None,
+    components: Optional[List[Dict[str, Any]]] = None,
+    snapshot: Optional[Tuple[List[str], List[List[str]]]] = None,
+):
+    """send_next() del pacer: trabaja sobre una copia local de la hoja y la
+    recorre en orden, releyendo Sheets completa solo cada
+    CAMPAIGN_PACER_REFRESH_S o al agotarse (para confirmar que de verdad no
+    quedan pendientes). Antes de cada envío relee SOLO la fila elegida: si
+    ya no tiene el mismo WhatsApp o ya no está pendiente (filas insertadas,
+    borradas o reordenadas desde la copia), se relee la hoja y se elige de
+    nuevo; así ESTATUS nunca se escribe en la fila de otro lead. Nunca
+    reenvía a un número ya intentado en esta corrida, aunque la hoja
+    releída aún no lo refleje."""
+    state: Dict[str, Any] = {"headers": [], "rows": [], "loaded_at": None, "after_row": 1}
+    attempted: set[str] = set()
+    if snapshot:
+        state.update(headers=snapshot[0], rows=snapshot[1], loaded_at=time.monotonic())
+
+    def _reload() -> None:
+        headers, rows = _sheet_get_rows()
+        state.update(headers=headers, rows=rows, loaded_at=time.monotonic(), after_row=1)
+
+    def _next_unattempted() -> Optional[Dict[str, Any]]:
+        if not state["headers"]:
+            return None
+        for item in _iter_pending(state["headers"], state["rows"], after_row=state["after_row"]):
+            if _normalize_to_e164_mx(item["whatsapp"]) not in attempted:
+                return item
+        return None
+
+    def _still_pending(item: Dict[str, Any]) -> bool:
+        current = next(_iter_pending(state["headers"], [_read_lead_row(item["row_number"])]), None)
+        return current is not None and (
+            _normalize_phone_last10(current["whatsapp"]) == _normalize_phone_last10(item["whatsapp"])
+        )
+
+    def _send_next() -> Dict[str, Any]:
+        fresh = state["loaded_at"] is None or time.monotonic() - state["loaded_at"] >= CAMPAIGN_PACER_REFRESH_S
+        if fresh:
+            _reload()
+        nxt = _next_unattempted()
+        if not nxt and state["after_row"] > 1:
+            _reload()
+            fresh = True
+            nxt = _next_unattempted()
+        if nxt and not fresh and not _still_pending(nxt):
+            log.info("📣 Pacer: fila %s cambió desde la copia local; se relee la hoja", nxt["row_number"])
+            _reload()
+            nxt = _next_unattempted()
+        if not nxt:
+            return {"ok": True, "sent": False, "reason": "no_pending"}
+        state["after_row"] = nxt["row_number"]
+        attempted.add(_normalize_to_e164_mx(nxt["whatsapp"]))
+        return _send_campaign_template(
+            state["headers"], nxt, template_name,
+            params=params, image_url=image_url, components=components,
+        )
+
+    return _send_next
+
+
+def _auto_token_ok() -> bool:
+    token = (request.headers.get("X-AUTO-TOKEN") or "").strip()
+    return bool(AUTO_SEND_TOKEN and token == AUTO_SEND_TOKEN)
+
+
+@app.post("/ext/campaign/pacer/start")
+def ext_campaign_pacer_start():
+    """Arranca el drenado continuo de la campaña. Body: template (obligatorio),
+    params/image_url/components (igual que auto-send-one), y el ritmo:
+    rate_per_minute, o duration_minutes para repartir los pendientes
+    actuales en esa ventana. max_sends opcional.
+
+    El pacer vive en el proceso que atendió este request: con varios
+    workers de gunicorn, stop/status solo ven el pacer si caen en el mismo
+    worker, y otro worker podría arrancar un segundo pacer. Usar con un solo
+    worker (o llamar siempre al mismo), o /ext/auto-send-one desde un cron."""
+    try:
+        if not _auto_token_ok():
+            return jsonify({"ok": False, "error": "unauthorized"}), 401
+
+        body = request.get_json(force=True, silent=True) or {}
+        template_name = str(body.get("template", "")).strip()
+        if not template_name:
+            return jsonify({
+                "ok": False,
+                "reason": "template_required_for_business_initiated_message",
+            }), 400
+
+        components = body.get("components") if isinstance(body.get("components"), list) else None
+        if body.get("components") is not None and components is None:
+            return jsonify({"ok": False, "error": "components debe ser una lista"}), 400
+
+        if _campaign_pacer.is_running():
+            return jsonify({"ok": False, "error": "pacer ya activo", "status": _campaign_pacer.status()}), 409
+
+        if _is_campaign_paused():
+            return jsonify({"ok": False, "started": False, "reason": "paused_by_boardroom"}), 409
+
+        headers, rows = _sheet_get_rows()
+        if not headers:
+            return jsonify({"ok": False, "error": "Sheet vacío"}), 400
+        pending = _count_pending(headers, rows)
+        if not pending:
+            return jsonify({"ok": True, "started": False, "reason": "no_pending"}), 200
+
+        try:
+            if body.get("duration_minutes") is not None:
+                duration_min = float(body["duration_minutes"])
+                if duration_min <= 0:
+                    raise ValueError
+                rate = pending / duration_min
+            else:
+                rate = float(body.get("rate_per_minute") or CAMPAIGN_PACER_DEFAULT_RATE_PER_MIN)
+                if rate <= 0:
+                    raise ValueError
+            max_sends = int(body["max_sends"]) if body.get("max_sends") is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error": "rate_per_minute/duration_minutes/max_sends inválidos"}), 400
+
+        rate = min(rate, CAMPAIGN_PACER_MAX_RATE_PER_MIN)
+        send_next = _make_pacer_send_next(
+            template_name,
+            params=body.get("params") if "params" in body else None,
+            image_url=str(body.get("image_url") or body.get("header_image_url") or "").strip() or None,
+            components=components,
+            snapshot=(headers, rows),
+        )
+        _campaign_pacer.start(send_next, interval_s=60.0 / rate, max_sends=max_sends, label=template_name)
+        log.info("📣 Pacer de campaña '%s': %s pendientes a %.2f/min", template_name, pending, rate)
+        return jsonify({"ok": True, "started": True, "pending": pending, "status": _campaign_pacer.status()}), 202
+
+    except Exception as exc:
+        log.exception("❌ Error en /ext/campaign/pacer/start")
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+@app.post("/ext/campaign/pacer/stop")
+def ext_campaign_pacer_stop():
+    """Detiene el pacer de ESTE proceso (ver nota multi-worker en start)."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    stopped = _campaign_pacer.stop()
+    return jsonify({"ok": True, "stopped": stopped, "status": _campaign_pacer.status()}), 200
+
+
+@app.get("/ext/campaign/pacer/status")
+def ext_campaign_pacer_status():
+    """Estado del pacer de ESTE proceso (ver nota multi-worker en start)."""
+    if not _auto_token_ok():
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "status": _campaign_pacer.status()}), 200
+
+
 @app.route("/ext/boardroom/instruct", methods=["POST"])
 def boardroom_instruct():
     """CF-4: recibe instrucciones de Boardroom. Alcance minimo: kill switch
@@ -3053,6 +4164,7 @@ def boardroom_instruct():
         except Exception as exc:
             log.exception("❌ Error aplicando pause_outbound")
             return jsonify({"ok": False, "error": str(exc)}), 500
+        _campaign_pacer.stop(reason="paused_by_boardroom")
         log.warning("⏸️ Campana outbound pausada por Boardroom")
         return jsonify({"ok": True, "instruction": instruction, "paused": True}), 200
 
@@ -3068,9 +4180,27 @@ def boardroom_instruct():
     return jsonify({"ok": False, "error": f"instruction desconocida: {instruction}"}), 400
 
 
+# Retoma jobs diferidos y eventos del outbox pendientes tras un
+# reinicio/deploy. Solo si el store ya existe: un proceso que nunca agendo
+# nada no abre SQLite al importar.
+if os.path.exists(VICKY_DB_PATH):
+    _scheduler()
+    _outbox()
+
+# Indice FAQ local (mmap, sin copiar a RAM); ver core_retrieval.
+if FAQ_AUTO_BUILD:
+    ensure_faq_index(FAQ_SRC_DIR, FAQ_INDEX_DIR)
+faq_index = load_faq_index(FAQ_INDEX_DIR)
+
+# Ultimo paso al importar: con la app ya creada, el warm-up corre en segundo
+# plano y /ext/ready lo reporta.
+if WARMUP_ENABLED:
+    _warmup.start()
+
+
 if __name__ == "__main__":
     log.info("🚀 Iniciando Vicky Bot SECOM en puerto %s", PORT)
     log.info("📞 WhatsApp configurado: %s", bool(META_TOKEN and WABA_PHONE_ID))
     log.info("📊 Google Sheets/Drive: %s", google_ready)
-    log.info("🧠 OpenAI: %s", bool(openai and OPENAI_API_KEY))
+    log.info("🧠 OpenAI: %s", openai_ready)
     app.run(host="0.0.0.0", port=PORT, debug=False)
@@ -0,0 +1,68 @@
+# bench_amounts.py — micro-benchmark de extract_number (parser previo vs utils_amounts)
+# ------------------------------------------------------------
+# Uso:  python benchmarks/bench_amounts.py [--loops 20000]
+# Corre ambos parsers sobre respuestas tipicas de los embudos (edad, pension,
+# monto) y reporta microsegundos por llamada. `legacy_extract_number` es la
+# version anterior tal cual, solo para comparar.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import timeit
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils_amounts import parse_amount  # noqa: E402
+
+SAMPLES = (
+    "45", "8500", "$8,500", "100000", "tengo 45 años", "120,000 pesos",
+    "500 mil", "1.5 millones", "ocho mil quinientos", "como 8 mil", "un millón",
+)
+
+
+def legacy_extract_number(text: str) -> Optional[float]:
+    if not text:
+        return None
+    clean = (
+        text.lower()
+        .replace(",", "")
+        .replace("$", "")
+        .replace("millón", "000000")
+        .replace("millon", "000000")
+        .replace("millones", "000000")
+    )
+    match = re.search(r"(\d{1,12}(?:\.\d+)?)", clean)
+    try:
+        return float(match.group(1)) if match else None
+    except Exception:
+        return None
+
+
+def _per_call_us(fn, loops: int) -> float:
+    def run() -> None:
+        for sample in SAMPLES:
+            fn(sample)
+    best = min(timeit.repeat(run, number=loops, repeat=5))
+    return best / (loops * len(SAMPLES)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loops", type=int, default=20000)
+    args = parser.parse_args()
+
+    legacy = _per_call_us(legacy_extract_number, args.loops)
+    current = _per_call_us(parse_amount, args.loops)
+    print(f"legacy extract_number : {legacy:6.2f} us/llamada")
+    print(f"utils_amounts         : {current:6.2f} us/llamada  ({current / legacy:.2f}x)")
+    for sample in SAMPLES:
+        print(f"  {sample!r:24} legacy={legacy_extract_number(sample)!s:12} nuevo={parse_amount(sample)}")
+
+
+if __name__ == "__main__":
+    main()
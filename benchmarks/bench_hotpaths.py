@@ -0,0 +1,298 @@
+# bench_hotpaths.py — micro-benchmarks de funciones puras del turno, con baseline
+# ------------------------------------------------------------
+# Uso:  python benchmarks/bench_hotpaths.py run      [-k route]
+#       python benchmarks/bench_hotpaths.py save     [-k ...]   (reescribe el baseline)
+#       python benchmarks/bench_hotpaths.py compare  [--threshold 0.25] [--no-confirm]
+# Cada caso corre un corpus sintetico fijo (mismo seed siempre) y reporta
+# microsegundos por operacion (mediana de varias repeticiones). Los casos
+# con lru_cache (senales, comandos, clasificador) vacian el cache en cada
+# pasada: se mide el costo de un texto nuevo, no un hit.
+# Cada repeticion del caso va pegada a una de la calibracion (un loop de
+# Python puro) y `compare` escala el baseline por calibracion_actual /
+# calibracion_guardada del mismo caso: un runner mas lento, o mas cargado en
+# ese momento, no se reporta como regresion. La dispersion entre
+# repeticiones (`spread`) es el piso de ruido de cada caso: los casos de ~1 us
+# varian mas que el threshold entre corridas. Un caso que supera
+# baseline * (1 + max(threshold, NOISE_FACTOR * spread)) se vuelve a medir en
+# una segunda pasada; sale con codigo 1 solo si la regresion se repite (una
+# rafaga de carga del runner no basta para fallar).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as vicky  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hotpaths.json")
+SHEET_ROWS = 50_000
+# Tolerancia minima de cada caso = NOISE_FACTOR * su dispersion medida.
+NOISE_FACTOR = 3.0
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], None]  # una pasada sobre el corpus completo
+    ops: int                 # operaciones por pasada
+
+
+# ==========================
+# Corpus sinteticos
+# ==========================
+TEXTS = (
+    "hola", "menu", "menú", "1", "2", "5", "si", "sí claro", "no gracias", "me interesa",
+    "quiero el seguro de auto", "cuanto cuesta el seguro de vida", "prestamo imss ley 73",
+    "necesito un credito para mi negocio", "quiero hablar con un asesor", "vrim", "ok",
+    "buenas tardes, me llego su mensaje pero no entiendo que es", "tengo 45 años", "$8,500",
+)
+AMOUNTS = (
+    "45", "8500", "$8,500", "100000", "tengo 45 años", "120,000 pesos", "500 mil",
+    "1.5 millones", "ocho mil quinientos", "como 8 mil", "un millón", "no se",
+)
+PHONES = (
+    "5216681234567", "526681234567", "6681234567", "+52 1 668 123 4567", "(668) 123-4567",
+    "52-668-123-45-67", "1234567", "", "521 668 123 4567", "+526681234567",
+)
+ROUTE_TURNS = (
+    ("", "menu"), ("", "1"), ("", "2"), ("", "vida"), ("", "auto"), ("", "contacto"),
+    ("", "quiero un credito"), ("", "algo que no entiendo"), ("__greeted__", "menuu"),
+    ("vida_edad", "45"), ("vida_edad", "no se"), ("imss_beneficios", "si"),
+    ("emp_confirma", "sí"), ("auto_intro", "listo"), ("vida_objetivo", "1"), ("__greeted__", "salir"),
+)
+BOARDROOM_BODIES = (
+    None,
+    {"status": "ok", "instruction": {"type": "send_message", "message": "Hola"}},
+    {"status": "ok", "instruction": {"type": "send_options", "message": "", "options": [{"label": "A"}, {"label": "B"}]}},
+    {"status": "ok", "instruction": {"type": "send_message", "message": ""}},
+    {"status": "ok", "instruction": {"type": "no_action"}},
+    {"status": "fallback", "instruction": {"type": "send_message", "message": "x"}},
+    {"status": "error"},
+    "not-a-dict",
+)
+
+
+def _event_inputs() -> List[tuple]:
+    inputs = []
+    for i, text in enumerate(TEXTS):
+        msg = {"id": f"wamid.bench{i}", "type": "text", "text": {"body": text}}
+        inputs.append((f"521668000{i:04d}", text, msg, "text", {"row": i + 2, "nombre": f"Cliente {i}"} if i % 2 else None))
+    inputs.append(("5216680009999", "", {"id": "wamid.img", "type": "image", "image": {"id": "m1"}}, "image", None))
+    return inputs
+
+
+def _sheet(rows: int, seed: int = 43) -> tuple:
+    rng = random.Random(seed)
+    headers = ["Nombre", "WhatsApp", "ESTATUS", "LAST_MESSAGE_AT", "PRODUCTO"]
+    table = [
+        [f"Cliente {i}", f"+52 1 {rng.randrange(10**10):010d}", "nuevo", "", ""]
+        for i in range(rows)
+    ]
+    return headers, table
+
+
+# ==========================
+# Casos
+# ==========================
+def _clear_caches() -> None:
+    vicky._intent_signals.cache_clear()
+    vicky._resolve_command.cache_clear()
+    vicky._classify_intent.cache_clear()
+
+
+def _over(fn: Callable[..., Any], corpus: Sequence[Any], cold: bool = False, star: bool = False) -> Callable[[], None]:
+    def run() -> None:
+        if cold:
+            _clear_caches()
+        for item in corpus:
+            fn(*item) if star else fn(item)
+    return run
+
+
+def _route_pass() -> None:
+    _clear_caches()
+    phone = "5216680000001"
+    for state, text in ROUTE_TURNS:
+        vicky.user_state[phone] = state
+        vicky.user_data.pop(phone, None)
+        vicky._route_command(phone, text, None)
+
+
+def build_cases(headers: List[str], rows: List[List[str]]) -> List[Case]:
+    targets = [
+        vicky._normalize_phone_last10(rows[0][1]),
+        vicky._normalize_phone_last10(rows[len(rows) // 2][1]),
+        vicky._normalize_phone_last10(rows[-1][1]),
+        "0000000000",
+    ]
+    events = _event_inputs()
+    return [
+        Case("route_command", _route_pass, len(ROUTE_TURNS)),
+        Case("interpret_response", _over(vicky.interpret_response, TEXTS, cold=True), len(TEXTS)),
+        Case("extract_number", _over(vicky.extract_number, AMOUNTS), len(AMOUNTS)),
+        Case("normalize_phone_last10", _over(vicky._normalize_phone_last10, PHONES), len(PHONES)),
+        Case("normalize_to_e164_mx", _over(vicky._normalize_to_e164_mx, PHONES), len(PHONES)),
+        Case("classify_boardroom_outcome", _over(vicky._classify_boardroom_outcome, BOARDROOM_BODIES), len(BOARDROOM_BODIES)),
+        Case("build_boardroom_event", _over(vicky._build_boardroom_event, events, cold=True, star=True), len(events)),
+        Case(f"match_client_in_sheets_{len(rows) // 1000}k", _over(vicky.match_client_in_sheets, targets), len(targets)),
+    ]
+
+
+@contextlib.contextmanager
+def bench_environment(headers: List[str], rows: List[List[str]]) -> Iterator[None]:
+    """Sin red ni logs: send_message no sale y Sheets lee la tabla sintetica."""
+    level = vicky.log.level
+    vicky.log.setLevel(logging.WARNING)
+    with patch.object(vicky, "send_message", lambda *a, **k: True), \
+         patch.object(vicky, "google_ready", True), \
+         patch.object(vicky, "sheets_svc", object()), \
+         patch.object(vicky, "SHEETS_ID_LEADS", "bench"), \
+         patch.object(vicky, "_sheet_get_rows", lambda: (headers, rows)):
+        try:
+            yield
+        finally:
+            vicky.log.setLevel(level)
+            vicky.user_state.clear()
+            vicky.user_data.clear()
+
+
+def _calibration() -> None:
+    acc: Dict[int, int] = {}
+    for i in range(2000):
+        acc[i % 97] = acc.get(i % 97, 0) + i
+
+
+def _per_op_us(timer: timeit.Timer, number: int, ops: int) -> float:
+    return timer.timeit(number) / (number * ops) * 1e6
+
+
+def measure(fn: Callable[[], None], ops: int, repeat: int) -> Dict[str, float]:
+    """Mediana de `repeat` tandas del caso, cada una junto a una tanda de
+    calibracion; spread = desviacion robusta (MAD escalada) de
+    caso/calibracion relativa a su mediana: un pico aislado no la infla."""
+    timer, calibration = timeit.Timer(fn), timeit.Timer(_calibration)
+    number, _ = timer.autorange()
+    cal_number, _ = calibration.autorange()
+    case_us: List[float] = []
+    cal_us: List[float] = []
+    for _ in range(max(1, repeat)):
+        cal_us.append(_per_op_us(calibration, cal_number, 1))
+        case_us.append(_per_op_us(timer, number, ops))
+    ratios = [case / cal for case, cal in zip(case_us, cal_us)]
+    middle = statistics.median(ratios)
+    return {
+        "calibration_us": round(statistics.median(cal_us), 3),
+        "us": round(statistics.median(case_us), 3),
+        "spread": round(1.4826 * statistics.median(abs(r - middle) for r in ratios) / middle, 3) if middle else 0.0,
+    }
+
+
+def run_suite(pattern: Optional[str], repeat: int, only: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    headers, rows = _sheet(SHEET_ROWS)
+    results: Dict[str, Dict[str, float]] = {}
+    with bench_environment(headers, rows):
+        for case in build_cases(headers, rows):
+            if pattern and pattern not in case.name:
+                continue
+            if only is not None and case.name not in only:
+                continue
+            results[case.name] = measure(case.run, case.ops, repeat)
+    return {"python": platform.python_version(), "cases": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    rows = []
+    for name, entry in current["cases"].items():
+        now = entry["us"]
+        before = baseline["cases"].get(name)
+        if before is None:
+            rows.append({"case": name, "now_us": now, "expected_us": None, "ratio": None,
+                         "tolerance": None, "regression": False})
+            continue
+        expected = before["us"] * entry["calibration_us"] / before["calibration_us"]
+        ratio = now / expected if expected else 0.0
+        noise = max(before.get("spread", 0.0), entry.get("spread", 0.0))
+        tolerance = max(threshold, NOISE_FACTOR * noise)
+        rows.append({
+            "case": name, "now_us": now, "expected_us": round(expected, 3),
+            "ratio": round(ratio, 3), "tolerance": round(tolerance, 3),
+            "regression": ratio > 1.0 + tolerance,
+        })
+    return rows
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    for row in rows:
+        flag = "REGRESION" if row["regression"] else ("nuevo" if row["ratio"] is None else "ok")
+        expected = f"{row['expected_us']:.3f}" if row["expected_us"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+        tolerance = f"+{row['tolerance']:.0%}" if row["tolerance"] is not None else "-"
+        print(f"  {row['case']:32} {row['now_us']:12.3f} us  esperado {expected:>12}  {ratio:>7}  "
+              f"tol {tolerance:>5}  {flag}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de funciones del turno.")
+    parser.add_argument("command", choices=("run", "save", "compare"))
+    parser.add_argument("-k", dest="pattern", help="solo casos cuyo nombre contenga este texto")
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--threshold", type=float, default=0.25, help="tolerancia relativa para compare")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--no-confirm", dest="confirm", action="store_false",
+                        help="compare: falla en la primera pasada sin volver a medir")
+    args = parser.parse_args()
+
+    current = run_suite(args.pattern, args.repeat)
+    if args.command == "run":
+        for name, entry in current["cases"].items():
+            print(f"  {name:32} {entry['us']:12.3f} us/op   (calibracion {entry['calibration_us']:.1f} us, "
+                  f"ruido ±{entry['spread']:.0%})")
+        return 0
+
+    if args.command == "save":
+        baseline: Dict[str, Any] = {}
+        if args.pattern and os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as fh:
+                baseline = json.load(fh)
+        merged = {**baseline.get("cases", {}), **current["cases"]}
+        current["cases"] = dict(sorted(merged.items()))
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(current, fh, indent=2)
+            fh.write("\n")
+        print(f"baseline guardado en {args.baseline} ({len(current['cases'])} casos)")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    rows = compare(current, baseline, args.threshold)
+    _print_rows(rows)
+    regressions = [row["case"] for row in rows if row["regression"]]
+    if regressions and args.confirm:
+        print(f"\nconfirmando {len(regressions)} caso(s) con una segunda pasada...")
+        rows = compare(run_suite(None, args.repeat, only=regressions), baseline, args.threshold)
+        _print_rows(rows)
+        confirmed = [row["case"] for row in rows if row["regression"]]
+        noise = [name for name in regressions if name not in confirmed]
+        if noise:
+            print(f"\nno se repitio (ruido del runner): {', '.join(noise)}")
+        regressions = confirmed
+    if regressions:
+        print(f"\n{len(regressions)} regresion(es) sobre su tolerancia: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# bench_import.py — tiempo de `import app` (cold start) y sus imports mas caros
+# ------------------------------------------------------------
+# Uso:  python benchmarks/bench_import.py [--runs 7] [--compare-ref HEAD~1] [--top 15]
+# Cada corrida es un interprete nuevo (`python -X importtime -c "import app"`)
+# con el mismo entorno, asi que mide lo que paga un cold start en Render
+# antes de atender el primer webhook. Reporta la mediana y el minimo del
+# tiempo total y los modulos con mayor tiempo acumulado (de -X importtime).
+# --compare-ref extrae esa revision con `git archive` a un directorio
+# temporal y la mide igual, para comparar contra el arbol actual. Para ver
+# el efecto de Google/OpenAI, correr con GOOGLE_CREDENTIALS_JSON y los SDK
+# instalados (requirements.txt).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+def _one_run(cwd: str) -> Tuple[float, Dict[str, int]]:
+    env = dict(os.environ, LOG_QUEUE_ENABLED="false", LOG_LEVEL="ERROR")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app fallo en {cwd}:\n{proc.stderr[-2000:]}")
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        found = _IMPORTTIME.match(line)
+        if found:
+            cumulative[found.group(4)] = int(found.group(2))
+    return wall, cumulative
+
+
+def measure(cwd: str, runs: int) -> Tuple[List[float], Dict[str, int]]:
+    _one_run(cwd)  # calienta el cache de disco y escribe los .pyc
+    walls: List[float] = []
+    best: Dict[str, int] = {}
+    for _ in range(runs):
+        wall, cumulative = _one_run(cwd)
+        walls.append(wall)
+        for name, us in cumulative.items():
+            best[name] = min(us, best.get(name, us))
+    return walls, best
+
+
+def _report(label: str, walls: List[float], cumulative: Dict[str, int], top: int) -> None:
+    print(f"{label}: mediana {statistics.median(walls) * 1000:.1f} ms, minimo {min(walls) * 1000:.1f} ms ({len(walls)} corridas)")
+    app_us = cumulative.get("app")
+    if app_us is not None:
+        print(f"  import app (acumulado, -X importtime): {app_us / 1000:.1f} ms")
+    ranked = sorted(((us, name) for name, us in cumulative.items() if "." not in name and name != "app"), reverse=True)
+    for us, name in ranked[:top]:
+        print(f"    {name:32} {us / 1000:8.1f} ms")
+
+
+def _export(ref: str, dest: str) -> None:
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", dest], input=archive.stdout, check=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tiempo de import de app.py en un interprete nuevo.")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="modulos de primer nivel a listar")
+    parser.add_argument("--compare-ref", help="revision de git a medir contra el arbol actual")
+    args = parser.parse_args()
+
+    walls, cumulative = measure(ROOT, args.runs)
+    _report("arbol actual", walls, cumulative, args.top)
+    if not args.compare_ref:
+        return
+    with tempfile.TemporaryDirectory(prefix="vicky-import-") as tmp:
+        _export(args.compare_ref, tmp)
+        ref_walls, ref_cumulative = measure(tmp, args.runs)
+    print()
+    _report(args.compare_ref, ref_walls, ref_cumulative, args.top)
+    delta = statistics.median(walls) - statistics.median(ref_walls)
+    print(f"\ndiferencia de mediana: {delta * 1000:+.1f} ms ({statistics.median(walls) / statistics.median(ref_walls):.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# bench_webhook_load.py — carga end-to-end del webhook contra upstreams falsos
+# ------------------------------------------------------------
+# Uso:  python benchmarks/bench_webhook_load.py [--rps 20] [--duration 20]
+#           [--mix text=0.6,button=0.1,media=0.1,status=0.2]
+#           [--graph-latency-ms 80] [--sheets-latency-ms 150] [--bus-latency-ms 250]
+#           [--graph-error-rate 0] [--sheets-error-rate 0] [--bus-error-rate 0]
+#           [--json]
+# Levanta Graph, Sheets values y Boardroom falsos (fake_upstreams.py), apunta
+# app.py a ellos por entorno (GRAPH_API_BASE, BUS_URL, ...), sirve la app en
+# un servidor WSGI local y le manda webhooks de Meta (texto, boton, media y
+# status) a un ritmo fijo. Carga abierta: cada request sale a su hora
+# programada y la latencia se mide desde esa hora, asi una app saturada se
+# ve como cola y no como menos trafico (coordinated omission).
+# Reporta throughput, p50/p95/p99 de la respuesta del webhook, llamadas a
+# cada upstream por turno y los histogramas por etapa de /ext/metrics.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from fake_upstreams import (  # noqa: E402
+    FaultProfile,
+    SheetsStore,
+    SheetsValuesClient,
+    boardroom_server,
+    graph_server,
+    sheets_server,
+)
+
+KINDS = ("text", "button", "media", "status")
+LEADS_TITLE = "Prospectos SECOM Auto"
+TEXTS = (
+    "hola", "menu", "1", "2", "me interesa el seguro de auto", "cuanto cuesta el seguro de vida",
+    "quiero informacion del prestamo imss", "gracias", "ok", "tengo 45 años", "8500",
+    "buenas tardes, quisiera saber mas de la tarjeta", "contacto", "si", "no",
+)
+BUTTONS = ("Me interesa", "Más información", "No por ahora")
+STATUSES = ("sent", "delivered", "read", "failed")
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Percentil exacto (rango mas cercano) de una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in KINDS:
+            raise ValueError(f"tipo desconocido en --mix: {name!r} (validos: {', '.join(KINDS)})")
+        weights[name] = float(value)
+    if sum(weights.values()) <= 0:
+        raise ValueError("--mix sin pesos positivos")
+    return weights
+
+
+# ==========================
+# Payloads de Meta
+# ==========================
+def _envelope(value: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WABA_BENCH",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "5210000000000", "phone_number_id": "PHONE_BENCH"},
+                    **value,
+                },
+            }],
+        }],
+    }
+
+
+def build_payload(kind: str, phone: str, rng: random.Random) -> Dict[str, Any]:
+    if kind == "status":
+        return _envelope({"statuses": [{
+            "id": f"wamid.{uuid.uuid4().hex}",
+            "status": rng.choice(STATUSES),
+            "timestamp": str(int(time.time())),
+            "recipient_id": phone,
+        }]})
+
+    msg: Dict[str, Any] = {"from": phone, "id": f"wamid.{uuid.uuid4().hex}", "timestamp": str(int(time.time()))}
+    if kind == "text":
+        msg.update(type="text", text={"body": rng.choice(TEXTS)})
+    elif kind == "button":
+        label = rng.choice(BUTTONS)
+        msg.update(type="button", button={"text": label, "payload": label})
+    else:
+        msg.update(type="image", image={"id": f"media{rng.randrange(10**9)}", "mime_type": "image/jpeg"})
+    return _envelope({"contacts": [{"profile": {"name": "Bench"}, "wa_id": phone}], "messages": [msg]})
+
+
+def leads_table(phones: List[str], known_ratio: float) -> List[List[str]]:
+    rows = [["Nombre", "WhatsApp", "ESTATUS", "LAST_MESSAGE_AT"]]
+    for i, phone in enumerate(phones[: int(len(phones) * known_ratio)]):
+        rows.append([f"Cliente {i}", phone[-10:], "", ""])
+    # Relleno: el matching lee la hoja completa en cada turno.
+    for i in range(2000):
+        rows.append([f"Relleno {i}", f"699{i:07d}", "", ""])
+    return rows
+
+
+# ==========================
+# Arranque
+# ==========================
+def _configure_app(graph_url: str, bus_url: str, sheets_url: str, db_path: str) -> Any:
+    os.environ.update({
+        "META_TOKEN": "bench-token",
+        "WABA_PHONE_ID": "PHONE_BENCH",
+        "GRAPH_API_BASE": f"{graph_url}/v20.0",
+        "BUS_URL": bus_url,
+        "BUS_INTERNAL_TOKEN": "bench-bus",
+        "BOARDROOM_DECISION_URL": bus_url,
+        "BOARDROOM_AUTH_TOKEN": "bench-boardroom",
+        "SHEETS_ID_LEADS": "SHEET_BENCH",
+        "SHEETS_TITLE_LEADS": LEADS_TITLE,
+        "VICKY_DB_PATH": db_path,
+    })
+    import app as vicky  # noqa: E402  (lee el entorno al importar)
+
+    vicky.sheets_svc = SheetsValuesClient(sheets_url, timeout=vicky.WPP_TIMEOUT)
+    vicky.google_ready = True
+    return vicky
+
+
+def _serve(app: Any) -> Tuple[str, Any]:
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name="BenchApp").start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    phones = [f"521668{rng.randrange(10**7):07d}" for _ in range(args.phones)]
+
+    store = SheetsStore({LEADS_TITLE: leads_table(phones, args.known_ratio)})
+    fakes = {
+        "graph": graph_server(FaultProfile(args.graph_latency_ms, args.graph_latency_ms * args.jitter, args.graph_error_rate), args.seed),
+        "sheets": sheets_server(store, FaultProfile(args.sheets_latency_ms, args.sheets_latency_ms * args.jitter, args.sheets_error_rate), args.seed),
+        "boardroom": boardroom_server(FaultProfile(args.bus_latency_ms, args.bus_latency_ms * args.jitter, args.bus_error_rate), args.seed),
+    }
+    for fake in fakes.values():
+        fake.start()
+
+    db_dir = tempfile.mkdtemp(prefix="vicky-bench-")
+    vicky = _configure_app(fakes["graph"].base_url, fakes["boardroom"].base_url, fakes["sheets"].base_url,
+                           os.path.join(db_dir, "bench.sqlite3"))
+    if not args.verbose:
+        logging.getLogger("vicky-secom").setLevel(logging.WARNING)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    base_url, server = _serve(vicky.app)
+    baseline_turns = _turn_count(vicky)
+
+    total = max(1, int(args.rps * args.duration))
+    plan = [(i / args.rps, rng.choices(kinds, weights)[0], rng.choice(phones)) for i in range(total)]
+    local = threading.local()
+    results: List[Tuple[str, float, int]] = []
+    results_lock = threading.Lock()
+
+    def fire(scheduled: float, kind: str, phone: str) -> None:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            status = session.post(f"{base_url}/webhook", json=build_payload(kind, phone, random.Random()), timeout=60).status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = time.perf_counter() - scheduled
+        with results_lock:
+            results.append((kind, elapsed, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="BenchClient") as pool:
+        for offset, kind, phone in plan:
+            pool.submit(fire, start + offset, kind, phone)
+    wall = time.perf_counter() - start
+    server.shutdown()
+    # Status en el ring buffer y entregas pendientes se escriben antes de
+    # apagar los upstreams falsos (cuentan en las llamadas a Sheets).
+    vicky._status_buffer.flush()
+    vicky._delivery.stop()
+    for fake in fakes.values():
+        fake.stop()
+
+    turns = _turn_count(vicky) - baseline_turns
+    return _report(results, wall, turns, fakes, vicky._metrics.snapshot(), args)
+
+
+def _turn_count(vicky: Any) -> int:
+    return sum(entry["count"] for entry in vicky._metrics.snapshot().get("turn", {}).values())
+
+
+def _report(
+    results: List[Tuple[str, float, int]],
+    wall: float,
+    turns: int,
+    fakes: Dict[str, Any],
+    stages: Dict[str, Dict[str, Any]],
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    def summary(values: List[float]) -> Dict[str, Any]:
+        ordered = sorted(values)
+        return {
+            "count": len(ordered),
+            **{f"p{int(q * 100)}_ms": round(percentile(ordered, q) * 1000, 1) if ordered else None for q in (0.5, 0.95, 0.99)},
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else None,
+        }
+
+    by_kind = {kind: summary([e for k, e, _s in results if k == kind]) for kind in KINDS}
+    upstreams: Dict[str, Any] = {}
+    for name, fake in fakes.items():
+        calls, errors = fake.calls(), fake.errors()
+        upstreams[name] = {
+            route: {"calls": n, "errors": errors.get(route, 0), "per_turn": round(n / turns, 2) if turns else None}
+            for route, n in sorted(calls.items())
+        }
+    return {
+        "config": {
+            "rps": args.rps, "duration_s": args.duration, "mix": args.mix, "concurrency": args.concurrency,
+            "latency_ms": {"graph": args.graph_latency_ms, "sheets": args.sheets_latency_ms, "boardroom": args.bus_latency_ms},
+            "error_rate": {"graph": args.graph_error_rate, "sheets": args.sheets_error_rate, "boardroom": args.bus_error_rate},
+        },
+        "requests": len(results),
+        "non_200": sum(1 for _k, _e, s in results if s != 200),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "turns": turns,
+        "latency": {"all": summary([e for _k, e, _s in results]), **by_kind},
+        "upstreams": upstreams,
+        "stages": stages,
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"requests={report['requests']}  non_200={report['non_200']}  wall={report['wall_s']}s  "
+          f"throughput={report['throughput_rps']} rps  turnos={report['turns']}")
+    print("\nlatencia del webhook (ms, desde la hora programada)")
+    for kind, row in report["latency"].items():
+        if row["count"]:
+            print(f"  {kind:7} n={row['count']:<6} p50={row['p50_ms']:<8} p95={row['p95_ms']:<8} p99={row['p99_ms']:<8} max={row['max_ms']}")
+    print("\nllamadas a upstreams (total / errores inyectados / por turno)")
+    for name, routes in report["upstreams"].items():
+        for route, row in routes.items():
+            print(f"  {name:9} {route:20} {row['calls']:<7} {row['errors']:<5} {row['per_turn']}")
+    print("\netapas (p50/p95/p99 s, de /ext/metrics)")
+    for stage, outcomes in report["stages"].items():
+        for outcome, row in outcomes.items():
+            print(f"  {stage:24} {outcome:10} n={row['count']:<6} {row['p50']} / {row['p95']} / {row['p99']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Carga end-to-end del webhook contra upstreams falsos.")
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de trafico programado")
+    parser.add_argument("--mix", default="text=0.6,button=0.1,media=0.1,status=0.2")
+    parser.add_argument("--concurrency", type=int, default=64, help="clientes simultaneos maximos")
+    parser.add_argument("--phones", type=int, default=200)
+    parser.add_argument("--known-ratio", type=float, default=0.5, help="fraccion de telefonos presentes en la hoja")
+    parser.add_argument("--graph-latency-ms", type=float, default=80.0)
+    parser.add_argument("--sheets-latency-ms", type=float, default=150.0)
+    parser.add_argument("--bus-latency-ms", type=float, default=250.0)
+    parser.add_argument("--jitter", type=float, default=0.25, help="jitter como fraccion de la latencia")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0)
+    parser.add_argument("--bus-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="imprime el reporte como JSON")
+    parser.add_argument("--verbose", action="store_true", help="deja los logs INFO de la app")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# fake_upstreams.py — servidores locales que imitan Graph, Sheets values y el bus de Boardroom
+# ------------------------------------------------------------
+# Para medir el turno completo sin tocar Meta, Google ni Boardroom. Cada
+# fake es un ThreadingHTTPServer en 127.0.0.1 (puerto libre) con:
+#   - latencia inyectada: latency_ms +/- jitter (uniforme) antes de responder;
+#   - errores inyectados: con probabilidad error_rate responde error_status;
+#   - conteo de llamadas por ruta ("send", "values.get", "bus_event"...).
+# Las respuestas tienen la forma minima que app.py lee de cada upstream.
+# SheetsValuesClient expone la cadena spreadsheets().values().get(...)
+# .execute() del cliente de Google pero habla REST con el fake, para que
+# app.py no distinga el origen.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+import requests
+
+Reply = Tuple[int, Any]  # (status, dict JSON | bytes)
+RouteFn = Callable[[re.Match, Dict[str, Any]], Reply]
+
+
+class FaultProfile(NamedTuple):
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class Route(NamedTuple):
+    name: str
+    method: str
+    pattern: Pattern[str]
+    handler: RouteFn
+
+
+class FakeServer:
+    """Servidor HTTP local con rutas por regex, latencia y errores inyectados."""
+
+    def __init__(self, name: str, routes: List[Route], profile: FaultProfile = FaultProfile(), seed: Optional[int] = None) -> None:
+        self.name = name
+        self.routes = routes
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()
+        self._errors: Counter = Counter()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name=f"Fake-{self.name}")
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def calls(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._calls)
+
+    def errors(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._errors)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._errors.clear()
+
+    def _fault(self) -> Tuple[float, bool]:
+        with self._lock:
+            jitter = self._rng.uniform(-1.0, 1.0) * self.profile.jitter_ms
+            failed = self._rng.random() < self.profile.error_rate
+        return max(0.0, self.profile.latency_ms + jitter) / 1000.0, failed
+
+    def dispatch(self, method: str, path: str, body: Dict[str, Any]) -> Reply:
+        for route in self.routes:
+            if route.method != method:
+                continue
+            found = route.pattern.fullmatch(path)
+            if not found:
+                continue
+            delay, failed = self._fault()
+            if delay:
+                time.sleep(delay)
+            with self._lock:
+                self._calls[route.name] += 1
+                if failed:
+                    self._errors[route.name] += 1
+            if failed:
+                return self.profile.error_status, {"error": {"message": "injected", "code": self.profile.error_status}}
+            return route.handler(found, body)
+        with self._lock:
+            self._calls["unrouted"] += 1
+        return 404, {"error": {"message": f"sin ruta {method} {path}"}}
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+                status, reply = server.dispatch(method, unquote(urlsplit(self.path).path), body)
+                if isinstance(reply, bytes):
+                    data, ctype = reply, "application/octet-stream"
+                else:
+                    data, ctype = json.dumps(reply).encode("utf-8"), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:  # noqa: N802
+                self._serve("GET")
+
+            def do_POST(self) -> None:  # noqa: N802
+                self._serve("POST")
+
+            def do_PUT(self) -> None:  # noqa: N802
+                self._serve("PUT")
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+# ==========================
+# Graph API (WhatsApp Cloud)
+# ==========================
+def graph_server(profile: FaultProfile = FaultProfile(), seed: Optional[int] = None) -> FakeServer:
+    """Rutas bajo /v20.0: envio de mensajes, metadata de media y descarga."""
+    holder: Dict[str, str] = {}
+
+    def send(_m: re.Match, _body: Dict[str, Any]) -> Reply:
+        return 200, {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+
+    def media_meta(m: re.Match, _body: Dict[str, Any]) -> Reply:
+        media_id = m.group(1)
+        return 200, {
+            "id": media_id,
+            "url": f"{holder['base']}/_media/{media_id}",
+            "mime_type": "image/jpeg",
+            "filename": f"{media_id}.jpg",
+        }
+
+    def media_bytes(_m: re.Match, _body: Dict[str, Any]) -> Reply:
+        return 200, b"\xff\xd8\xff" + b"\x00" * 2048
+
+    fake = FakeServer("graph", [
+        Route("send", "POST", re.compile(r"/v20\.0/[^/]+/messages"), send),
+        Route("media_meta", "GET", re.compile(r"/v20\.0/([^/]+)"), media_meta),
+        Route("media_download", "GET", re.compile(r"/_media/([^/]+)"), media_bytes),
+    ], profile, seed)
+    holder["base"] = fake.base_url
+    return fake
+
+
+# ==========================
+# Sheets values API (v4)
+# ==========================
+_A1_CELL = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _col_index(letters: str) -> int:
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - ord("A") + 1)
+    return idx - 1
+
+
+class SheetsStore:
+    """Pestanas en memoria: titulo -> filas (la primera es el encabezado)."""
+
+    def __init__(self, tabs: Optional[Dict[str, List[List[str]]]] = None) -> None:
+        self._lock = threading.Lock()
+        self.tabs: Dict[str, List[List[str]]] = {k: [list(r) for r in v] for k, v in (tabs or {}).items()}
+
+    def get(self, a1: str) -> List[List[str]]:
+        title, _, ref = a1.partition("!")
+        with self._lock:
+            rows = self.tabs.get(title, [])
+            cell = _A1_CELL.fullmatch(ref)
+            if cell:
+                row_i, col_i = int(cell.group(2)) - 1, _col_index(cell.group(1))
+                value = rows[row_i][col_i] if row_i < len(rows) and col_i < len(rows[row_i]) else ""
+                return [[value]] if value else []
+            return [list(r) for r in rows]
+
+    def append(self, a1: str, values: List[List[Any]]) -> None:
+        title = a1.partition("!")[0]
+        with self._lock:
+            self.tabs.setdefault(title, []).extend([str(v) for v in row] for row in values)
+
+    def set_cell(self, a1: str, value: Any) -> None:
+        title, _, ref = a1.partition("!")
+        cell = _A1_CELL.fullmatch(ref)
+        if not cell:
+            return
+        row_i, col_i = int(cell.group(2)) - 1, _col_index(cell.group(1))
+        with self._lock:
+            rows = self.tabs.setdefault(title, [])
+            while len(rows) <= row_i:
+                rows.append([])
+            row = rows[row_i]
+            row.extend([""] * (col_i + 1 - len(row)))
+            row[col_i] = str(value)
+
+
+def sheets_server(store: SheetsStore, profile: FaultProfile = FaultProfile(), seed: Optional[int] = None) -> FakeServer:
+    """Rutas REST de spreadsheets.values: get, append, update y batchUpdate."""
+
+    def get(m: re.Match, _body: Dict[str, Any]) -> Reply:
+        return 200, {"range": m.group(1), "values": store.get(m.group(1))}
+
+    def append(m: re.Match, body: Dict[str, Any]) -> Reply:
+        store.append(m.group(1), body.get("values") or [])
+        return 200, {"updates": {"updatedRows": len(body.get("values") or [])}}
+
+    def update(m: re.Match, body: Dict[str, Any]) -> Reply:
+        values = body.get("values") or [[""]]
+        store.set_cell(m.group(1), values[0][0] if values and values[0] else "")
+        return 200, {"updatedCells": 1}
+
+    def batch_update(_m: re.Match, body: Dict[str, Any]) -> Reply:
+        for item in body.get("data") or []:
+            values = item.get("values") or [[""]]
+            store.set_cell(item.get("range", ""), values[0][0] if values and values[0] else "")
+        return 200, {"totalUpdatedCells": len(body.get("data") or [])}
+
+    return FakeServer("sheets", [
+        Route("values.batchUpdate", "POST", re.compile(r"/v4/spreadsheets/[^/]+/values:batchUpdate"), batch_update),
+        Route("values.append", "POST", re.compile(r"/v4/spreadsheets/[^/]+/values/(.+):append"), append),
+        Route("values.get", "GET", re.compile(r"/v4/spreadsheets/[^/]+/values/(.+)"), get),
+        Route("values.update", "PUT", re.compile(r"/v4/spreadsheets/[^/]+/values/(.+)"), update),
+    ], profile, seed)
+
+
+class SheetsHttpError(Exception):
+    """Misma forma que googleapiclient.errors.HttpError: `.resp.status`."""
+
+    def __init__(self, status: int, text: str) -> None:
+        super().__init__(f"HTTP {status}: {text[:200]}")
+        self.resp = SimpleNamespace(status=status)
+
+
+class _SheetsRequest:
+    def __init__(self, session: requests.Session, method: str, url: str, timeout: float, **kwargs: Any) -> None:
+        self._session, self._method, self._url, self._timeout, self._kwargs = session, method, url, timeout, kwargs
+
+    def execute(self) -> Dict[str, Any]:
+        resp = self._session.request(self._method, self._url, timeout=self._timeout, **self._kwargs)
+        if resp.status_code >= 400:
+            raise SheetsHttpError(resp.status_code, resp.text)
+        return resp.json()
+
+
+class SheetsValuesClient:
+    """Sustituto de `build("sheets", "v4")` limitado a spreadsheets().values()."""
+
+    def __init__(self, base_url: str, timeout: float = 15.0) -> None:
+        self._base = base_url.rstrip("/")
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def spreadsheets(self) -> "SheetsValuesClient":
+        return self
+
+    def values(self) -> "SheetsValuesClient":
+        return self
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _url(self, spreadsheet_id: str, suffix: str) -> str:
+        return f"{self._base}/v4/spreadsheets/{spreadsheet_id}/values{suffix}"
+
+    def get(self, spreadsheetId: str, range: str) -> _SheetsRequest:  # noqa: N803,A002
+        return _SheetsRequest(self._session(), "GET", self._url(spreadsheetId, "/" + quote(range, safe="")), self._timeout)
+
+    def append(self, spreadsheetId: str, range: str, body: Dict[str, Any], **params: Any) -> _SheetsRequest:  # noqa: N803,A002
+        url = self._url(spreadsheetId, "/" + quote(range, safe="") + ":append")
+        return _SheetsRequest(self._session(), "POST", url, self._timeout, params=params, json=body)
+
+    def update(self, spreadsheetId: str, range: str, body: Dict[str, Any], **params: Any) -> _SheetsRequest:  # noqa: N803,A002
+        url = self._url(spreadsheetId, "/" + quote(range, safe=""))
+        return _SheetsRequest(self._session(), "PUT", url, self._timeout, params=params, json=body)
+
+    def batchUpdate(self, spreadsheetId: str, body: Dict[str, Any]) -> _SheetsRequest:  # noqa: N802,N803
+        return _SheetsRequest(self._session(), "POST", self._url(spreadsheetId, ":batchUpdate"), self._timeout, json=body)
+
+
+# ==========================
+# Boardroom (bus + decision)
+# ==========================
+def boardroom_server(
+    profile: FaultProfile = FaultProfile(),
+    seed: Optional[int] = None,
+    reply: str = "Gracias por escribir, en un momento te atiende un asesor.",
+) -> FakeServer:
+    """Bus (/bus/event, /bus/event/confirm, evento legacy en /) y decision
+    (/api/boardroom/orchestrate). El bus siempre instruye send_message."""
+
+    def bus_event(_m: re.Match, body: Dict[str, Any]) -> Reply:
+        return 200, {
+            "status": "ok",
+            "event_id": body.get("event_id", ""),
+            "instruction_id": f"ins-{uuid.uuid4().hex[:12]}",
+            "instruction": {"type": "send_message", "message": reply},
+        }
+
+    def ok(_m: re.Match, _body: Dict[str, Any]) -> Reply:
+        return 200, {"ok": True}
+
+    def decision(_m: re.Match, _body: Dict[str, Any]) -> Reply:
+        return 200, {"ok": True, "handled": False, "reason": "fake"}
+
+    return FakeServer("boardroom", [
+        Route("bus_confirm", "POST", re.compile(r"/bus/event/confirm"), ok),
+        Route("bus_event", "POST", re.compile(r"/bus/event"), bus_event),
+        Route("decision", "POST", re.compile(r"/api/boardroom/orchestrate"), decision),
+        Route("legacy_event", "POST", re.compile(r"/?"), ok),
+    ], profile, seed)
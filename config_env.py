@@ -38,6 +38,16 @@ ADVISOR_NUMBER = _get("ADVISOR_NUMBER") or _get("NOTIFICATION_NUMBER")
 # GPT (opcional)
 OPENAI_API_KEY = _get("OPENAI_API_KEY")
 GPT_MODEL = _get("GPT_MODEL", "gpt-4o-mini")
+GPT_TIMEOUT_S = float(_get("GPT_TIMEOUT_S", "20") or "20")
+GPT_MAX_CONCURRENCY = int(_get("GPT_MAX_CONCURRENCY", "4") or "4")
+GPT_QUEUE_TIMEOUT_S = float(_get("GPT_QUEUE_TIMEOUT_S", "5") or "5")
+GPT_CACHE_SIZE = int(_get("GPT_CACHE_SIZE", "256") or "256")
+GPT_CACHE_TTL_S = float(_get("GPT_CACHE_TTL_S", "3600") or "3600")
+
+# Indice FAQ local (core_retrieval); sin indice construido el fallback va directo a GPT.
+FAQ_INDEX_DIR = _get("FAQ_INDEX_DIR", os.path.join("knowledge", "index"))
+FAQ_CONTEXT_PASSAGES = int(_get("FAQ_CONTEXT_PASSAGES", "3") or "3")
+FAQ_LOCAL_MIN_COVERAGE = float(_get("FAQ_LOCAL_MIN_COVERAGE", "0.8") or "0.8")
 
 # Google Sheets (opcional)
 GOOGLE_SHEET_ID = _get("GOOGLE_SHEET_ID") or _get("SHEET_ID_PROSPECTOS")
@@ -0,0 +1,130 @@
+# core_classifier.py — clasificador local de intencion (bolsa de palabras + numpy)
+# ------------------------------------------------------------
+# Cada turno idle en modo autoridad iba a Boardroom aun para "menu", "1" u
+# "hola", y el product_hint salia de un if/elif por keywords. Aqui cada
+# ejemplo etiquetado (semillas del menu + historico etiquetado) es un vector
+# de unigramas y bigramas ponderado por idf; clasificar es un producto
+# matriz-vector y un max por clase (np.maximum.reduceat), sin servicios.
+#   - intent: clase del ejemplo mas parecido.
+#   - confidence: (mejor - segunda clase) * cobertura, donde cobertura es la
+#     fraccion del texto que el clasificador conoce. "menu" -> 1.0; "hola,
+#     mi auto choco ayer y no se que hacer" -> baja aunque diga "auto".
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import csv
+import logging
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_intents import normalize_text
+
+log = logging.getLogger("vicky-secom.classifier")
+
+_WORD = re.compile(r"\w+")
+
+
+class Prediction(NamedTuple):
+    intent: Optional[str]
+    confidence: float
+
+
+def _fold_plural(word: str) -> str:
+    # Mismo plural simple que IntentMatcher (raices de 4+ letras):
+    # "placas" -> "placa", "terminales" -> "terminal".
+    if len(word) >= 6 and word.endswith("es") and word[-3] not in "aeiou":
+        return word[:-2]
+    if len(word) >= 5 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def features(text: str) -> List[str]:
+    words = [_fold_plural(w) for w in _WORD.findall(normalize_text(text))]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """Vecino mas cercano (coseno) sobre ejemplos etiquetados."""
+
+    def __init__(self, examples: Iterable[Tuple[str, str]]) -> None:
+        by_label: Dict[str, List[List[str]]] = {}
+        for text, label in examples:
+            feats = features(text)
+            if feats and label:
+                by_label.setdefault(label, []).append(feats)
+        if not by_label:
+            raise ValueError("IntentClassifier sin ejemplos")
+
+        self.labels: List[str] = sorted(by_label)
+        rows: List[List[str]] = []
+        starts: List[int] = []
+        for label in self.labels:
+            starts.append(len(rows))
+            rows.extend(by_label[label])
+
+        self.vocab: Dict[str, int] = {}
+        for feats in rows:
+            for feat in feats:
+                self.vocab.setdefault(feat, len(self.vocab))
+        # idf por clase: un termino presente en muchas intenciones pesa poco.
+        label_df = np.zeros(len(self.vocab), dtype=np.float32)
+        for label in self.labels:
+            cols = {self.vocab[f] for feats in by_label[label] for f in feats}
+            label_df[list(cols)] += 1
+        self.idf = np.log1p(len(self.labels) / label_df).astype(np.float32)
+
+        matrix = np.zeros((len(rows), len(self.vocab)), dtype=np.float32)
+        for i, feats in enumerate(rows):
+            for feat in feats:
+                matrix[i, self.vocab[feat]] += 1.0
+        matrix *= self.idf
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._matrix = matrix
+        self._starts = np.asarray(starts, dtype=np.int64)
+        self.examples = len(rows)
+
+    def predict(self, text: str) -> Prediction:
+        feats = features(text)
+        if not feats:
+            return Prediction(None, 0.0)
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        known = 0
+        for feat in feats:
+            col = self.vocab.get(feat)
+            if col is not None:
+                query[col] += 1.0
+                known += 1
+        if not known:
+            return Prediction(None, 0.0)
+        query *= self.idf
+        query /= float(np.linalg.norm(query))
+
+        per_label = np.maximum.reduceat(self._matrix @ query, self._starts)
+        order = np.argsort(-per_label)
+        best = float(per_label[order[0]])
+        second = float(per_label[order[1]]) if len(order) > 1 else 0.0
+        if best <= 0:
+            return Prediction(None, 0.0)
+        confidence = (best - second) * known / len(feats)
+        return Prediction(self.labels[int(order[0])], round(max(0.0, min(1.0, confidence)), 3))
+
+
+def load_labeled_csv(path: str, text_column: str = "MENSAJE", label_column: str = "INTENT") -> List[Tuple[str, str]]:
+    """Ejemplos de un export de RESPUESTAS_CLIENTE con una columna de
+    intencion agregada a mano. Filas sin etiqueta se ignoran."""
+    examples: List[Tuple[str, str]] = []
+    with open(path, encoding="utf-8", newline="") as fh:
+        for row in csv.DictReader(fh):
+            norm = {(k or "").strip().upper(): (v or "").strip() for k, v in row.items()}
+            text, label = norm.get(text_column, ""), norm.get(label_column, "").lower()
+            if text and label:
+                examples.append((text, label))
+    return examples
+
+
+def seed_examples(groups: Dict[str, Sequence[str]]) -> List[Tuple[str, str]]:
+    return [(phrase, label) for label, phrases in groups.items() for phrase in phrases]
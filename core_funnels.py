@@ -0,0 +1,161 @@
+# core_funnels.py — motor declarativo para los embudos (vida/imss/emp/fp/auto/tpv)
+# ------------------------------------------------------------
+# Cada embudo es una tabla: estado -> Step(prompt, parser, llave, transicion).
+# El motor resuelve el estado con un lookup en dict (no una cadena de
+# `startswith`), valida la respuesta, guarda el dato y avanza; al cerrar el
+# embudo ejecuta de una vez los efectos de salida (resumen al cliente, aviso
+# al asesor, update en Sheets, menu). Un producto nuevo es configuracion.
+# El motor no conoce WhatsApp ni Sheets: app.py le inyecta los efectos.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+log = logging.getLogger("vicky-secom.funnels")
+
+# Valor que un parser devuelve cuando la respuesta no sirve para el paso.
+INVALID = object()
+
+
+class FunnelContext(NamedTuple):
+    phone: str
+    text: str
+    match: Optional[Dict[str, Any]]
+    data: Dict[str, Any]
+
+
+class Completion(NamedTuple):
+    """Efectos de salida de un embudo, ejecutados juntos y en este orden."""
+
+    message: Optional[str] = None
+    advisor: Optional[str] = None
+    sheet: Optional[Dict[str, str]] = None
+    after: Optional[Callable[[], None]] = None
+    menu: bool = False
+
+
+Transition = Union[str, Tuple[str, Optional[str]]]
+
+
+def _strip_required(text: str, data: Dict[str, Any]) -> Any:
+    value = (text or "").strip()
+    return value if value else INVALID
+
+
+class Step(NamedTuple):
+    """Un estado del embudo.
+
+    - prompt: mensaje al entrar al estado (y al reintentar, si no hay retry).
+    - parse(text, data): valor o INVALID.
+    - store: llave en user_data, o callable(data, value) para datos anidados.
+    - next: estado siguiente, o callable(value, ctx) -> estado | (estado,
+      mensaje) cuando la transicion lleva su propio mensaje. None = fin.
+    - complete(ctx) -> Completion: efectos de salida si next es None.
+    """
+
+    prompt: Optional[str] = None
+    parse: Callable[[str, Dict[str, Any]], Any] = _strip_required
+    store: Union[str, Callable[[Dict[str, Any], Any], None], None] = None
+    next: Union[str, Callable[[Any, FunnelContext], Transition], None] = None
+    retry: Optional[str] = None
+    complete: Optional[Callable[[FunnelContext], Completion]] = None
+
+
+class Funnel(NamedTuple):
+    prefix: str
+    steps: Dict[str, Step]
+    restart: Callable[[FunnelContext], None]
+
+
+class FunnelEffects(NamedTuple):
+    send: Callable[[str, str], Any]
+    notify: Callable[[str], Any]
+    update_sheet: Callable[[Optional[Dict[str, Any]], Dict[str, str]], Any]
+    main_menu: Callable[[str], Any]
+    set_state: Callable[[str, str], None]
+    get_data: Callable[[str], Dict[str, Any]]
+
+
+def _prefix_of(state: str) -> str:
+    head, sep, _ = state.partition("_")
+    return f"{head}_" if sep else ""
+
+
+class FunnelEngine:
+    """Despacho O(1): prefijo -> embudo, estado -> Step."""
+
+    def __init__(self, funnels: Iterable[Funnel], effects: FunnelEffects, idle_state: str = "__greeted__") -> None:
+        self.effects = effects
+        self.idle_state = idle_state
+        self._funnels: Dict[str, Funnel] = {}
+        for funnel in funnels:
+            self._funnels[funnel.prefix] = funnel
+
+    def handles(self, state: str) -> bool:
+        return _prefix_of(state or "") in self._funnels
+
+    def step(self, state: str) -> Optional[Step]:
+        funnel = self._funnels.get(_prefix_of(state or ""))
+        return funnel.steps.get(state) if funnel else None
+
+    def advance(self, phone: str, state: str, text: str, match: Optional[Dict[str, Any]]) -> bool:
+        """Procesa una respuesta dentro del embudo. False si el estado no
+        pertenece a ningun embudo registrado."""
+        funnel = self._funnels.get(_prefix_of(state or ""))
+        if funnel is None:
+            return False
+        data = self.effects.get_data(phone)
+        data["last_message"] = text or ""
+        ctx = FunnelContext(phone, text or "", match, data)
+
+        step = funnel.steps.get(state)
+        if step is None:
+            # Estado huerfano del prefijo (version vieja, dato corrupto): reinicia.
+            funnel.restart(ctx)
+            return True
+
+        value = step.parse(ctx.text, data)
+        if value is INVALID:
+            retry = step.retry or step.prompt
+            if retry:
+                self.effects.send(phone, retry)
+            return True
+
+        if isinstance(step.store, str):
+            data[step.store] = value
+        elif step.store is not None:
+            step.store(data, value)
+
+        if step.next is None:
+            self._complete(ctx, step)
+            return True
+
+        target = step.next if isinstance(step.next, str) else step.next(value, ctx)
+        state_name, message = target if isinstance(target, tuple) else (target, None)
+        self.effects.set_state(phone, state_name)
+        prompt = message if message is not None else (funnel.steps[state_name].prompt if state_name in funnel.steps else None)
+        if prompt:
+            self.effects.send(phone, prompt)
+        return True
+
+    def _complete(self, ctx: FunnelContext, step: Step) -> None:
+        done = step.complete(ctx) if step.complete else Completion()
+        if done.message:
+            self.effects.send(ctx.phone, done.message)
+        if done.advisor:
+            self.effects.notify(done.advisor)
+        if done.sheet and ctx.match and ctx.match.get("row"):
+            try:
+                self.effects.update_sheet(ctx.match, done.sheet)
+            except Exception:
+                log.exception("⚠️ No fue posible actualizar Sheets al cerrar embudo")
+        if done.after:
+            try:
+                done.after()
+            except Exception:
+                log.exception("⚠️ Error en efectos de cierre del embudo %s", ctx.phone)
+        self.effects.set_state(ctx.phone, self.idle_state)
+        if done.menu:
+            self.effects.main_menu(ctx.phone)
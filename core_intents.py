@@ -0,0 +1,182 @@
+# core_intents.py — matcher de intenciones precompilado (una pasada por texto)
+# ------------------------------------------------------------
+# El router detectaba intenciones con muchos `any(k in t for k in (...))`
+# sobre tuplas: una pasada por keyword y por lista, y con falsos positivos
+# por substring ("no" dentro de "bueno", "si" dentro de "asi"). Aqui todas
+# las listas se compilan en UNA regex con limites de palabra y alternativas
+# de mayor a menor longitud; un solo finditer sobre el texto normalizado
+# devuelve todas las senales a la vez, sin importar cuantas listas haya.
+# CommandIndex resuelve los comandos del menu con tolerancia a acentos y
+# typos ("menuu", "seguro d auto") sin comparar contra cada alias.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Set
+
+
+def normalize_text(text: str) -> str:
+    """minusculas, sin acentos y con espacios colapsados."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    plain = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(plain.split())
+
+
+def _keyword_regex(keyword: str) -> str:
+    body = r"\s+".join(re.escape(part) for part in keyword.split())
+    # Plural simple ("placa" -> "placas", "terminal" -> "terminales") solo
+    # para palabras de 4+ letras: "no" no debe empatar con "nos".
+    if len(keyword) >= 4 and keyword[-1].isalpha():
+        body += "(?:es|s)?"
+    return body
+
+
+class IntentMatcher:
+    """Senales nombradas -> keywords; match(text) devuelve el set de senales.
+
+    Una keyword que contiene a otra (p. ej. "seguro de vida" contiene
+    "seguro" y "vida") hereda sus senales: la regex consume la frase mas
+    larga y aun asi se reportan todas, igual que las busquedas por
+    substring que reemplaza.
+    """
+
+    def __init__(self, signals: Mapping[str, Iterable[str]]) -> None:
+        by_keyword: Dict[str, Set[str]] = {}
+        for name, keywords in signals.items():
+            for kw in keywords:
+                norm = normalize_text(kw)
+                if norm:
+                    by_keyword.setdefault(norm, set()).add(name)
+
+        compiled = {kw: re.compile(rf"(?<!\w){_keyword_regex(kw)}(?!\w)") for kw in by_keyword}
+        self._signals: Dict[str, FrozenSet[str]] = {}
+        for kw, names in by_keyword.items():
+            inherited = set(names)
+            for other, pattern in compiled.items():
+                if other != kw and pattern.search(kw):
+                    inherited |= by_keyword[other]
+            self._signals[kw] = frozenset(inherited)
+
+        ordered = sorted(by_keyword, key=len, reverse=True)
+        self._group_to_kw = ordered
+        self._pattern = re.compile(
+            r"(?<!\w)(?:" + "|".join(f"({_keyword_regex(kw)})" for kw in ordered) + r")(?!\w)"
+        )
+        self.names: FrozenSet[str] = frozenset(signals)
+
+    def match(self, text: str) -> FrozenSet[str]:
+        found: Set[str] = set()
+        for m in self._pattern.finditer(normalize_text(text)):
+            found |= self._signals[self._group_to_kw[m.lastindex - 1]]
+        return frozenset(found)
+
+
+def _deletes(word: str, depth: int) -> Set[str]:
+    """Todas las variantes de `word` con hasta `depth` caracteres borrados."""
+    found: Set[str] = set()
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Distancia Damerau (transposiciones adyacentes); corta en limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: list = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class CommandIndex:
+    """Alias de comandos -> comando, tolerante a acentos y typos.
+
+    Indice estilo SymSpell precalculado al construir: cada alias normalizado
+    se guarda junto con sus variantes por borrado. Un alias exacto cuesta un
+    lookup en dict; un typo cuesta unos cuantos lookups (los borrados del
+    texto) y solo los candidatos que comparten un borrado se verifican con
+    distancia de edicion, nunca contra todos los alias.
+
+    - Alias y textos de menos de `min_fuzzy_len` letras ("1", "auto",
+      "imss") y los alias de `exact_only` solo empatan exacto: en palabras
+      cortas un typo ya es otra palabra ("alto", "miss"). Lo unico que se
+      les tolera es una letra repetida por teclear de mas ("menuu").
+    - Tolerancia: 1 edicion, 2 para alias de `long_alias_len`+ letras.
+    - Si dos comandos distintos empatan a la misma distancia, no se adivina.
+    """
+
+    def __init__(
+        self,
+        aliases: Mapping[str, Iterable[str]],
+        exact_only: Iterable[str] = (),
+        min_fuzzy_len: int = 5,
+        long_alias_len: int = 10,
+    ) -> None:
+        skip = {normalize_text(a) for a in exact_only}
+        self._exact: Dict[str, str] = {}
+        self._max_edits: Dict[str, int] = {}
+        self._by_delete: Dict[str, Set[str]] = {}
+        for command, names in aliases.items():
+            for alias in names:
+                norm = normalize_text(alias)
+                if not norm:
+                    continue
+                self._exact[norm] = command
+                if len(norm) < min_fuzzy_len or norm in skip:
+                    continue
+                edits = 2 if len(norm) >= long_alias_len else 1
+                self._max_edits[norm] = edits
+                for variant in _deletes(norm, edits) | {norm}:
+                    self._by_delete.setdefault(variant, set()).add(norm)
+        self._max_len = max((len(a) for a in self._max_edits), default=0) + 2
+        self._min_len = min_fuzzy_len
+        self.commands: FrozenSet[str] = frozenset(aliases)
+
+    def resolve(self, text: str) -> Optional[str]:
+        query = normalize_text(text)
+        command = self._exact.get(query)
+        if command is not None:
+            return command
+        if not self._min_len <= len(query) <= self._max_len:
+            return self._resolve_stutter(query)
+
+        best: Optional[str] = None
+        best_distance = 3
+        tied = False
+        for variant in _deletes(query, 2) | {query}:
+            for alias in self._by_delete.get(variant, ()):
+                limit = self._max_edits[alias]
+                distance = _edit_distance(query, alias, limit)
+                if distance > limit or distance > best_distance:
+                    continue
+                candidate = self._exact[alias]
+                if distance < best_distance:
+                    best, best_distance, tied = candidate, distance, False
+                elif candidate != best:
+                    tied = True
+        if best is None and not tied:
+            return self._resolve_stutter(query)
+        return None if tied else best
+
+    def _resolve_stutter(self, query: str) -> Optional[str]:
+        """Alias corto con una letra duplicada de mas ("menuu", "imsss")."""
+        found = {
+            self._exact[variant]
+            for variant in {query[:i] + query[i + 1:] for i in range(1, len(query)) if query[i] == query[i - 1]}
+            if variant in self._exact and len(variant) < self._min_len
+        }
+        return found.pop() if len(found) == 1 else None
@@ -0,0 +1,373 @@
+# core_retrieval.py — indice BM25 local (numpy, memory-mapped) sobre FAQ y PDFs de producto
+# ------------------------------------------------------------
+# El fallback de texto libre mandaba todo a OpenAI, aun preguntas cuya
+# respuesta esta en nuestros propios documentos (VRIM, Vida Temporal, IMSS
+# Ley 73, TPV). Aqui el indice se construye offline (`build`) y se guarda
+# en disco como arreglos .npy + un meta.json:
+#   - postings por termino (CSC: indptr/doc_ids/tf) para BM25 vectorizado:
+#     cada termino de la pregunta suma su contribucion a todos sus pasajes
+#     en una sola operacion numpy, sin recorrer el corpus;
+#   - una matriz densa de vectores hasheados (unigramas + bigramas, L2)
+#     para re-rankear el top de BM25 con un producto punto.
+# Al arrancar, `load_index` abre los .npy con mmap_mode="r": no se copian a RAM
+# ni se recalcula nada; el SO pagina solo lo que se toca.
+# Uso offline (comando de build del deploy):
+#   python core_retrieval.py build --src knowledge --out knowledge/index
+# Con FAQ_AUTO_BUILD=true (apagado por defecto: recorrer y construir al
+# importar alarga el arranque) app.py llama a `ensure_index`, que lo
+# construye cuando falta o es mas viejo que las fuentes. La publicacion es
+# atomica (ver build_index): varios workers pueden construir y leer a la vez.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core_intents import normalize_text
+
+log = logging.getLogger("vicky-secom.retrieval")
+
+# PDF opcional: pypdf primero, pdfminer como respaldo.
+try:
+    from pypdf import PdfReader
+except Exception:  # pragma: no cover - dependencia opcional
+    PdfReader = None
+try:
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
+except Exception:  # pragma: no cover - dependencia opcional
+    pdfminer_extract_text = None
+
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+HASH_DIM = 512
+PASSAGE_WORDS = 90
+
+_WORD = re.compile(r"[a-z0-9]+")
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_STOPWORDS = frozenset(
+    "a al algo como con cual cuales de del donde el en es esta este esto la las le lo los me mi mas "
+    "muy no o para pero por que se si sin su sus te tu un una uno unos y ya yo".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Terminos sin acentos ni stopwords, con plural simple recortado."""
+    terms: List[str] = []
+    for word in _WORD.findall(normalize_text(text)):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("es"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _hashed_vector(terms: Sequence[str]) -> np.ndarray:
+    vec = np.zeros(HASH_DIM, dtype=np.float32)
+    grams = list(terms) + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+    for gram in grams:
+        vec[zlib.crc32(gram.encode("utf-8")) % HASH_DIM] += 1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+# ==========================
+# Construccion (offline)
+# ==========================
+def read_source(path: str) -> str:
+    if path.lower().endswith(".pdf"):
+        if PdfReader is not None:
+            return "\n\n".join((page.extract_text() or "") for page in PdfReader(path).pages)
+        if pdfminer_extract_text is not None:
+            return pdfminer_extract_text(path)
+        raise RuntimeError(f"Sin pypdf/pdfminer para leer {path}")
+    with open(path, encoding="utf-8") as fh:
+        return fh.read()
+
+
+def split_passages(text: str, max_words: int = PASSAGE_WORDS) -> List[str]:
+    """Pasajes por seccion/parrafo; los parrafos cortos se juntan hasta
+    ~max_words y un encabezado markdown siempre abre pasaje nuevo."""
+    passages: List[str] = []
+    current: List[str] = []
+    words = 0
+    for block in re.split(r"\n\s*\n", _COMMENT.sub("", text or "")):
+        block = " ".join(block.split())
+        if not block:
+            continue
+        n = len(block.split())
+        if current and (block.startswith("#") or words + n > max_words):
+            passages.append(" ".join(current))
+            current, words = [], 0
+        current.append(block.lstrip("# "))
+        words += n
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def build_index(documents: Iterable[Tuple[str, str]], out_dir: str) -> Dict[str, Any]:
+    """documents: (fuente, texto). Escribe los .npy y meta.json en out_dir."""
+    passages: List[Dict[str, str]] = []
+    doc_terms: List[List[str]] = []
+    for source, text in documents:
+        for passage in split_passages(text):
+            terms = tokenize(passage)
+            if terms:
+                passages.append({"source": source, "text": passage})
+                doc_terms.append(terms)
+    if not passages:
+        raise ValueError("No hay pasajes para indexar")
+
+    vocab: Dict[str, int] = {}
+    postings: Dict[int, Dict[int, int]] = {}
+    for doc_id, terms in enumerate(doc_terms):
+        for term in terms:
+            term_id = vocab.setdefault(term, len(vocab))
+            bucket = postings.setdefault(term_id, {})
+            bucket[doc_id] = bucket.get(doc_id, 0) + 1
+
+    n_docs = len(doc_terms)
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    doc_ids: List[int] = []
+    tfs: List[float] = []
+    for term_id in range(len(vocab)):
+        bucket = postings[term_id]
+        doc_ids.extend(bucket.keys())
+        tfs.extend(bucket.values())
+        indptr[term_id + 1] = len(doc_ids)
+
+    # idf de Okapi con piso epsilon * idf promedio (igual que rank_bm25).
+    df = np.diff(indptr).astype(np.float64)
+    idf = np.log((n_docs - df + 0.5) / (df + 0.5))
+    idf = np.where(idf < 0, EPSILON * float(idf.mean()), idf)
+
+    # Publicacion atomica: los arreglos van a un subdirectorio nuevo y
+    # meta.json (reemplazado con os.replace al final) apunta a el. Un proceso
+    # que abre el indice a media construccion ve la version anterior completa,
+    # nunca arreglos de una version con meta.json de otra.
+    os.makedirs(out_dir, exist_ok=True)
+    version = tempfile.mkdtemp(prefix="v-", dir=out_dir)
+    np.save(os.path.join(version, "indptr.npy"), indptr)
+    np.save(os.path.join(version, "doc_ids.npy"), np.asarray(doc_ids, dtype=np.int32))
+    np.save(os.path.join(version, "tf.npy"), np.asarray(tfs, dtype=np.float32))
+    np.save(os.path.join(version, "idf.npy"), idf.astype(np.float32))
+    np.save(os.path.join(version, "doc_len.npy"), np.asarray([len(t) for t in doc_terms], dtype=np.float32))
+    np.save(os.path.join(version, "vectors.npy"), np.stack([_hashed_vector(t) for t in doc_terms]))
+    meta = {
+        "vocab": vocab, "passages": passages, "k1": K1, "b": B, "hash_dim": HASH_DIM,
+        "arrays": os.path.basename(version),
+    }
+    meta_path = os.path.join(out_dir, "meta.json")
+    previous = _arrays_dir_name(meta_path)
+    fd, tmp_meta = tempfile.mkstemp(prefix=".meta-", suffix=".json", dir=out_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path)
+    _prune_versions(out_dir, keep={os.path.basename(version), previous})
+    log.info("📚 Indice FAQ: %s pasajes, %s terminos -> %s", n_docs, len(vocab), out_dir)
+    return {"passages": n_docs, "terms": len(vocab)}
+
+
+def _arrays_dir_name(meta_path: str) -> Optional[str]:
+    try:
+        with open(meta_path, encoding="utf-8") as fh:
+            return json.load(fh).get("arrays")
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_versions(out_dir: str, keep: Iterable[Optional[str]]) -> None:
+    # Se conserva la version anterior: un proceso que ya leyo el meta.json
+    # viejo aun puede abrir sus arreglos. Los que ya estan mapeados siguen
+    # validos aunque se borren (el SO libera el archivo al desmapear).
+    keep = {name for name in keep if name}
+    for name in os.listdir(out_dir):
+        if name.startswith("v-") and name not in keep:
+            shutil.rmtree(os.path.join(out_dir, name), ignore_errors=True)
+
+
+def build_from_dir(src_dir: str, out_dir: str) -> Dict[str, Any]:
+    documents = []
+    for root, _dirs, files in os.walk(src_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(out_dir)):
+            continue
+        for name in sorted(files):
+            if name.lower().endswith((".pdf", ".md", ".txt")):
+                path = os.path.join(root, name)
+                documents.append((os.path.relpath(path, src_dir), read_source(path)))
+    return build_index(documents, out_dir)
+
+
+def _source_mtimes(src_dir: str, out_dir: str) -> Iterable[float]:
+    for root, _dirs, files in os.walk(src_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(out_dir)):
+            continue
+        for name in files:
+            if name.lower().endswith((".pdf", ".md", ".txt")):
+                yield os.path.getmtime(os.path.join(root, name))
+
+
+def ensure_index(src_dir: str, out_dir: str) -> bool:
+    """Construye el indice si no existe o alguna fuente es mas nueva.
+    True si se construyo; un error se registra y el bot sigue sin RAG."""
+    meta_path = os.path.join(out_dir, "meta.json")
+    try:
+        built_at = os.path.getmtime(meta_path) if os.path.exists(meta_path) else None
+        newest = max(_source_mtimes(src_dir, out_dir), default=None) if os.path.isdir(src_dir) else None
+        if newest is None or (built_at is not None and built_at >= newest):
+            return False
+        build_from_dir(src_dir, out_dir)
+        return True
+    except Exception:
+        log.exception("⚠️ No fue posible construir el indice FAQ %s", out_dir)
+        return False
+
+
+# ==========================
+# Consulta (runtime)
+# ==========================
+class Passage(NamedTuple):
+    text: str
+    source: str
+    score: float  # BM25 + re-rank, solo para ordenar
+    coverage: float  # fraccion de la pregunta (por idf) presente; en [0, 1]
+
+
+class RetrievalIndex:
+    """Indice ya construido, abierto con mmap. search() no escribe nada."""
+
+    def __init__(self, index_dir: str) -> None:
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        # Indices construidos antes del versionado tienen los .npy junto al meta.
+        arrays_dir = os.path.join(index_dir, meta.get("arrays") or "")
+
+        def _load(name: str) -> np.ndarray:
+            return np.load(os.path.join(arrays_dir, name), mmap_mode="r")
+
+        self.index_dir = index_dir
+        self.vocab: Dict[str, int] = meta["vocab"]
+        self.passages: List[Dict[str, str]] = meta["passages"]
+        self.k1 = float(meta.get("k1", K1))
+        self.b = float(meta.get("b", B))
+        self.indptr = _load("indptr.npy")
+        self.doc_ids = _load("doc_ids.npy")
+        self.tf = _load("tf.npy")
+        self.idf = _load("idf.npy")
+        self.doc_len = _load("doc_len.npy")
+        self.vectors = _load("vectors.npy")
+        self._norm_len = self.k1 * (1 - self.b + self.b * self.doc_len / float(self.doc_len.mean()))
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def bm25(self, terms: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Puntaje BM25 por pasaje y la fraccion (ponderada por idf) de los
+        terminos de la pregunta que aparecen en cada pasaje."""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        matched = np.zeros(len(self.passages), dtype=np.float32)
+        max_idf = float(self.idf.max()) if len(self.idf) else 1.0
+        total = 0.0
+        seen = set()
+        for term in terms:
+            term_id = self.vocab.get(term)
+            first = term not in seen
+            seen.add(term)
+            if term_id is None:
+                total += max_idf if first else 0.0  # ningun pasaje lo tiene: baja la cobertura
+                continue
+            idf = float(self.idf[term_id])
+            lo, hi = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            docs = self.doc_ids[lo:hi]
+            tf = self.tf[lo:hi]
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm_len[docs])
+            if first:
+                total += idf
+                matched[docs] += idf
+        return scores, (matched / total if total > 0 else matched)
+
+    def search(self, query: str, k: int = 3, candidates: int = 20, rerank_weight: float = 0.3) -> List[Passage]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        scores, coverage = self.bm25(terms)
+        top = float(scores.max()) if scores.size else 0.0
+        if top <= 0:
+            return []
+        n = min(candidates, int(np.count_nonzero(scores)))
+        cand = np.argpartition(-scores, n - 1)[:n]
+        similarity = self.vectors[cand] @ _hashed_vector(terms)
+        final = (1 - rerank_weight) * scores[cand] / top + rerank_weight * similarity
+        order = np.argsort(-final)[:k]
+        return [
+            Passage(
+                self.passages[int(cand[i])]["text"],
+                self.passages[int(cand[i])]["source"],
+                float(final[i]),
+                float(coverage[int(cand[i])]),
+            )
+            for i in order
+        ]
+
+
+_default_index: Optional[RetrievalIndex] = None
+_default_loaded = False
+
+
+def load_index(index_dir: str) -> Optional[RetrievalIndex]:
+    """Abre el indice del directorio (una vez por proceso). None si no hay
+    indice construido o esta corrupto: el bot sigue sin RAG. Un error al
+    abrirlo no se memoriza: la siguiente consulta lo reintenta."""
+    global _default_index, _default_loaded
+    if _default_loaded:
+        return _default_index
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        _default_loaded = True
+        log.info("📚 Sin indice FAQ en %s; fallback sin recuperacion local", index_dir)
+        return None
+    try:
+        _default_index = RetrievalIndex(index_dir)
+        _default_loaded = True
+        log.info("📚 Indice FAQ cargado (mmap): %s pasajes", len(_default_index))
+    except Exception:
+        log.exception("⚠️ No fue posible abrir el indice FAQ %s", index_dir)
+        _default_index = None
+    return _default_index
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Indice BM25 local de FAQ/PDFs de producto")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    build = sub.add_parser("build", help="construye el indice desde un directorio de .pdf/.md/.txt")
+    build.add_argument("--src", default="knowledge")
+    build.add_argument("--out", default=os.path.join("knowledge", "index"))
+    query = sub.add_parser("query", help="consulta el indice construido")
+    query.add_argument("text")
+    query.add_argument("--index", default=os.path.join("knowledge", "index"))
+    query.add_argument("-k", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        print(json.dumps(build_from_dir(args.src, args.out)))
+        return
+    for passage in RetrievalIndex(args.index).search(args.text, k=args.k):
+        print(f"[{passage.score:.3f} cov={passage.coverage:.2f}] {passage.source}: {passage.text[:160]}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,186 @@
+# integrations_google.py — clientes de Sheets y Drive perezosos y cacheados
+# ------------------------------------------------------------
+# app.py importaba googleapiclient y llamaba build("sheets"/"drive") al
+# importar: credenciales, parseo de los documentos de discovery y el import
+# del SDK corrian antes de poder responder el primer webhook (cold start en
+# Render) y en cada modulo de tests que importa app.
+# Aqui, al importar solo se valida que haya credenciales (json.loads) y que
+# el SDK este instalado (find_spec, sin importarlo). El SDK, las credenciales
+# y cada servicio se crean una sola vez, en el primer uso, bajo lock.
+# Discovery siempre estatico: el documento que trae googleapiclient
+# (static_discovery=True) o uno propio en GOOGLE_DISCOVERY_DIR
+# (<api>.<version>.json, via build_from_document). Nunca se descarga.
+# LazyService deja que app.py siga usando `sheets_svc.spreadsheets()`.
+# SheetSnapshot cachea una lectura completa de rango con TTL (hoja de leads,
+# ENVIO_STATUS) para que el warm-up la deje cargada y los turnos no relean
+# la hoja entera cada vez.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+log = logging.getLogger("vicky-secom.google")
+
+DEFAULT_SCOPES = (
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+)
+
+
+class GoogleUnavailable(RuntimeError):
+    """No hay credenciales/SDK, o crear el cliente fallo (no se reintenta)."""
+
+
+def sdk_available() -> bool:
+    return importlib.util.find_spec("googleapiclient") is not None
+
+
+class GoogleServices:
+    """Credenciales y servicios de Google creados en el primer uso."""
+
+    def __init__(
+        self,
+        credentials_json: str,
+        scopes: Sequence[str] = DEFAULT_SCOPES,
+        discovery_dir: str = "",
+        on_failure: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        self.scopes = list(scopes)
+        self.discovery_dir = discovery_dir
+        self.on_failure = on_failure
+        self._lock = threading.Lock()
+        self._info: Optional[Dict[str, Any]] = None
+        self._credentials: Any = None
+        self._services: Dict[str, Any] = {}
+        self._error: Optional[str] = None
+        if credentials_json:
+            try:
+                self._info = json.loads(credentials_json)
+            except ValueError:
+                log.exception("❌ GOOGLE_CREDENTIALS_JSON no es un JSON valido")
+        self.configured = bool(self._info) and sdk_available()
+
+    def sheets(self) -> Any:
+        return self._service("sheets", "v4")
+
+    def drive(self) -> Any:
+        return self._service("drive", "v3")
+
+    def media_upload(self, data: bytes, mime_type: str) -> Any:
+        from googleapiclient.http import MediaIoBaseUpload
+
+        return MediaIoBaseUpload(io.BytesIO(data), mimetype=mime_type, resumable=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"configured": self.configured, "built": sorted(self._services), "error": self._error}
+
+    def _service(self, api: str, version: str) -> Any:
+        service = self._services.get(api)
+        if service is not None:
+            return service
+        with self._lock:
+            service = self._services.get(api)
+            if service is not None:
+                return service
+            if self._error:
+                raise GoogleUnavailable(self._error)
+            if not self.configured:
+                raise GoogleUnavailable("Google no configurado (credenciales o SDK faltantes)")
+            try:
+                service = self._build(api, version)
+            except Exception as exc:
+                self._error = f"{api}.{version}: {type(exc).__name__}: {exc}"
+                log.exception("❌ No fue posible crear el cliente %s %s. Modo mínimo activo.", api, version)
+                if self.on_failure:
+                    self.on_failure(exc)
+                raise GoogleUnavailable(self._error) from exc
+            self._services[api] = service
+        log.info("✅ Cliente Google %s %s listo", api, version)
+        return service
+
+    def _build(self, api: str, version: str) -> Any:
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build, build_from_document
+
+        if self._credentials is None:
+            self._credentials = service_account.Credentials.from_service_account_info(self._info, scopes=self.scopes)
+        doc_path = os.path.join(self.discovery_dir, f"{api}.{version}.json") if self.discovery_dir else ""
+        if doc_path and os.path.exists(doc_path):
+            with open(doc_path, encoding="utf-8") as fh:
+                return build_from_document(fh.read(), credentials=self._credentials)
+        return build(api, version, credentials=self._credentials, static_discovery=True, cache_discovery=False)
+
+
+class LazyService:
+    """Proxy del servicio: el primer acceso a un atributo crea el cliente."""
+
+    __slots__ = ("_factory",)
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory(), name)
+
+
+class SheetSnapshot:
+    """Ultima lectura de `loader()` valida por `ttl_s` segundos. Una sola
+    recarga a la vez; ttl_s <= 0 desactiva el cache (siempre lee)."""
+
+    def __init__(self, ttl_s: float, loader: Callable[[], Any]) -> None:
+        self.ttl_s = float(ttl_s)
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self.hits = 0
+        self.loads = 0
+
+    def get(self) -> Any:
+        if self.ttl_s <= 0:
+            return self._loader()
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_s:
+                self.hits += 1
+                return self._value
+            return self._load()
+
+    def prime(self) -> Any:
+        """Fuerza una lectura (warm-up), aunque el cache este desactivado."""
+        with self._lock:
+            return self._load()
+
+    def refresh(self, min_age_s: float = 0.0) -> Any:
+        """Relee salvo que la lectura vigente tenga menos de `min_age_s`
+        (una rafaga de misses concurrentes comparte una sola relectura)."""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < min_age_s:
+                self.hits += 1
+                return self._value
+            return self._load()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._value = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+            return {"ttl_s": self.ttl_s, "age_s": round(age, 1) if age is not None else None, "hits": self.hits, "loads": self.loads}
+
+    def _load(self) -> Any:
+        value = self._loader()
+        self.loads += 1
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
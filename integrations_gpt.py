@@ -1,4 +1,40 @@
-from config_env import OPENAI_API_KEY, GPT_MODEL
+# integrations_gpt.py — cliente OpenAI compartido, limite de concurrencia y cache
+# ------------------------------------------------------------
+# Antes cada llamada construia un OpenAI() nuevo (conexiones HTTP nuevas,
+# handshake TLS incluido) y la ruta "sgpt:" de app.py usaba la API de modulo
+# sin tope de peticiones simultaneas. Aqui:
+#   - un solo cliente por API key, creado la primera vez y reutilizado (su
+#     pool de conexiones se conserva entre llamadas);
+#   - un semaforo limita las completions en vuelo; si no hay lugar en
+#     GPT_QUEUE_TIMEOUT_S se responde "ocupado" en vez de encolar sin fin;
+#   - cache LRU con TTL por prompt normalizado (minusculas, sin acentos ni
+#     signos sueltos): la misma pregunta de FAQ no cuesta otro round trip.
+# ask_gpt consulta antes el indice FAQ local (core_retrieval): si un pasaje
+# cubre la pregunta responde con el sin llamar a OpenAI; si no, manda solo
+# los pasajes top como contexto para una respuesta aterrizada. app.py lo usa
+# en la ruta "sgpt:" y faq_answer (solo local) en el fallback de texto libre.
+# ------------------------------------------------------------
+
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config_env import (
+    FAQ_CONTEXT_PASSAGES,
+    FAQ_INDEX_DIR,
+    FAQ_LOCAL_MIN_COVERAGE,
+    GPT_CACHE_SIZE,
+    GPT_CACHE_TTL_S,
+    GPT_MAX_CONCURRENCY,
+    GPT_MODEL,
+    GPT_QUEUE_TIMEOUT_S,
+    GPT_TIMEOUT_S,
+    OPENAI_API_KEY,
+)
+from core_intents import normalize_text
+from core_retrieval import Passage, load_index
 from utils_logger import get_logger
 
 log = get_logger("gpt")
@@ -21,22 +57,186 @@ _system_prompt = (
     "no compares negativamente con otras aseguradoras."
 )
 
-def ask_gpt(prompt: str, max_tokens: int = 300) -> str:
-    if not OPENAI_API_KEY:
+
+class GPTBusy(RuntimeError):
+    """No hubo lugar en el limite de concurrencia dentro del tiempo de espera."""
+
+
+class _TTLCache:
+    """LRU acotado con expiracion por entrada."""
+
+    def __init__(self, maxsize: int, ttl_s: float) -> None:
+        self.maxsize = max(0, int(maxsize))
+        self.ttl_s = float(ttl_s)
+        self._data: "OrderedDict[Tuple[Any, ...], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Tuple[Any, ...], value: str) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+_inflight = threading.BoundedSemaphore(max(1, GPT_MAX_CONCURRENCY))
+_inflight_count = 0
+_inflight_lock = threading.Lock()
+_cache = _TTLCache(GPT_CACHE_SIZE, GPT_CACHE_TTL_S)
+
+
+def sdk_available() -> bool:
+    """El paquete openai esta instalado (sin importarlo: se importa en el
+    primer _get_client)."""
+    return importlib.util.find_spec("openai") is not None
+
+
+def _get_client(api_key: str) -> Any:
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI(api_key=api_key, timeout=GPT_TIMEOUT_S, max_retries=1)
+            _clients[api_key] = client
+        return client
+
+
+def _cache_key(prompt: str, system: Optional[str], model: str, temperature: float, max_tokens: Optional[int]) -> Tuple[Any, ...]:
+    question = normalize_text(prompt).strip(" ¿?¡!.,;:")
+    return (model, system or "", round(float(temperature), 2), max_tokens, question)
+
+
+def complete(
+    prompt: str,
+    system: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: float = 0.6,
+    max_tokens: Optional[int] = None,
+    api_key: Optional[str] = None,
+) -> str:
+    """Texto de la completion (cacheado). Lanza GPTBusy si no hay lugar y
+    deja pasar los errores de OpenAI para que el llamador decida el mensaje."""
+    global _inflight_count
+    model = model or GPT_MODEL
+    key = _cache_key(prompt, system, model, temperature, max_tokens)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not _inflight.acquire(timeout=GPT_QUEUE_TIMEOUT_S):
+        raise GPTBusy(f"{GPT_MAX_CONCURRENCY} completions en vuelo")
+    try:
+        with _inflight_lock:
+            _inflight_count += 1
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        kwargs: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        resp = _get_client(api_key or OPENAI_API_KEY).chat.completions.create(**kwargs)
+        answer = (resp.choices[0].message.content or "").strip()
+    finally:
+        with _inflight_lock:
+            _inflight_count -= 1
+        _inflight.release()
+    if answer:
+        _cache.put(key, answer)
+    return answer
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "clients": len(_clients),
+        "inflight": _inflight_count,
+        "max_concurrency": GPT_MAX_CONCURRENCY,
+        "cache_entries": len(_cache),
+        "cache_hits": _cache.hits,
+        "cache_misses": _cache.misses,
+    }
+
+
+def faq_passages(prompt: str) -> List[Passage]:
+    index = load_index(FAQ_INDEX_DIR)
+    if index is None:
+        return []
+    try:
+        return index.search(prompt, k=max(1, FAQ_CONTEXT_PASSAGES))
+    except Exception:
+        log.exception("Error consultando indice FAQ")
+        return []
+
+
+def _local_answer(passage: Passage) -> str:
+    # Los pasajes de FAQ empiezan con la pregunta; se responde solo lo demas.
+    question, sep, answer = passage.text.partition("? ")
+    return answer.strip() if sep and len(question) < 160 and answer.strip() else passage.text
+
+
+def _grounded_system_prompt(passages: List[Passage]) -> str:
+    context = "\n".join(f"- {p.text}" for p in passages)[:1500]
+    return (
+        f"{_system_prompt} "
+        "Usa esta informacion de COHIFIS si responde la pregunta:\n"
+        f"{context}"
+    )
+
+
+def _covered_answer(passages: List[Passage]) -> Optional[str]:
+    if passages and passages[0].coverage >= FAQ_LOCAL_MIN_COVERAGE:
+        log.info("Respuesta desde FAQ local (%s, cobertura %.2f)", passages[0].source, passages[0].coverage)
+        return _local_answer(passages[0])
+    return None
+
+
+def faq_answer(prompt: str) -> Optional[str]:
+    """Respuesta del indice FAQ local si un pasaje cubre la pregunta; None si
+    no hay indice o ningun pasaje alcanza FAQ_LOCAL_MIN_COVERAGE."""
+    return _covered_answer(faq_passages(prompt))
+
+
+def ask_gpt(prompt: str, max_tokens: int = 300, api_key: Optional[str] = None) -> str:
+    passages = faq_passages(prompt)
+    local = _covered_answer(passages)
+    if local is not None:
+        return local
+    api_key = api_key or OPENAI_API_KEY
+    if not api_key:
         return "Escribe *menu* para ver las opciones disponibles."
+    system = _grounded_system_prompt(passages) if passages else _system_prompt
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        resp = client.chat.completions.create(
-            model=GPT_MODEL,
-            messages=[
-                {"role": "system", "content": _system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.6,
-            max_tokens=max_tokens,
-        )
-        return resp.choices[0].message.content.strip()
+        return complete(prompt, system=system, temperature=0.6, max_tokens=max_tokens, api_key=api_key)
+    except GPTBusy:
+        log.warning("GPT ocupado; se responde sin completion")
+        return "En este momento tengo muchas consultas. Escribe *menu* para ver opciones."
     except Exception as e:
         log.exception("Error GPT: %s", e)
         return "No pude procesar tu consulta. Escribe *menu* para ver opciones."
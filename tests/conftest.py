@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+from workers_delivery_tracker import DeliveryTracker
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    # Los breakers son estado de modulo: los tests que simulan caidas de
+    # Boardroom/Graph no deben dejar un circuito abierto para el siguiente.
+    vicky._breakers.reset()
+    yield
+    vicky._breakers.reset()
+
+
+@pytest.fixture(autouse=True)
+def isolated_local_db(tmp_path):
+    # Scheduler y outbox escriben en VICKY_DB_PATH: cada test usa su propio
+    # SQLite y se detienen los threads que haya creado.
+    with patch.object(vicky, "VICKY_DB_PATH", str(tmp_path / "vicky_test.sqlite3")), \
+         patch.object(vicky, "_job_scheduler", None), \
+         patch.object(vicky, "_bus_outbox", None):
+        yield
+        for worker in (vicky._job_scheduler, vicky._bus_outbox):
+            if worker is not None:
+                worker.stop(timeout=1.0)
+
+
+@pytest.fixture(autouse=True)
+def reset_sheet_caches():
+    # Lecturas cacheadas de Sheets/Drive: cada test parte sin datos previos.
+    vicky._leads_snapshot.invalidate()
+    vicky._envio_status_snapshot.invalidate()
+    vicky._drive_folder_ids.clear()
+    yield
+    vicky._leads_snapshot.invalidate()
+    vicky._envio_status_snapshot.invalidate()
+    vicky._drive_folder_ids.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_delivery_tracker():
+    # El tracker de entregas guarda wamids y la ultima plantilla por telefono.
+    tracker = DeliveryTracker(vicky._append_envio_status_rows, vicky._write_delivery_to_leads,
+                              normalize_phone=vicky._normalize_phone_last10)
+    with patch.object(vicky, "_delivery", tracker):
+        yield tracker
+    tracker.stop(timeout=1.0)
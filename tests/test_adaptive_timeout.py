@@ -0,0 +1,67 @@
+from unittest.mock import Mock, patch
+
+import requests
+
+import app as vicky
+from utils_latency import LatencyRegistry, LatencyTracker
+
+
+def test_default_timeout_until_enough_samples():
+    tracker = LatencyTracker(min_samples=5, default_s=3.0)
+    for _ in range(4):
+        tracker.record(0.2)
+    assert tracker.timeout() == 3.0
+    tracker.record(0.2)
+    assert tracker.timeout() < 1.0
+
+
+def test_timeout_is_percentile_plus_margin_within_bounds():
+    tracker = LatencyTracker(percentile=0.9, margin_s=0.5, floor_s=0.8, ceiling_s=4.0, min_samples=10)
+    for _ in range(10):
+        tracker.record(0.1)
+    assert tracker.timeout() == 0.8            # piso
+    for _ in range(10):
+        tracker.record(2.0)
+    assert 2.5 <= tracker.timeout() <= 2.9      # p90 ~2 s (bucket) + margen
+    for _ in range(20):
+        tracker.record(30.0)
+    assert tracker.timeout() == 4.0            # techo
+
+
+def test_window_forgets_old_samples_and_reports_percentiles():
+    tracker = LatencyTracker(window=10, min_samples=1)
+    for _ in range(10):
+        tracker.record(5.0, timed_out=True)
+    for _ in range(10):
+        tracker.record(0.05)
+    snap = tracker.snapshot()
+    assert snap["samples"] == 10 and snap["timeouts"] == 10
+    assert 0.05 <= snap["p99"] < 0.06
+    assert snap["p50"] <= snap["p90"] <= snap["p95"] <= snap["p99"]
+
+
+def test_boardroom_request_uses_endpoint_timeout_and_records_latency():
+    registry = LatencyRegistry(min_samples=1, floor_s=0.5, margin_s=0.0)
+    url = "https://boardroom.example.com/bus/event"
+    registry.get(url).record(0.1)
+    ok = Mock(status_code=200, text="")
+    with patch.object(vicky, "_latency", registry), \
+         patch.object(vicky, "BUS_URL", "https://boardroom.example.com"), \
+         patch.object(vicky, "BUS_INTERNAL_TOKEN", "tok"), \
+         patch.object(vicky, "_BUS_ACTIVE", True), \
+         patch.object(vicky.requests, "post", return_value=ok) as post:
+        vicky._request_boardroom_instruction({"event_id": "evt-1"})
+        assert post.call_args.kwargs["timeout"] == 0.5
+        with patch.object(vicky.requests, "post", side_effect=requests.exceptions.Timeout()):
+            assert vicky._request_boardroom_instruction({"event_id": "evt-2"}) == (None, "timeout")
+
+    snap = registry.snapshot()[url]
+    assert (snap["samples"], snap["timeouts"]) == (3, 1)
+
+
+def test_health_reports_latency_percentiles():
+    registry = LatencyRegistry()
+    registry.get("https://boardroom.example.com/decision").record(0.3)
+    with patch.object(vicky, "_latency", registry):
+        body = vicky.app.test_client().get("/ext/health").get_json()
+    assert set(body["boardroom_latency"]["https://boardroom.example.com/decision"]) >= {"p50", "p95", "timeout_s"}
@@ -0,0 +1,43 @@
+import pytest
+
+import app as vicky
+from utils_amounts import parse_amount
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("8500", 8500.0),
+        ("$8,500", 8500.0),
+        ("$ 120,000.50 MXN", 120000.5),
+        ("1.500.000", 1500000.0),
+        ("tengo 45 años", 45.0),
+        ("500 mil", 500000.0),
+        ("1.5 millones", 1500000.0),
+        ("1,5 millones", 1500000.0),
+        ("ocho mil quinientos", 8500.0),
+        ("8 mil 500", 8500.0),
+        ("dos millones trescientos mil", 2300000.0),
+        ("Un Millón de pesos", 1000000.0),
+        ("treinta y cinco", 35.0),
+        ("quiero un préstamo de 100 mil", 100000.0),
+        ("100k", 100000.0),
+        ("tengo dos hijos y 40 años", 40.0),
+        ("tengo dos hijos y gano quince mil pesos", 15000.0),
+        ("dos hijos", 2.0),
+        ("entre 50 y 100 mil", 50.0),
+        ("1 y 2 millones", 1.0),
+        ("8,500 y 9000", 8500.0),
+        ("cincuenta y cinco mil", 55000.0),
+        ("hola", None),
+        ("", None),
+    ],
+)
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+def test_extract_number_feeds_funnel_validation():
+    assert vicky.extract_number("ciento veinte mil") == 120000.0
+    assert vicky._parse_emp_monto("150 mil", {}) == 150000.0
+    assert vicky._parse_edad("un auto", {}) is vicky.INVALID
@@ -0,0 +1,87 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+
+
+PHONE = "5216681234567"
+OK_BODY = {
+    "status": "ok",
+    "instruction_id": "instr-1",
+    "event_id": "evt-1",
+    "instruction": {"type": "send_message", "message": "Respuesta Boardroom"},
+}
+
+
+def _payload(text):
+    message = {"from": PHONE, "id": "wamid.hedge", "type": "text", "text": {"body": text}}
+    return {"entry": [{"changes": [{"value": {"messages": [message]}}]}]}
+
+
+def _slow(value, delay=0.2):
+    def call(*_args, **_kwargs):
+        time.sleep(delay)
+        return value
+    return call
+
+
+@pytest.fixture(autouse=True)
+def fallback_mode():
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+    with patch.object(vicky, "SECOM_LOCAL_FALLBACK_ENABLED", True), \
+         patch.object(vicky, "match_client_in_sheets", return_value=None), \
+         patch.object(vicky, "append_respuesta_cliente"), \
+         patch.object(vicky, "_notify_advisor"):
+        yield
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+
+
+def test_fallback_reads_run_in_parallel_with_boardroom():
+    with patch.object(vicky, "_request_boardroom_instruction", side_effect=_slow((None, "timeout"))), \
+         patch.object(vicky, "get_last_envio_template", side_effect=_slow("promo_tpv")) as last_tpl, \
+         patch.object(vicky, "send_message", return_value=True) as send_message:
+        started = time.monotonic()
+        rv = vicky.app.test_client().post("/webhook", json=_payload("info"))
+        elapsed = time.monotonic() - started
+
+    assert rv.status_code == 200
+    assert elapsed < 0.35  # max(Boardroom, Sheets), no la suma
+    last_tpl.assert_called_once()
+    assert vicky.user_state[PHONE] == "tpv_giro"
+    send_message.assert_called_once()
+
+
+def test_handled_outcome_discards_plan_and_keeps_single_response_owner():
+    with patch.object(vicky, "_request_boardroom_instruction", return_value=(OK_BODY, None)), \
+         patch.object(vicky, "get_last_envio_template", return_value="promo_tpv"), \
+         patch.object(vicky, "_confirm_boardroom_execution"), \
+         patch.object(vicky, "send_message", return_value=True) as send_message:
+        vicky.app.test_client().post("/webhook", json=_payload("info"))
+
+    send_message.assert_called_once_with(PHONE, "Respuesta Boardroom")
+    assert vicky.user_state.get(PHONE) != "tpv_giro"
+
+
+def test_no_prefetch_thread_when_fallback_needs_no_reads():
+    with patch.object(vicky, "_request_boardroom_instruction", return_value=(None, "timeout")), \
+         patch.object(vicky._hedge_pool, "submit") as submit, \
+         patch.object(vicky, "send_message", return_value=True), \
+         patch.object(vicky, "send_main_menu"):
+        vicky.app.test_client().post("/webhook", json=_payload("hola"))
+
+    submit.assert_not_called()
+
+
+def test_failed_prefetch_falls_back_to_inline_read():
+    with patch.object(vicky, "_request_boardroom_instruction", return_value=(None, "timeout")), \
+         patch.object(vicky, "_prepare_fallback_plan", side_effect=RuntimeError("sheets")), \
+         patch.object(vicky, "get_last_envio_template", return_value="promo_tpv") as last_tpl, \
+         patch.object(vicky, "send_message", return_value=True):
+        vicky.app.test_client().post("/webhook", json=_payload("info"))
+
+    last_tpl.assert_called_once()
+    assert vicky.user_state[PHONE] == "tpv_giro"
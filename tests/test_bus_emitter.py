@@ -0,0 +1,107 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+import app as vicky
+from workers_bus_emitter import BusEmitter
+
+
+PHONE = "5216681234567"
+
+
+def _session(status_code=200, side_effect=None):
+    session = Mock()
+    session.post.return_value = Mock(status_code=status_code)
+    if side_effect is not None:
+        session.post.side_effect = side_effect
+    return session
+
+
+def test_submit_delivers_through_pooled_session_with_fixed_workers():
+    session = _session()
+    emitter = BusEmitter(workers=2, session=session)
+    for i in range(20):
+        assert emitter.submit("https://bus.example.com/bus/event", {"n": i}, label=str(i))
+    assert emitter.flush()
+
+    stats = emitter.stats()
+    assert stats["sent"] == 20 and stats["failed"] == 0
+    assert stats["workers_alive"] == 2
+    assert session.post.call_count == 20
+    assert len([t for t in threading.enumerate() if t.name.startswith("BusEmitter")]) >= 2
+    emitter.stop()
+
+
+def test_overflow_drop_newest_rejects_and_counts():
+    gate = threading.Event()
+    session = _session(side_effect=lambda *a, **kw: gate.wait(2) and Mock(status_code=200))
+    emitter = BusEmitter(workers=1, max_queue=2, overflow="drop_newest", session=session)
+
+    results = [emitter.submit("u", {"n": i}) for i in range(6)]
+    gate.set()
+    assert emitter.flush()
+    stats = emitter.stats()
+    assert results.count(False) == stats["dropped_overflow"] >= 1
+    assert stats["sent"] == results.count(True)
+    emitter.stop()
+
+
+def test_overflow_drop_oldest_keeps_newest_events():
+    emitter = BusEmitter(workers=1, max_queue=2, overflow="drop_oldest", session=_session())
+    with patch.object(emitter, "_ensure_started"):  # sin workers: la cola solo se llena
+        for i in range(5):
+            assert emitter.submit("u", {"n": i})
+    assert [item.payload["n"] for item in emitter._queue] == [3, 4]
+    assert emitter.stats()["dropped_overflow"] == 3
+
+
+def test_micro_batching_groups_events_for_batch_url():
+    session = _session()
+    emitter = BusEmitter(workers=1, batch_max=10, batch_wait_s=0.2, session=session)
+    with patch.object(emitter, "_ensure_started"):
+        for i in range(4):
+            emitter.submit("https://bus/event", {"n": i}, batch_url="https://bus/batch")
+    with emitter._cond:  # arrancar el worker con los 4 eventos ya encolados
+        emitter._ensure_started()
+    assert emitter.flush()
+
+    session.post.assert_called_once()
+    args, kwargs = session.post.call_args
+    assert args[0] == "https://bus/batch"
+    assert [e["n"] for e in kwargs["json"]["events"]] == [0, 1, 2, 3]
+    assert emitter.stats()["batches"] == 1
+    emitter.stop()
+
+
+def test_failed_posts_are_counted_not_raised():
+    emitter = BusEmitter(workers=1, session=_session(side_effect=RuntimeError("bus caido")))
+    emitter.submit("u", {})
+    emitter.submit("u", {})
+    assert emitter.flush()
+    assert emitter.stats()["failed"] == 2
+    emitter.stop()
+
+
+def test_observation_and_legacy_events_go_through_emitter_without_new_threads():
+    # Con el outbox durable apagado, el emisor en memoria es el camino directo.
+    emitter = Mock()
+    with patch.object(vicky, "_bus_emitter", emitter), \
+         patch.object(vicky, "BUS_OUTBOX_ENABLED", False), \
+         patch.object(vicky, "BUS_URL", "https://boardroom.example.com"), \
+         patch.object(vicky, "BUS_INTERNAL_TOKEN", "tok"), \
+         patch.object(vicky, "_BUS_ACTIVE", True), \
+         patch.object(vicky.threading, "Thread") as thread_cls:
+        msg = {"id": "wamid.1", "type": "text", "text": {"body": "hola"}}
+        vicky._emit_boardroom_observation(PHONE, msg, None, "text", "hola")
+        vicky._emit_bus_event(PHONE, "hola")
+
+    thread_cls.assert_not_called()
+    urls = [c.args[0] for c in emitter.submit.call_args_list]
+    assert urls == ["https://boardroom.example.com/bus/event", "https://boardroom.example.com"]
+    assert emitter.submit.call_args_list[0].args[1]["text"] == "hola"
+
+
+def test_health_exposes_emitter_counters():
+    rv = vicky.app.test_client().get("/ext/health")
+    assert {"submitted", "sent", "dropped_overflow", "queued"} <= set(rv.get_json()["bus_emitter"])
@@ -0,0 +1,148 @@
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+import app as vicky
+from workers_outbox import Outbox
+
+
+PHONE = "5216681234567"
+
+
+def _session(*status_codes):
+    session = Mock()
+    session.post.side_effect = [Mock(status_code=code) for code in status_codes]
+    return session
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def _box(db_path, session, **kwargs):
+    return Outbox(db_path, headers_for=lambda kind: {"X-Kind": kind}, session=session, **kwargs)
+
+
+def test_enqueue_is_deduplicated_and_drain_delivers_once(db_path):
+    session = _session(200)
+    box = _box(db_path, session)
+    assert box.enqueue("confirm:i-1", "confirm", "https://bus/confirm", {"instruction_id": "i-1"}) is True
+    assert box.enqueue("confirm:i-1", "confirm", "https://bus/confirm", {"instruction_id": "i-1"}) is False
+
+    assert box.drain_once() == 1
+    assert box.drain_once() == 0
+    session.post.assert_called_once()
+    assert session.post.call_args.kwargs["headers"] == {"X-Kind": "confirm"}
+    assert box.stats()["counts"] == {"sent": 1}
+
+
+def test_transient_failure_is_retried_with_backoff(db_path):
+    session = _session(503, 200)
+    box = _box(db_path, session, retry_base_s=10)
+    box.enqueue("event:e-1", "observation", "https://bus/event", {"event_id": "e-1"})
+
+    assert box.drain_once() == 0
+    assert box.pending_count() == 1
+    assert box.drain_once() == 0          # aun no vence el backoff
+    assert box.drain_once(now=time.time() + 11) == 1
+    assert session.post.call_count == 2
+
+
+def test_permanent_rejection_and_exhausted_attempts_go_dead(db_path):
+    session = _session(400, 500, 500)
+    box = _box(db_path, session, max_attempts=2, retry_base_s=0)
+    box.enqueue("event:bad", "observation", "https://bus/event", {})
+    box.enqueue("event:slow", "observation", "https://bus/event", {})
+
+    box.drain_once()
+    box.drain_once()
+    assert box.stats()["counts"] == {"dead": 2}
+
+
+def test_rows_with_batch_url_are_posted_together(db_path):
+    session = _session(200)
+    box = _box(db_path, session)
+    for i in range(3):
+        box.enqueue(f"event:{i}", "observation", "https://bus/event", {"event_id": i}, batch_url="https://bus/batch")
+
+    assert box.drain_once() == 3
+    session.post.assert_called_once()
+    assert session.post.call_args.args[0] == "https://bus/batch"
+    assert [e["event_id"] for e in session.post.call_args.kwargs["json"]["events"]] == [0, 1, 2]
+
+
+def test_pending_rows_survive_restart(db_path):
+    _box(db_path, _session()).enqueue("confirm:i-2", "confirm", "https://bus/confirm", {})
+    session = _session(200)
+    assert _box(db_path, session).drain_once() == 1
+
+
+def test_row_claimed_by_another_process_is_not_posted_twice(db_path):
+    session = _session(200)
+    mine, other = _box(db_path, session), _box(db_path, _session())
+    mine.enqueue("event:e-1", "event", "https://bus/events", {})
+    real_execute = mine._conn.execute
+
+    def racing_execute(sql, *args):
+        # El otro proceso reclama la fila entre nuestro SELECT y nuestro UPDATE.
+        if sql.startswith("UPDATE bus_outbox SET status = 'sending'"):
+            other._conn.execute("UPDATE bus_outbox SET status = 'sending' WHERE dedupe_key = 'event:e-1'")
+        return real_execute(sql, *args)
+
+    with patch.object(mine, "_conn", Mock(execute=racing_execute)):
+        assert mine.drain_once() == 0
+    session.post.assert_not_called()
+
+
+def test_stale_sending_rows_are_requeued(db_path):
+    box = _box(db_path, _session(200), stale_sending_s=60)
+    box.enqueue("event:e-2", "event", "https://bus/events", {})
+    box._conn.execute("UPDATE bus_outbox SET status = 'sending', updated_at = ?", (time.time(),))
+    assert box.drain_once() == 0  # en vuelo en otro proceso vivo
+    box._conn.execute("UPDATE bus_outbox SET updated_at = 0")
+    assert box.drain_once() == 1
+
+
+def test_groups_are_posted_in_parallel_and_all_settled(db_path):
+    session = Mock()
+    session.post.return_value = Mock(status_code=200)
+    box = _box(db_path, session, workers=3)
+    for n in range(6):
+        box.enqueue(f"event:p-{n}", "event", "https://bus/events", {"n": n})
+    assert box.drain_once() == 6
+    assert box.stats()["counts"] == {"sent": 6}
+
+
+def test_database_uses_wal_without_fsync_per_insert(db_path):
+    box = _box(db_path, _session())
+    assert box._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert box._conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_open_breaker_keeps_rows_on_disk(db_path):
+    breaker = Mock()
+    breaker.allow.return_value = False
+    session = _session()
+    box = _box(db_path, session, breaker=breaker)
+    box.enqueue("event:e-2", "observation", "https://bus/event", {})
+    assert box.drain_once() == 0
+    session.post.assert_not_called()
+    assert box.pending_count() == 1
+
+
+def test_confirm_leaves_the_turn_and_is_deduplicated_by_instruction_id():
+    with patch.object(vicky, "BUS_URL", "https://boardroom.example.com"), \
+         patch.object(vicky, "BUS_INTERNAL_TOKEN", "tok"), \
+         patch.object(vicky, "_BUS_ACTIVE", True), \
+         patch.object(Outbox, "start"), \
+         patch.object(vicky.requests, "post") as post:
+        body = {"instruction_id": "instr-9"}
+        vicky._confirm_boardroom_execution(body, True, "sent", None)
+        vicky._confirm_boardroom_execution(body, True, "sent", None)
+        assert vicky._bus_headers("confirm")["Authorization"] == "Bearer tok"
+
+    post.assert_not_called()
+    stats = vicky._bus_outbox.stats()
+    assert (stats["enqueued"], stats["duplicates"]) == (1, 1)
@@ -0,0 +1,161 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+from workers_campaign_pacer import CampaignPacer
+
+
+HEADERS = ["Nombre", "WhatsApp", "ESTATUS", "LAST_MESSAGE_AT"]
+ROWS = [
+    ["Ana", "6681000001", "PENDIENTE", ""],
+    ["Beto", "6681000002", "ENVIADO_TEMPLATE", "2024-01-01T00:00:00"],
+    ["Caro", "6681000003", "", ""],
+]
+
+
+def _wait_stopped(pacer, timeout=2.0):
+    deadline = time.time() + timeout
+    while pacer.is_running() and time.time() < deadline:
+        time.sleep(0.005)
+    return pacer.status()
+
+
+@pytest.fixture
+def client():
+    vicky.app.config["TESTING"] = True
+    with vicky.app.test_client() as c:
+        yield c
+
+
+@pytest.fixture
+def auto_send_token():
+    with patch.object(vicky, "AUTO_SEND_TOKEN", "auto-secret"):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_pacer():
+    pacer = CampaignPacer(is_paused=lambda: vicky._is_campaign_paused(), pause_check_s=0)
+    with patch.object(vicky, "_campaign_pacer", pacer), \
+         patch.object(vicky, "CAMPAIGN_PACER_MAX_RATE_PER_MIN", 60000):
+        yield pacer
+        pacer.stop()
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+    vicky._consecutive_send_failures = 0
+
+
+def test_pacer_drains_until_no_pending():
+    results = iter([{"sent": True}, {"sent": False}, {"reason": "no_pending"}])
+    pacer = CampaignPacer(is_paused=lambda: False)
+    pacer.start(lambda: next(results), interval_s=0.001)
+
+    status = _wait_stopped(pacer)
+    assert status["stop_reason"] == "drained"
+    assert (status["sent"], status["failed"]) == (1, 1)
+
+
+def test_pacer_stops_on_auto_pause_and_max_sends():
+    pacer = CampaignPacer(is_paused=lambda: False)
+    pacer.start(lambda: {"sent": False, "auto_paused": True}, interval_s=0.001)
+    assert _wait_stopped(pacer)["stop_reason"] == "auto_paused"
+
+    pacer.start(lambda: {"sent": True}, interval_s=0.001, max_sends=3)
+    status = _wait_stopped(pacer)
+    assert status["stop_reason"] == "max_sends_reached"
+    assert status["sent"] == 3
+
+
+def test_pacer_respects_kill_switch_before_sending():
+    calls = []
+    pacer = CampaignPacer(is_paused=lambda: True)
+    pacer.start(lambda: calls.append(1) or {"sent": True}, interval_s=0.001)
+    assert _wait_stopped(pacer)["stop_reason"] == "paused_by_boardroom"
+    assert calls == []
+
+
+def test_pacer_paces_sends_at_interval():
+    stamps = []
+    pacer = CampaignPacer(is_paused=lambda: False)
+    pacer.start(lambda: stamps.append(time.monotonic()) or {"sent": True}, interval_s=0.05, max_sends=3)
+    _wait_stopped(pacer)
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert len(gaps) == 2 and all(g >= 0.04 for g in gaps)
+
+
+def test_start_endpoint_requires_token_and_template(client, auto_send_token):
+    assert client.post("/ext/campaign/pacer/start", json={"template": "promo_vrim"}).status_code == 401
+    resp = client.post("/ext/campaign/pacer/start", json={}, headers={"X-AUTO-TOKEN": "auto-secret"})
+    assert resp.status_code == 400
+    assert resp.get_json()["reason"] == "template_required_for_business_initiated_message"
+
+
+def test_start_endpoint_refuses_when_campaign_paused(client, auto_send_token):
+    with patch.object(vicky, "_is_campaign_paused", return_value=True):
+        resp = client.post(
+            "/ext/campaign/pacer/start",
+            json={"template": "promo_vrim"},
+            headers={"X-AUTO-TOKEN": "auto-secret"},
+        )
+    assert resp.status_code == 409
+
+
+def test_pacer_endpoint_sends_all_pending_without_per_message_sheet_reads(client, auto_send_token, fresh_pacer):
+    with patch.object(vicky, "_is_campaign_paused", return_value=False), \
+         patch.object(vicky, "_sheet_get_rows", return_value=(HEADERS, ROWS)) as get_rows, \
+         patch.object(vicky, "_read_lead_row", side_effect=lambda row: ROWS[row - 2]) as read_row, \
+         patch.object(vicky, "send_template_message", return_value=True) as send_template, \
+         patch.object(vicky, "_update_row_cells") as update_row:
+        resp = client.post(
+            "/ext/campaign/pacer/start",
+            json={"template": "promo_vrim", "rate_per_minute": 60000},
+            headers={"X-AUTO-TOKEN": "auto-secret"},
+        )
+        assert resp.status_code == 202
+        assert resp.get_json()["pending"] == 2
+        status = _wait_stopped(fresh_pacer)
+
+    assert status["stop_reason"] == "drained"
+    assert status["sent"] == 2
+    assert [c.args[0] for c in send_template.call_args_list] == ["5216681000001", "5216681000003"]
+    assert [c.args[0] for c in update_row.call_args_list] == [2, 4]
+    # snapshot inicial + una relectura para confirmar que ya no hay pendientes;
+    # por envio solo se relee la fila elegida.
+    assert get_rows.call_count == 2
+    assert [c.args[0] for c in read_row.call_args_list] == [2, 4]
+
+
+def test_pacer_rereads_sheet_when_target_row_shifted(client, auto_send_token, fresh_pacer):
+    # Alguien inserto una fila arriba de Ana despues de la copia local.
+    shifted = [["Nuevo", "6689999999", "", ""]] + ROWS
+    sheets = iter([(HEADERS, ROWS), (HEADERS, shifted), (HEADERS, shifted)])
+    with patch.object(vicky, "_is_campaign_paused", return_value=False), \
+         patch.object(vicky, "_sheet_get_rows", side_effect=lambda: next(sheets)), \
+         patch.object(vicky, "_read_lead_row", side_effect=lambda row: shifted[row - 2]), \
+         patch.object(vicky, "send_template_message", return_value=True) as send_template, \
+         patch.object(vicky, "_update_row_cells") as update_row:
+        resp = client.post(
+            "/ext/campaign/pacer/start",
+            json={"template": "promo_vrim", "rate_per_minute": 60000, "max_sends": 1},
+            headers={"X-AUTO-TOKEN": "auto-secret"},
+        )
+        assert resp.status_code == 202
+        _wait_stopped(fresh_pacer)
+
+    # Tras releer, la siguiente pendiente es la fila nueva (fila 2) y Ana
+    # quedo en la 3: cada ESTATUS cae en la fila de su propio numero.
+    sent_to = [c.args[0] for c in send_template.call_args_list]
+    rows = [c.args[0] for c in update_row.call_args_list]
+    assert sent_to == ["5216689999999"] and rows == [2]
+
+
+def test_stop_and_status_endpoints(client, auto_send_token, fresh_pacer):
+    fresh_pacer.start(lambda: {"sent": True}, interval_s=10)
+    headers = {"X-AUTO-TOKEN": "auto-secret"}
+    assert client.get("/ext/campaign/pacer/status", headers=headers).get_json()["status"]["running"] is True
+
+    resp = client.post("/ext/campaign/pacer/stop", headers=headers)
+    assert resp.get_json()["stopped"] is True
+    assert resp.get_json()["status"]["stop_reason"] == "stopped_by_request"
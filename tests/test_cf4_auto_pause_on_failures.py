@@ -82,7 +82,6 @@ def test_auto_send_one_reports_auto_paused_in_response(client, auto_send_token):
          patch.object(vicky, "_pick_next_pending", return_value={"whatsapp": "5216681234567", "nombre": "Juan", "row_number": 2}), \
          patch.object(vicky, "_normalize_to_e164_mx", return_value="5216681234567"), \
          patch.object(vicky, "send_template_message", return_value=False), \
-         patch.object(vicky, "append_envio_status"), \
          patch.object(vicky, "_update_row_cells"), \
          patch.object(vicky, "_status_for_template", return_value="ENVIADO"), \
          patch.object(vicky, "_set_campaign_paused") as set_paused, \
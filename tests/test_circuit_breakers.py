@@ -0,0 +1,120 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+import app as vicky
+from utils_circuit_breaker import CircuitBreaker
+
+
+PHONE = "5216681234567"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def bus_configured():
+    with patch.object(vicky, "BUS_URL", "https://boardroom.example.com"), \
+         patch.object(vicky, "BUS_INTERNAL_TOKEN", "super-secret-token"), \
+         patch.object(vicky, "_BUS_ACTIVE", True):
+        yield
+
+
+def _trip(name):
+    breaker = vicky._breakers.get(name)
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_breaker_opens_on_failure_rate_and_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker("x", failure_rate=0.5, min_calls=4, open_s=10, probe_interval_s=2, clock=clock)
+    for ok in (True, False, True):
+        breaker.record_success() if ok else breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.allow() is False
+
+    clock.now += 10
+    assert breaker.allow() is True   # una sola prueba en half-open
+    assert breaker.allow() is False
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 10
+    assert breaker.allow() is True
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["opened_count"] == 2
+
+
+def test_old_failures_fall_out_of_the_window():
+    clock = FakeClock()
+    breaker = CircuitBreaker("x", min_calls=2, window_s=5, clock=clock)
+    breaker.record_failure()
+    clock.now += 6
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_open_bus_breaker_skips_boardroom_request(bus_configured):
+    _trip("bus")
+    with patch.object(vicky.requests, "post") as post:
+        instruction, reason = vicky._request_boardroom_instruction({"event_id": "evt-1", "phone": PHONE})
+    assert (instruction, reason) == (None, "circuit_open")
+    post.assert_not_called()
+
+
+def test_bus_timeouts_open_the_breaker(bus_configured):
+    with patch.object(vicky.requests, "post", side_effect=requests.exceptions.Timeout()) as post:
+        for _ in range(10):
+            vicky._request_boardroom_instruction({"event_id": "evt-1", "phone": PHONE})
+    assert post.call_count == vicky._breakers.get("bus").min_calls
+    assert vicky._breakers.get("bus").state == "open"
+
+
+def test_graph_4xx_does_not_count_as_upstream_failure():
+    bad_request = Mock(status_code=400, text="bad")
+    with patch.object(vicky, "META_TOKEN", "t"), \
+         patch.object(vicky, "WPP_API_URL", "https://graph.example.com/messages"), \
+         patch.object(vicky.requests, "post", return_value=bad_request):
+        for _ in range(10):
+            assert vicky.send_message(PHONE, "hola") is False
+    assert vicky._breakers.get("graph").state == "closed"
+
+
+def test_open_graph_breaker_fails_fast_without_http():
+    _trip("graph")
+    with patch.object(vicky, "META_TOKEN", "t"), \
+         patch.object(vicky, "WPP_API_URL", "https://graph.example.com/messages"), \
+         patch.object(vicky.requests, "post") as post, \
+         patch.object(vicky.time, "sleep") as sleep:
+        assert vicky.send_message(PHONE, "hola") is False
+        assert vicky.send_template_message(PHONE, "promo_vrim") is False
+    post.assert_not_called()
+    sleep.assert_not_called()
+
+
+def test_open_sheets_breaker_skips_client_match():
+    _trip("sheets")
+    sheets = Mock()
+    with patch.object(vicky, "google_ready", True), \
+         patch.object(vicky, "sheets_svc", sheets), \
+         patch.object(vicky, "SHEETS_ID_LEADS", "sheet-id"):
+        assert vicky.match_client_in_sheets(PHONE) is None
+    sheets.spreadsheets.return_value.values.return_value.get.return_value.execute.assert_not_called()
+
+
+def test_health_reports_breaker_state():
+    _trip("boardroom")
+    body = vicky.app.test_client().get("/ext/health").get_json()
+    assert body["circuit_breakers"]["boardroom"]["state"] == "open"
+    assert set(body["circuit_breakers"]) >= {"boardroom", "bus", "sheets", "graph"}
@@ -0,0 +1,126 @@
+import json
+from unittest.mock import MagicMock, Mock, patch
+
+import app as vicky
+from workers_delivery_tracker import DeliveryTracker
+from workers_status_buffer import StatusRingBuffer
+
+PHONE = "5216681234567"
+
+
+def _status(wamid, state, ts=1700000000, recipient=PHONE):
+    return {"id": wamid, "status": state, "timestamp": str(ts), "recipient_id": recipient}
+
+
+def _tracker(rows, leads=None, **kwargs):
+    return DeliveryTracker(rows.append, leads.append if leads is not None else None,
+                           normalize_phone=vicky._normalize_phone_last10, flush_interval_s=60, **kwargs)
+
+
+def test_status_progression_is_coalesced_into_one_row_per_wamid():
+    rows, leads = [], []
+    tracker = _tracker(rows, leads)
+    tracker.record_send("wamid.1", PHONE, "promo_tpv", lead_row=5)
+    tracker.record_send("wamid.2", PHONE, "promo_tpv")
+    tracker.on_statuses([_status("wamid.1", "delivered"), _status("wamid.1", "read", 1700000060),
+                         _status("wamid.1", "delivered"), _status("wamid.2", "read")])
+    assert tracker.state_of("wamid.1") == "read"
+    assert tracker.flush()
+    tracker.stop()
+
+    assert rows == [[
+        ["6681234567", "wamid.1", "read", "2023-11-14T22:14:20+00:00", "promo_tpv"],
+        ["6681234567", "wamid.2", "read", "2023-11-14T22:13:20+00:00", "promo_tpv"],
+    ]]
+    assert leads == [{5: ("6681234567", {"ENTREGA_ESTADO": "read", "ENTREGA_AT": "2023-11-14T22:14:20+00:00"})}]
+    stats = tracker.stats()
+    assert stats["stale"] == 1 and stats["reached"]["delivered"] == 2
+    assert stats["delivery_rate"] == 1.0 and stats["read_rate"] == 1.0
+
+
+def test_unknown_wamid_is_written_only_when_failed():
+    rows = []
+    tracker = _tracker(rows)
+    tracker.on_statuses([
+        _status("wamid.otro", "failed"), {"id": "wamid.x", "status": "bogus"},
+        _status("wamid.respuesta", "delivered"), _status("wamid.respuesta", "read"),
+    ])
+    tracker.flush()
+    tracker.stop()
+    assert rows == [[["6681234567", "wamid.otro", "failed", "2023-11-14T22:13:20+00:00", ""]]]
+    assert tracker.stats()["unknown"] == 3
+
+
+def test_failed_write_keeps_pending_and_newer_state_wins():
+    calls = []
+
+    def flaky(batch):
+        calls.append([row[2] for row in batch])
+        if len(calls) == 1:
+            raise RuntimeError("sheets 503")
+
+    tracker = DeliveryTracker(flaky, flush_interval_s=60)
+    tracker.record_send("wamid.1", PHONE, "promo_tpv")
+    tracker.record_send("", PHONE, "promo_tpv", status="failed")
+    assert tracker.flush() is False
+    tracker.on_statuses([_status("wamid.1", "delivered")])
+    assert tracker.flush() is True
+    tracker.stop()
+    assert calls == [["sent", "failed"], ["failed", "delivered"]]
+    assert tracker.stats()["flush_errors"] == 1 and tracker.stats()["rows_written"] == 2
+
+
+def test_template_send_is_tracked_and_status_webhook_updates_it(isolated_delivery_tracker):
+    ok = Mock(status_code=200, text="{}")
+    ok.json.return_value = {"messages": [{"id": "wamid.abc"}]}
+    buffer = StatusRingBuffer(vicky._handle_status_batch)
+    body = {"entry": [{"changes": [{"value": {"statuses": [_status("wamid.abc", "read")]}}]}]}
+    with patch.object(vicky, "META_TOKEN", "t"), \
+         patch.object(vicky, "WPP_API_URL", "https://graph.example.com/messages"), \
+         patch.object(vicky.requests, "post", return_value=ok), \
+         patch.object(vicky, "_status_buffer", buffer):
+        assert vicky.send_template_message(PHONE, "promo_tpv", lead_row=7) is True
+        assert isolated_delivery_tracker.state_of("wamid.abc") == "sent"
+        client = vicky.app.test_client()
+        assert client.post("/webhook", data=json.dumps(body), content_type="application/json").status_code == 200
+        assert buffer.flush(2.0)
+    buffer.stop()
+    assert isolated_delivery_tracker.state_of("wamid.abc") == "read"
+    # Aun sin flush, la plantilla se conoce localmente (sin leer ENVIO_STATUS).
+    assert vicky.get_last_envio_template("6681234567") == "promo_tpv"
+
+
+def _write_leads(rows, updates):
+    sheets = MagicMock()
+    with patch.object(vicky, "google_ready", True), \
+         patch.object(vicky, "sheets_svc", sheets), \
+         patch.object(vicky, "SHEETS_ID_LEADS", "sheet-id"), \
+         patch.object(vicky, "SHEETS_TITLE_LEADS", "Leads"), \
+         patch.object(vicky, "_sheet_get_rows", return_value=(["Nombre", "WhatsApp", "ENTREGA_ESTADO"], rows)):
+        vicky._write_delivery_to_leads(updates)
+    return sheets.spreadsheets().values().batchUpdate
+
+
+def test_delivery_columns_are_written_in_one_batch_update_when_present():
+    rows = [["Ana", "5216681111111"], ["Juan", "5216682222222"], ["Luis", "5216683333333"]]
+    batch = _write_leads(rows, {
+        4: ("6683333333", {"ENTREGA_ESTADO": "read", "ENTREGA_AT": "t1"}),
+        2: ("6681111111", {"ENTREGA_ESTADO": "delivered", "ENTREGA_AT": "t2"}),
+    })
+    assert batch.call_args.kwargs["body"]["data"] == [
+        {"range": "Leads!C2", "values": [["delivered"]]},
+        {"range": "Leads!C4", "values": [["read"]]},
+    ]
+
+
+def test_delivery_write_follows_lead_whose_row_shifted_since_send():
+    # Se inserto una fila arriba despues del envio: Juan paso de la 2 a la 3,
+    # y Pedro ya no esta en la hoja.
+    rows = [["Nuevo", "5216689999999"], ["Juan", "5216682222222"]]
+    batch = _write_leads(rows, {
+        2: ("6682222222", {"ENTREGA_ESTADO": "read"}),
+        5: ("6687777777", {"ENTREGA_ESTADO": "delivered"}),
+    })
+    assert batch.call_args.kwargs["body"]["data"] == [{"range": "Leads!C3", "values": [["read"]]}]
+
+    assert not _write_leads(rows, {2: ("6687777777", {"ENTREGA_ESTADO": "read"})}).called
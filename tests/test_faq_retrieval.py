@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+import app as vicky
+import integrations_gpt as gpt
+from core_retrieval import RetrievalIndex, build_from_dir, build_index, ensure_index, tokenize
+
+DOCS = [
+    ("vrim.md", "## ¿Qué es VRIM?\n\nVRIM es una tarjeta médica: una membresía de atención médica."),
+    ("imss.md", "## ¿Necesito nómina Inbursa?\n\nNo es obligatoria para el préstamo IMSS Ley 73."),
+    ("tpv.md", "## ¿Qué es la terminal TPV?\n\nUna terminal punto de venta para cobrar con tarjeta."),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    build_index(DOCS, str(tmp_path))
+    return RetrievalIndex(str(tmp_path))
+
+
+def test_index_is_memory_mapped_and_ranks_the_right_passage(index):
+    assert isinstance(index.vectors, np.memmap) and isinstance(index.tf, np.memmap)
+    top = index.search("¿que es vrim?", k=2)
+    assert top[0].source == "vrim.md"
+    assert top[0].coverage == pytest.approx(1.0)
+    assert index.search("hola buenas tardes") == []
+
+
+def test_bm25_scores_match_rank_bm25(index):
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    corpus = [tokenize(p["text"]) for p in index.passages]
+    query = tokenize("tarjeta medica o terminal para tarjeta")
+    expected = rank_bm25.BM25Okapi(corpus).get_scores(query)
+    scores, _coverage = index.bm25(query)
+    assert np.allclose(scores, expected, rtol=1e-4)
+
+
+def test_build_from_dir_reads_markdown_and_skips_output(tmp_path):
+    src = tmp_path / "knowledge"
+    src.mkdir()
+    (src / "faq.md").write_text("<!-- nota interna -->\n## ¿Qué es VRIM?\n\nMembresía médica.", encoding="utf-8")
+    stats = build_from_dir(str(src), str(src / "index"))
+    assert stats["passages"] == 1
+    assert "nota" not in RetrievalIndex(str(src / "index")).passages[0]["text"]
+
+
+def test_ask_gpt_answers_covered_questions_locally(index):
+    with patch.object(gpt, "load_index", return_value=index), patch.object(gpt, "complete") as complete:
+        answer = gpt.ask_gpt("¿Qué es VRIM?")
+    assert answer.startswith("VRIM es una tarjeta médica")
+    complete.assert_not_called()
+
+
+def test_ask_gpt_sends_only_top_passages_as_context(index):
+    with patch.object(gpt, "load_index", return_value=index), patch.object(gpt, "OPENAI_API_KEY", "sk"), \
+         patch.object(gpt, "complete", return_value="Claro.") as complete:
+        assert gpt.ask_gpt("¿la terminal cobra comisión por venta?") == "Claro."
+    system = complete.call_args.kwargs["system"]
+    assert "terminal punto de venta" in system
+
+
+def test_rebuild_publishes_atomically_and_keeps_open_index_readable(tmp_path):
+    build_index(DOCS, str(tmp_path))
+    opened = RetrievalIndex(str(tmp_path))
+    build_index(DOCS[:1], str(tmp_path))
+    build_index(DOCS[:2], str(tmp_path))
+
+    # Solo la version vigente y la anterior quedan en disco.
+    assert len([n for n in os.listdir(tmp_path) if n.startswith("v-")]) == 2
+    assert len(RetrievalIndex(str(tmp_path))) == 2
+    # El indice ya mapeado sigue respondiendo aunque su version se borro.
+    assert opened.search("¿que es vrim?", k=1)[0].source == "vrim.md"
+
+
+def test_ensure_index_builds_only_when_missing_or_stale(tmp_path):
+    src = tmp_path / "knowledge"
+    src.mkdir()
+    (src / "faq.md").write_text("## ¿Qué es VRIM?\n\nMembresía médica.", encoding="utf-8")
+    out = str(src / "index")
+    assert ensure_index(str(src), out) is True
+    assert ensure_index(str(src), out) is False
+    assert ensure_index(str(tmp_path / "no-existe"), str(tmp_path / "otro")) is False
+
+
+def test_free_text_fallback_answers_from_faq_before_generic_reply(index):
+    phone = "5216680000039"
+    vicky.user_state.pop(phone, None)
+    with patch.object(gpt, "load_index", return_value=index), \
+         patch.object(vicky, "send_message") as send:
+        vicky._route_command(phone, "¿Qué es VRIM?", None)
+        vicky._route_command(phone, "quiero hablar de otra cosa", None)
+    first, second = (c.args[1] for c in send.call_args_list)
+    assert first.startswith("VRIM es una tarjeta médica")
+    assert second.startswith("En breve, su asesor")
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+import app as vicky
+from core_funnels import INVALID, Completion, Funnel, FunnelEffects, FunnelEngine, Step
+
+PHONE = "5216681111111"
+
+
+def _engine(steps, restart=None):
+    sent, states, notes, menus, data = [], {}, [], [], {}
+    effects = FunnelEffects(
+        send=lambda phone, text: sent.append(text),
+        notify=notes.append,
+        update_sheet=lambda match, updates: notes.append(("sheet", updates)),
+        main_menu=menus.append,
+        set_state=states.__setitem__,
+        get_data=lambda phone: data,
+    )
+    funnel = Funnel("demo_", steps, restart or (lambda ctx: sent.append("restart")))
+    return FunnelEngine([funnel], effects), sent, states, notes, menus, data
+
+
+def test_engine_validates_stores_and_advances_by_table():
+    steps = {
+        "demo_edad": Step(
+            parse=lambda text, data: int(text) if text.isdigit() else INVALID,
+            store="edad", next="demo_ciudad", retry="edad invalida",
+        ),
+        "demo_ciudad": Step(
+            "ciudad?", store="ciudad",
+            complete=lambda ctx: Completion("listo", "aviso", {"ESTATUS": "ok"}, menu=True),
+        ),
+    }
+    engine, sent, states, notes, menus, data = _engine(steps)
+
+    assert engine.advance(PHONE, "demo_edad", "abc", None)
+    assert sent == ["edad invalida"] and not states
+    engine.advance(PHONE, "demo_edad", "40", None)
+    assert data["edad"] == 40 and states[PHONE] == "demo_ciudad" and sent[-1] == "ciudad?"
+
+    engine.advance(PHONE, "demo_ciudad", "Culiacán", {"row": 7})
+    assert sent[-1] == "listo"
+    assert notes == ["aviso", ("sheet", {"ESTATUS": "ok"})]
+    assert states[PHONE] == "__greeted__" and menus == [PHONE]
+
+
+def test_engine_ignores_foreign_states_and_restarts_orphans():
+    engine, sent, *_ = _engine({"demo_a": Step("a?")})
+    assert engine.advance(PHONE, "__greeted__", "hola", None) is False
+    assert engine.advance(PHONE, "vida_edad", "40", None) is False
+    assert engine.advance(PHONE, "demo_viejo", "hola", None) is True
+    assert sent == ["restart"]
+
+
+def test_router_uses_engine_for_imss_flow():
+    sent = []
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+    with patch.object(vicky, "send_message", side_effect=lambda p, t: sent.append(t)), \
+         patch.object(vicky, "send_main_menu") as menu, \
+         patch.object(vicky, "_notify_advisor") as notify:
+        vicky.imss_start(PHONE, None)
+        for text in ("sí", "8500", "nada", "120000", "Ana Pérez", "Mazatlán", "no"):
+            vicky._route_command(PHONE, text, None)
+
+    assert "No pude leer" not in " ".join(sent)
+    assert "Escribe un *monto* (ej. 100000)." in sent
+    assert sent[-1].startswith("✅ *Preautorizado*")
+    assert "- Monto deseado: $120,000" in sent[-1]
+    assert vicky.user_state[PHONE] == "__greeted__"
+    menu.assert_called_once_with(PHONE)
+    notify.assert_called_once()
@@ -0,0 +1,78 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import integrations_google as google
+from integrations_google import GoogleServices, GoogleUnavailable, LazyService
+
+CREDS = '{"type": "service_account", "client_email": "bot@example.iam.gserviceaccount.com"}'
+
+
+def test_not_configured_without_credentials_or_sdk():
+    assert GoogleServices("").configured is False
+    assert GoogleServices("{no json").configured is False
+    with patch.object(google, "sdk_available", return_value=False):
+        assert GoogleServices(CREDS).configured is False
+    with pytest.raises(GoogleUnavailable):
+        GoogleServices("").sheets()
+
+
+def test_services_are_built_once_on_first_use():
+    built = []
+    with patch.object(google, "sdk_available", return_value=True):
+        services = GoogleServices(CREDS)
+    assert services.stats() == {"configured": True, "built": [], "error": None}
+
+    def fake_build(api, version):
+        built.append((api, version))
+        return object()
+
+    with patch.object(services, "_build", side_effect=fake_build):
+        threads = [threading.Thread(target=services.sheets) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert services.sheets() is services.sheets()
+        services.drive()
+    assert built == [("sheets", "v4"), ("drive", "v3")]
+    assert services.stats()["built"] == ["drive", "sheets"]
+
+
+def test_build_failure_is_cached_and_reported():
+    failures = []
+    with patch.object(google, "sdk_available", return_value=True):
+        services = GoogleServices(CREDS, on_failure=failures.append)
+    with patch.object(services, "_build", side_effect=ValueError("bad key")) as build:
+        for _ in range(3):
+            with pytest.raises(GoogleUnavailable, match="bad key"):
+                services.sheets()
+    assert build.call_count == 1 and len(failures) == 1
+    assert "sheets.v4" in services.stats()["error"]
+
+
+def test_lazy_service_proxies_attribute_access():
+    calls = []
+
+    class Sheets:
+        def spreadsheets(self):
+            return "ok"
+
+    def factory():
+        calls.append(1)
+        return Sheets()
+
+    proxy = LazyService(factory)
+    assert calls == []
+    assert proxy.spreadsheets() == "ok"
+    assert calls == [1]
+
+
+def test_app_does_not_import_google_or_openai_sdks():
+    import sys
+
+    import app  # noqa: F401
+
+    assert "googleapiclient.discovery" not in sys.modules
+    assert "openai" not in sys.modules
@@ -0,0 +1,81 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+import integrations_gpt as gpt
+
+
+class _FakeClient:
+    def __init__(self, answer="Respuesta", gate=None):
+        self.calls = 0
+        self.answer = answer
+        self.gate = gate
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" {self.answer} "))])
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    gpt._cache.clear()
+    yield
+    gpt._cache.clear()
+
+
+def test_repeated_normalized_question_hits_cache_and_reuses_client():
+    client = _FakeClient()
+    with patch.object(gpt, "_get_client", return_value=client) as get_client:
+        assert gpt.complete("¿Qué es VRIM?", api_key="sk") == "Respuesta"
+        assert gpt.complete("  que es   vrim ", api_key="sk") == "Respuesta"
+        assert gpt.complete("¿Qué es VRIM?", api_key="sk", temperature=0.1) == "Respuesta"
+    assert client.calls == 2  # otra temperatura es otra entrada
+    assert get_client.call_count == 2
+
+
+def test_shared_client_is_built_once_per_key():
+    fake_module = SimpleNamespace(OpenAI=lambda **kw: object())
+    with patch.dict("sys.modules", {"openai": fake_module}), patch.dict(gpt._clients, clear=True):
+        assert gpt._get_client("sk-1") is gpt._get_client("sk-1")
+        assert gpt._get_client("sk-2") is not gpt._get_client("sk-1")
+
+
+def test_concurrency_limit_rejects_when_saturated():
+    gate = threading.Event()
+    client = _FakeClient(gate=gate)
+    sem = threading.BoundedSemaphore(1)
+    with patch.object(gpt, "_get_client", return_value=client), patch.object(gpt, "_inflight", sem), \
+         patch.object(gpt, "GPT_QUEUE_TIMEOUT_S", 0.05):
+        worker = threading.Thread(target=gpt.complete, args=("pregunta uno",), kwargs={"api_key": "sk"})
+        worker.start()
+        while client.calls == 0:
+            time.sleep(0.001)
+        with pytest.raises(gpt.GPTBusy):
+            gpt.complete("pregunta dos", api_key="sk")
+        gate.set()
+        worker.join(2)
+    assert client.calls == 1
+
+
+def test_sgpt_turn_goes_through_faq_aware_ask_gpt():
+    phone = "5216680000038"
+    vicky.user_state[phone] = "__greeted__"
+    msg = {"from": phone, "type": "text", "text": {"body": "sgpt: ¿qué cubre el seguro de auto?"}}
+    with patch.object(vicky, "BOARDROOM_IS_AUTHORITY", False), patch.object(vicky, "BOARDROOM_ENABLED", False), \
+         patch.object(vicky, "match_client_in_sheets", return_value=None), \
+         patch.object(vicky, "append_respuesta_cliente"), patch.object(vicky, "_notify_advisor"), \
+         patch.object(vicky, "openai_ready", True), patch.object(vicky, "OPENAI_API_KEY", "sk"), \
+         patch.object(gpt, "load_index", return_value=None), \
+         patch.object(gpt, "complete", return_value="Cubre daños.") as complete, \
+         patch.object(vicky, "send_message") as send:
+        vicky._process_inbound_message(msg)
+    assert complete.call_args.args == ("¿qué cubre el seguro de auto?",)
+    assert complete.call_args.kwargs["api_key"] == "sk"
+    send.assert_called_once_with(phone, "Cubre daños.")
@@ -0,0 +1,129 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+from workers_debounce import InboundDebouncer
+
+
+PHONE = "5216681234567"
+
+
+def _payload(text=None, mtype="text", msg_id="wamid.1"):
+    if mtype == "text":
+        message = {"from": PHONE, "id": msg_id, "type": "text", "text": {"body": text}}
+    else:
+        message = {"from": PHONE, "id": msg_id, "type": mtype, mtype: {"id": "media-1"}}
+    return {"entry": [{"changes": [{"value": {"messages": [message]}}]}]}
+
+
+@pytest.fixture
+def debouncer():
+    debouncer = InboundDebouncer(
+        on_flush=lambda phone, msgs: vicky._flush_inbound_burst(phone, msgs),
+        window_s=0.05,
+        max_wait_s=1.0,
+    )
+    with patch.object(vicky, "INBOUND_DEBOUNCE_MS", 50), \
+         patch.object(vicky, "_inbound_debouncer", debouncer):
+        yield debouncer
+        debouncer.stop()
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+
+
+def test_debouncer_coalesces_burst_into_one_flush():
+    flushed = []
+    debouncer = InboundDebouncer(on_flush=lambda key, items: flushed.append((key, items)), window_s=0.05)
+    for word in ("hola", "quiero info", "del seguro de auto"):
+        debouncer.submit("a", word)
+    debouncer.submit("b", "1")
+    assert debouncer.flush_all()
+    debouncer.stop()
+
+    assert sorted(flushed) == [("a", ["hola", "quiero info", "del seguro de auto"]), ("b", ["1"])]
+    assert debouncer.stats()["coalesced"] == 2
+
+
+def test_max_wait_bounds_a_never_ending_burst():
+    flushed = []
+    debouncer = InboundDebouncer(on_flush=lambda key, items: flushed.append(items), window_s=0.05, max_wait_s=0.12)
+    deadline = time.monotonic() + 0.4
+    while not flushed and time.monotonic() < deadline:
+        debouncer.submit("a", "x")
+        time.sleep(0.02)
+    debouncer.stop()
+    assert flushed and len(flushed[0]) < 10
+
+
+def test_exclusive_is_queued_behind_in_flight_flush_without_blocking():
+    events = []
+    started, release = threading.Event(), threading.Event()
+
+    def on_flush(key, items):
+        events.append(("flush-start", items))
+        started.set()
+        release.wait(2.0)
+        events.append(("flush-end", items))
+
+    debouncer = InboundDebouncer(on_flush=on_flush, window_s=0.3)
+    debouncer.submit("a", "hola")
+    assert started.wait(2.0)
+    debouncer.submit("a", "otro")
+    t0 = time.monotonic()
+    assert debouncer.run_exclusive("a", lambda pending: events.append(("exclusive", pending))) is False
+    assert debouncer.run_exclusive("a", lambda pending: events.append(("exclusive", pending))) is False
+    assert time.monotonic() - t0 < 0.1
+    debouncer.submit("a", "despues")
+    release.set()
+    assert debouncer.flush_all()
+    debouncer.stop()
+    assert events == [
+        ("flush-start", ["hola"]), ("flush-end", ["hola"]),
+        ("exclusive", ["otro"]), ("exclusive", None),
+        ("flush-start", ["despues"]), ("flush-end", ["despues"]),
+    ]
+    assert debouncer.stats()["queued_exclusive"] == 2
+
+
+def test_exclusive_runs_inline_when_key_is_free():
+    debouncer = InboundDebouncer(on_flush=lambda key, items: None, window_s=5.0)
+    debouncer.submit("a", "hola")
+    seen = []
+    assert debouncer.run_exclusive("a", seen.append) is True
+    assert seen == [["hola"]] and not debouncer.pending("a")
+    debouncer.stop()
+
+
+def test_webhook_burst_becomes_single_turn(debouncer):
+    with patch.object(vicky, "_process_inbound_message") as process:
+        client = vicky.app.test_client()
+        for i, text in enumerate(("hola", "quiero info", "del seguro de auto")):
+            assert client.post("/webhook", json=_payload(text, msg_id=f"wamid.{i}")).status_code == 200
+        process.assert_not_called()
+        assert debouncer.flush_all()
+
+    process.assert_called_once()
+    merged = process.call_args.args[0]
+    assert merged["text"]["body"] == "hola quiero info del seguro de auto"
+    assert merged["id"] == "wamid.2"
+    assert merged["coalesced_ids"] == ["wamid.0", "wamid.1", "wamid.2"]
+
+
+def test_active_funnel_answers_are_not_debounced(debouncer):
+    vicky.user_state[PHONE] = "vida_edad"
+    with patch.object(vicky, "_process_inbound_message") as process:
+        vicky.app.test_client().post("/webhook", json=_payload("35"))
+    process.assert_called_once()
+    assert debouncer.stats()["received"] == 0
+
+
+def test_media_flushes_pending_burst_first(debouncer):
+    seen = []
+    with patch.object(vicky, "_process_inbound_message", side_effect=lambda m: seen.append(m["type"])):
+        client = vicky.app.test_client()
+        client.post("/webhook", json=_payload("te mando mi ine"))
+        client.post("/webhook", json=_payload(mtype="image", msg_id="wamid.img"))
+    assert seen == ["text", "image"]
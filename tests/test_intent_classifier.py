@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+from core_classifier import IntentClassifier, features, load_labeled_csv
+
+PHONE = "5216680000040"
+
+
+def test_classifier_scores_known_intents_with_confidence():
+    assert vicky._classify_intent("menu") == ("menu", 1.0)
+    assert vicky._classify_intent("1").intent == "imss"
+    assert vicky._classify_intent("Buenas tardes").intent == "greeting"
+    assert vicky._classify_intent("no gracias").intent == "negative"
+    vague = vicky._classify_intent("hola quiero info del seguro de auto")
+    assert vague.intent == "auto" and vague.confidence < 0.5
+    assert vicky._classify_intent("xyz").intent is None
+
+
+def test_labeled_history_is_learned(tmp_path):
+    path = tmp_path / "respuestas.csv"
+    path.write_text("TELEFONO,MENSAJE,FECHA,INTENT\n6681,me urge una membresia medica,2024-01-01,vrim\n6682,ok,,\n", encoding="utf-8")
+    examples = load_labeled_csv(str(path))
+    assert examples == [("me urge una membresia medica", "vrim")]
+    clf = IntentClassifier(examples + [("terminal", "tpv")])
+    assert clf.predict("membresia medica").intent == "vrim"
+
+
+def test_plurals_fold_like_the_intent_matcher():
+    assert features("las placas y terminales") == ["las", "placa", "y", "terminal", "las placa", "placa y", "y terminal"]
+    assert vicky._infer_product_hint("me vencieron las placas") == "auto"
+
+
+@pytest.mark.parametrize("text", ["seguro", "me interesa", "quiero un seguro", "hola"])
+def test_low_confidence_prediction_is_not_sent_as_product_hint(text):
+    assert vicky._infer_product_hint(text) == "unknown"
+
+
+def test_low_confidence_falls_back_to_keyword_signals():
+    assert vicky._classify_intent("mi auto choco ayer y no se que hacer").confidence < vicky.INTENT_HINT_MIN_CONFIDENCE
+    assert vicky._infer_product_hint("mi auto choco ayer y no se que hacer") == "auto"
+
+
+def test_boardroom_payload_carries_intent_and_product_hint():
+    event = vicky._build_boardroom_event(PHONE, "quiero una terminal", {"id": "wamid.x"}, "text", None)
+    assert event["campaign"]["product_hint"] == "tpv"
+    assert event["intent"]["name"] == "tpv"
+    assert 0 < event["intent"]["confidence"] <= 1
+
+
+def test_product_hint_only_sends_values_boardroom_already_knows():
+    assert vicky._classify_intent("vrim").intent == "vrim"
+    assert vicky._infer_product_hint("vrim") == "unknown"
+    assert vicky._infer_product_hint("quiero financiamiento") == "unknown"
+
+
+def test_product_intents_never_short_circuit_boardroom():
+    with patch.object(vicky, "INTENT_SHORT_CIRCUIT_ENABLED", True), \
+         patch.object(vicky, "SECOM_LOCAL_FALLBACK_ENABLED", True):
+        assert vicky._classify_intent("vrim").confidence >= vicky.INTENT_SHORT_CIRCUIT_MIN_CONFIDENCE
+        assert vicky._intent_short_circuit(PHONE, "vrim", True) is False
+        assert vicky._intent_short_circuit(PHONE, "menu", True) is True
+
+
+@pytest.mark.parametrize("enabled,consulted", [(True, False), (False, True)])
+def test_trivial_turn_short_circuits_boardroom_only_when_enabled(enabled, consulted):
+    vicky.user_state[PHONE] = "__greeted__"
+    msg = {"from": PHONE, "id": "wamid.menu", "type": "text", "text": {"body": "menu"}}
+    with patch.object(vicky, "INTENT_SHORT_CIRCUIT_ENABLED", enabled), \
+         patch.object(vicky, "BOARDROOM_IS_AUTHORITY", True), patch.object(vicky, "SECOM_LOCAL_FALLBACK_ENABLED", True), \
+         patch.object(vicky, "match_client_in_sheets", return_value=None), patch.object(vicky, "append_respuesta_cliente"), \
+         patch.object(vicky, "_emit_boardroom_observation") as observed, \
+         patch.object(vicky, "_consult_boardroom_hedged", return_value=("FALLBACK", None, None)) as consult, \
+         patch.object(vicky, "send_main_menu") as menu, patch.object(vicky, "send_message"), \
+         patch.object(vicky, "_notify_advisor"):
+        vicky._process_inbound_message(msg)
+    assert consult.called is consulted
+    assert observed.called is not consulted
+    menu.assert_called_once_with(PHONE)
@@ -0,0 +1,82 @@
+from unittest.mock import patch
+
+import app as vicky
+from core_intents import CommandIndex, IntentMatcher, normalize_text
+
+
+def test_single_pass_returns_every_signal_including_nested_phrases():
+    matcher = IntentMatcher({"vida": ("seguro de vida",), "seguro": ("seguro",), "auto": ("auto",)})
+    assert matcher.match("Quiero un SEGURO DE VIDA y del auto") == {"vida", "seguro", "auto"}
+
+
+def test_word_boundaries_accents_and_plurals():
+    matcher = IntentMatcher({"neg": ("no",), "credit": ("crédito",), "tpv": ("terminal",)})
+    assert matcher.match("bueno, nos vemos") == frozenset()
+    assert matcher.match("necesito creditos y terminales") == {"credit", "tpv"}
+    assert normalize_text("  Pensión   LEY 73 ") == "pension ley 73"
+
+
+def test_router_helpers_keep_their_decisions():
+    assert vicky.interpret_response("Sí, claro") == "positive"
+    assert vicky.interpret_response("no gracias") == "negative"
+    assert vicky.interpret_response("bueno") == "neutral"  # antes: "no" dentro de "bueno"
+    assert vicky._infer_product_hint("3") == "vida_temporal"
+    assert vicky._infer_product_hint("quiero una terminal") == "tpv"
+    assert vicky._infer_product_hint("pension ley 73") == "imss"
+    assert vicky._explicit_non_auto_intent("mejor un préstamo IMSS") is True
+    assert vicky._explicit_non_auto_intent("préstamo para mi póliza") is False
+    assert vicky._explicit_non_alianza_intent("soy contador, y la comisión?") is False
+    assert vicky._explicit_non_alianza_intent("me interesa el seguro de auto") is True
+
+
+def test_signals_keep_variants_that_substring_search_used_to_catch():
+    assert "hint_imss" in vicky._intent_signals("soy pensionado")
+    assert "hint_imss" in vicky._intent_signals("Soy Pensionada del IMSS")
+    assert "auto_context" in vicky._intent_signals("es para mi automóvil")
+    assert "hint_auto" in vicky._intent_signals("tengo dos automoviles")
+
+
+def test_menu_commands_are_a_module_constant():
+    assert "seguro de vida" in vicky.LOCAL_MENU_COMMANDS
+    assert isinstance(vicky.LOCAL_MENU_COMMANDS, frozenset)
+
+
+def test_command_index_tolerates_accents_and_typos_without_guessing():
+    index = CommandIndex(
+        {"auto": ("seguro auto", "seguros de auto"), "menu": ("menu", "inicio"), "vida": ("vida", "salud")},
+        exact_only=("salud",),
+    )
+    assert index.resolve("Seguro d auto") == "auto"
+    assert index.resolve("MENÚÚ") == "menu"
+    assert index.resolve("saludo") is None  # alias solo exacto
+    assert index.resolve("via") is None  # muy corto para tolerar typos
+    assert index.resolve("vira") is None  # alias corto: un typo ya es otra palabra
+    assert index.resolve("menuu") == "menu"  # pero si una letra repetida
+    assert index.resolve("xyz abc") is None
+
+
+def test_router_resolves_misspelled_commands():
+    with patch.object(vicky, "vida_start") as vida, patch.object(vicky, "send_main_menu") as menu, \
+         patch.object(vicky, "send_message") as send, patch.object(vicky, "_notify_advisor") as notify:
+        vicky.user_state.pop("5216680000036", None)
+        vicky._route_command("5216680000036", "menuu", None)
+        vicky._route_command("5216680000036", "seguro de vidaa", None)
+    menu.assert_called_once()
+    vida.assert_called_once()
+    send.assert_not_called()
+    notify.assert_not_called()
+    assert vicky._resolve_command("vrím") == "vrim"
+    assert vicky._resolve_command("prestamo imss") == "imss"
+
+
+def test_short_words_one_edit_away_from_aliases_do_not_open_flows():
+    for text in ("alto", "miss", "vira", "meno"):
+        assert vicky._resolve_command(text) is None
+    with patch.object(vicky, "auto_start") as auto, patch.object(vicky, "imss_start") as imss, \
+         patch.object(vicky, "send_message") as send:
+        for text in ("alto", "miss"):
+            vicky.user_state.pop("5216680000037", None)
+            vicky._route_command("5216680000037", text, None)
+    auto.assert_not_called()
+    imss.assert_not_called()
+    assert send.call_count == 2  # respuesta generica de asesor
@@ -0,0 +1,173 @@
+import time
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+
+import app as vicky
+from workers_scheduler import JobScheduler
+
+
+PHONE = "5216681234567"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def app_scheduler(db_path):
+    # Sin thread despachador: el test dispara run_due() a mano.
+    with patch.object(vicky, "VICKY_DB_PATH", db_path), \
+         patch.object(vicky, "_job_scheduler", None), \
+         patch.object(vicky.JobScheduler, "start"):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+    yield
+    vicky.user_state.clear()
+    vicky.user_data.clear()
+
+
+def test_due_job_runs_handler_once(db_path):
+    sched = JobScheduler(db_path)
+    seen = []
+    sched.register("ping", seen.append)
+    sched.schedule("ping", time.time() - 1, {"n": 1})
+    sched.schedule("ping", time.time() + 3600, {"n": 2})
+
+    assert sched.run_due() == 1
+    assert sched.run_due() == 0
+    assert seen == [{"n": 1}]
+    assert sched.pending_count() == 1
+
+
+def test_jobs_survive_restart_including_interrupted_ones(db_path):
+    first = JobScheduler(db_path)
+    first.schedule("ping", time.time() - 1, {"n": 1}, job_id="job-a")
+    first.schedule("ping", time.time() - 1, {"n": 2}, job_id="job-b")
+    first._conn.execute("UPDATE scheduled_jobs SET status = 'running', updated_at = 0 WHERE id = 'job-a'")
+    # job-b lo esta corriendo otro worker vivo: no se reencola.
+    first._conn.execute("UPDATE scheduled_jobs SET status = 'running', updated_at = ? WHERE id = 'job-b'",
+                        (time.time(),))
+
+    second = JobScheduler(db_path)
+    seen = []
+    second.register("ping", seen.append)
+    assert second.run_due() == 1
+    assert seen == [{"n": 1}]
+    assert second.stats()["counts"] == {"done": 1, "running": 1}
+
+
+def test_job_claimed_by_another_worker_is_not_run_twice(db_path):
+    mine, other = JobScheduler(db_path), JobScheduler(db_path)
+    seen = []
+    mine.register("ping", seen.append)
+    mine.schedule("ping", time.time() - 1, {"n": 1}, job_id="job-a")
+    real_execute = mine._conn.execute
+
+    def racing_execute(sql, *args):
+        # El otro worker reclama el job entre nuestro SELECT y nuestro UPDATE.
+        if sql.startswith("UPDATE scheduled_jobs SET status = 'running'"):
+            other._conn.execute("UPDATE scheduled_jobs SET status = 'running' WHERE id = 'job-a'")
+        return real_execute(sql, *args)
+
+    with patch.object(mine, "_conn", Mock(execute=racing_execute)):
+        assert mine.run_due() == 0
+    assert seen == []
+
+
+def test_schedule_is_idempotent_by_job_id(db_path):
+    sched = JobScheduler(db_path)
+    sched.schedule("ping", time.time() + 60, {}, job_id="same")
+    sched.schedule("ping", time.time() + 60, {}, job_id="same")
+    assert sched.pending_count() == 1
+
+
+def test_failing_handler_is_retried_then_marked_failed(db_path):
+    sched = JobScheduler(db_path, max_attempts=2, retry_base_s=0)
+    sched.register("boom", lambda payload: (_ for _ in ()).throw(RuntimeError("x")))
+    sched.schedule("boom", time.time() - 1, {})
+
+    assert sched.run_due() == 1
+    assert sched.pending_count() == 1
+    assert sched.run_due() == 1
+    assert sched.stats()["counts"] == {"failed": 1}
+
+
+def test_dispatcher_thread_fires_job_scheduled_after_start(db_path):
+    sched = JobScheduler(db_path, idle_poll_s=30)
+    seen = []
+    sched.register("ping", seen.append)
+    sched.start()
+    try:
+        sched.schedule("ping", time.time(), {"n": 1})
+        deadline = time.time() + 2
+        while not seen and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        sched.stop()
+    assert seen == [{"n": 1}]
+
+
+def test_auto_expiry_date_schedules_jobs_without_sleeping_thread(app_scheduler):
+    vicky.user_state[PHONE] = "auto_vencimiento_fecha"
+    with patch.object(vicky, "send_message", return_value=True), \
+         patch.object(vicky, "write_followup_to_sheets"):
+        vicky._route_command(PHONE, "2030-06-30", None)
+
+    jobs = {job["kind"]: job for job in vicky._job_scheduler.list_jobs()}
+    assert set(jobs) == {"auto_reintento", "auto_recordatorio"}
+    assert jobs["auto_recordatorio"]["payload"]["objetivo"] == date(2030, 5, 31).isoformat()
+    assert jobs["auto_recordatorio"]["run_at"].startswith("2030-05-31")
+    assert vicky.user_state[PHONE] == "__greeted__"
+
+
+def test_reintento_job_uses_normal_send_path(app_scheduler):
+    with patch.object(vicky, "send_message", return_value=True) as send_message, \
+         patch.object(vicky, "write_followup_to_sheets") as followup:
+        vicky._retry_after_days(PHONE, 0)
+        assert vicky._job_scheduler.run_due(time.time() + 1) == 1
+
+    send_message.assert_called_once()
+    assert send_message.call_args.args[0] == PHONE
+    assert followup.call_args.args[0] == "auto_reintento"
+
+
+def test_recordatorio_job_notifies_advisor_and_sends_template_when_configured(app_scheduler):
+    with patch.object(vicky, "AUTO_REMINDER_TEMPLATE", "recordatorio_auto"), \
+         patch.object(vicky, "send_template_message", return_value=True) as send_template, \
+         patch.object(vicky, "_notify_advisor") as notify, \
+         patch.object(vicky, "write_followup_to_sheets"):
+        vicky._schedule_auto_recordatorio(PHONE, date(2020, 2, 1), date(2020, 1, 2))
+        assert vicky._job_scheduler.run_due() == 1
+
+    send_template.assert_called_once_with(PHONE, "recordatorio_auto")
+    notify.assert_called_once()
+
+
+def test_failed_send_keeps_reintento_job_pending_for_retry(app_scheduler):
+    with patch.object(vicky, "send_message", return_value=False), \
+         patch.object(vicky, "write_followup_to_sheets") as followup:
+        vicky._retry_after_days(PHONE, 0)
+        assert vicky._job_scheduler.run_due(time.time() + 1) == 1
+
+    followup.assert_not_called()
+    [job] = vicky._job_scheduler.list_jobs()
+    assert job["attempts"] == 1 and "RuntimeError" in job["last_error"]
+
+
+def test_failed_template_does_not_notify_advisor(app_scheduler):
+    with patch.object(vicky, "AUTO_REMINDER_TEMPLATE", "recordatorio_auto"), \
+         patch.object(vicky, "send_template_message", return_value=False), \
+         patch.object(vicky, "_notify_advisor") as notify:
+        vicky._schedule_auto_recordatorio(PHONE, date(2020, 2, 1), date(2020, 1, 2))
+        assert vicky._job_scheduler.run_due() == 1
+
+    notify.assert_not_called()
+    assert vicky._job_scheduler.pending_count() == 1
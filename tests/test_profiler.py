@@ -0,0 +1,87 @@
+import threading
+import time
+from unittest.mock import patch
+
+import app as vicky
+from utils_profiler import RequestProfiler, StackSampler
+
+TOKEN = {"X-AUTO-TOKEN": "secret"}
+
+
+def _busy_leaf(stop):
+    while not stop.is_set():
+        sum(range(200))
+
+
+def test_sampler_collapses_stacks_of_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_leaf, args=(stop,), name="Busy-7")
+    worker.start()
+    sampler = StackSampler()
+    try:
+        assert sampler.start(0.3, interval_s=0.005)
+        assert not sampler.start(1.0)  # una captura a la vez
+        sampler.wait(2.0)
+    finally:
+        stop.set()
+        worker.join()
+
+    status = sampler.status()
+    assert not status["running"] and status["samples"] > 5
+    lines = sampler.collapsed().splitlines()
+    busy = [line for line in lines if line.startswith("Busy;")]
+    assert busy and "_busy_leaf (test_profiler.py:" in busy[0]
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) > 0 and "StackSampler" not in sampler.collapsed()
+
+
+def test_request_profiler_only_profiles_armed_matching_requests():
+    profiler = RequestProfiler()
+    assert profiler.maybe_start("/webhook") is None
+    profiler.arm(1, "/webhook")
+    assert profiler.maybe_start("/health") is None
+    profile = profiler.maybe_start("/webhook")
+    assert profile is not None
+    time.sleep(0.001)
+    profiler.finish(profile, "POST /webhook")
+    assert profiler.maybe_start("/webhook") is None
+    assert profiler.last_report().startswith("# POST /webhook")
+    assert profiler.status()["armed"] == 0 and profiler.status()["last"]["label"] == "POST /webhook"
+
+
+def test_profile_endpoints_require_token():
+    client = vicky.app.test_client()
+    with patch.object(vicky, "AUTO_SEND_TOKEN", "secret"):
+        assert client.post("/ext/profile/start", json={"seconds": 1}).status_code == 401
+        assert client.get("/ext/profile/stacks", headers={"X-AUTO-TOKEN": "nope"}).status_code == 401
+        assert client.post("/ext/profile/request", json={}).status_code == 401
+
+
+def test_armed_cprofile_captures_next_webhook_request():
+    client = vicky.app.test_client()
+    with patch.object(vicky, "AUTO_SEND_TOKEN", "secret"), \
+         patch.object(vicky, "_request_profiler", RequestProfiler()):
+        assert client.get("/ext/profile/request", headers=TOKEN).status_code == 404
+        armed = client.post("/ext/profile/request", json={"count": 1}, headers=TOKEN)
+        assert armed.status_code == 202 and armed.get_json()["status"]["armed"] == 1
+
+        client.post("/webhook", json={"entry": [{"changes": [{"value": {"statuses": [{"status": "read"}]}}]}]})
+        report = client.get("/ext/profile/request", headers=TOKEN)
+        assert report.status_code == 200
+        assert "webhook_receive" in report.get_data(as_text=True)
+        status = client.get("/ext/profile/status", headers=TOKEN).get_json()
+        assert status["request"]["armed"] == 0
+
+
+def test_sampler_endpoint_starts_and_serves_collapsed_text():
+    client = vicky.app.test_client()
+    with patch.object(vicky, "AUTO_SEND_TOKEN", "secret"), \
+         patch.object(vicky, "_stack_sampler", StackSampler()):
+        started = client.post("/ext/profile/start", json={"seconds": 5, "interval_ms": 2}, headers=TOKEN)
+        assert started.status_code == 202
+        assert client.post("/ext/profile/start", json={"seconds": 5}, headers=TOKEN).status_code == 409
+        time.sleep(0.05)
+        assert client.post("/ext/profile/stop", headers=TOKEN).get_json()["stopped"] is True
+        stacks = client.get("/ext/profile/stacks", headers=TOKEN)
+        assert stacks.status_code == 200 and stacks.mimetype == "text/plain"
+        assert client.post("/ext/profile/start", json={"seconds": -1}, headers=TOKEN).status_code == 400
@@ -0,0 +1,63 @@
+import io
+import logging
+
+from utils_logger import LazyJson, QueueLogging, SamplingFilter, parse_sample_rates
+
+
+def test_lazy_json_truncates_at_the_source():
+    text = str(LazyJson({"entry": [{"body": "a" * 5000}]}, limit=100))
+    assert len(text) == 101 and text.endswith("…")
+    assert text.startswith('{"entry": [{"body": "aaa')
+    assert str(LazyJson({"ok": "sí"}, limit=100)) == '{"ok": "sí"}'
+    assert str(LazyJson({"ok": True}, limit=0)) == '{"ok": true}'
+
+
+def test_lazy_json_is_not_serialized_when_level_is_disabled():
+    logger = logging.getLogger("vicky-secom.test-lazy")
+    logger.setLevel(logging.WARNING)
+
+    class Exploding:
+        def __str__(self):
+            raise AssertionError("no deberia formatearse")
+
+    logger.info("payload %s", Exploding())
+
+
+def test_sampling_filter_passes_one_in_n_and_reports_omitted():
+    filt = SamplingFilter(parse_sample_rates("status=0.25, bulk=0, bogus=x"))
+    assert filt.rates == {"status": 0.25, "bulk": 0.0}
+
+    def record(sample=None):
+        rec = logging.LogRecord("t", logging.INFO, __file__, 1, "linea", None, None)
+        if sample:
+            rec.sample = sample
+        return rec
+
+    passed = [r for r in (record("status") for _ in range(9)) if filt.filter(r)]
+    assert len(passed) == 3
+    assert passed[0].msg == "linea"
+    assert passed[1].msg == "linea (+3 similares omitidos)"
+    assert not any(filt.filter(record("bulk")) for _ in range(5))
+    assert all(filt.filter(record()) for _ in range(5))
+    assert filt.stats()["seen"]["status"] == 9
+
+
+def test_queue_pipeline_formats_in_listener_and_drops_when_full():
+    pipeline = QueueLogging("%(levelname)s %(message)s", max_queue=2)
+    out = io.StringIO()
+    pipeline.stream.setStream(out)
+    logger = logging.getLogger("vicky-secom.test-queue")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.handler)
+    try:
+        for i in range(4):  # sin listener: la cola de 2 se llena
+            logger.info("msg %s", i)
+        assert pipeline.stats()["dropped"] == 2
+        pipeline.start()
+        logger.info("payload %s", LazyJson({"a": 1}))
+        pipeline.stop()
+    finally:
+        logger.removeHandler(pipeline.handler)
+    assert out.getvalue().splitlines() == ["INFO msg 0", "INFO msg 1", 'INFO payload {"a": 1}']
+    assert pipeline.stats()["running"] is False
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import pytest
+
+import app as vicky
+from utils_metrics import Histogram, StageMetrics
+
+
+def test_histogram_quantiles_interpolate_inside_buckets():
+    hist = Histogram((0.1, 0.2, 0.4))
+    for value in (0.05,) * 50 + (0.15,) * 45 + (0.3,) * 5:
+        hist.observe(value)
+    assert hist.quantile(0.5) == pytest.approx(0.1)
+    assert 0.1 < hist.quantile(0.95) <= 0.2
+    assert 0.2 < hist.quantile(0.99) <= 0.4
+
+
+def test_timed_records_outcome_and_errors():
+    metrics = StageMetrics(namespace="t")
+
+    @metrics.timed("lookup", outcome=lambda r: "hit" if r else "miss")
+    def lookup(value):
+        if value == "boom":
+            raise RuntimeError(value)
+        return value
+
+    lookup("x")
+    lookup(None)
+    with pytest.raises(RuntimeError):
+        lookup("boom")
+    snap = metrics.snapshot()["lookup"]
+    assert {k: v["count"] for k, v in snap.items()} == {"hit": 1, "miss": 1, "error": 1}
+
+    text = metrics.render_prometheus()
+    assert '# TYPE t_stage_duration_seconds histogram' in text
+    assert 't_stage_duration_seconds_bucket{stage="lookup",outcome="hit",le="+Inf"} 1' in text
+    assert 't_stage_duration_estimate_seconds{stage="lookup",outcome="miss",quantile="0.95"}' in text
+
+
+def _count(stage, outcome):
+    return vicky._metrics.snapshot().get(stage, {}).get(outcome, {}).get("count", 0)
+
+
+def test_turn_stages_are_exported_at_ext_metrics():
+    before = _count("sheets_match", "miss"), _count("graph_send_message", "failed")
+    with patch.object(vicky, "google_ready", False), patch.object(vicky, "META_TOKEN", ""):
+        assert vicky.match_client_in_sheets("6681234567") is None
+        assert vicky.send_message("5216681234567", "hola") is False
+    assert (_count("sheets_match", "miss"), _count("graph_send_message", "failed")) == (before[0] + 1, before[1] + 1)
+
+    client = vicky.app.test_client()
+    resp = client.get("/ext/metrics")
+    body = resp.get_data(as_text=True)
+    assert resp.status_code == 200 and resp.mimetype == "text/plain"
+    assert f'vicky_stage_duration_seconds_count{{stage="sheets_match",outcome="miss"}} {before[0] + 1}' in body
+    json_body = client.get("/ext/metrics?format=json").get_json()
+    assert json_body["stages"]["graph_send_message"]["failed"]["p50"] is not None
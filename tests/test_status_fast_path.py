@@ -0,0 +1,72 @@
+import json
+import threading
+from unittest.mock import patch
+
+import app as vicky
+from workers_status_buffer import StatusRingBuffer, extract_statuses, is_status_only
+
+
+def _status_body(*states, entries=1):
+    entry = {"changes": [{"value": {"statuses": [{"id": f"wamid.{s}", "status": s} for s in states]}}]}
+    return json.dumps({"object": "whatsapp_business_account", "entry": [entry] * entries}).encode()
+
+
+def test_status_only_detection_is_a_byte_search():
+    assert is_status_only(_status_body("read"))
+    message = {"entry": [{"changes": [{"value": {"messages": [{"from": "1"}], "statuses": []}}]}]}
+    assert not is_status_only(json.dumps(message).encode())
+    assert not is_status_only(b'{"entry": []}')
+
+
+def test_extract_statuses_walks_every_entry_and_change():
+    payload = json.loads(_status_body("sent", "delivered", entries=2))
+    assert [s["status"] for s in extract_statuses(payload)] == ["sent", "delivered", "sent", "delivered"]
+    assert extract_statuses({"entry": [{"changes": [{"value": {}}]}]}) == []
+
+
+def test_ring_buffer_drops_oldest_when_full_and_batches_the_rest():
+    busy, release = threading.Event(), threading.Event()
+    batches = []
+
+    def handler(statuses):
+        batches.append([s["status"] for s in statuses])
+        busy.set()
+        release.wait(2.0)
+
+    buffer = StatusRingBuffer(handler, capacity=2, batch_max=10)
+    buffer.submit(_status_body("primero"))
+    assert busy.wait(2.0)  # el thread queda ocupado con el primer lote
+    for state in ("a", "b", "c"):
+        buffer.submit(_status_body(state))
+    buffer.submit(b"{no json")
+    release.set()
+    assert buffer.flush(2.0)
+    buffer.stop()
+
+    assert batches == [["primero"], ["c"]]
+    stats = buffer.stats()
+    assert stats["received"] == 5 and stats["dropped"] == 2
+    assert stats["parse_errors"] == 1 and stats["statuses"] == 2
+
+
+def test_webhook_acks_status_callbacks_without_the_generic_handler():
+    seen = []
+    buffer = StatusRingBuffer(seen.extend)
+    client = vicky.app.test_client()
+    with patch.object(vicky, "_status_buffer", buffer), \
+         patch.object(vicky, "_dispatch_inbound_message") as dispatch:
+        resp = client.post("/webhook", data=_status_body("delivered", "read"), content_type="application/json")
+        assert resp.status_code == 200 and resp.get_json() == {"ok": True}
+        assert buffer.flush(2.0)
+
+        message = {"entry": [{"changes": [{"value": {"messages": [{"from": "5216681234567", "type": "text"}]}}]}]}
+        assert client.post("/webhook", json=message).status_code == 200
+    buffer.stop()
+    assert [s["status"] for s in seen] == ["delivered", "read"]
+    dispatch.assert_called_once()
+
+
+def test_failed_status_is_logged_with_detail():
+    with patch.object(vicky.log, "warning") as warning:
+        vicky._handle_status_batch([{"id": "wamid.1", "status": "failed", "errors": [{"code": 131026}]}])
+    assert "131026" in str(warning.call_args.args[1])
@@ -0,0 +1,140 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as vicky
+from integrations_google import SheetSnapshot
+from workers_warmup import Warmup
+
+HEADERS = ["Nombre", "WhatsApp", "ESTATUS"]
+ROWS = [["Juan", "5216681234567", "PENDIENTE"]]
+
+
+@pytest.fixture
+def sheets_on():
+    with patch.object(vicky, "google_ready", True), \
+         patch.object(vicky, "sheets_svc", MagicMock()), \
+         patch.object(vicky, "SHEETS_ID_LEADS", "sheet-id"), \
+         patch.object(vicky, "SHEETS_TITLE_LEADS", "Leads"):
+        yield
+
+
+def test_warmup_runs_steps_in_order_and_records_failures():
+    calls = []
+    warmup = Warmup()
+    warmup.add("uno", lambda: calls.append("uno") or {"rows": 3})
+    warmup.add("dos", lambda: 1 / 0)
+    warmup.add("tres", lambda: calls.append("tres"))
+    assert warmup.status()["state"] == "pending" and not warmup.ready()
+
+    warmup.run()
+    status = warmup.status()
+    assert calls == ["uno", "tres"]
+    assert status["state"] == "done" and status["ready"] and status["pending"] == []
+    assert [s["name"] for s in status["steps"]] == ["uno", "dos", "tres"]
+    assert status["steps"][0]["detail"] == {"rows": 3}
+    assert status["steps"][1]["ok"] is False and "ZeroDivisionError" in status["steps"][1]["error"]
+
+
+def test_warmup_deadline_reports_ready_while_a_step_hangs():
+    warmup = Warmup(deadline_s=0.05)
+    warmup.add("lento", lambda: time.sleep(0.5))
+    assert warmup.start() and not warmup.start()
+    assert not warmup.ready()
+    time.sleep(0.1)
+    status = warmup.status()
+    assert status["state"] == "deadline_exceeded" and status["ready"]
+    assert status["pending"] == ["lento"]
+    warmup.wait(2.0)
+    assert warmup.status()["state"] == "done"
+
+
+def test_ready_endpoint_is_503_until_warmup_finishes():
+    client = vicky.app.test_client()
+    assert client.get("/ext/ready").get_json() == {"ready": True, "warmup": {"state": "disabled"}}
+
+    warmup = Warmup()
+    warmup.add("paso", lambda: None)
+    with patch.object(vicky, "WARMUP_ENABLED", True), patch.object(vicky, "_warmup", warmup):
+        pending = client.get("/ext/ready")
+        assert pending.status_code == 503 and pending.get_json()["warmup"]["pending"] == ["paso"]
+        warmup.run()
+        ready = client.get("/ext/ready")
+        assert ready.status_code == 200 and ready.get_json()["ready"] is True
+    assert client.get("/health").status_code == 200
+
+
+def test_app_warmup_steps_preload_leads_and_envio_status(sheets_on):
+    with patch.object(vicky, "DRIVE_PARENT_FOLDER_ID", ""), \
+         patch.object(vicky, "BUS_URL", ""), \
+         patch.object(vicky._google, "sheets"), \
+         patch.object(vicky, "_sheet_get_rows", return_value=(HEADERS, ROWS)) as get_rows, \
+         patch.object(vicky, "_read_envio_status", return_value=[["TELEFONO"], ["6681234567", "w", "sent", "t", "promo_tpv"]]) as read_envio:
+        warmup = Warmup()
+        for name, fn in vicky._warmup._steps:
+            warmup.add(name, fn)
+        warmup.run()
+        details = {s["name"]: s.get("detail") for s in warmup.status()["steps"]}
+        assert details["leads"] == {"headers": 3, "rows": 1}
+        assert details["envio_status"] == {"rows": 2}
+        assert details["drive_folders"] == "omitido" and details["bus"] == "omitido"
+
+        # El primer turno ya no relee ninguna de las dos hojas.
+        assert vicky.match_client_in_sheets("6681234567")["nombre"] == "Juan"
+        assert vicky.get_last_envio_template("6681234567") == "promo_tpv"
+        assert get_rows.call_count == 1 and read_envio.call_count == 1
+
+
+def test_leads_snapshot_is_invalidated_by_local_writes(sheets_on):
+    with patch.object(vicky, "_sheet_get_rows", return_value=(HEADERS, ROWS)) as get_rows:
+        assert vicky.match_client_in_sheets("6681234567")["row"] == 2
+        vicky._safe_update_row_cells(2, {"ESTATUS": "CONTACTADO"})
+        assert get_rows.call_count == 1
+        vicky.match_client_in_sheets("6681234567")
+        assert get_rows.call_count == 2
+
+
+def test_snapshot_miss_rereads_sheet_before_treating_phone_as_unknown(sheets_on):
+    added = ROWS + [["Ana", "5216687654321", "PENDIENTE"]]
+    with patch.object(vicky, "LEADS_MISS_REFRESH_MIN_AGE_S", 0.0), \
+         patch.object(vicky, "_sheet_get_rows", side_effect=[(HEADERS, ROWS), (HEADERS, added), (HEADERS, added)]) as get_rows:
+        assert vicky.match_client_in_sheets("6681234567")["row"] == 2
+        # Otro proceso agrego a Ana despues del snapshot: el miss relee.
+        assert vicky.match_client_in_sheets("6687654321")["nombre"] == "Ana"
+        assert get_rows.call_count == 2
+        assert vicky.match_client_in_sheets("6680000000") is None
+        assert get_rows.call_count == 3
+
+
+def test_snapshot_miss_refresh_is_shared_inside_min_age(sheets_on):
+    with patch.object(vicky, "_sheet_get_rows", return_value=(HEADERS, ROWS)) as get_rows:
+        assert vicky.match_client_in_sheets("6680000000") is None
+        assert vicky.match_client_in_sheets("6680000001") is None
+        assert get_rows.call_count == 1
+
+
+def test_sheet_snapshot_ttl_zero_always_reads():
+    loads = []
+    snapshot = SheetSnapshot(0, lambda: loads.append(1) or len(loads))
+    assert snapshot.get() == 1 and snapshot.get() == 2
+    cached = SheetSnapshot(60, lambda: loads.append(1) or len(loads))
+    assert cached.get() == cached.get() == 3
+    assert cached.stats()["hits"] == 1 and cached.stats()["loads"] == 1
+
+
+def test_drive_folders_are_primed_and_reused():
+    drive = MagicMock()
+    drive.files().list().execute.side_effect = [
+        {"files": [{"id": "f1", "name": "Juan_4567"}], "nextPageToken": "p2"},
+        {"files": [{"id": "f2", "name": "Ana_1111"}]},
+    ]
+    drive.files.reset_mock()
+    with patch.object(vicky, "google_ready", True), \
+         patch.object(vicky, "drive_svc", drive), \
+         patch.object(vicky, "DRIVE_PARENT_FOLDER_ID", "parent"):
+        assert vicky._prime_drive_folders() == 2
+        assert drive.files().list.call_args.kwargs["pageToken"] == "p2"
+        drive.files.reset_mock()
+        assert vicky._find_or_create_client_folder("Ana_1111") == "f2"
+        drive.files().list.assert_not_called()
@@ -0,0 +1,72 @@
+import threading
+from unittest.mock import patch
+
+import app as vicky
+
+ANA = "5216681111111"
+BETO = "5216682222222"
+
+
+def _msg(phone, msg_id, ts, text="hola"):
+    return {"from": phone, "id": msg_id, "timestamp": str(ts), "type": "text", "text": {"body": text}}
+
+
+def _batch():
+    # Dos entries, varios changes; mensajes desordenados y un id repetido.
+    return {"entry": [
+        {"changes": [
+            {"value": {"messages": [_msg(ANA, "a2", 102, "segundo"), _msg(BETO, "b1", 100)]}},
+            {"value": {"messages": [_msg(ANA, "a1", 101, "primero")]}},
+        ]},
+        {"changes": [{"value": {
+            "messages": [_msg(ANA, "a3", 103, "tercero"), _msg(ANA, "a2", 102, "segundo")],
+            "statuses": [{"id": "wamid.s", "status": "read", "recipient_id": BETO}],
+        }}]},
+    ]}
+
+
+def test_grouping_orders_each_phone_by_timestamp_and_drops_repeated_ids():
+    payload = _batch()
+    groups = vicky._group_messages_by_phone(vicky.extract_messages(payload))
+    assert list(groups) == [ANA, BETO]
+    assert [m["id"] for m in groups[ANA]] == ["a1", "a2", "a3"]
+    assert [m["id"] for m in groups[BETO]] == ["b1"]
+
+
+def test_webhook_processes_every_message_with_one_lookup_per_phone(isolated_delivery_tracker):
+    seen = []
+    lock = threading.Lock()
+
+    def process(msg):
+        vicky._lookup_client(vicky._normalize_phone_last10(msg["from"]))
+        with lock:
+            seen.append(msg["id"])
+
+    with patch.object(vicky, "_process_inbound_message", side_effect=process), \
+         patch.object(vicky, "match_client_in_sheets", return_value=None) as lookup:
+        assert vicky.app.test_client().post("/webhook", json=_batch()).status_code == 200
+
+    assert sorted(seen) == ["a1", "a2", "a3", "b1"]
+    assert [i for i in seen if i.startswith("a")] == ["a1", "a2", "a3"]
+    assert sorted(c.args[0] for c in lookup.call_args_list) == ["6681111111", "6682222222"]
+    assert isolated_delivery_tracker.stats()["statuses"] == 1
+
+
+def test_failing_message_does_not_drop_the_rest_of_the_batch():
+    seen = []
+
+    def process(msg):
+        if msg["id"] == "a1":
+            raise RuntimeError("boom")
+        seen.append(msg["id"])
+
+    with patch.object(vicky, "_process_inbound_message", side_effect=process):
+        assert vicky.app.test_client().post("/webhook", json=_batch()).status_code == 200
+    assert sorted(seen) == ["a2", "a3", "b1"]
+
+
+def test_lookup_outside_a_group_is_not_memoized():
+    with patch.object(vicky, "match_client_in_sheets", return_value=None) as lookup:
+        vicky._lookup_client("6681111111")
+        vicky._lookup_client("6681111111")
+    assert lookup.call_count == 2
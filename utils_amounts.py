@@ -0,0 +1,116 @@
+# utils_amounts.py — parser de montos en espanol (digitos, palabras y magnitudes)
+# ------------------------------------------------------------
+# extract_number encadenaba .replace() y una regex: "500 mil" daba 500,
+# "1.5 millones" daba 1.5000000 y "ocho mil quinientos" no daba nada. Aqui
+# una sola regex precompilada parte el texto en tokens (numero o palabra) y
+# un recorrido acumula el monto con la regla de siempre: los valores se
+# suman, "mil" multiplica lo acumulado del grupo y "millon(es)" cierra un
+# grupo. Gana el primer monto "fuerte" (con digitos, magnitud o seguido de
+# "pesos"/"mxn"): en "tengo dos hijos y 40 años" el monto es 40, no 2. Si
+# ninguno lo es, gana el primero ("treinta y cinco").
+# Un texto que es solo digitos ("8500", "45") no pasa por el recorrido.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional
+
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|[a-záéíóúüñ]+")
+_SEPARATORS = re.compile(r"[.,]")
+
+_UNITS: Dict[str, int] = {
+    "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9,
+    "diez": 10, "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
+    "dieciseis": 16, "diecisiete": 17, "dieciocho": 18, "diecinueve": 19,
+    "veinte": 20, "veintiun": 21, "veintiuno": 21, "veintidos": 22, "veintitres": 23, "veinticuatro": 24,
+    "veinticinco": 25, "veintiseis": 26, "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
+    "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60, "setenta": 70, "ochenta": 80, "noventa": 90,
+    "cien": 100, "ciento": 100, "doscientos": 200, "trescientos": 300, "cuatrocientos": 400,
+    "quinientos": 500, "seiscientos": 600, "setecientos": 700, "ochocientos": 800, "novecientos": 900,
+    "doscientas": 200, "trescientas": 300, "cuatrocientas": 400, "quinientas": 500,
+    "seiscientas": 600, "setecientas": 700, "ochocientas": 800, "novecientas": 900,
+}
+_ACCENTED = {"dieciséis": 16, "veintiún": 21, "veintidós": 22, "veintitrés": 23, "veintiséis": 26}
+
+# Clase de cada palabra conocida en un solo dict: valor (> 0), magnitud o
+# articulo. Las palabras con acento van tal cual para no normalizar el texto.
+_MIL, _MILLON, _ARTICULO, _Y = -1, -2, -3, -4
+_WORDS: Dict[str, int] = {
+    **_UNITS, **_ACCENTED,
+    "mil": _MIL, "k": _MIL,
+    "millon": _MILLON, "millón": _MILLON, "millones": _MILLON, "mdp": _MILLON,
+    # "un"/"una" no empiezan un monto: "un millon" si, "un auto" no.
+    "un": _ARTICULO, "una": _ARTICULO,
+    "y": _Y,
+}
+_CURRENCY = frozenset({"pesos", "peso", "mxn"})
+
+
+def _digits_value(token: str) -> float:
+    """Numero con separadores: la coma es de miles salvo que no agrupe de a
+    3; con punto y coma juntos, el ultimo separador es el decimal."""
+    if "," in token and "." in token:
+        cut = max(token.rfind(","), token.rfind("."))
+        return float(_SEPARATORS.sub("", token[:cut]) + "." + token[cut + 1:])
+    sep = "," if "," in token else "." if "." in token else ""
+    if not sep:
+        return float(token)
+    parts = token.split(sep)
+    if len(parts) > 2 or len(parts[1]) == 3:
+        return float("".join(parts))
+    return float(parts[0] + "." + parts[1])
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Monto del texto como float, o None si no hay ninguno."""
+    if not text:
+        return None
+    stripped = text.strip()
+    if stripped.isdigit():
+        return float(stripped)
+
+    first: Optional[float] = None
+    total = group = 0.0
+    started = strong = False
+    last = ""  # "digits", "y" o "" (palabra) -- token anterior del monto
+    for tok in _TOKEN.findall(text.lower()):
+        is_digits = tok[0].isdigit()
+        kind = None if is_digits else _WORDS.get(tok)
+        # Fin del monto en curso: dos numeros sueltos ("45 3"), una palabra
+        # ajena o un articulo despues de empezar. "y" solo une palabras
+        # ("treinta y cinco"); junto a digitos es un rango o una lista
+        # ("entre 50 y 100 mil", "8,500 y 9000") y el monto es el primero.
+        if started and (
+            (is_digits and last in ("digits", "y"))
+            or (kind == _Y and last == "digits")
+            or (not is_digits and kind in (None, _ARTICULO))
+        ):
+            if tok in _CURRENCY:
+                strong = True
+            if strong:
+                return total + group
+            if first is None:
+                first = total + group
+            total = group = 0.0
+            started = False
+        last = "digits" if is_digits else "y" if kind == _Y else ""
+        if is_digits:
+            group += _digits_value(tok)
+            started = strong = True
+        elif kind is None or kind in (_ARTICULO, _Y):
+            # "y" ("treinta y cinco") y articulos antes del monto se saltan.
+            continue
+        elif kind > 0:
+            group += kind
+            started = True
+        elif kind == _MIL:
+            group = (group or 1.0) * 1000
+            started = strong = True
+        elif kind == _MILLON:
+            total += (group or 1.0) * 1_000_000
+            group = 0.0
+            started = strong = True
+    if started and (strong or first is None):
+        return total + group
+    return first
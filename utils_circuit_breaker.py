@@ -0,0 +1,164 @@
+# utils_circuit_breaker.py — circuit breaker por upstream (closed/open/half-open)
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Breaker por tasa de fallos en una ventana deslizante de tiempo.
+
+    - closed: todo pasa; se registran exitos/fallos de los ultimos
+      `window_s` segundos. Con al menos `min_calls` llamadas y una tasa de
+      fallo >= `failure_rate`, abre.
+    - open: allow() devuelve False (fail-fast al fallback del caller)
+      durante `open_s` segundos.
+    - half_open: deja pasar una llamada de prueba cada `probe_interval_s`;
+      si sale bien cierra, si falla vuelve a open. Una prueba que nunca
+      reporta no bloquea: a los `probe_interval_s` se permite otra.
+
+    El breaker no hace la llamada: el caller pregunta allow() y despues
+    reporta record_success()/record_failure(). Asi encaja en los helpers
+    existentes sin cambiar su forma de devolver errores.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_s: float = 30.0,
+        open_s: float = 30.0,
+        probe_interval_s: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate = float(failure_rate)
+        self.min_calls = max(1, int(min_calls))
+        self.window_s = float(window_s)
+        self.open_s = float(open_s)
+        self.probe_interval_s = float(probe_interval_s)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._last_probe_at = float("-inf")
+        self._rejected = 0
+        self._opened_count = 0
+
+    # ---------- API ----------
+    def allow(self) -> bool:
+        with self._lock:
+            now = self._clock()
+            if self._state == OPEN and now - self._opened_at >= self.open_s:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and now - self._last_probe_at >= self.probe_interval_s:
+                self._last_probe_at = now
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._close()
+                return
+            self._push(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self._clock()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            self._push(False)
+            if self._state == CLOSED:
+                total = len(self._events)
+                failures = sum(1 for _, ok in self._events if not ok)
+                if total >= self.min_calls and failures / total >= self.failure_rate:
+                    self._open(now)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_s:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            self._trim(self._clock())
+            total = len(self._events)
+            failures = sum(1 for _, ok in self._events if not ok)
+            return {
+                "state": state,
+                "window_calls": total,
+                "window_failures": failures,
+                "rejected": self._rejected,
+                "opened_count": self._opened_count,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._close()
+
+    # ---------- Internos (con lock tomado) ----------
+    def _push(self, ok: bool) -> None:
+        now = self._clock()
+        self._events.append((now, ok))
+        self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        horizon = now - self.window_s
+        while self._events and self._events[0][0] < horizon:
+            self._events.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._last_probe_at = float("-inf")
+        self._opened_count += 1
+        self._events.clear()
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._events.clear()
+
+
+class BreakerRegistry:
+    """Un breaker por upstream, creado bajo demanda con la misma config."""
+
+    def __init__(self, **defaults: Any) -> None:
+        self._defaults = defaults
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self._defaults)
+                self._breakers[name] = breaker
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in breakers}
+
+    def reset(self) -> None:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        for b in breakers:
+            b.reset()
+
@@ -0,0 +1,129 @@
+# utils_latency.py — histograma rodante de latencias y timeout adaptativo
+# ------------------------------------------------------------
+# Un timeout fijo paga el peor caso en cada turno degradado cuando el
+# upstream sano responde en 200 ms, y se queda corto en sus cold starts.
+# Aqui cada endpoint lleva un histograma de las ultimas N latencias (buckets
+# log-espaciados + ring buffer para sacar las viejas) y el timeout sale de
+# un percentil configurable + margen, acotado por piso y techo.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Limites superiores de bucket en segundos: 5 ms .. ~60 s, razon ~1.15.
+_BUCKETS: List[float] = []
+_b = 0.005
+while _b < 60.0:
+    _BUCKETS.append(round(_b, 4))
+    _b *= 1.15
+_BUCKETS.append(float("inf"))
+
+REPORTED_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class LatencyTracker:
+    """Latencias recientes de un endpoint y el timeout derivado.
+
+    - record(seconds): agrega una muestra; al pasar `window` muestras se
+      descarta la mas vieja. Un timeout se registra con el valor del timeout
+      usado (muestra censurada): asi el percentil sube solo y el timeout
+      crece por `margin_s` en cada racha lenta hasta el techo.
+    - timeout(): `default_s` mientras haya menos de `min_samples`; despues
+      percentil(`percentile`) + `margin_s`, dentro de [floor_s, ceiling_s].
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        percentile: float = 0.95,
+        margin_s: float = 0.3,
+        floor_s: float = 0.8,
+        ceiling_s: float = 6.0,
+        default_s: float = 3.0,
+        min_samples: int = 20,
+    ) -> None:
+        self.window = max(1, int(window))
+        self.percentile = min(1.0, max(0.0, float(percentile)))
+        self.margin_s = float(margin_s)
+        self.floor_s = float(floor_s)
+        self.ceiling_s = max(self.floor_s, float(ceiling_s))
+        self.default_s = float(default_s)
+        self.min_samples = max(1, int(min_samples))
+        self._lock = threading.Lock()
+        self._counts = [0] * len(_BUCKETS)
+        self._ring: Deque[int] = deque()
+        self._timeouts = 0
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        idx = bisect.bisect_left(_BUCKETS, max(0.0, float(seconds)))
+        with self._lock:
+            if len(self._ring) >= self.window:
+                self._counts[self._ring.popleft()] -= 1
+            self._ring.append(idx)
+            self._counts[idx] += 1
+            if timed_out:
+                self._timeouts += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            return self._quantile(q)
+
+    def timeout(self) -> float:
+        with self._lock:
+            if len(self._ring) < self.min_samples:
+                return self.default_s
+            value = self._quantile(self.percentile)
+        value = (value if value is not None else self.default_s) + self.margin_s
+        return round(min(self.ceiling_s, max(self.floor_s, value)), 3)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snap: Dict[str, Any] = {
+                f"p{int(q * 100)}": self._quantile(q) for q in REPORTED_PERCENTILES
+            }
+            snap["samples"] = len(self._ring)
+            snap["timeouts"] = self._timeouts
+        snap["timeout_s"] = self.timeout()
+        return snap
+
+    def _quantile(self, q: float) -> Optional[float]:
+        # Con lock tomado. Devuelve el limite superior del bucket (el techo
+        # del ultimo bucket finito para el bucket de desborde).
+        total = len(self._ring)
+        if not total:
+            return None
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for idx, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                bound = _BUCKETS[idx]
+                return bound if bound != float("inf") else _BUCKETS[-2]
+        return _BUCKETS[-2]
+
+
+class LatencyRegistry:
+    """Un tracker por endpoint, creado bajo demanda con la misma config."""
+
+    def __init__(self, **defaults: Any) -> None:
+        self._defaults = defaults
+        self._lock = threading.Lock()
+        self._trackers: Dict[str, LatencyTracker] = {}
+
+    def get(self, key: str) -> LatencyTracker:
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = LatencyTracker(**self._defaults)
+                self._trackers[key] = tracker
+            return tracker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            items = list(self._trackers.items())
+        return {key: tracker.snapshot() for key, tracker in items}
@@ -1,4 +1,30 @@
+# utils_logger.py — logging no bloqueante (QueueHandler/QueueListener) y muestreo
+# ------------------------------------------------------------
+# Cada log.info del turno escribia a stderr en el thread del request, y el
+# webhook serializaba el payload completo solo para loguear 500 caracteres.
+#   - setup_queue_logging: el root solo encola (put_nowait, sin lock de I/O)
+#     y un QueueListener escribe. El formateo (args -> mensaje) tambien pasa
+#     al listener. Cola llena = el registro se descarta y se cuenta.
+#   - LazyJson: el payload se serializa solo si el registro se emite, en el
+#     listener, y se corta en la fuente (iterencode se detiene al limite).
+#   - SamplingFilter: lineas de alto volumen marcadas con
+#     extra={"sample": "<clave>"} pasan 1 de cada round(1/tasa); la que pasa
+#     dice cuantas similares se omitieron.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import atexit
+import json
 import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, default=str)
+
 
 def get_logger(name: str = "vicky", level: str = "INFO") -> logging.Logger:
     logger = logging.getLogger(name)
@@ -9,3 +35,155 @@ def get_logger(name: str = "vicky", level: str = "INFO") -> logging.Logger:
     handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
     logger.addHandler(handler)
     return logger
+
+
+class LazyJson:
+    """JSON truncado que se calcula en str(), es decir, solo al formatear."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = 500) -> None:
+        self.value = value
+        self.limit = int(limit)
+
+    def __str__(self) -> str:
+        parts = []
+        size = 0
+        try:
+            for chunk in _ENCODER.iterencode(self.value):
+                parts.append(chunk)
+                size += len(chunk)
+                if self.limit and size > self.limit:
+                    return "".join(parts)[: self.limit] + "…"
+        except (TypeError, ValueError):
+            return repr(self.value)[: self.limit or None]
+        return "".join(parts)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """"status=0.1,bulk_progress=0.05" -> {"status": 0.1, ...}. Entradas
+    invalidas se ignoran."""
+    rates: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if not key:
+            continue
+        try:
+            rates[key] = max(0.0, min(1.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada N registros por clave `record.sample`. Registros
+    sin clave, o con clave sin tasa, pasan siempre."""
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = dict(rates)
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._lines: Dict[Tuple[str, str], int] = {}
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        rate = self.rates.get(key) if key else None
+        if rate is None or rate >= 1.0:
+            return True
+        # Cada linea (plantilla del mensaje) lleva su propia cuenta aunque
+        # compartan clave de tasa.
+        line = (key, str(record.msg))
+        with self._lock:
+            self._seen[key] = self._seen.get(key, 0) + 1
+            seen = self._lines.get(line, 0)
+            self._lines[line] = seen + 1
+            if rate <= 0.0 or seen % max(1, round(1.0 / rate)):
+                self._suppressed[line] = self._suppressed.get(line, 0) + 1
+                return False
+            omitted = self._suppressed.pop(line, 0)
+        if omitted:
+            record.msg = f"{record.msg} (+{omitted} similares omitidos)"
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"rates": dict(self.rates), "seen": dict(self._seen)}
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Mismo proceso: el listener formatea el registro original (args y
+        # exc_info intactos) en lugar de hacerlo aqui, en el thread del request.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class QueueLogging:
+    """Pipeline root -> cola acotada -> QueueListener -> StreamHandler."""
+
+    def __init__(self, fmt: str, datefmt: Optional[str] = None, max_queue: int = 10000) -> None:
+        self.queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(0, int(max_queue)))
+        self.handler = _NonBlockingQueueHandler(self.queue)
+        self.stream = logging.StreamHandler()
+        self.stream.setFormatter(logging.Formatter(fmt, datefmt))
+        self._listener: Optional[QueueListener] = None
+
+    def start(self) -> None:
+        self._listener = QueueListener(self.queue, self.stream, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self) -> None:
+        """Vacia la cola y detiene el listener (atexit)."""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def _restart_in_child(self) -> None:
+        # Tras fork (gunicorn --preload) el thread del listener no existe en
+        # el hijo: se descarta lo heredado y se levanta uno nuevo.
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.handler.queue = self.queue
+        self._listener = None
+        self.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "running": self._listener is not None,
+        }
+
+
+def setup_queue_logging(
+    level: int = logging.INFO,
+    fmt: str = "%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    datefmt: Optional[str] = None,
+    max_queue: int = 10000,
+) -> Optional[QueueLogging]:
+    """Como logging.basicConfig, pero con la escritura en un thread aparte.
+    Si el root ya tiene handlers (otro runner ya configuro logging) no toca
+    nada y devuelve None."""
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    pipeline = QueueLogging(fmt, datefmt, max_queue)
+    root.setLevel(level)
+    root.addHandler(pipeline.handler)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=pipeline._restart_in_child)
+    return pipeline
@@ -0,0 +1,165 @@
+# utils_metrics.py — histogramas por etapa del turno y salida Prometheus
+# ------------------------------------------------------------
+# Una respuesta lenta podia venir de Sheets, Boardroom, Graph o Drive y la
+# unica pista eran lineas de log. Aqui cada etapa instrumentada alimenta un
+# histograma acumulado (buckets fijos, contador y suma, como un histogram
+# de Prometheus) por (etapa, resultado). Registrar es un bisect y tres
+# sumas bajo un lock por serie; no hay threads ni I/O.
+# `render_prometheus()` produce el formato de texto 0.0.4 para /ext/metrics:
+# p50/p95/p99 salen con histogram_quantile() en Prometheus, y ademas se
+# exportan estimados locales (interpolados por bucket) para verlos sin PromQL.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import bisect
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Limites superiores en segundos: de 5 ms (lookup en memoria) a 30 s (Drive).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Buckets acumulables + suma + conteo; quantile() interpola dentro del bucket."""
+
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # ultimo = +Inf
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        idx = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += seconds
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, q: float, snap: Optional[Tuple[List[int], float, int]] = None) -> Optional[float]:
+        counts, _total, count = snap or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for idx, n in enumerate(counts):
+            if n and seen + n >= rank:
+                if idx >= len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[idx - 1] if idx else 0.0
+                return lower + (self.bounds[idx] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class StageMetrics:
+    """Histogramas de latencia por (etapa, resultado) y contadores sueltos."""
+
+    def __init__(self, namespace: str = "vicky", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.namespace = namespace
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stage: str, seconds: float, outcome: str = "ok") -> None:
+        key = (stage, outcome)
+        hist = self._series.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._series.setdefault(key, Histogram(self.buckets))
+        hist.observe(max(0.0, seconds))
+
+    def inc(self, name: str, label: str = "", value: int = 1) -> None:
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0) + value
+
+    def timed(self, stage: str, outcome: Optional[Callable[[Any], str]] = None) -> Callable:
+        """Decorador: mide la llamada completa. `outcome(result)` clasifica
+        el resultado ("ok", "miss", "timeout"...); una excepcion es "error"."""
+
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    self.observe(stage, time.perf_counter() - start, "error")
+                    raise
+                try:
+                    label = outcome(result) if outcome else "ok"
+                except Exception:
+                    label = "unknown"
+                self.observe(stage, time.perf_counter() - start, label)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            series = sorted(self._series.items())
+        out: Dict[str, Dict[str, Any]] = {}
+        for (stage, outcome), hist in series:
+            snap = hist.snapshot()
+            entry: Dict[str, Any] = {"count": snap[2], "sum_s": round(snap[1], 4)}
+            for q in QUANTILES:
+                value = hist.quantile(q, snap)
+                entry[f"p{int(q * 100)}"] = round(value, 4) if value is not None else None
+            out.setdefault(stage, {})[outcome] = entry
+        return out
+
+    def render_prometheus(self) -> str:
+        ns = self.namespace
+        with self._lock:
+            series = sorted(self._series.items())
+            counters = sorted(self._counters.items())
+        lines = [
+            f"# HELP {ns}_stage_duration_seconds Latencia por etapa del turno.",
+            f"# TYPE {ns}_stage_duration_seconds histogram",
+        ]
+        quantile_lines: List[str] = []
+        for (stage, outcome), hist in series:
+            labels = f'stage="{_escape(stage)}",outcome="{_escape(outcome)}"'
+            counts, total, count = snap = hist.snapshot()
+            cumulative = 0
+            for bound, n in zip(hist.bounds, counts):
+                cumulative += n
+                lines.append(f'{ns}_stage_duration_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{ns}_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{ns}_stage_duration_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{ns}_stage_duration_seconds_count{{{labels}}} {count}")
+            for q in QUANTILES:
+                value = hist.quantile(q, snap)
+                if value is not None:
+                    quantile_lines.append(f'{ns}_stage_duration_estimate_seconds{{{labels},quantile="{q:g}"}} {value:.6f}')
+        if quantile_lines:
+            lines.append(f"# HELP {ns}_stage_duration_estimate_seconds Percentil estimado en proceso (interpolado por bucket).")
+            lines.append(f"# TYPE {ns}_stage_duration_estimate_seconds gauge")
+            lines.extend(quantile_lines)
+        names = sorted({name for (name, _label), _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {ns}_{name}_total counter")
+            for (cname, label), value in counters:
+                if cname == name:
+                    suffix = f'{{kind="{_escape(label)}"}}' if label else ""
+                    lines.append(f"{ns}_{name}_total{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,246 @@
+# utils_profiler.py — profiler por muestreo y cProfile de un request, bajo demanda
+# ------------------------------------------------------------
+# Cuando la latencia se dispara en produccion no hay forma de perfilar sin
+# redeploy. Dos herramientas que se prenden desde un endpoint:
+#   - StackSampler: un thread toma sys._current_frames() cada interval_s
+#     durante N segundos y cuenta cada pila. No instrumenta llamadas (el
+#     costo es un recorrido de pilas por muestra, ~200 Hz por defecto) y se
+#     apaga solo. Salida en formato "collapsed" (una linea por pila:
+#     "thread;f1;f2;f3 cuenta"), la que consumen flamegraph.pl y speedscope.
+#   - RequestProfiler: arma cProfile para los siguientes `count` requests
+#     cuyo path empiece con el prefijo; guarda el reporte pstats (texto) y,
+#     si hay directorio de salida, el .pstats binario.
+# Sin threads al importar: el sampler solo existe mientras muestrea.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+
+log = logging.getLogger("vicky-secom.profiler")
+
+_THREAD_DIGITS = re.compile(r"[-_ ]?\d+")
+# Hojas de threads ociosos (pool esperando trabajo, servidor en select):
+# se descartan salvo include_idle, para que el flamegraph muestre trabajo.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socketserver.py", "serve_forever"),
+}
+
+
+def _frame_label(code: Any) -> str:
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_root(name: str) -> str:
+    # "Thread-12 (process_request_thread)" y "Thread-13 (...)" son el mismo rol.
+    return _THREAD_DIGITS.sub("", name).replace(";", ",") or "thread"
+
+
+class StackSampler:
+    """Muestreo de pilas de todos los threads durante una ventana acotada."""
+
+    def __init__(self, max_seconds: float = 300.0, max_depth: int = 96, output_dir: str = "") -> None:
+        self.max_seconds = float(max_seconds)
+        self.max_depth = int(max_depth)
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self._status: Dict[str, Any] = {"running": False}
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._status)
+            snapshot["stacks"] = len(self._stacks)
+        snapshot["running"] = self.is_running()
+        return snapshot
+
+    def start(self, seconds: float, interval_s: float = 0.005, include_idle: bool = False) -> bool:
+        """Arranca una captura nueva (descarta la anterior). False si ya hay
+        una corriendo."""
+        seconds = max(0.1, min(float(seconds), self.max_seconds))
+        interval_s = max(0.001, float(interval_s))
+        with self._lock:
+            if self.is_running():
+                return False
+            self._stop.clear()
+            self._stacks = Counter()
+            self._status = {
+                "running": True,
+                "seconds": seconds,
+                "interval_ms": round(interval_s * 1000, 3),
+                "include_idle": include_idle,
+                "samples": 0,
+                "started_at": datetime.utcnow().isoformat(),
+                "finished_at": None,
+                "output_file": None,
+            }
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, interval_s, include_idle),
+                daemon=True, name="StackSampler",
+            )
+            self._thread.start()
+        log.info("🔬 Sampler activo %.1fs cada %.1f ms", seconds, interval_s * 1000)
+        return True
+
+    def stop(self) -> bool:
+        if not self.is_running():
+            return False
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        if self._thread:
+            self._thread.join(timeout)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def _sample_once(self, own_ident: Optional[int], include_idle: bool) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        found: List[str] = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            labels: List[str] = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(_thread_root(names.get(ident, "thread")))
+            found.append(";".join(reversed(labels)))
+        with self._lock:
+            self._stacks.update(found)
+            self._status["samples"] += 1
+
+    def _run(self, seconds: float, interval_s: float, include_idle: bool) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                self._sample_once(own, include_idle)
+                self._stop.wait(interval_s)
+        except Exception:
+            log.exception("❌ Error en el sampler de pilas")
+        output_file = _write_output(self.output_dir, "stacks", "collapsed", self.collapsed())
+        with self._lock:
+            self._status["finished_at"] = datetime.utcnow().isoformat()
+            self._status["output_file"] = output_file
+        log.info("🔬 Sampler terminado: %s muestras, %s pilas", self._status["samples"], len(self._stacks))
+
+
+class RequestProfiler:
+    """cProfile para los siguientes `count` requests que coincidan con el path."""
+
+    def __init__(self, output_dir: str = "", top: int = 60) -> None:
+        self.output_dir = output_dir
+        self.top = int(top)
+        self._lock = threading.Lock()
+        self._armed = 0
+        self._prefix = "/webhook"
+        self._last: Optional[Dict[str, Any]] = None
+
+    def arm(self, count: int = 1, path_prefix: str = "/webhook") -> Dict[str, Any]:
+        with self._lock:
+            self._armed = max(0, int(count))
+            self._prefix = path_prefix or "/"
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            last = {k: v for k, v in (self._last or {}).items() if k != "report"} or None
+            return {"armed": self._armed, "path_prefix": self._prefix, "last": last}
+
+    def maybe_start(self, path: str) -> Optional[cProfile.Profile]:
+        """Llamado al inicio de cada request; barato cuando no hay nada armado."""
+        if not self._armed:
+            return None
+        with self._lock:
+            if not self._armed or not (path or "").startswith(self._prefix):
+                return None
+            self._armed -= 1
+        import cProfile  # solo cuando hay algo armado: no pesa en el cold start
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Otro profiler ya activo en este thread.
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, label: str) -> None:
+        import pstats
+
+        profile.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        report = f"# {label}\n{out.getvalue()}"
+        output_file = None
+        if self.output_dir:
+            output_file = _output_path(self.output_dir, "request", "pstats")
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                stats.dump_stats(output_file)
+            except OSError:
+                log.exception("❌ No fue posible guardar %s", output_file)
+                output_file = None
+        with self._lock:
+            self._last = {
+                "label": label,
+                "at": datetime.utcnow().isoformat(),
+                "total_s": round(stats.total_tt, 6),
+                "output_file": output_file,
+                "report": report,
+            }
+
+    def last_report(self) -> Optional[str]:
+        with self._lock:
+            return (self._last or {}).get("report")
+
+
+def _output_path(output_dir: str, prefix: str, ext: str) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    return os.path.join(output_dir, f"{prefix}-{stamp}.{ext}")
+
+
+def _write_output(output_dir: str, prefix: str, ext: str, text: str) -> Optional[str]:
+    if not output_dir:
+        return None
+    path = _output_path(output_dir, prefix, ext)
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    except OSError:
+        log.exception("❌ No fue posible guardar %s", path)
+        return None
+    return path
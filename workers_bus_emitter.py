@@ -0,0 +1,227 @@
+# workers_bus_emitter.py — emisor acotado de eventos hacia el bus de Boardroom
+# ------------------------------------------------------------
+# Antes cada evento fire-and-forget abria su propio threading.Thread con un
+# requests.post suelto: bajo carga eso es creacion ilimitada de threads, sin
+# reuso de conexiones y sin backpressure si el bus esta lento. Aqui hay un
+# numero fijo de workers, una cola en memoria acotada con politica de
+# desborde explicita, una requests.Session con pool de conexiones y
+# micro-batching opcional. Los contadores quedan visibles en /ext/health.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("vicky-secom.bus")
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+
+class BusItem(NamedTuple):
+    url: str
+    payload: Dict[str, Any]
+    headers: Dict[str, str]
+    batch_url: Optional[str]
+    label: str
+
+
+class BusEmitter:
+    """Pool fijo de workers que entrega eventos al bus en segundo plano.
+
+    - submit() nunca bloquea ni crea threads: encola o descarta segun
+      `overflow` (drop_oldest: se pierde el evento mas viejo; drop_newest:
+      se rechaza el nuevo) y devuelve si el evento quedo encolado.
+    - Con batch_max > 1, los eventos consecutivos con el mismo `batch_url`
+      se agrupan (hasta batch_max o batch_wait_s) en un solo POST
+      {"events": [...]}; sin batch_url cada evento va solo a su `url`.
+    - Los workers arrancan en el primer submit (importar el modulo no crea
+      threads).
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue: int = 1000,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        batch_max: int = 1,
+        batch_wait_s: float = 0.05,
+        timeout: float = 3.0,
+        session: Optional[requests.Session] = None,
+        on_result: Optional[Callable[[BusItem, bool, float], None]] = None,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.overflow = overflow if overflow in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST) else OVERFLOW_DROP_OLDEST
+        self.batch_max = max(1, int(batch_max))
+        self.batch_wait_s = max(0.0, float(batch_wait_s))
+        self.timeout = timeout
+        self.on_result = on_result
+        self._session = session or self._pooled_session(self.workers)
+        self._queue: Deque[BusItem] = deque()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stop = False
+        self._inflight = 0
+        self._counters = {
+            "submitted": 0,
+            "sent": 0,
+            "failed": 0,
+            "dropped_overflow": 0,
+            "batches": 0,
+        }
+
+    @staticmethod
+    def _pooled_session(pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 4))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # ---------- API ----------
+    def submit(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        batch_url: Optional[str] = None,
+        label: str = "",
+    ) -> bool:
+        item = BusItem(url, payload, dict(headers or {}), batch_url if self.batch_max > 1 else None, label)
+        with self._cond:
+            self._counters["submitted"] += 1
+            if len(self._queue) >= self.max_queue:
+                self._counters["dropped_overflow"] += 1
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    log.warning("⚠️ Cola del bus llena (%s); evento %s descartado", self.max_queue, label)
+                    return False
+                dropped = self._queue.popleft()
+                log.warning("⚠️ Cola del bus llena (%s); se descarta evento viejo %s", self.max_queue, dropped.label)
+            self._queue.append(item)
+            self._ensure_started()
+            self._cond.notify()
+        return True
+
+    def preconnect(self, url: str) -> int:
+        """Abre (TLS incluido) una conexion del pool hacia el host de `url`
+        para que el primer envio real no pague el handshake. Devuelve el
+        status HTTP; cualquier respuesta deja la conexion en el pool."""
+        resp = self._session.head(url, timeout=self.timeout)
+        return resp.status_code
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["queued"] = len(self._queue)
+        stats.update(
+            workers=self.workers,
+            workers_alive=sum(1 for t in self._threads if t.is_alive()),
+            max_queue=self.max_queue,
+            overflow=self.overflow,
+            batch_max=self.batch_max,
+        )
+        return stats
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que la cola se vacie (tests / apagado ordenado)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._queue and self._inflight == 0:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # ---------- Workers ----------
+    def _ensure_started(self) -> None:
+        # Llamado con self._cond tomado.
+        if self._threads and all(t.is_alive() for t in self._threads):
+            return
+        self._stop = False
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for i in range(len(self._threads), self.workers):
+            t = threading.Thread(target=self._worker, daemon=True, name=f"BusEmitter-{i}")
+            self._threads.append(t)
+            t.start()
+
+    def _take_batch(self) -> List[BusItem]:
+        # Llamado con self._cond tomado y la cola no vacia.
+        first = self._queue.popleft()
+        batch = [first]
+        if first.batch_url is None:
+            return batch
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_max:
+            if self._queue:
+                if self._queue[0].batch_url != first.batch_url:
+                    break
+                batch.append(self._queue.popleft())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop:
+                break
+            self._cond.wait(remaining)
+        return batch
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                if self._stop and not self._queue:
+                    return
+                self._inflight += 1
+                batch = self._take_batch()
+            try:
+                self._deliver(batch)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+
+    def _deliver(self, batch: List[BusItem]) -> None:
+        first = batch[0]
+        started = time.monotonic()
+        ok = False
+        try:
+            if len(batch) > 1:
+                resp = self._session.post(
+                    first.batch_url,
+                    json={"events": [item.payload for item in batch]},
+                    headers=first.headers,
+                    timeout=self.timeout,
+                )
+            else:
+                resp = self._session.post(first.url, json=first.payload, headers=first.headers, timeout=self.timeout)
+            ok = resp.status_code < 400
+            if not ok:
+                log.warning("Bus emit %s respondio HTTP %s", first.label, resp.status_code)
+        except Exception as exc:
+            log.warning("Bus emit fallido %s error=%s: %s", first.label, type(exc).__name__, exc)
+        elapsed = time.monotonic() - started
+
+        with self._cond:
+            self._counters["sent" if ok else "failed"] += len(batch)
+            if len(batch) > 1:
+                self._counters["batches"] += 1
+        if self.on_result:
+            for item in batch:
+                try:
+                    self.on_result(item, ok, elapsed)
+                except Exception:
+                    log.exception("❌ Error en callback on_result del bus")
@@ -0,0 +1,167 @@
+# workers_campaign_pacer.py — pacer in-process para la campana outbound
+# ------------------------------------------------------------
+# Sustituye al cron externo que llamaba /ext/auto-send-one una vez por lead.
+# Un solo thread llama `send_next()` a ritmo fijo (intervalo entre envios)
+# hasta vaciar la cola de pendientes, hasta un maximo opcional de envios, o
+# hasta que el kill switch CF-4 / la auto-pausa por fallos lo detengan.
+# El pacer no sabe nada de Sheets ni de WhatsApp: app.py le inyecta los
+# callables, igual que el resto de workers.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+log = logging.getLogger("vicky-secom.pacer")
+
+SendNext = Callable[[], Dict[str, Any]]
+
+
+class CampaignPacer:
+    """Drena la cola de pendientes a un intervalo constante.
+
+    `send_next()` devuelve el mismo dict que /ext/auto-send-one:
+    {"sent": bool, "reason": "no_pending", "auto_paused": True, ...}.
+    `is_paused()` es el kill switch; se consulta como maximo cada
+    `pause_check_s` segundos (no en cada envio) para no pagar una lectura
+    de Sheets por mensaje. La auto-pausa por racha de fallos se detecta en
+    el mismo ciclo via `auto_paused` en la respuesta de send_next.
+    """
+
+    def __init__(
+        self,
+        is_paused: Callable[[], bool],
+        pause_check_s: float = 30.0,
+        max_consecutive_errors: int = 3,
+    ) -> None:
+        self._is_paused = is_paused
+        self.pause_check_s = float(pause_check_s)
+        self.max_consecutive_errors = max(1, int(max_consecutive_errors))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {"running": False, "stop_reason": None}
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._status)
+        snapshot["running"] = self.is_running()
+        return snapshot
+
+    def start(
+        self,
+        send_next: SendNext,
+        interval_s: float,
+        max_sends: Optional[int] = None,
+        label: str = "",
+    ) -> bool:
+        """Arranca el drenado. False si ya hay una corrida activa."""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._stop.clear()
+            self._status = {
+                "running": True,
+                "label": label,
+                "interval_s": float(interval_s),
+                "rate_per_minute": round(60.0 / interval_s, 3) if interval_s > 0 else None,
+                "max_sends": max_sends,
+                "sent": 0,
+                "failed": 0,
+                "errors": 0,
+                "started_at": datetime.utcnow().isoformat(),
+                "last_send_at": None,
+                "last_result": None,
+                "stopped_at": None,
+                "stop_reason": None,
+            }
+            self._thread = threading.Thread(
+                target=self._loop,
+                args=(send_next, float(interval_s), max_sends),
+                daemon=True,
+                name="CampaignPacer",
+            )
+            self._thread.start()
+        log.info("▶️ Pacer de campana iniciado (%s, cada %.1fs)", label, interval_s)
+        return True
+
+    def stop(self, reason: str = "stopped_by_request", timeout: float = 5.0) -> bool:
+        thread = self._thread
+        if not (thread and thread.is_alive()):
+            return False
+        with self._lock:
+            self._status["stop_reason"] = reason
+        self._stop.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        return True
+
+    def _finish(self, reason: str) -> None:
+        with self._lock:
+            if not self._status.get("stop_reason"):
+                self._status["stop_reason"] = reason
+            self._status["stopped_at"] = datetime.utcnow().isoformat()
+            final = dict(self._status)
+        log.info(
+            "⏹️ Pacer de campana detenido: %s (%s ✅, %s ❌)",
+            final["stop_reason"], final.get("sent"), final.get("failed"),
+        )
+
+    def _loop(self, send_next: SendNext, interval_s: float, max_sends: Optional[int]) -> None:
+        next_at = time.monotonic()
+        last_pause_check = float("-inf")
+        consecutive_errors = 0
+        attempts = 0
+
+        while not self._stop.is_set():
+            delay = next_at - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            # Intervalo fijo desde el inicio del envio anterior, sin deriva.
+            next_at = max(next_at + interval_s, time.monotonic())
+
+            if time.monotonic() - last_pause_check >= self.pause_check_s:
+                last_pause_check = time.monotonic()
+                if self._is_paused():
+                    self._finish("paused_by_boardroom")
+                    return
+
+            try:
+                result = send_next() or {}
+                consecutive_errors = 0
+            except Exception as exc:
+                consecutive_errors += 1
+                log.exception("❌ Error en envio del pacer de campana")
+                with self._lock:
+                    self._status["errors"] += 1
+                    self._status["last_result"] = {"error": f"{type(exc).__name__}: {exc}"}
+                if consecutive_errors >= self.max_consecutive_errors:
+                    self._finish("too_many_errors")
+                    return
+                continue
+
+            if result.get("reason") == "no_pending":
+                self._finish("drained")
+                return
+
+            attempts += 1
+            with self._lock:
+                self._status["sent" if result.get("sent") else "failed"] += 1
+                self._status["last_send_at"] = datetime.utcnow().isoformat()
+                self._status["last_result"] = result
+
+            if result.get("auto_paused"):
+                self._finish("auto_paused")
+                return
+            if max_sends is not None and attempts >= max_sends:
+                self._finish("max_sends_reached")
+                return
+
+        self._finish("stopped_by_request")
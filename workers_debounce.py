@@ -0,0 +1,217 @@
+# workers_debounce.py — agregacion de rafagas de mensajes entrantes por telefono
+# ------------------------------------------------------------
+# Un cliente que escribe "hola" / "quiero info" / "del seguro de auto" en
+# tres mensajes seguidos disparaba tres turnos completos (lookup en Sheets,
+# append a RESPUESTAS_CLIENTE, consulta a Boardroom, respuesta). Aqui cada
+# mensaje elegible se guarda en un buffer por llave (telefono) y el turno se
+# dispara una sola vez cuando la llave lleva `window_s` sin mensajes nuevos
+# (o al llegar a `max_wait_s` desde el primero, o a `max_items`).
+# Un thread despachador vigila los vencimientos y entrega los buffers a un
+# pool fijo; nunca corren dos flush de la misma llave a la vez. Un mensaje
+# no agregable va por `run_exclusive(key, fn)`: si la llave esta libre corre
+# en linea con la rafaga pendiente; si hay un flush en curso se encola detras
+# de el y lo corre el worker del pool al terminar. El thread del webhook
+# nunca espera un flush (Meta corta el webhook a los pocos segundos).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("vicky-secom.debounce")
+
+OnFlush = Callable[[str, List[Any]], None]
+Exclusive = Callable[[Optional[List[Any]]], None]
+
+
+class _Buffer:
+    __slots__ = ("items", "first_at", "due_at")
+
+    def __init__(self, now: float) -> None:
+        self.items: List[Any] = []
+        self.first_at = now
+        self.due_at = now
+
+
+class InboundDebouncer:
+    """Buffers por llave con ventana deslizante y tope de espera.
+
+    - submit(key, item): agrega y recalcula el vencimiento
+      min(ultimo + window_s, primero + max_wait_s).
+    - run_exclusive(key, fn): corre fn(buffer pendiente o None) con la llave
+      ocupada, en linea si esta libre o en el pool detras del flush en curso
+      (para que un mensaje no agregable no se adelante ni corra en paralelo
+      a la rafaga que lo precede). Nunca bloquea a quien llama.
+    - on_flush(key, items) y los fn encolados corren en el pool; sus
+      excepciones se registran y no detienen al despachador.
+    """
+
+    def __init__(
+        self,
+        on_flush: OnFlush,
+        window_s: float = 1.5,
+        max_wait_s: float = 5.0,
+        max_items: int = 10,
+        workers: int = 4,
+    ) -> None:
+        self.on_flush = on_flush
+        self.window_s = max(0.0, float(window_s))
+        self.max_wait_s = max(self.window_s, float(max_wait_s))
+        self.max_items = max(1, int(max_items))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="InboundFlush")
+        self._cond = threading.Condition()
+        self._buffers: Dict[str, _Buffer] = {}
+        self._running: Set[str] = set()
+        # Llave -> [(rafaga previa, fn)] esperando a que termine su flush.
+        self._queued: Dict[str, List[Tuple[Optional[List[Any]], Exclusive]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._counters = {"received": 0, "turns": 0, "coalesced": 0, "errors": 0, "queued_exclusive": 0}
+
+    # ---------- API ----------
+    def submit(self, key: str, item: Any) -> None:
+        now = time.monotonic()
+        with self._cond:
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = _Buffer(now)
+            buf.items.append(item)
+            if len(buf.items) >= self.max_items:
+                buf.due_at = now
+            else:
+                buf.due_at = min(now + self.window_s, buf.first_at + self.max_wait_s)
+            self._counters["received"] += 1
+            self._ensure_started()
+            self._cond.notify()
+
+    def run_exclusive(self, key: str, fn: Exclusive) -> bool:
+        """True si fn corrio en linea; False si quedo encolada detras del
+        flush en curso de la llave. En linea, las excepciones de fn llegan a
+        quien llama."""
+        with self._cond:
+            items = self._take_pending(key)
+            if key in self._running:
+                self._queued.setdefault(key, []).append((items, fn))
+                self._counters["queued_exclusive"] += 1
+                return False
+            self._running.add(key)
+        try:
+            fn(items)
+        finally:
+            self._release(key)
+        return True
+
+    def pending(self, key: str) -> bool:
+        with self._cond:
+            return key in self._buffers
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["buffered_keys"] = len(self._buffers)
+            stats["flushing"] = len(self._running)
+        stats.update(window_s=self.window_s, max_wait_s=self.max_wait_s)
+        return stats
+
+    def flush_all(self, timeout: float = 5.0) -> bool:
+        """Vence todos los buffers ya y espera a que terminen (tests /
+        apagado ordenado)."""
+        with self._cond:
+            for buf in self._buffers.values():
+                buf.due_at = 0.0
+            self._cond.notify()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._buffers and not self._running:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.flush_all(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ---------- Despachador ----------
+    def _ensure_started(self) -> None:
+        # Llamado con self._cond tomado.
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="InboundDebouncer")
+        self._thread.start()
+
+    def _take_pending(self, key: str) -> Optional[List[Any]]:
+        # Llamado con self._cond tomado.
+        buf = self._buffers.pop(key, None)
+        if buf is None:
+            return None
+        self._count_turn(buf.items)
+        return buf.items
+
+    def _release(self, key: str) -> None:
+        # La llave pasa al siguiente fn encolado (en el pool) o se libera.
+        with self._cond:
+            queued = self._queued.pop(key, None)
+            if queued:
+                self._pool.submit(self._run_queued, key, queued)
+                return
+            self._running.discard(key)
+            self._cond.notify_all()
+
+    def _count_turn(self, items: List[Any]) -> None:
+        self._counters["turns"] += 1
+        self._counters["coalesced"] += len(items) - 1
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                now = time.monotonic()
+                ready = [
+                    key for key, buf in self._buffers.items()
+                    if buf.due_at <= now and key not in self._running
+                ]
+                for key in ready:
+                    items = self._buffers.pop(key).items
+                    self._running.add(key)
+                    self._count_turn(items)
+                    self._pool.submit(self._run, key, items)
+                waiting = [
+                    buf.due_at for key, buf in self._buffers.items() if key not in self._running
+                ]
+                # Llaves con flush en curso: las despierta _run al terminar.
+                wait_s = max(0.0, min(waiting) - now) if waiting else None
+                self._cond.wait(wait_s)
+
+    def _run(self, key: str, items: List[Any]) -> None:
+        try:
+            self.on_flush(key, items)
+        except Exception:
+            with self._cond:
+                self._counters["errors"] += 1
+            log.exception("❌ Error procesando rafaga de mensajes")
+        finally:
+            self._release(key)
+
+    def _run_queued(self, key: str, queued: List[Tuple[Optional[List[Any]], Exclusive]]) -> None:
+        try:
+            for items, fn in queued:
+                try:
+                    fn(items)
+                except Exception:
+                    with self._cond:
+                        self._counters["errors"] += 1
+                    log.exception("❌ Error procesando mensaje encolado tras la rafaga")
+        finally:
+            self._release(key)
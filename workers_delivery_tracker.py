@@ -0,0 +1,311 @@
+# workers_delivery_tracker.py — estado de entrega por wamid y escritura en lote
+# ------------------------------------------------------------
+# Cada plantilla enviada escribia su fila "sent" en ENVIO_STATUS dentro del
+# envio, y los callbacks de status solo se logueaban si eran `failed`: no
+# habia tasa de entrega ni de lectura por lead. Aqui:
+#   - record_send guarda el wamid devuelto por Meta (telefono, plantilla,
+#     fila del lead) en un indice en memoria acotado;
+#   - on_statuses avanza el estado de cada wamid (sent < delivered < read;
+#     failed es terminal; un callback atrasado no retrocede el estado);
+#   - cada cambio queda pendiente, coalescido por wamid, y un thread lo
+#     escribe cada `flush_interval_s` en UNA llamada a ENVIO_STATUS y UNA a
+#     la hoja de leads (callables inyectados por app.py). Si la escritura
+#     falla, los pendientes se conservan para el siguiente ciclo.
+# Un wamid desconocido (respuestas de send_message, que no se rastrean, o
+# envios de otro worker / antes de un reinicio) solo se cuenta: cada
+# respuesta del bot agregaria filas. La excepcion es `failed`, que si se
+# escribe con el recipient_id del callback para no perder fallas.
+# El indice vive en memoria del proceso: supone UN worker recibiendo el
+# webhook y enviando plantillas. Con varios workers, el callback de un wamid
+# enviado por otro proceso cae como desconocido y sus delivered/read no se
+# escriben (ni en ENVIO_STATUS ni en la hoja de leads).
+# La fila del lead se captura al enviar y puede moverse antes del flush
+# (filas insertadas/borradas/ordenadas): cada actualizacion viaja con el
+# telefono para que el escritor verifique la fila antes de escribir.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("vicky-secom.delivery")
+
+STATE_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+
+WriteEnvioRows = Callable[[List[List[str]]], None]
+WriteLeadUpdates = Callable[[Dict[int, Tuple[str, Dict[str, str]]]], None]
+
+
+def _iso_from_epoch(value: Any) -> str:
+    try:
+        return datetime.fromtimestamp(int(value), tz=timezone.utc).isoformat()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return datetime.now(timezone.utc).isoformat()
+
+
+class _Message:
+    __slots__ = ("phone", "template", "lead_row", "state", "updated_at")
+
+    def __init__(self, phone: str, template: str, lead_row: Optional[int], state: str, updated_at: str) -> None:
+        self.phone = phone
+        self.template = template
+        self.lead_row = lead_row
+        self.state = state
+        self.updated_at = updated_at
+
+
+class DeliveryTracker:
+    """Indice wamid -> estado de entrega con escritura periodica en lote.
+
+    `normalize_phone` convierte el telefono a la llave de ENVIO_STATUS
+    (ultimos 10 digitos en app.py). Las filas para ENVIO_STATUS son
+    [telefono, wamid, estado, fecha_iso, plantilla]; las actualizaciones de
+    leads son {fila: (telefono, {columna: valor})} con `state_column`/
+    `time_column`; la fila es la del envio y el escritor la verifica contra
+    el telefono.
+    """
+
+    def __init__(
+        self,
+        write_envio_rows: WriteEnvioRows,
+        write_lead_updates: Optional[WriteLeadUpdates] = None,
+        normalize_phone: Callable[[str], str] = str,
+        flush_interval_s: float = 10.0,
+        max_messages: int = 50000,
+        max_pending: int = 5000,
+        state_column: str = "ENTREGA_ESTADO",
+        time_column: str = "ENTREGA_AT",
+    ) -> None:
+        self.write_envio_rows = write_envio_rows
+        self.write_lead_updates = write_lead_updates
+        self.normalize_phone = normalize_phone
+        self.flush_interval_s = max(0.05, float(flush_interval_s))
+        self.max_messages = max(1, int(max_messages))
+        self.max_pending = max(1, int(max_pending))
+        self.state_column = state_column
+        self.time_column = time_column
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._messages: "OrderedDict[str, _Message]" = OrderedDict()
+        self._last_template: Dict[str, str] = {}
+        self._pending_rows: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._pending_leads: Dict[int, Tuple[str, Dict[str, str]]] = {}
+        self._seq = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._atexit = False
+        self._counters = {
+            "sends": 0,
+            "send_failures": 0,
+            "statuses": 0,
+            "unknown": 0,
+            "stale": 0,
+            "rows_written": 0,
+            "lead_updates_written": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "dropped_pending": 0,
+        }
+        self._reached = {"sent": 0, "delivered": 0, "read": 0, "failed": 0}
+
+    # ---------- API ----------
+    def record_send(
+        self,
+        wamid: str,
+        phone: str,
+        template: str,
+        lead_row: Optional[int] = None,
+        status: str = "sent",
+        timestamp_iso: Optional[str] = None,
+    ) -> None:
+        """Envio aceptado por Meta (status "sent", con wamid) o envio fallido
+        (status "failed", normalmente sin wamid)."""
+        when = timestamp_iso or datetime.now(timezone.utc).isoformat()
+        phone_key = self.normalize_phone(phone)
+        with self._lock:
+            if status == "failed":
+                self._counters["send_failures"] += 1
+            else:
+                self._counters["sends"] += 1
+                self._reached["sent"] += 1
+            if template:
+                self._last_template[phone_key] = template
+            if wamid:
+                self._messages[wamid] = _Message(phone_key, template, lead_row, status, when)
+                self._messages.move_to_end(wamid)
+                while len(self._messages) > self.max_messages:
+                    self._messages.popitem(last=False)
+                key = wamid
+            else:
+                self._seq += 1
+                key = f"sin-wamid:{self._seq}"
+            self._queue_row(key, [phone_key, wamid or "", status, when, template or ""])
+            if lead_row:
+                self._queue_lead(lead_row, phone_key, status, when)
+        self._ensure_started()
+
+    def on_statuses(self, statuses: List[Dict[str, Any]]) -> None:
+        """Callbacks de Meta (ya extraidos del payload), en orden de llegada."""
+        if not statuses:
+            return
+        with self._lock:
+            for st in statuses:
+                wamid = str(st.get("id") or "")
+                state = str(st.get("status") or "").lower()
+                if not wamid or state not in STATE_RANK:
+                    continue
+                self._counters["statuses"] += 1
+                when = _iso_from_epoch(st.get("timestamp"))
+                msg = self._messages.get(wamid)
+                if msg is None:
+                    self._counters["unknown"] += 1
+                    if state == "failed":
+                        phone_key = self.normalize_phone(str(st.get("recipient_id") or ""))
+                        self._queue_row(wamid, [phone_key, wamid, state, when, ""])
+                    continue
+                previous = STATE_RANK.get(msg.state, 0)
+                if STATE_RANK[state] <= previous:
+                    self._counters["stale"] += 1
+                    continue
+                msg.state = state
+                msg.updated_at = when
+                if state == "failed":
+                    self._reached["failed"] += 1
+                else:
+                    # Un "read" que llega sin "delivered" previo tambien cuenta
+                    # como entregado.
+                    for reached in ("delivered", "read"):
+                        if previous < STATE_RANK[reached] <= STATE_RANK[state]:
+                            self._reached[reached] += 1
+                self._queue_row(wamid, [msg.phone, wamid, state, when, msg.template])
+                if msg.lead_row:
+                    self._queue_lead(msg.lead_row, msg.phone, state, when)
+        self._ensure_started()
+
+    def state_of(self, wamid: str) -> Optional[str]:
+        with self._lock:
+            msg = self._messages.get(wamid)
+            return msg.state if msg else None
+
+    def last_template(self, phone: str) -> str:
+        """Ultima plantilla enviada a ese telefono por este proceso."""
+        with self._lock:
+            return self._last_template.get(self.normalize_phone(phone), "")
+
+    def flush(self) -> bool:
+        """Escribe los pendientes ahora. False si alguna escritura fallo (los
+        pendientes se conservan)."""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending_rows.items())
+                leads = self._pending_leads
+                self._pending_rows = OrderedDict()
+                self._pending_leads = {}
+            if not rows and not leads:
+                return True
+            ok = True
+            if rows:
+                try:
+                    self.write_envio_rows([row for _, row in rows])
+                    self._count("rows_written", len(rows))
+                except Exception:
+                    ok = False
+                    log.exception("❌ Error escribiendo %s filas en ENVIO_STATUS; se reintenta", len(rows))
+                    self._requeue_rows(rows)
+            if leads and self.write_lead_updates is not None:
+                try:
+                    self.write_lead_updates(leads)
+                    self._count("lead_updates_written", len(leads))
+                except Exception:
+                    ok = False
+                    log.exception("❌ Error actualizando entrega de %s leads; se reintenta", len(leads))
+                    self._requeue_leads(leads)
+            self._count("flushes" if ok else "flush_errors", 1)
+            return ok
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            reached = dict(self._reached)
+            stats.update(
+                tracked=len(self._messages),
+                pending_rows=len(self._pending_rows),
+                pending_leads=len(self._pending_leads),
+                reached=reached,
+            )
+        sent = reached["sent"]
+        stats["delivery_rate"] = round(reached["delivered"] / sent, 4) if sent else None
+        stats["read_rate"] = round(reached["read"] / sent, 4) if sent else None
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detiene el thread y hace un ultimo flush (atexit)."""
+        self._stop.set()
+        self._wakeup.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    # ---------- Interno ----------
+    def _queue_row(self, key: str, row: List[str]) -> None:
+        # Llamado con self._lock tomado. Un wamid con fila pendiente solo
+        # conserva su ultimo estado (coalescido hasta el siguiente flush).
+        self._pending_rows.pop(key, None)
+        self._pending_rows[key] = row
+        while len(self._pending_rows) > self.max_pending:
+            self._pending_rows.popitem(last=False)
+            self._counters["dropped_pending"] += 1
+
+    def _queue_lead(self, lead_row: int, phone: str, state: str, when: str) -> None:
+        # Llamado con self._lock tomado.
+        self._pending_leads[int(lead_row)] = (phone, {self.state_column: state, self.time_column: when})
+
+    def _requeue_rows(self, rows: List[Any]) -> None:
+        with self._lock:
+            newer = self._pending_rows
+            self._pending_rows = OrderedDict((key, row) for key, row in rows if key not in newer)
+            self._pending_rows.update(newer)
+            while len(self._pending_rows) > self.max_pending:
+                self._pending_rows.popitem(last=False)
+                self._counters["dropped_pending"] += 1
+
+    def _requeue_leads(self, leads: Dict[int, Tuple[str, Dict[str, str]]]) -> None:
+        with self._lock:
+            for row, updates in leads.items():
+                self._pending_leads.setdefault(row, updates)
+
+    def _count(self, name: str, n: int) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._flush_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="DeliveryTracker")
+            self._thread.start()
+            if not self._atexit:
+                atexit.register(self.stop)
+                self._atexit = True
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.flush()
+            except Exception:
+                log.exception("❌ Error en flush del tracker de entregas")
@@ -0,0 +1,351 @@
+# workers_outbox.py — outbox durable (SQLite) para eventos y confirmaciones del bus
+# ------------------------------------------------------------
+# El turno del webhook ya no habla con el bus: solo inserta la fila en la
+# tabla `bus_outbox` (una escritura local, sin RTT) y un thread drenador la
+# entrega despues, en lotes, con reintentos y backoff exponencial. Cada fila
+# tiene una llave de dedupe (instruction_id / event_id): encolar dos veces lo
+# mismo no duplica, y si el proceso muere a medio envio la fila sigue
+# pendiente y se reenvia al arrancar -- entrega at-least-once hacia el Ledger.
+# Los headers (token) no se guardan en disco: se piden a `headers_for(kind)`
+# al momento de entregar. La base va en modo WAL con synchronous=NORMAL: el
+# INSERT del webhook no espera un fsync por fila (un corte de luz puede
+# perder las ultimas filas confirmadas, no corrompe la base).
+# Varios procesos pueden compartir la base (workers de gunicorn): cada fila
+# se reclama con un UPDATE a 'sending' condicionado a status='pending' y
+# solo la entrega quien lo gano; una fila 'sending' de un proceso muerto
+# vuelve a 'pending' tras `stale_sending_s`. Los lotes reclamados se
+# entregan con `workers` threads: sin BUS_BATCH_URL cada fila es un POST y
+# el techo es ~workers / latencia_del_bus eventos por segundo por proceso.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("vicky-secom.outbox")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bus_outbox (
+    dedupe_key  TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    batch_url   TEXT,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    next_at     REAL NOT NULL,
+    last_error  TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bus_outbox_due ON bus_outbox (status, next_at);
+"""
+
+# Fila pendiente: (dedupe_key, kind, url, batch_url, payload_json, attempts)
+_Row = Tuple[str, str, str, Optional[str], str, int]
+
+
+class Outbox:
+    """Cola durable de POSTs hacia el bus con un thread drenador.
+
+    - enqueue(dedupe_key, kind, url, payload, batch_url=None): inserta la
+      fila (INSERT OR IGNORE por dedupe_key) y despierta al drenador.
+      Devuelve False si la llave ya existia.
+    - drain_once(): reclama y entrega lo vencido (los grupos en paralelo
+      con `workers` threads); publico para probar sin thread.
+    - Respuesta 2xx o 409 (el receptor ya lo tenia) marca `sent`; 429/5xx,
+      timeout o error de red reprograman con backoff; cualquier otro 4xx es
+      un payload que nunca va a pasar y queda `dead` para revision, igual que
+      al agotar max_attempts.
+    - Filas consecutivas con el mismo `batch_url` viajan en un solo POST
+      {"events": [...]}; sin batch_url cada fila va sola a su `url`.
+    - `breaker` opcional (utils_circuit_breaker): con el circuito abierto el
+      drenador no intenta nada y las filas esperan en disco.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        headers_for: Callable[[str], Dict[str, str]],
+        batch_size: int = 50,
+        max_attempts: int = 10,
+        retry_base_s: float = 2.0,
+        retry_max_s: float = 600.0,
+        idle_poll_s: float = 30.0,
+        keep_sent_s: float = 86400.0,
+        timeout: float = 3.0,
+        session: Optional[requests.Session] = None,
+        breaker: Any = None,
+        workers: int = 2,
+        stale_sending_s: float = 60.0,
+    ) -> None:
+        self.db_path = db_path
+        self.headers_for = headers_for
+        self.batch_size = max(1, int(batch_size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_s = float(retry_base_s)
+        self.retry_max_s = float(retry_max_s)
+        self.idle_poll_s = float(idle_poll_s)
+        self.keep_sent_s = float(keep_sent_s)
+        self.timeout = timeout
+        self.breaker = breaker
+        self.workers = max(1, int(workers))
+        self.stale_sending_s = max(float(stale_sending_s), float(timeout) * 2)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._session = session or self._pooled_session()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"enqueued": 0, "duplicates": 0, "sent": 0, "retried": 0, "dead": 0, "batches": 0}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _pooled_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # ---------- API ----------
+    def enqueue(
+        self,
+        dedupe_key: str,
+        kind: str,
+        url: str,
+        payload: Dict[str, Any],
+        batch_url: Optional[str] = None,
+    ) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO bus_outbox "
+                "(dedupe_key, kind, url, batch_url, payload, status, attempts, next_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)",
+                (dedupe_key, kind, url, batch_url, json.dumps(payload, ensure_ascii=False), now, now, now),
+            )
+            inserted = cur.rowcount > 0
+            self._counters["enqueued" if inserted else "duplicates"] += 1
+        if inserted:
+            self._wakeup.set()
+        return inserted
+
+    def preconnect(self, url: str) -> int:
+        """Abre (TLS incluido) una conexion del pool hacia el host de `url`
+        para que el primer envio real no pague el handshake. Devuelve el
+        status HTTP; cualquier respuesta deja la conexion en el pool."""
+        resp = self._session.head(url, timeout=self.timeout)
+        return resp.status_code
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM bus_outbox GROUP BY status").fetchall()
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM bus_outbox WHERE status = 'pending'"
+            ).fetchone()
+            counters = dict(self._counters)
+        oldest_at = oldest[0] if oldest else None
+        return {
+            "running": self.is_running(),
+            "counts": {status: count for status, count in rows},
+            "oldest_pending_age_s": round(time.time() - oldest_at, 1) if oldest_at else None,
+            **counters,
+        }
+
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM bus_outbox WHERE status = 'pending'").fetchone()
+        return int(row[0] if row else 0)
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="BusOutbox")
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # ---------- Drenado ----------
+    def drain_once(self, now: Optional[float] = None) -> int:
+        """Entrega un lote de filas vencidas. Devuelve cuantas quedaron `sent`."""
+        now = time.time() if now is None else now
+        if self.breaker is not None and not self.breaker.allow():
+            return 0
+        self._requeue_stale(now)
+        with self._lock:
+            candidates: List[_Row] = self._conn.execute(
+                "SELECT dedupe_key, kind, url, batch_url, payload, attempts FROM bus_outbox "
+                "WHERE status = 'pending' AND next_at <= ? ORDER BY created_at LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            # Reclamo atomico por fila: otro proceso con la misma base pudo
+            # tomarla entre el SELECT y aqui; solo se entrega si la ganamos.
+            due = [
+                row for row in candidates
+                if self._conn.execute(
+                    "UPDATE bus_outbox SET status = 'sending', updated_at = ? "
+                    "WHERE dedupe_key = ? AND status = 'pending'",
+                    (time.time(), row[0]),
+                ).rowcount == 1
+            ]
+
+        groups = self._group(due)
+        if self.workers > 1 and len(groups) > 1:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="BusOutboxPost")
+            sent = sum(self._pool.map(self._deliver, groups))
+        else:
+            sent = sum(self._deliver(group) for group in groups)
+        self._prune(now)
+        return sent
+
+    def _deliver(self, group: List[_Row]) -> int:
+        status, error = self._post(group)
+        return self._settle(group, status, error)
+
+    def _requeue_stale(self, now: float) -> int:
+        """Filas que un proceso muerto dejo en `sending` vuelven a la cola."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE bus_outbox SET status = 'pending', updated_at = ? "
+                "WHERE status = 'sending' AND updated_at < ?",
+                (now, now - self.stale_sending_s),
+            )
+        if cur.rowcount:
+            log.warning("♻️ Outbox: %s filas huerfanas en sending vuelven a pending", cur.rowcount)
+        return cur.rowcount
+
+    @staticmethod
+    def _group(rows: List[_Row]) -> List[List[_Row]]:
+        groups: List[List[_Row]] = []
+        for row in rows:
+            batch_url = row[3]
+            if batch_url and groups and groups[-1][0][3] == batch_url:
+                groups[-1].append(row)
+            else:
+                groups.append([row])
+        return groups
+
+    def _post(self, group: List[_Row]) -> Tuple[Optional[int], Optional[str]]:
+        first = group[0]
+        try:
+            headers = self.headers_for(first[1])
+            if len(group) > 1:
+                body: Any = {"events": [json.loads(row[4]) for row in group]}
+                resp = self._session.post(first[3], json=body, headers=headers, timeout=self.timeout)
+            else:
+                resp = self._session.post(first[2], json=json.loads(first[4]), headers=headers, timeout=self.timeout)
+        except Exception as exc:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            return None, f"{type(exc).__name__}: {exc}"[:500]
+        if self.breaker is not None:
+            if resp.status_code == 429 or resp.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        return resp.status_code, None if resp.status_code < 400 else f"http_{resp.status_code}"
+
+    def _settle(self, group: List[_Row], status: Optional[int], error: Optional[str]) -> int:
+        now = time.time()
+        delivered = status is not None and (status < 400 or status == 409)
+        retryable = status is None or status == 429 or status >= 500
+        updates_sent: List[Tuple[float, str]] = []
+        updates_retry: List[Tuple[int, float, Optional[str], float, str]] = []
+        updates_dead: List[Tuple[int, Optional[str], float, str]] = []
+        for key, kind, _url, _batch_url, _payload, attempts in group:
+            attempts += 1
+            if delivered:
+                updates_sent.append((now, key))
+            elif retryable and attempts < self.max_attempts:
+                delay = min(self.retry_max_s, self.retry_base_s * (2 ** (attempts - 1)))
+                updates_retry.append((attempts, now + delay, error, now, key))
+            else:
+                updates_dead.append((attempts, error, now, key))
+                log.error("❌ Outbox: %s %s descartado tras %s intentos (%s)", kind, key, attempts, error)
+
+        with self._lock:
+            if updates_sent:
+                self._conn.executemany(
+                    "UPDATE bus_outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, "
+                    "updated_at = ? WHERE dedupe_key = ?",
+                    updates_sent,
+                )
+            if updates_retry:
+                self._conn.executemany(
+                    "UPDATE bus_outbox SET status = 'pending', attempts = ?, next_at = ?, last_error = ?, "
+                    "updated_at = ? WHERE dedupe_key = ?",
+                    updates_retry,
+                )
+            if updates_dead:
+                self._conn.executemany(
+                    "UPDATE bus_outbox SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? "
+                    "WHERE dedupe_key = ?",
+                    updates_dead,
+                )
+            self._counters["sent"] += len(updates_sent)
+            self._counters["retried"] += len(updates_retry)
+            self._counters["dead"] += len(updates_dead)
+            if len(group) > 1:
+                self._counters["batches"] += 1
+        if updates_retry:
+            log.warning("⚠️ Outbox: %s eventos reprogramados (%s)", len(updates_retry), error)
+        return len(updates_sent)
+
+    def _prune(self, now: float) -> None:
+        # Las filas `sent` se conservan un rato solo para dedupe de reencolados.
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM bus_outbox WHERE status = 'sent' AND updated_at < ?",
+                (now - self.keep_sent_s,),
+            )
+
+    def _seconds_until_next(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_at) FROM bus_outbox WHERE status = 'pending'"
+            ).fetchone()
+        if not row or row[0] is None:
+            return self.idle_poll_s
+        return max(0.0, min(self.idle_poll_s, row[0] - time.time()))
+
+    def _loop(self) -> None:
+        log.info("📮 Outbox del bus iniciado (%s)", self.db_path)
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                if self.drain_once() >= self.batch_size:
+                    continue  # hay mas atrasado: seguir sin esperar
+                wait_s = self._seconds_until_next()
+            except Exception:
+                log.exception("❌ Error drenando outbox del bus")
+                wait_s = self.idle_poll_s
+            if self.breaker is not None and self.breaker.state != "closed":
+                wait_s = max(wait_s, 1.0)
+            self._wakeup.wait(wait_s)
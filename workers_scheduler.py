@@ -0,0 +1,279 @@
+# workers_scheduler.py — jobs diferidos persistentes (SQLite) con un solo dispatcher
+# ------------------------------------------------------------
+# Reemplaza el patron "threading.Thread + time.sleep(dias)" por una cola de
+# jobs en SQLite ordenada por run_at. Un unico thread despachador duerme hasta
+# el siguiente vencimiento (o hasta que alguien agenda algo antes) y ejecuta
+# el handler registrado para cada `kind`. Los jobs sobreviven reinicios y
+# deploys: al arrancar se retoman los pendientes, incluidos los que quedaron
+# a medias ("running") cuando murio el proceso -- entrega at-least-once.
+# Varios workers pueden compartir la base: cada job se reclama con un UPDATE
+# condicionado a status='pending' y solo lo corre quien lo gano; un "running"
+# vuelve a la cola solo si lleva mas de `stale_running_s` sin actualizarse.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("vicky-secom.scheduler")
+
+JobHandler = Callable[[Dict[str, Any]], None]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    run_at      REAL NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_error  TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due ON scheduled_jobs (status, run_at);
+"""
+
+
+def _to_epoch(when: datetime | float | int) -> float:
+    if isinstance(when, datetime):
+        return when.timestamp()
+    return float(when)
+
+
+class JobScheduler:
+    """Cola de jobs diferidos respaldada por SQLite.
+
+    - schedule(kind, run_at, payload, job_id=None): agenda (idempotente por job_id).
+    - register(kind, handler): handler(payload) se ejecuta en el dispatcher.
+    - start()/stop(): ciclo de vida del unico thread despachador.
+
+    Un handler que lanza excepcion se reintenta con backoff exponencial
+    (retry_base_s * 2**intentos) hasta max_attempts; despues queda `failed`
+    en la tabla para revision manual, nunca se pierde en silencio.
+
+    Un job en `running` por mas de `stale_running_s` se considera huerfano
+    (proceso muerto) y se reencola; debe ser mayor que el job mas lento.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_attempts: int = 5,
+        retry_base_s: float = 60.0,
+        idle_poll_s: float = 300.0,
+        batch_size: int = 20,
+        stale_running_s: float = 900.0,
+    ) -> None:
+        self.db_path = db_path
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_s = float(retry_base_s)
+        self.idle_poll_s = float(idle_poll_s)
+        self.batch_size = max(1, int(batch_size))
+        self.stale_running_s = float(stale_running_s)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+        self._requeue_stale(time.time())
+
+    # ---------- API ----------
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def schedule(
+        self,
+        kind: str,
+        run_at: datetime | float | int,
+        payload: Optional[Dict[str, Any]] = None,
+        job_id: Optional[str] = None,
+    ) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO scheduled_jobs "
+                "(id, kind, run_at, payload, status, attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+                (job_id, kind, _to_epoch(run_at), json.dumps(payload or {}, ensure_ascii=False), now, now),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE scheduled_jobs SET status = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND status = 'pending'",
+                (time.time(), job_id),
+            )
+        return cur.rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM scheduled_jobs GROUP BY status"
+            ).fetchall()
+            nxt = self._conn.execute(
+                "SELECT MIN(run_at) FROM scheduled_jobs WHERE status = 'pending'"
+            ).fetchone()
+        counts = {status: count for status, count in rows}
+        next_run = nxt[0] if nxt else None
+        return {
+            "running": self.is_running(),
+            "counts": counts,
+            "next_run_at": datetime.utcfromtimestamp(next_run).isoformat() if next_run else None,
+        }
+
+    def pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM scheduled_jobs WHERE status = 'pending'"
+            ).fetchone()
+        return int(row[0] if row else 0)
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="JobScheduler")
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ---------- Dispatcher ----------
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Ejecuta los jobs vencidos a `now`. Devuelve cuantos corrio.
+        Publico para poder probarlo sin thread."""
+        now = time.time() if now is None else now
+        self._requeue_stale(now)
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT id, kind, payload, attempts FROM scheduled_jobs "
+                "WHERE status = 'pending' AND run_at <= ? ORDER BY run_at LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            # Reclamo atomico por job: otro worker con la misma base pudo
+            # tomarlo entre el SELECT y aqui; solo se corre si lo ganamos.
+            due = [
+                job for job in candidates
+                if self._conn.execute(
+                    "UPDATE scheduled_jobs SET status = 'running', updated_at = ? "
+                    "WHERE id = ? AND status = 'pending'",
+                    (time.time(), job[0]),
+                ).rowcount == 1
+            ]
+
+        for job_id, kind, raw_payload, attempts in due:
+            self._run_one(job_id, kind, raw_payload, attempts)
+        return len(due)
+
+    def _requeue_stale(self, now: float) -> int:
+        """Jobs que quedaron en `running` por un proceso muerto vuelven a la cola."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE scheduled_jobs SET status = 'pending', updated_at = ? "
+                "WHERE status = 'running' AND updated_at < ?",
+                (now, now - self.stale_running_s),
+            )
+        if cur.rowcount:
+            log.warning("♻️ %s jobs huerfanos en running vuelven a pending", cur.rowcount)
+        return cur.rowcount
+
+    def _run_one(self, job_id: str, kind: str, raw_payload: str, attempts: int) -> None:
+        handler = self._handlers.get(kind)
+        error: Optional[str] = None
+        if handler is None:
+            error = f"sin handler para kind={kind}"
+        else:
+            try:
+                handler(json.loads(raw_payload or "{}"))
+            except Exception as exc:
+                log.exception("❌ Job %s (%s) fallo", job_id, kind)
+                error = f"{type(exc).__name__}: {exc}"
+
+        now = time.time()
+        with self._lock:
+            if error is None:
+                self._conn.execute(
+                    "UPDATE scheduled_jobs SET status = 'done', attempts = ?, last_error = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (attempts + 1, now, job_id),
+                )
+                return
+            attempts += 1
+            if attempts >= self.max_attempts or handler is None:
+                self._conn.execute(
+                    "UPDATE scheduled_jobs SET status = 'failed', attempts = ?, last_error = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (attempts, error, now, job_id),
+                )
+                log.error("⛔ Job %s (%s) descartado tras %s intentos: %s", job_id, kind, attempts, error)
+                return
+            self._conn.execute(
+                "UPDATE scheduled_jobs SET status = 'pending', attempts = ?, last_error = ?, "
+                "run_at = ?, updated_at = ? WHERE id = ?",
+                (attempts, error, now + self.retry_base_s * (2 ** (attempts - 1)), now, job_id),
+            )
+
+    def _seconds_until_next(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(run_at) FROM scheduled_jobs WHERE status = 'pending'"
+            ).fetchone()
+        next_run = row[0] if row else None
+        if next_run is None:
+            return self.idle_poll_s
+        return max(0.0, min(self.idle_poll_s, next_run - time.time()))
+
+    def _loop(self) -> None:
+        log.info("⏱️ JobScheduler iniciado (%s)", self.db_path)
+        while not self._stop.is_set():
+            try:
+                if self.run_due():
+                    continue
+                wait_s = self._seconds_until_next()
+            except Exception:
+                log.exception("❌ Error en ciclo del JobScheduler")
+                wait_s = self.idle_poll_s
+            self._wakeup.wait(wait_s)
+            self._wakeup.clear()
+        log.info("⏹️ JobScheduler detenido")
+
+    def list_jobs(self, status: str = "pending", limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, run_at, payload, attempts, last_error FROM scheduled_jobs "
+                "WHERE status = ? ORDER BY run_at LIMIT ?",
+                (status, limit),
+            ).fetchall()
+        return [
+            {
+                "id": r[0],
+                "kind": r[1],
+                "run_at": datetime.utcfromtimestamp(r[2]).isoformat(),
+                "payload": json.loads(r[3] or "{}"),
+                "attempts": r[4],
+                "last_error": r[5],
+            }
+            for r in rows
+        ]
@@ -0,0 +1,137 @@
+# workers_status_buffer.py — ring buffer para callbacks de status de WhatsApp
+# ------------------------------------------------------------
+# La mayoria de los POST de Meta a /webhook son `statuses` (sent, delivered,
+# read, failed). Cada uno pasaba por request.get_json, el log del payload y
+# el handler generico, ocupando un worker igual que un mensaje real; en una
+# campana grande la avalancha de status competia con los clientes.
+# Aqui el webhook detecta el caso con una busqueda de bytes sobre el cuerpo
+# crudo (sin parsear JSON), lo deja en un ring buffer acotado y responde 200.
+# Un solo thread parsea los cuerpos fuera del request y entrega los status en
+# lotes a `on_statuses` (inyectado por app.py). Buffer lleno = se descarta el
+# cuerpo mas viejo y se cuenta: los status son informativos, no turnos.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+log = logging.getLogger("vicky-secom.status")
+
+OnStatuses = Callable[[List[Dict[str, Any]]], None]
+
+
+def is_status_only(body: bytes) -> bool:
+    """True si el cuerpo trae `statuses` y ningun `messages`. Las llaves de
+    JSON siempre van entre comillas, asi que basta buscar los bytes."""
+    return b'"statuses"' in body and b'"messages"' not in body
+
+
+def extract_statuses(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Todos los status del payload, de todas las entries/changes, en orden."""
+    statuses: List[Dict[str, Any]] = []
+    for entry in payload.get("entry") or []:
+        for change in (entry or {}).get("changes") or []:
+            value = (change or {}).get("value") or {}
+            statuses.extend(st for st in value.get("statuses") or [] if isinstance(st, dict))
+    return statuses
+
+
+class StatusRingBuffer:
+    """Cuerpos crudos en una deque acotada; un thread los procesa en lotes."""
+
+    def __init__(self, on_statuses: OnStatuses, capacity: int = 10000, batch_max: int = 200) -> None:
+        self.on_statuses = on_statuses
+        self.capacity = max(1, int(capacity))
+        self.batch_max = max(1, int(batch_max))
+        self._buffer: Deque[bytes] = deque(maxlen=self.capacity)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._inflight = 0
+        self._counters = {"received": 0, "dropped": 0, "statuses": 0, "batches": 0, "parse_errors": 0, "errors": 0}
+
+    # ---------- API ----------
+    def submit(self, body: bytes) -> None:
+        with self._cond:
+            if len(self._buffer) == self.capacity:
+                self._counters["dropped"] += 1
+            self._buffer.append(body)
+            self._counters["received"] += 1
+            self._ensure_started()
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["queued"] = len(self._buffer)
+        stats.update(capacity=self.capacity, running=bool(self._thread and self._thread.is_alive()))
+        return stats
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que el buffer se vacie (tests / apagado ordenado)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._buffer and self._inflight == 0:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ---------- Worker ----------
+    def _ensure_started(self) -> None:
+        # Llamado con self._cond tomado. Arranque perezoso: tras un fork el
+        # hijo levanta su propio thread con el primer status.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="StatusBuffer")
+        self._thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._buffer and not self._stop:
+                    self._cond.wait()
+                if self._stop and not self._buffer:
+                    return
+                bodies = [self._buffer.popleft() for _ in range(min(self.batch_max, len(self._buffer)))]
+                self._inflight += 1
+            try:
+                self._process(bodies)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+
+    def _process(self, bodies: List[bytes]) -> None:
+        statuses: List[Dict[str, Any]] = []
+        parse_errors = 0
+        for body in bodies:
+            try:
+                statuses.extend(extract_statuses(json.loads(body)))
+            except (ValueError, AttributeError, TypeError):
+                parse_errors += 1
+        errors = 0
+        if statuses:
+            try:
+                self.on_statuses(statuses)
+            except Exception:
+                errors = 1
+                log.exception("❌ Error procesando lote de %s status", len(statuses))
+        with self._cond:
+            self._counters["statuses"] += len(statuses)
+            self._counters["batches"] += 1
+            self._counters["parse_errors"] += parse_errors
+            self._counters["errors"] += errors
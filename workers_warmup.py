@@ -0,0 +1,125 @@
+# workers_warmup.py — fase de calentamiento opcional al arrancar el worker
+# ------------------------------------------------------------
+# Tras un deploy, los primeros clientes pagaban el handshake TLS contra
+# Google y el bus, la creacion de los clientes de Sheets/Drive y la lectura
+# en frio de la hoja de leads. Warmup corre una lista de pasos (callables
+# inyectados por app.py) una sola vez, en un thread propio, y expone su
+# estado para /ext/ready:
+#   - un paso que falla se registra y no detiene a los demas;
+#   - `ready` es True al terminar todos los pasos o al vencer `deadline_s`
+#     (un upstream lento no deja al worker fuera del balanceador);
+#   - tras fork (gunicorn --preload) el hijo vuelve a calentar sus propias
+#     conexiones: las del padre no se comparten.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("vicky-secom.warmup")
+
+
+class Warmup:
+    """Pasos de calentamiento en orden; estado consultable en todo momento."""
+
+    def __init__(self, deadline_s: float = 60.0) -> None:
+        self.deadline_s = max(0.0, float(deadline_s))
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._results: List[Dict[str, Any]] = []
+        self._fork_hook = False
+
+    def add(self, name: str, fn: Callable[[], Any]) -> None:
+        self._steps.append((name, fn))
+
+    def start(self) -> bool:
+        """Lanza el calentamiento en segundo plano. False si ya arranco."""
+        with self._lock:
+            if self._started_at is not None:
+                return False
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="vicky-warmup", daemon=True)
+            self._thread.start()
+        if not self._fork_hook and hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+            self._fork_hook = True
+        return True
+
+    def run(self) -> None:
+        """Calentamiento sincrono (tests y scripts)."""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.monotonic()
+        self._run()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready()
+
+    def ready(self) -> bool:
+        with self._lock:
+            if self._started_at is None:
+                return False
+            if self._finished_at is not None:
+                return True
+            return time.monotonic() - self._started_at >= self.deadline_s
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            started, finished = self._started_at, self._finished_at
+            results = [dict(r) for r in self._results]
+        if started is None:
+            state = "pending"
+        elif finished is not None:
+            state = "done"
+        elif time.monotonic() - started >= self.deadline_s:
+            state = "deadline_exceeded"
+        else:
+            state = "running"
+        end = finished if finished is not None else time.monotonic()
+        return {
+            "state": state,
+            "ready": state in ("done", "deadline_exceeded"),
+            "elapsed_ms": round((end - started) * 1000, 1) if started is not None else None,
+            "steps": results,
+            "pending": [name for name, _ in self._steps[len(results):]],
+        }
+
+    def _run(self) -> None:
+        for name, fn in self._steps:
+            started = time.monotonic()
+            result: Dict[str, Any] = {"name": name, "ok": True}
+            try:
+                detail = fn()
+                if detail is not None:
+                    result["detail"] = detail
+            except Exception as exc:
+                result["ok"] = False
+                result["error"] = f"{type(exc).__name__}: {exc}"
+                log.warning("⚠️ Warm-up %s fallo: %s", name, result["error"])
+            result["ms"] = round((time.monotonic() - started) * 1000, 1)
+            with self._lock:
+                self._results.append(result)
+        with self._lock:
+            self._finished_at = time.monotonic()
+            elapsed = self._finished_at - (self._started_at or self._finished_at)
+        failed = [r["name"] for r in self._results if not r["ok"]]
+        log.info("🔥 Warm-up terminado en %.0f ms (fallidos: %s)", elapsed * 1000, ", ".join(failed) or "ninguno")
+
+    def _restart_in_child(self) -> None:
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self._finished_at = None
+        self._results = []
+        self.start()